@@ -1,12 +1,13 @@
 from nose.tools import assert_regexp_matches, assert_equal, assert_false
 
-from cassandra import (InvalidRequest, ReadFailure,
+from cassandra import (ConsistencyLevel, InvalidRequest, ReadFailure,
                        ReadTimeout, Unauthorized, Unavailable, WriteFailure,
                        WriteTimeout)
-from cassandra.query import SimpleStatement
 from time import sleep
 
 import tools
+from statement_cache import STATEMENT_CACHE
+from token_ranges import TokenRangeScanner
 
 """
 The assertion methods in this file are used to structure, execute, and test different queries and scenarios. Use these anytime you are trying
@@ -106,42 +107,48 @@ def assert_unauthorized(session, query, message):
     assert_exception(session, query, matching=message, expected=Unauthorized)
 
 
-def assert_one(session, query, expected, cl=None):
+def assert_one(session, query, expected, cl=None, prepared=False):
     """
     Assert query returns one row.
     @param session Session to use
     @param query Query to run
     @param expected Expected results from query
     @param cl Optional Consistency Level setting. Default ONE
+    @param prepared Optional boolean flag. If True, the query's literals are turned into bind
+           markers and the statement is prepared once and cached, which is cheaper when
+           the same query shape is run in a loop
 
     Examples:
     assert_one(session, "LIST USERS", ['cassandra', True])
     assert_one(session, query, [0, 0])
     """
-    simple_query = SimpleStatement(query, consistency_level=cl)
-    res = session.execute(simple_query)
+    statement = STATEMENT_CACHE.statement_for(session, query, consistency_level=cl, parameterize_literals=prepared)
+    res = session.execute(statement)
     list_res = tools.rows_to_list(res)
     assert list_res == [expected], "Expected {} from {}, but got {}".format([expected], query, list_res)
 
 
-def assert_none(session, query, cl=None):
+def assert_none(session, query, cl=None, prepared=False):
     """
     Assert query returns nothing
     @param session Session to use
     @param query Query to run
     @param cl Optional Consistency Level setting. Default ONE
+    @param prepared Optional boolean flag. If True, the query's literals are turned into bind
+           markers and the statement is prepared once and cached, which is cheaper when
+           the same query shape is run in a loop
 
     Examples:
     assert_none(self.session1, "SELECT * FROM test where key=2;")
     assert_none(cursor, "SELECT * FROM test WHERE k=2", cl=ConsistencyLevel.SERIAL)
     """
-    simple_query = SimpleStatement(query, consistency_level=cl)
-    res = session.execute(simple_query)
+    statement = STATEMENT_CACHE.statement_for(session, query, consistency_level=cl, parameterize_literals=prepared)
+    res = session.execute(statement)
     list_res = tools.rows_to_list(res)
     assert list_res == [], "Expected nothing from {}, but got {}".format(query, list_res)
 
 
-def assert_all(session, query, expected, cl=None, ignore_order=False):
+def assert_all(session, query, expected, cl=None, ignore_order=False, prepared=False):
     """
     Assert query returns all expected items optionally in the correct order
     @param session Session in use
@@ -149,13 +156,16 @@ def assert_all(session, query, expected, cl=None, ignore_order=False):
     @param expected Expected results from query
     @param cl Optional Consistency Level setting. Default ONE
     @param ignore_order Optional boolean flag determining whether response is ordered
+    @param prepared Optional boolean flag. If True, the query's literals are turned into bind
+           markers and the statement is prepared once and cached, which is cheaper when
+           the same query shape is run in a loop
 
     Examples:
     assert_all(session, "LIST USERS", [['aleksey', False], ['cassandra', True]])
     assert_all(self.session1, "SELECT * FROM ttl_table;", [[1, 42, 1, 1]])
     """
-    simple_query = SimpleStatement(query, consistency_level=cl)
-    res = session.execute(simple_query)
+    statement = STATEMENT_CACHE.statement_for(session, query, consistency_level=cl, parameterize_literals=prepared)
+    res = session.execute(statement)
     list_res = tools.rows_to_list(res)
     if ignore_order:
         expected = sorted(expected)
@@ -202,6 +212,32 @@ def assert_row_count(session, table_name, expected, where=None):
     )
 
 
+def assert_row_count_by_token_range(session, keyspace, table_name, expected, cl=ConsistencyLevel.ONE, concurrency=16, splits_per_range=None):
+    """
+    Assert the number of rows in a table matches expected, counting each
+    token range of the table separately and concurrently. Use this instead of
+    assert_row_count on tables too big for a single `SELECT count(*)` to
+    finish before the coordinator times out.
+    @param session Session to use
+    @param keyspace Name of the keyspace containing the table
+    @param table_name Name of the table to query
+    @param expected Number of rows expected to be in table
+    @param cl Optional Consistency Level setting. Default ONE
+    @param concurrency Optional maximum number of token ranges counted at once. Default 16
+    @param splits_per_range Optional number of pieces each range owned by a node is counted in. Defaults to
+                            enough pieces for 256 ranges, so that no query counts a large part of the ring of
+                            a cluster without vnodes
+
+    Examples:
+    assert_row_count_by_token_range(session, 'keyspace1', 'standard1', 1000000, cl=ConsistencyLevel.ALL)
+    """
+    scanner = TokenRangeScanner(session, keyspace, table_name, consistency_level=cl, concurrency=concurrency, splits_per_range=splits_per_range)
+    count = scanner.count()
+    assert count == expected, "Expected a row count of {} in table '{}.{}', but counting its token ranges got {}".format(
+        expected, keyspace, table_name, count
+    )
+
+
 def assert_crc_check_chance_equal(session, table, expected, ks="ks", view=False):
     """
     Assert crc_check_chance equals expected for a given table or view
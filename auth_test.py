@@ -9,7 +9,7 @@ from cassandra.protocol import SyntaxException
 from assertions import (assert_all, assert_invalid, assert_one,
                         assert_unauthorized)
 from dtest import CASSANDRA_VERSION_FROM_BUILD, Tester, debug
-from jmxutils import JolokiaAgent, make_mbean, remove_perf_disable_shared_mem
+from jmxutils import JolokiaAgent, enable_jolokia_agent, make_mbean
 from tools import known_failure, since
 
 
@@ -936,7 +936,7 @@ class TestAuth(Tester):
         cluster.set_datadir_count(1)
         cluster.populate(1)
         [node] = cluster.nodelist()
-        remove_perf_disable_shared_mem(node)
+        enable_jolokia_agent(node)
         cluster.start(wait_for_binary_proto=True)
 
         with JolokiaAgent(node) as jmx:
@@ -4,7 +4,6 @@ import re
 import shutil
 import subprocess
 import tempfile
-import threading
 import time
 
 from cassandra import ConsistencyLevel
@@ -15,6 +14,7 @@ from assertions import assert_almost_equal, assert_one, assert_not_running
 from dtest import Tester, debug, DISABLE_VNODES
 from tools import (InterruptBootstrap, KillOnBootstrap, known_failure,
                    new_node, no_vnodes, query_c1c2, since)
+from utils.dirwatch import watch_node
 
 
 def assert_bootstrap_state(tester, node, expected_bootstrap_state):
@@ -641,29 +641,17 @@ class TestBootstrap(Tester):
             node1.flush()
         node2 = new_node(cluster)
         node2.start(wait_for_binary_proto=True, wait_other_notice=True)
-        event = threading.Event()
-        failed = threading.Event()
         jobs = 1
-        thread = threading.Thread(target=self._monitor_datadir, args=(node1, event, len(node1.get_sstables("keyspace1", "standard1")), jobs, failed))
-        thread.start()
-        node1.nodetool("cleanup -j {} keyspace1 standard1".format(jobs))
-        event.set()
-        thread.join()
-        self.assertFalse(failed.is_set())
-
-    def _monitor_datadir(self, node, event, basecount, jobs, failed):
-        while True:
-            sstables = [s for s in node.get_sstables("keyspace1", "standard1") if "tmplink" not in s]
-            debug("---")
-            for sstable in sstables:
-                debug(sstable)
-            if len(sstables) > basecount + jobs:
-                debug("Current count is {}, basecount was {}".format(len(sstables), basecount))
-                failed.set()
-                return
-            if event.is_set():
-                return
-            time.sleep(.1)
+        basecount = len(node1.get_sstables("keyspace1", "standard1"))
+        # every sstable written and removed during the cleanup is seen, however short-lived
+        watcher = watch_node(node1)
+        try:
+            node1.nodetool("cleanup -j {} keyspace1 standard1".format(jobs))
+        finally:
+            watcher.stop()
+        maxcount = watcher.max_sstable_count("keyspace1", "standard1")
+        debug("Max count was {}, basecount was {}".format(maxcount, basecount))
+        self.assertLessEqual(maxcount, basecount + jobs)
 
     def _cleanup(self, node):
         commitlog_dir = os.path.join(node.get_path(), 'commitlogs')
@@ -17,6 +17,7 @@ from nose.tools import assert_equal, assert_less_equal
 
 from dtest import Tester, debug
 from tools import rows_to_list, since, known_failure
+from utils.commitlog import commitlog_segments, segment_statistics
 from utils.fileutils import size_of_files_in_dir
 from utils.funcutils import get_rate_limited_function
 
@@ -501,6 +502,15 @@ class TestCDC(Tester):
         generation_node.stop()
         generation_session.cluster.shutdown()
 
+        # the segments moved to cdc_raw should be complete, and hold the CDC data
+        cdc_raw_segments = commitlog_segments(os.path.join(generation_node.get_path(), 'cdc_raw'))
+        self.assertNotEqual([], cdc_raw_segments)
+        for segment in cdc_raw_segments:
+            statistics = segment_statistics(segment)
+            debug('{}: {}'.format(segment, statistics))
+            self.assertTrue(statistics['header_crc_valid'], msg=segment)
+            self.assertGreater(statistics['sync_sections'], 0, msg=segment)
+
         # create a new node to use for cdc_raw cl segment replay
         loading_node = self._init_new_loading_node(ks_name, cdc_table_info.create_stmt)
 
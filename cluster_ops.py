@@ -0,0 +1,142 @@
+"""
+Run the same operation on many nodes of a cluster, or on many of anything
+else, at once, rather than one after the other.
+
+    run_on_nodes(cluster.nodelist(), lambda node: node.nodetool('replaybatchlog'))
+    stop_nodes(cluster.nodelist())
+    start_nodes(cluster.nodelist())
+
+At most `max_concurrency` operations run at a time. An operation that takes
+longer than `timeout` seconds is reported as failed, and no longer waited for.
+All the operations are run, even when some fail; their errors are then raised
+together, as a dtest.MultiError, with the item each one failed on in its
+traceback.
+
+Nodes that need each other to notice them going down or coming up, or that
+bootstrap, can't be stopped or started at the same time: keep those one at a
+time.
+"""
+import Queue
+import threading
+import time
+import traceback
+
+from dtest import MultiError, debug
+
+MAX_CONCURRENCY = 8
+# long enough for a flush, drain or start of a node under load
+OPERATION_TIMEOUT = 600
+
+
+class NodeOperationTimeout(Exception):
+    pass
+
+
+def run_concurrently(items, operation, max_concurrency=MAX_CONCURRENCY, timeout=OPERATION_TIMEOUT, description=None, name=str):
+    """
+    Run operation(item) for every item of items, concurrently.
+
+    @param timeout Time, in seconds, each operation has to complete, or None to wait for as long as it takes
+    @param description What the operation does, for logs and errors
+    @param name Function giving the name of an item, for logs and errors
+    @return The results of the operations, in the order of items
+    @throws MultiError With an exception for every item the operation failed, or timed out, on
+    """
+    description = description or getattr(operation, '__name__', 'operation')
+    items = list(items)
+    results = [None] * len(items)
+    errors, tracebacks = [], []
+    done = Queue.Queue()
+    # index of a running operation -> when it times out
+    deadlines = {}
+
+    def run(index, item):
+        try:
+            done.put((index, operation(item), None, None))
+        except Exception as e:
+            done.put((index, None, e, traceback.format_exc()))
+
+    started = time.time()
+    next_item = 0
+    while next_item < len(items) or deadlines:
+        while next_item < len(items) and len(deadlines) < max_concurrency:
+            thread = threading.Thread(target=run, args=(next_item, items[next_item]), name='{} on {}'.format(description, name(items[next_item])))
+            # an operation that timed out is left behind
+            thread.daemon = True
+            thread.start()
+            deadlines[next_item] = time.time() + timeout if timeout is not None else None
+            next_item += 1
+
+        try:
+            # wait in short steps, so that the test can be interrupted
+            index, result, error, error_traceback = done.get(timeout=1)
+        except Queue.Empty:
+            now = time.time()
+            for index, deadline in deadlines.items():
+                if deadline is not None and now > deadline:
+                    del deadlines[index]
+                    errors.append(NodeOperationTimeout('{} did not complete on {} within {}s'.format(description, name(items[index]), timeout)))
+                    tracebacks.append('')
+            continue
+
+        if index not in deadlines:
+            # completed after it timed out
+            continue
+        del deadlines[index]
+        if error is not None:
+            # the errors are kept as they were raised, as not every exception can be built from a message alone
+            errors.append(error)
+            tracebacks.append('\n{} failed on {}:\n{}'.format(description, name(items[index]), error_traceback))
+        else:
+            results[index] = result
+
+    debug('{} on {} took {:.1f}s'.format(description, ', '.join(name(item) for item in items), time.time() - started))
+    if errors:
+        raise MultiError(errors, tracebacks)
+    return results
+
+
+def run_on_nodes(nodes, operation, **kwargs):
+    """
+    Run operation(node) for every node of nodes, concurrently, as run_concurrently() does.
+
+    @return The results of the operations, in the order of nodes
+    """
+    return run_concurrently(nodes, operation, name=lambda node: node.name, **kwargs)
+
+
+def nodetool_on_nodes(nodes, cmd, **kwargs):
+    """
+    Run a nodetool command on every node of nodes.
+
+    @return The (stdout, stderr) of every node
+    """
+    return run_on_nodes(nodes, lambda node: node.nodetool(cmd), description='nodetool {}'.format(cmd), **kwargs)
+
+
+def flush_nodes(nodes, **kwargs):
+    run_on_nodes(nodes, lambda node: node.flush(), description='flush', **kwargs)
+
+
+def drain_nodes(nodes, **kwargs):
+    run_on_nodes(nodes, lambda node: node.drain(block_on_log=True), description='drain', **kwargs)
+
+
+def stop_nodes(nodes, drain=False, gently=True, wait_other_notice=False, **kwargs):
+    """
+    Stop every node of nodes, after draining it if drain.
+    """
+    def stop(node):
+        if drain:
+            node.drain(block_on_log=True)
+        node.stop(gently=gently, wait_other_notice=wait_other_notice)
+
+    run_on_nodes(nodes, stop, description='drain and stop' if drain else 'stop', **kwargs)
+
+
+def start_nodes(nodes, wait_for_binary_proto=True, wait_other_notice=False, jvm_args=None, **kwargs):
+    """
+    Start every node of nodes, and wait for them to accept CQL connections if wait_for_binary_proto.
+    """
+    run_on_nodes(nodes, lambda node: node.start(wait_for_binary_proto=wait_for_binary_proto, wait_other_notice=wait_other_notice, jvm_args=jvm_args),
+                 description='start', **kwargs)
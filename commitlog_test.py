@@ -1,8 +1,6 @@
-import binascii
 import glob
 import os
 import stat
-import struct
 import subprocess
 import time
 from distutils.version import LooseVersion
@@ -16,6 +14,7 @@ from parse import parse
 from assertions import assert_almost_equal, assert_none, assert_one
 from dtest import Tester, debug
 from tools import known_failure, rows_to_list, since
+from utils.commitlog import CommitLogSegment, commitlog_segments
 
 
 class TestCommitLog(Tester):
@@ -501,27 +500,15 @@ class TestCommitLog(Tester):
         # modify the commit log crc values
         cl_dir = os.path.join(path, 'commitlogs')
         self.assertTrue(len(os.listdir(cl_dir)) > 0)
-        for cl in os.listdir(cl_dir):
-            # locate the CRC location
-            with open(os.path.join(cl_dir, cl), 'r') as f:
-                f.seek(0)
-                version = struct.unpack('>i', f.read(4))[0]
-                crc_pos = 12
-                if version >= 5:
-                    f.seek(crc_pos)
-                    psize = struct.unpack('>h', f.read(2))[0] & 0xFFFF
-                    crc_pos += 2 + psize
-
+        for cl in commitlog_segments(cl_dir):
             # rewrite it with crap
-            with open(os.path.join(cl_dir, cl), 'w') as f:
-                f.seek(crc_pos)
-                f.write(struct.pack('>i', 123456))
+            with CommitLogSegment(cl, writable=True) as segment:
+                segment.rewrite_header(crc=123456)
 
             # verify said crap
-            with open(os.path.join(cl_dir, cl), 'r') as f:
-                f.seek(crc_pos)
-                crc = struct.unpack('>i', f.read(4))[0]
-                self.assertEqual(crc, 123456)
+            with CommitLogSegment(cl) as segment:
+                self.assertEqual(segment.header_crc, 123456)
+                self.assertFalse(segment.header_crc_valid())
 
         mark = node.mark_log()
         node.start()
@@ -578,62 +565,25 @@ class TestCommitLog(Tester):
             sstables = sstables + len([f for f in os.listdir(os.path.join(ks_dir, db_dir)) if f.endswith('.db')])
         self.assertEqual(sstables, 0)
 
-        def get_header_crc(header):
-            """
-            When calculating the header crc, C* splits up the 8b id, first adding the 4 least significant
-            bytes to the crc, then the 5 most significant bytes, so this splits them and calculates the same way
-            """
-            new_header = header[:4]
-            # C* evaluates most and least significant 4 bytes out of order
-            new_header += header[8:12]
-            new_header += header[4:8]
-            # C* evaluates the short parameter length as an int
-            new_header += '\x00\x00' + header[12:14]  # the
-            new_header += header[14:]
-            return binascii.crc32(new_header)
-
         # modify the compression parameters to look for a compressor that isn't there
         # while this scenario is pretty unlikely, if a jar or lib got moved or something,
         # you'd have a similar situation, which would be fixable by the user
         path = node.get_path()
         cl_dir = os.path.join(path, 'commitlogs')
         self.assertTrue(len(os.listdir(cl_dir)) > 0)
-        for cl in os.listdir(cl_dir):
-            # read the header and find the crc location
-            with open(os.path.join(cl_dir, cl), 'r') as f:
-                f.seek(0)
-                crc_pos = 12
-                f.seek(crc_pos)
-                psize = struct.unpack('>h', f.read(2))[0] & 0xFFFF
-                crc_pos += 2 + psize
-
-                header_length = crc_pos
-                f.seek(crc_pos)
-                crc = struct.unpack('>i', f.read(4))[0]
-
+        for cl in commitlog_segments(cl_dir):
+            with CommitLogSegment(cl, writable=True) as segment:
                 # check that we're going this right
-                f.seek(0)
-                header_bytes = f.read(header_length)
-                self.assertEqual(get_header_crc(header_bytes), crc)
-
-            # rewrite it with imaginary compressor
-            self.assertIn('LZ4Compressor', header_bytes)
-            header_bytes = header_bytes.replace('LZ4Compressor', 'LZ5Compressor')
-            self.assertNotIn('LZ4Compressor', header_bytes)
-            self.assertIn('LZ5Compressor', header_bytes)
-            with open(os.path.join(cl_dir, cl), 'w') as f:
-                f.seek(0)
-                f.write(header_bytes)
-                f.seek(crc_pos)
-                f.write(struct.pack('>i', get_header_crc(header_bytes)))
+                self.assertTrue(segment.header_crc_valid())
+                self.assertIn('LZ4Compressor', segment.compression)
+
+                # rewrite it with imaginary compressor, and a valid crc
+                segment.rewrite_header(parameters=segment.raw_parameters.replace('LZ4Compressor', 'LZ5Compressor'))
 
             # verify we wrote everything correctly
-            with open(os.path.join(cl_dir, cl), 'r') as f:
-                f.seek(0)
-                self.assertEqual(f.read(header_length), header_bytes)
-                f.seek(crc_pos)
-                crc = struct.unpack('>i', f.read(4))[0]
-                self.assertEqual(crc, get_header_crc(header_bytes))
+            with CommitLogSegment(cl) as segment:
+                self.assertIn('LZ5Compressor', segment.compression)
+                self.assertTrue(segment.header_crc_valid())
 
         mark = node.mark_log()
         node.start()
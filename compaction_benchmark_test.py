@@ -0,0 +1,205 @@
+"""
+Benchmarks of the compaction strategies, on the same workload: writes of
+every key, overwrites of every key, then deletes of a third of them, flushed
+in ten batches per phase so that there is something to compact, with reads
+of random keys after every batch.
+
+For every strategy, the bytes compacted, from system.compaction_history, and
+the throughput of compactions, from their log lines, are appended as a JSON
+line to COMPACTION_BENCHMARK_RESULTS, with the bytes the node read and wrote
+to disk, from /proc/<pid>/io, the write amplification, the peak disk usage of
+the table, and timelines of its number of sstables and of the sstables read
+per read, so that strategies and versions of Cassandra can be compared.
+
+The write amplification is the bytes written to disk by the node over the
+bytes of the keys and values written by the workload: it includes the writes
+of the commitlog and of flushes, besides those of compactions.
+
+    COMPACTION_BENCHMARK=yes COMPACTION_BENCHMARK_KEYS=1000000 nosetests -vs compaction_benchmark_test.py
+"""
+import datetime
+import json
+import math
+import os
+import random
+import time
+from unittest import skipUnless
+
+import psutil
+from cassandra.concurrent import execute_concurrent_with_args
+from ccmlib.common import is_win
+
+from compaction_observer import (CompactionObserver, compaction_log_file,
+                                 logged_compactions)
+from compaction_test import strategies
+from dtest import LOG_SAVED_DIR, Tester, debug
+from jmxutils import JolokiaAgent, enable_jolokia_agent, make_mbean
+from metrics_collector import Metric
+from utils.dirwatch import watch_node
+
+COMPACTION_BENCHMARK = os.environ.get('COMPACTION_BENCHMARK', '').lower() in ('yes', 'true')
+COMPACTION_BENCHMARK_KEYS = int(os.environ.get('COMPACTION_BENCHMARK_KEYS', '100000'))
+COMPACTION_BENCHMARK_RESULTS = os.environ.get('COMPACTION_BENCHMARK_RESULTS', os.path.join(LOG_SAVED_DIR, 'compaction_benchmark_results.jsonl'))
+
+VALUE_SIZE = 1024
+# distinct values, more than fit in a compression chunk, so that sstables don't compress
+VALUES = 128
+# batches of writes of a phase, each flushed into an sstable of its own
+BATCHES = 10
+READS_PER_BATCH = 1000
+KEY_SIZE = 4
+
+
+def table_metrics(version, keyspace, table):
+    """
+    @return The metrics_collector.Metrics of a table sampled during the benchmark
+    """
+    type_name = 'ColumnFamily' if version < '3.0' else 'Table'
+    return [Metric(name, make_mbean('metrics', type=type_name, keyspace=keyspace, scope=table, name=mbean_name), attribute)
+            for name, mbean_name, attribute in (('sstables_per_read', 'SSTablesPerReadHistogram', 'Mean'),
+                                                ('live_sstables', 'LiveSSTableCount', 'Value'),
+                                                ('pending_compactions', 'PendingCompactions', 'Value'),
+                                                ('disk_space_used', 'TotalDiskSpaceUsed', 'Count'))]
+
+
+@skipUnless(COMPACTION_BENCHMARK, 'set COMPACTION_BENCHMARK=yes to run the compaction benchmarks')
+@skipUnless(not is_win(), 'disk io is read from /proc')
+class CompactionBenchmark(Tester):
+    """
+    Benchmark of a compaction strategy, for comparing strategies and finding regressions.
+    """
+
+    __test__ = False
+
+    def setUp(self):
+        Tester.setUp(self)
+        # compactions are logged at DEBUG level since 2.2
+        self.cluster.set_log_level("DEBUG")
+
+    def run_phase(self, session, statement, keys, node, observer):
+        """
+        Run statement with the args of every key of keys, in BATCHES batches flushed one by one,
+        reading random keys after every batch, and wait for compactions to be over.
+
+        @param keys List of the args of statement
+        @return How long the phase took, with waiting for compactions
+        """
+        start = time.time()
+        batch_size = int(math.ceil(len(keys) / float(BATCHES)))
+        for i in xrange(0, len(keys), batch_size):
+            execute_concurrent_with_args(session, statement, keys[i:i + batch_size], concurrency=100)
+            node.flush()
+            self.read_keys(session)
+        observer.wait_for_quiescence('ks', 'cf', timeout=3600)
+        self.read_keys(session)
+        return time.time() - start
+
+    def read_keys(self, session):
+        keys = random.sample(xrange(COMPACTION_BENCHMARK_KEYS), min(READS_PER_BATCH, COMPACTION_BENCHMARK_KEYS))
+        execute_concurrent_with_args(session, self.select, [(key,) for key in keys], concurrency=100)
+
+    def compaction_strategy_benchmark_test(self):
+        """
+        Benchmark the compactions of self.strategy on writes, overwrites and deletes.
+        """
+        cluster = self.cluster
+        # unthrottled, for the throughput of the strategy, and not of the throttle
+        cluster.set_configuration_options(values={'compaction_throughput_mb_per_sec': 0})
+        cluster.populate(1)
+        [node] = cluster.nodelist()
+        enable_jolokia_agent(node)
+        cluster.start(wait_for_binary_proto=True)
+        # metrics and compactions in progress are read over JMX: without the agent, the timelines would be
+        # empty, and compactions would be waited for with nodetool JVMs, within the measured time
+        agent = JolokiaAgent(node)
+        self.assertTrue(agent.is_running(), 'The Jolokia agent of {} can not be reached'.format(node.name))
+        agent.close_connection()
+
+        session = self.patient_exclusive_cql_connection(node)
+        self.create_ks(session, 'ks', 1)
+        session.execute("CREATE TABLE cf (key int PRIMARY KEY, val blob) WITH compaction = {{'class': '{}'}}".format(self.strategy))
+        self.select = session.prepare('SELECT val FROM cf WHERE key = ?')
+        insert = session.prepare('INSERT INTO cf (key, val) VALUES (?, ?)')
+        delete = session.prepare('DELETE FROM cf WHERE key = ?')
+        values = [os.urandom(VALUE_SIZE) for _ in xrange(VALUES)]
+
+        collector = self.collect_metrics(metrics=table_metrics(node.get_cassandra_version(), 'ks', 'cf'), interval=1)
+        watcher = watch_node(node)
+        self.addCleanup(watcher.stop)
+        observer = CompactionObserver(node, session)
+        self.addCleanup(observer.close)
+
+        process = psutil.Process(node.pid)
+        io_before = process.io_counters()
+        compaction_mark = observer.mark()
+        log_mark = node.mark_log(filename=compaction_log_file(node))
+        start = time.time()
+
+        phases = []
+        writes = [(key, values[key % VALUES]) for key in xrange(COMPACTION_BENCHMARK_KEYS)]
+        deletes = [(key,) for key in xrange(0, COMPACTION_BENCHMARK_KEYS, 3)]
+        for name, statement, keys, user_bytes in (('write', insert, writes, len(writes) * (KEY_SIZE + VALUE_SIZE)),
+                                                  ('overwrite', insert, writes, len(writes) * (KEY_SIZE + VALUE_SIZE)),
+                                                  ('delete', delete, deletes, len(deletes) * KEY_SIZE)):
+            elapsed = self.run_phase(session, statement, keys, node, observer)
+            debug('{} phase of {} took {:.1f}s'.format(name, self.strategy, elapsed))
+            phases.append({'phase': name, 'keys': len(keys), 'user_bytes': user_bytes, 'elapsed': elapsed})
+
+        io_after = process.io_counters()
+        collector.stop()
+        compactions = observer.compactions_since(compaction_mark, 'ks', 'cf')
+        logged = logged_compactions(node, 'ks', 'cf', from_mark=log_mark)
+        self.assertTrue(compactions, 'No compaction of ks.cf with {}'.format(self.strategy))
+
+        user_bytes = sum(phase['user_bytes'] for phase in phases)
+        compaction_bytes_in = sum(record.bytes_in for record in compactions)
+        compaction_bytes_out = sum(record.bytes_out for record in compactions)
+        compaction_time = sum(compaction.duration for compaction in logged) / 1000.0
+        disk_write_bytes = io_after.write_bytes - io_before.write_bytes
+
+        def timeline(metric_name):
+            return [(t - start, value) for t, value in collector.series(node.name, metric_name) if t >= start and not math.isnan(value)]
+
+        result = {'benchmark': 'compaction',
+                  'strategy': self.strategy,
+                  'keys': COMPACTION_BENCHMARK_KEYS,
+                  'value_size': VALUE_SIZE,
+                  'phases': phases,
+                  'elapsed': time.time() - start,
+                  'user_bytes': user_bytes,
+                  'compactions': len(compactions),
+                  'compaction_bytes_in': compaction_bytes_in,
+                  'compaction_bytes_out': compaction_bytes_out,
+                  'compaction_time': compaction_time,
+                  # bytes/s
+                  'compaction_throughput': sum(compaction.bytes_in for compaction in logged) / compaction_time if compaction_time else None,
+                  'compaction_throughputs': [compaction.bytes_in * 1000.0 / compaction.duration for compaction in logged if compaction.duration],
+                  'disk_read_bytes': io_after.read_bytes - io_before.read_bytes,
+                  'disk_write_bytes': disk_write_bytes,
+                  'write_amplification': disk_write_bytes / float(user_bytes),
+                  'compaction_write_amplification': compaction_bytes_out / float(user_bytes),
+                  'peak_disk_bytes': watcher.peak_bytes('data', 'ks', 'cf'),
+                  'final_disk_bytes': watcher.total_bytes('data', 'ks', 'cf'),
+                  'max_sstable_count': watcher.max_sstable_count('ks', 'cf', since=start),
+                  'sstable_count_timeline': [(max(t - start, 0), count) for t, count in watcher.sstable_count_history('ks', 'cf')],
+                  'sstables_per_read_timeline': timeline('sstables_per_read'),
+                  'pending_compactions_timeline': timeline('pending_compactions'),
+                  'cassandra_version': str(cluster.version()),
+                  'install_dir': cluster.get_install_dir(),
+                  'date': datetime.datetime.utcnow().isoformat()}
+        self.assertTrue(result['sstables_per_read_timeline'] and result['pending_compactions_timeline'],
+                        'No metrics of ks.cf were sampled on {}'.format(node.name))
+        debug('{strategy}: {compactions} compactions, {throughput:.1f}MB/s, write amplification {write_amplification:.2f}, '
+              '{peak_mb:.0f}MB peak disk usage, {max_sstable_count} sstables at most'.format(
+                  throughput=(result['compaction_throughput'] or 0) / 2.0 ** 20, peak_mb=result['peak_disk_bytes'] / 2.0 ** 20, **result))
+
+        results_dir = os.path.dirname(COMPACTION_BENCHMARK_RESULTS)
+        if results_dir and not os.path.isdir(results_dir):
+            os.makedirs(results_dir)
+        with open(COMPACTION_BENCHMARK_RESULTS, 'a') as f:
+            f.write(json.dumps(result, sort_keys=True) + '\n')
+
+
+for strategy in strategies:
+    cls_name = ('CompactionBenchmark_with_' + strategy)
+    vars()[cls_name] = type(cls_name, (CompactionBenchmark,), {'strategy': strategy, '__test__': True})
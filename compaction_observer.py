@@ -0,0 +1,231 @@
+"""
+Wait for compactions to happen, or to be over, from the state of the
+CompactionManager and from system.compaction_history, instead of from the
+log lines of compactions.
+
+    observer = CompactionObserver(node, session)
+    mark = observer.mark()
+    node.flush()
+    node.nodetool('compact ks cf')
+    observer.wait_for_compactions_since(mark, 'ks', 'cf')
+    observer.wait_for_quiescence('ks', 'cf')
+
+A mark is taken before triggering compactions, and records the compactions
+already in the history: the ones completed after it are found whether they
+complete before the wait starts or during it, so there is no window for a
+compaction to be missed in.
+
+A node is quiescent when it has no pending nor running compactions, twice in a
+row, without any compaction task completing in between: a compaction submitted
+right after a flush can't run unnoticed between two samples.
+
+The CompactionManager is read through Jolokia, or, if the Jolokia agent can't
+be attached, from the output of nodetool compactionstats.
+
+How long compactions took is only in their log lines, which
+logged_compactions() reads.
+"""
+import os
+import re
+import time
+from collections import namedtuple
+
+from ccmlib.node import TimeoutError
+
+from dtest import debug
+from jmxutils import NodeAgent, make_mbean
+
+COMPACTION_MANAGER = make_mbean('db', 'CompactionManager')
+PENDING_TASKS = make_mbean('metrics', type='Compaction', name='PendingTasks')
+COMPLETED_TASKS = make_mbean('metrics', type='Compaction', name='CompletedTasks')
+
+CompactionRecord = namedtuple('CompactionRecord', ['id', 'keyspace', 'table', 'compacted_at', 'bytes_in', 'bytes_out', 'rows_merged'])
+CompactionMark = namedtuple('CompactionMark', ['time', 'history_ids'])
+# pending compactions, running compactions (dicts with the keyspace and columnfamily of each), and
+# compaction tasks completed, or None if unknown
+CompactionState = namedtuple('CompactionState', ['pending', 'active', 'completed'])
+# sizes in bytes, duration in milliseconds; keyspace and table are None when no sstable was written
+LoggedCompaction = namedtuple('LoggedCompaction', ['keyspace', 'table', 'bytes_in', 'bytes_out', 'duration'])
+
+# sizes are logged as '1,234 bytes', or just '1,234', before 3.6, and as '1.205KiB' since
+_SIZE = r'[\d,.]+(?: ?(?:bytes|[KMGT]iB))?'
+COMPACTED_LINE = re.compile(r'Compacted .*?to \[(?P<sstables>[^\]]*)\].*?(?P<bytes_in>{size}) to (?P<bytes_out>{size}) '
+                            r'\(~\d+% of original\) in (?P<duration>[\d,]+)ms'.format(size=_SIZE))
+SIZE_UNITS = {'bytes': 1, 'KiB': 2 ** 10, 'MiB': 2 ** 20, 'GiB': 2 ** 30, 'TiB': 2 ** 40}
+
+
+class CompactionObserver(object):
+    """
+    Observes the compactions of a node.
+
+    @param session A CQL session connected to node only, to read its compaction history;
+                   only needed by mark(), history() and the waits for compactions since a mark
+    @param interval Time, in seconds, between two reads of the state of the compactions
+    """
+
+    def __init__(self, node, session=None, interval=0.5):
+        self.node = node
+        self.session = session
+        self.interval = interval
+        self._jmx = NodeAgent(node, 'compactions will be read from nodetool compactionstats')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _table_metric_type(self):
+        return 'ColumnFamily' if self.node.get_cassandra_version() < '3.0' else 'Table'
+
+    def state(self, keyspace=None, table=None):
+        """
+        @return The CompactionState of the node, or of a keyspace, or of a table, if given
+        """
+        jmx = self._jmx.get()
+        if jmx is None:
+            return self._compactionstats_state(keyspace, table)
+
+        reads = [(PENDING_TASKS, 'Value'), (COMPLETED_TASKS, 'Value'), (COMPACTION_MANAGER, 'Compactions')]
+        if table is not None:
+            reads.append((make_mbean('metrics', type=self._table_metric_type(), keyspace=keyspace, scope=table, name='PendingCompactions'), 'Value'))
+        values = jmx.read_attributes(reads, ignore_errors=True)
+        active = [compaction for compaction in values[2] or []
+                  if (keyspace is None or compaction.get('keyspace') == keyspace) and (table is None or compaction.get('columnfamily') == table)]
+        # the pending compactions of a table are only known once it exists
+        pending = values[3] if table is not None and values[3] is not None else values[0]
+        return CompactionState(pending, active, values[1])
+
+    def _compactionstats_state(self, keyspace, table):
+        output, _ = self.node.nodetool('compactionstats', capture_output=True)
+        match = re.search(r'pending tasks: (\d+)', output)
+        active = []
+        for line in output.splitlines():
+            columns = line.split()
+            # the compactions running are listed as: [id] type keyspace table completed total unit progress,
+            # where the type can be several words
+            if len(columns) >= 7 and columns[-1].endswith('%'):
+                ks, cf = columns[-6], columns[-5]
+                if (keyspace is None or ks == keyspace) and (table is None or cf == table):
+                    active.append({'keyspace': ks, 'columnfamily': cf})
+        return CompactionState(int(match.group(1)) if match else 0, active, None)
+
+    def is_quiescent(self, keyspace=None, table=None):
+        """
+        @return Whether there are no pending nor running compactions, right now
+        """
+        state = self.state(keyspace, table)
+        return state.pending == 0 and not state.active
+
+    def wait_for_quiescence(self, keyspace=None, table=None, timeout=600):
+        """
+        Block until the node, or a keyspace, or a table, has no pending nor running compactions.
+
+        @throws TimeoutError If compactions are still pending or running after timeout seconds
+        """
+        deadline = time.time() + timeout
+        previous = None
+        while True:
+            state = self.state(keyspace, table)
+            quiescent = state.pending == 0 and not state.active
+            if quiescent and previous is not None and previous.completed == state.completed:
+                return
+            previous = state if quiescent else None
+            if time.time() > deadline:
+                raise TimeoutError('Compactions of {} still running after {}s: {} pending, running {}'.format(
+                    '.'.join(name for name in (keyspace, table) if name) or self.node.name, timeout, state.pending, state.active))
+            time.sleep(self.interval)
+
+    def history(self, keyspace=None, table=None):
+        """
+        @return The CompactionRecords of system.compaction_history, of a keyspace, or of a table, if given, oldest first
+        """
+        if self.session is None:
+            raise ValueError('A CQL session to {} is needed to read its compaction history'.format(self.node.name))
+        columns = ('id', 'keyspace_name', 'columnfamily_name', 'compacted_at', 'bytes_in', 'bytes_out', 'rows_merged')
+        rows = self.session.execute('SELECT {} FROM system.compaction_history'.format(', '.join(columns)))
+        # whatever the row factory of the session
+        records = [CompactionRecord(*([row[column] for column in columns] if isinstance(row, dict) else row)) for row in rows]
+        return sorted((record for record in records
+                       if (keyspace is None or record.keyspace == keyspace) and (table is None or record.table == table)),
+                      key=lambda record: record.compacted_at)
+
+    def mark(self):
+        """
+        @return A CompactionMark, to find the compactions completed after it with compactions_since()
+        """
+        return CompactionMark(time.time(), frozenset(record.id for record in self.history()))
+
+    def compactions_since(self, mark, keyspace=None, table=None):
+        """
+        @return The CompactionRecords of the compactions completed since mark, of a keyspace, or of a table, if given
+        """
+        return [record for record in self.history(keyspace, table) if record.id not in mark.history_ids]
+
+    def wait_for_compactions_since(self, mark, keyspace=None, table=None, count=1, timeout=600):
+        """
+        Block until at least count compactions, of a keyspace, or of a table, if given, completed since mark.
+
+        @return The CompactionRecords of the compactions completed since mark
+        @throws TimeoutError If less than count compactions completed within timeout seconds
+        """
+        deadline = time.time() + timeout
+        while True:
+            compactions = self.compactions_since(mark, keyspace, table)
+            if len(compactions) >= count:
+                debug('{} compactions of {} completed in {:.1f}s'.format(len(compactions), self.node.name, time.time() - mark.time))
+                return compactions
+            if time.time() > deadline:
+                raise TimeoutError('{} compactions of {} completed within {}s, expected {}'.format(
+                    len(compactions), '.'.join(name for name in (keyspace, table) if name) or self.node.name, timeout, count))
+            time.sleep(self.interval)
+
+    def close(self):
+        self._jmx.stop()
+
+
+def parse_size(text):
+    """
+    @return The number of bytes of a size as logged by Cassandra, like '1,234 bytes' or '1.205KiB'
+    """
+    number, unit = re.match(r'([\d,.]+) ?(\S*)', text).groups()
+    return int(float(number.replace(',', '')) * SIZE_UNITS[unit or 'bytes'])
+
+
+def parse_compacted_lines(lines, keyspace=None, table=None):
+    """
+    @return The LoggedCompactions of the 'Compacted' log lines of lines, of a keyspace and table if given
+    """
+    compactions = []
+    for line in lines:
+        match = COMPACTED_LINE.search(line)
+        if match is None:
+            continue
+        ks = cf = None
+        sstables = [sstable for sstable in match.group('sstables').split(',') if sstable.strip()]
+        if sstables:
+            # the sstables are written in <data dir>/<keyspace>/<table>-<id>/
+            ks, cf = sstables[0].strip().split(os.sep)[-3:-1]
+            cf = cf.split('-')[0]
+        if (keyspace is None or ks == keyspace) and (table is None or cf == table):
+            compactions.append(LoggedCompaction(ks, cf, parse_size(match.group('bytes_in')), parse_size(match.group('bytes_out')),
+                                                int(match.group('duration').replace(',', ''))))
+    return compactions
+
+
+def compaction_log_file(node):
+    """
+    @return The name of the log file compactions are logged in; they are logged at DEBUG level since 2.2
+    """
+    return 'system.log' if node.get_cassandra_version() < '2.2' else 'debug.log'
+
+
+def logged_compactions(node, keyspace=None, table=None, from_mark=None):
+    """
+    @param from_mark A mark of the compaction log file of node, from node.mark_log(filename=compaction_log_file(node))
+    @return The LoggedCompactions node logged, since from_mark if given, of a keyspace and table if given
+    """
+    with open(os.path.join(node.get_path(), 'logs', compaction_log_file(node))) as f:
+        if from_mark is not None:
+            f.seek(from_mark)
+        return parse_compacted_lines(f, keyspace, table)
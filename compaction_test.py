@@ -2,15 +2,15 @@ import os
 import random
 import re
 import string
-import subprocess
 import tempfile
 import time
 
-from ccmlib import common
 from assertions import assert_none, assert_one, assert_length_equal
+from compaction_observer import CompactionObserver
 from dtest import Tester, debug
 from distutils.version import LooseVersion
 from nose.tools import assert_equal
+from tool_runner import run_tool
 from tools import known_failure, since
 
 
@@ -88,7 +88,7 @@ class TestCompaction(Tester):
             debug("datasize not found")
             debug(output)
 
-        block_on_compaction_log(node1)
+        block_on_compaction(node1, self.patient_cql_connection(node1))
 
         output = node1.nodetool('cfstats', True)[0]
         if output.find(table_name) != -1:
@@ -163,7 +163,7 @@ class TestCompaction(Tester):
         for x in range(0, 100):
             session.execute('delete from cf where key = ' + str(x))
 
-        block_on_compaction_log(node1, ks='ks', table='cf')
+        block_on_compaction(node1, session, ks='ks', table='cf')
         time.sleep(1)
         try:
             for data_dir in node1.data_directories():
@@ -492,14 +492,10 @@ def get_sstable_data_files(node, ks, table):
     """
     Read sstable data files by using sstableutil, so we ignore temporary files
     """
-    env = common.make_cassandra_env(node.get_install_cassandra_root(), node.get_node_cassandra_root())
-    args = [node.get_tool('sstableutil'), '--type', 'final', ks, table]
+    stdout, stderr, rc = run_tool(node, 'sstableutil', ['--type', 'final', ks, table])
 
-    p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    stdout, stderr = p.communicate()
-
-    assert_equal(p.returncode, 0, "Error invoking sstableutil; returned {code}; {err}"
-                 .format(code=p.returncode, err=stderr))
+    assert_equal(rc, 0, "Error invoking sstableutil; returned {code}; {err}"
+                 .format(code=rc, err=stderr))
 
     ret = sorted(filter(lambda s: s.endswith('-Data.db'), stdout.splitlines()))
     return ret
@@ -509,6 +505,35 @@ def get_random_word(wordLen, population=string.ascii_letters + string.digits):
     return ''.join([random.choice(population) for _ in range(wordLen)])
 
 
+def block_on_compaction(node, session, ks=None, table=None):
+    """
+    @param node the node on which to trigger and block on compaction
+    @param session a CQL session connected to node, to read its compaction history
+    @param ks the keyspace to compact
+    @param table the table to compact
+
+    Helper method for testing compaction. This triggers compactions by
+    calling flush and compact on node, then blocks until at least one
+    compaction of the table completed, and no more are pending or running.
+    In situations where major compaction won't apply to a table, such as in
+    pre-2.2 LCS tables, the flush will trigger minor compactions.
+
+    By default, this method uses the keyspace and table names generated by
+    cassandra-stress.
+
+    @return the records of the compactions completed, from system.compaction_history
+    """
+    ks = ks or 'keyspace1'
+    table = table or 'standard1'
+    with CompactionObserver(node, session) as observer:
+        mark = observer.mark()
+        node.flush()
+        node.nodetool('compact {ks} {table}'.format(ks=ks, table=table))
+        compactions = observer.wait_for_compactions_since(mark, ks, table)
+        observer.wait_for_quiescence(ks, table)
+    return compactions
+
+
 def block_on_compaction_log(node, ks=None, table=None):
     """
     @param node the node on which to trigger and block on compaction
@@ -520,7 +545,9 @@ def block_on_compaction_log(node, ks=None, table=None):
     compaction won't apply to a table, such as in pre-2.2 LCS tables, the
     flush will trigger minor compactions.
 
-    This method uses log-watching to block until compaction is completed.
+    This method uses log-watching to block until compaction is completed,
+    for the tests that need the log line of the compaction; the others
+    should use block_on_compaction().
 
     By default, this method uses the keyspace and table names generated by
     cassandra-stress. These will not be used if ks and table names parameters
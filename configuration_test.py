@@ -4,7 +4,7 @@ import re
 from cassandra.concurrent import execute_concurrent_with_args
 
 from dtest import Tester, debug
-from jmxutils import JolokiaAgent, make_mbean, remove_perf_disable_shared_mem
+from jmxutils import JolokiaAgent, enable_jolokia_agent, make_mbean
 
 
 class TestConfiguration(Tester):
@@ -55,9 +55,9 @@ class TestConfiguration(Tester):
             self.cluster.set_configuration_options(values={'commitlog_segment_size_in_mb': 1})
             self.cluster.set_batch_commitlog(enabled=True)
 
-            # disable JVM option so we can use Jolokia
+            # load the Jolokia agent at startup
             # this has to happen after .set_configuration_options because of implmentation details
-            remove_perf_disable_shared_mem(node)
+            enable_jolokia_agent(node)
             self.cluster.start(wait_for_binary_proto=True)
             return node
 
@@ -101,7 +101,7 @@ class TestConfiguration(Tester):
         node1 = self.cluster.nodelist()[0]
         default_path = node1.data_directories()[0]
         node1.set_configuration_options({'saved_caches_directory': os.path.join(default_path, 'saved_caches')})
-        remove_perf_disable_shared_mem(node1)
+        enable_jolokia_agent(node1)
         self.cluster.start(wait_for_binary_proto=True)
 
         session = self.patient_exclusive_cql_connection(node1)
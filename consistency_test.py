@@ -1,8 +1,11 @@
-import Queue
-import sys
+import os
+import pickle
 import threading
 import time
+import traceback
 from collections import OrderedDict
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
 from copy import deepcopy
 
 from cassandra import ConsistencyLevel, consistency_value_to_name
@@ -11,10 +14,44 @@ from cassandra.query import SimpleStatement
 from assertions import assert_none, assert_unavailable, assert_length_equal
 from dtest import DISABLE_VNODES, Tester, debug, MultiError
 from tools import (create_c1c2_table, insert_c1c2, insert_columns,
-                   known_failure, query_c1c2, rows_to_list, since)
+                   known_failure, query_c1c2_keys, rows_to_list, since)
 from nose.tools import assert_greater_equal
 
 
+# state shared with the workers of TestAccuracy._run_test_function_in_parallel
+_parallel_validation_state = {}
+
+
+def _run_validation(task):
+    """
+    Run one consistency level combination of a TestAccuracy validation, in a worker
+    of TestAccuracy._run_test_function_in_parallel.
+
+    @param task (start, end, write_cl, read_cl[, serial_cl]) tuple for TestAccuracy.Validation
+    @return (elapsed seconds, exception or None, formatted traceback or None) tuple. Exceptions are
+            returned rather than raised so that their tracebacks survive the trip back from the worker.
+    """
+    state = _parallel_validation_state
+    test = state['test']
+    if state['pid'] != os.getpid():
+        # 'test' is a forked copy, so connect sessions that this worker process owns
+        state.update(pid=os.getpid(), sessions=[test.patient_exclusive_cql_connection(node, test.ksname)
+                                                for node in test.cluster.nodelist()])
+
+    start = time.time()
+    try:
+        state['valid_fcn'](TestAccuracy.Validation(test, state['sessions'], state['nodes'], state['rf_factors'], *task))
+        return time.time() - start, None, None
+    except Exception as e:
+        tb = traceback.format_exc()
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            # driver exceptions don't all survive pickling
+            e = Exception('{}: {}'.format(type(e).__name__, e))
+        return time.time() - start, e, tb
+
+
 class TestHelper(Tester):
 
     def __init__(self, *args, **kwargs):
@@ -479,44 +516,48 @@ class TestAccuracy(TestHelper):
 
     def _run_test_function_in_parallel(self, valid_fcn, nodes, rf_factors, combinations):
         """
-        Run a test function in parallel.
+        Run a test function in parallel, one consistency level combination at a time
+        in each of a pool of worker processes. Every worker connects its own sessions
+        to every node, so the workers don't compete for the GIL or for sessions.
+
+        Any failures are raised together in a MultiError once all combinations have run.
+        Per-combination timings are logged and kept in self.combination_timings.
         """
         self._start_cluster(save_sessions=True)
 
-        input_queue = Queue.Queue()
-        exceptions_queue = Queue.Queue()
-
-        def run():
-            while not input_queue.empty():
-                try:
-                    v = TestAccuracy.Validation(self, self.sessions, nodes, rf_factors, *input_queue.get(block=False))
-                    valid_fcn(v)
-                except Queue.Empty:
-                    pass
-                except:
-                    exceptions_queue.put(sys.exc_info())
-
+        tasks = []
         start = 0
         num_keys = 50
         for combination in combinations:
-            input_queue.put((start, start + num_keys) + combination)
+            tasks.append((start, start + num_keys) + combination)
             start += num_keys
 
-        threads = []
-        for n in range(0, 8):
-            t = threading.Thread(target=run)
-            t.setDaemon(True)
-            t.start()
-            threads.append(t)
+        # workers are forked and inherit this state, so the test (with its cluster) doesn't need to be pickled;
+        # the sessions are only used by thread workers, forked ones connect their own
+        _parallel_validation_state.update(test=self, valid_fcn=valid_fcn, nodes=nodes, rf_factors=rf_factors,
+                                          pid=os.getpid(), sessions=self.sessions)
+        executor_class = ProcessPoolExecutor if hasattr(os, 'fork') else ThreadPoolExecutor
+        executor = executor_class(max_workers=min(8, len(tasks)))
 
         self.log("Waiting for workers to complete")
-        while exceptions_queue.empty():
-            time.sleep(0.1)
-            if len(filter(lambda t: t.isAlive(), threads)) == 0:
-                break
-
-        if not exceptions_queue.empty():
-            _, exceptions, tracebacks = zip(*exceptions_queue.queue)
+        self.combination_timings = []
+        exceptions, tracebacks = [], []
+        try:
+            futures = {executor.submit(_run_validation, task): task for task in tasks}
+            for future in as_completed(futures):
+                combination = futures[future][2:]
+                elapsed, exc, tb = future.result()
+                self.log('WRITE/READ(/SERIAL) consistency {} took {:.2f}s'
+                         .format('/'.join(consistency_value_to_name(cl) for cl in combination), elapsed))
+                self.combination_timings.append((combination, elapsed))
+                if exc is not None:
+                    exceptions.append(exc)
+                    tracebacks.append(tb)
+        finally:
+            executor.shutdown(wait=True)
+            _parallel_validation_state.clear()
+
+        if exceptions:
             raise MultiError(exceptions=exceptions, tracebacks=tracebacks)
 
     def test_simple_strategy_users(self):
@@ -888,15 +929,13 @@ class TestConsistency(Tester):
         node2.start(wait_other_notice=True)
 
         # query everything to cause RR
-        for n in xrange(0, 10000):
-            query_c1c2(session, n, ConsistencyLevel.QUORUM)
+        query_c1c2_keys(session, xrange(0, 10000), ConsistencyLevel.QUORUM)
 
         node1.stop(wait_other_notice=True)
 
         # Check node2 for all the keys that should have been repaired
         session = self.patient_cql_connection(node2, keyspace='ks')
-        for n in xrange(0, 10000):
-            query_c1c2(session, n, ConsistencyLevel.ONE)
+        query_c1c2_keys(session, xrange(0, 10000), ConsistencyLevel.ONE)
 
     def quorum_available_during_failure_test(self):
         CL = ConsistencyLevel.QUORUM
@@ -923,8 +962,7 @@ class TestConsistency(Tester):
         node1.stop(wait_other_notice=True)
 
         debug("Reading back data.")
-        for n in xrange(100):
-            query_c1c2(session, n, CL)
+        query_c1c2_keys(session, xrange(100), CL)
 
     def stop_node(self, node_number):
         to_stop = self.cluster.nodes["node%d" % node_number]
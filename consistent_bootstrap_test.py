@@ -2,7 +2,7 @@ from cassandra import ConsistencyLevel
 
 from dtest import Tester, debug
 from tools import (create_c1c2_table, insert_c1c2, new_node, no_vnodes,
-                   query_c1c2)
+                   query_c1c2_keys)
 
 
 class TestBootstrapConsistency(Tester):
@@ -41,11 +41,9 @@ class TestBootstrapConsistency(Tester):
         node3.move(2)
 
         debug("Checking that no data was lost")
-        for n in xrange(10, 20):
-            query_c1c2(n2session, n, ConsistencyLevel.ALL)
+        query_c1c2_keys(n2session, xrange(10, 20), ConsistencyLevel.ALL)
 
-        for n in xrange(30, 1000):
-            query_c1c2(n2session, n, ConsistencyLevel.ALL)
+        query_c1c2_keys(n2session, xrange(30, 1000), ConsistencyLevel.ALL)
 
     def consistent_reads_after_bootstrap_test(self):
         debug("Creating a ring")
@@ -84,8 +82,6 @@ class TestBootstrapConsistency(Tester):
         n3session = self.patient_cql_connection(node3)
         n3session.execute("USE ks")
         debug("Checking that no data was lost")
-        for n in xrange(10, 20):
-            query_c1c2(n3session, n, ConsistencyLevel.ALL)
+        query_c1c2_keys(n3session, xrange(10, 20), ConsistencyLevel.ALL)
 
-        for n in xrange(30, 1000):
-            query_c1c2(n3session, n, ConsistencyLevel.ALL)
+        query_c1c2_keys(n3session, xrange(30, 1000), ConsistencyLevel.ALL)
@@ -0,0 +1,264 @@
+"""
+Long-lived cqlsh processes, so that running a batch of cqlsh commands doesn't
+pay for starting a Python interpreter, importing cqlshlib, connecting and
+fetching the schema every time.
+
+    sessions = CqlshSessions()
+    tester.addCleanup(sessions.close)
+    stdout, stderr = sessions.run(node, "SELECT * FROM ks.t")
+
+Each session keeps a cqlsh process reading commands from a pipe. After every
+batch of commands, the session makes cqlsh print markers on stdout (through
+CAPTURE, which prints 'Now capturing query output to <file>.') and stderr
+(through SOURCE of a file that doesn't exist), reads both streams up to them
+and strips them, so callers get the same (stdout, stderr) they would get from
+a cqlsh process of their own, line numbers of errors included.
+
+Batches that change the state of a cqlsh session (CONSISTENCY, PAGING,
+CAPTURE, ...), or that depend on cqlsh's copy of the schema being current
+(DESCRIBE, COPY), are run in a process of their own, as are batches whose
+last statement doesn't end, like ones with an unterminated string, which would
+leave a session waiting for the rest of it, and all batches on Windows, where
+pipes can't be selected. A session whose process exits is replaced on the next
+batch.
+"""
+import os
+import re
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from distutils.version import LooseVersion
+
+from ccmlib import common
+
+from dtest import debug
+
+# first words of commands that change or depend on more than a fresh cqlsh process' state
+STATEFUL_COMMANDS = frozenset(['USE', 'CONSISTENCY', 'SERIAL', 'PAGING', 'EXPAND', 'TRACING', 'CAPTURE', 'LOGIN',
+                               'SOURCE', 'DEBUG', 'QUIT', 'EXIT', 'DESC', 'DESCRIBE', 'COPY'])
+
+
+def cqlsh_command(node, cqlsh_options=None, env_vars=None):
+    """
+    @return The arguments and environment to run cqlsh against node with
+    """
+    cdir = node.get_install_dir()
+    cli = os.path.join(cdir, 'bin', common.platform_binary('cqlsh'))
+    env = common.make_cassandra_env(cdir, node.get_path())
+    env['LANG'] = 'en_US.UTF-8'
+    env.update(env_vars or {})
+    if LooseVersion(node.cluster.version()) >= LooseVersion('2.1'):
+        host, port = node.network_interfaces['binary']
+    else:
+        host, port = node.network_interfaces['thrift']
+    return [cli] + (cqlsh_options or []) + [host, str(port)], env
+
+
+def _split_statements(cmds):
+    """
+    Split cmds on the semicolons that aren't in a string, a quoted identifier or a comment.
+
+    @return (the statements, whether the last one ends, rather than in an unterminated string or comment)
+    """
+    statements = []
+    start = i = 0
+    closing = None
+    while i < len(cmds):
+        if closing is not None:
+            end = cmds.find(closing, i)
+            if end == -1:
+                # a line comment ends with the input
+                return statements + [cmds[start:]], closing == '\n'
+            if closing in ("'", '"') and cmds.startswith(closing * 2, end):
+                # an escaped quote
+                i = end + 2
+            else:
+                i = end + len(closing)
+                closing = None
+        elif cmds[i:i + 2] in ('--', '//'):
+            closing, i = '\n', i + 2
+        elif cmds[i:i + 2] in ('/*', '$$'):
+            closing, i = '*/' if cmds[i] == '/' else '$$', i + 2
+        elif cmds[i] in ("'", '"'):
+            closing, i = cmds[i], i + 1
+        elif cmds[i] == ';':
+            statements.append(cmds[start:i])
+            start = i = i + 1
+        else:
+            i += 1
+    return statements + [cmds[start:]], True
+
+
+def split_statements(cmds):
+    """
+    @return The statements of cmds, a string of ';'-separated commands, without their semicolons
+    """
+    return _split_statements(cmds)[0]
+
+
+def is_complete(cmds):
+    """
+    @return Whether the last statement of cmds ends, rather than in an unterminated string or comment
+    """
+    return _split_statements(cmds)[1]
+
+
+def cqlsh_input(cmds, keyspace=None):
+    """
+    @return What to write to cqlsh's stdin to run cmds, a string of ';'-separated commands, in keyspace
+    """
+    return ('USE {};'.format(keyspace) if keyspace else '') + ''.join(cmd + ';\n' for cmd in split_statements(cmds))
+
+
+def is_stateful(cmds):
+    return any(cmd.split(None, 1)[0].upper() in STATEFUL_COMMANDS for cmd in split_statements(cmds) if cmd.strip())
+
+
+def _cut_from_line_of(output, marker):
+    """
+    @return output, up to the start of the line where marker first appears
+    """
+    return output[:output.rfind('\n', 0, output.index(marker)) + 1]
+
+
+class CqlshSession(object):
+    """
+    A cqlsh process, and what's needed to frame the output of each batch of commands sent to it.
+    """
+
+    def __init__(self, args, env):
+        self._tmpdir = tempfile.mkdtemp(prefix='dtest-cqlsh-')
+        self._capture_path = os.path.join(self._tmpdir, 'end-of-output')
+        self._missing_path = os.path.join(self._tmpdir, 'end-of-errors')
+        # unbuffered, so that nothing cqlsh printed before the markers is held back
+        env = dict(env, PYTHONUNBUFFERED='1')
+        self.process = subprocess.Popen(args, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.keyspace = None
+        self._lines_written = 0
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, text, timeout):
+        """
+        Write text to cqlsh, and return what it printed because of it.
+
+        @return (stdout, stderr, whether the process is still running)
+        @throws RuntimeError If cqlsh didn't finish within timeout seconds
+        """
+        markers = "CAPTURE '{}';\nCAPTURE OFF;\nSOURCE '{}';\n".format(self._capture_path, self._missing_path)
+        line_offset = self._lines_written
+        self._lines_written += (text + markers).count('\n')
+        try:
+            self.process.stdin.write(text + markers)
+            self.process.stdin.flush()
+        except IOError:
+            # cqlsh exited; collect what it printed
+            pass
+
+        stdout, stderr = self._read_until_markers(time.time() + timeout)
+        finished = self._capture_path in stdout and self._missing_path in stderr
+        if finished:
+            stdout = _cut_from_line_of(stdout, self._capture_path)
+            stderr = _cut_from_line_of(stderr, self._missing_path)
+        # errors are numbered by line since the process started
+        stderr = re.sub(r'<stdin>:(\d+):', lambda m: '<stdin>:{}:'.format(int(m.group(1)) - line_offset), stderr)
+        return stdout, stderr, finished
+
+    def _read_until_markers(self, deadline):
+        outputs = {self.process.stdout.fileno(): [], self.process.stderr.fileno(): []}
+        stdout_fd, stderr_fd = self.process.stdout.fileno(), self.process.stderr.fileno()
+        open_fds = set(outputs)
+
+        def done(fd, marker):
+            output = ''.join(outputs[fd])
+            return marker in output and output.endswith('\n')
+
+        while open_fds and not (done(stdout_fd, self._capture_path) and done(stderr_fd, self._missing_path)):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.close()
+                raise RuntimeError("cqlsh didn't finish running commands in time. stdout: {}, stderr: {}".format(
+                    ''.join(outputs[stdout_fd]), ''.join(outputs[stderr_fd])))
+            readable, _, _ = select.select(list(open_fds), [], [], remaining)
+            for fd in readable:
+                data = os.read(fd, 65536)
+                if data:
+                    outputs[fd].append(data)
+                else:
+                    open_fds.discard(fd)
+        return ''.join(outputs[stdout_fd]), ''.join(outputs[stderr_fd])
+
+    def close(self):
+        if self.alive:
+            try:
+                self.process.stdin.close()
+                self.process.kill()
+            except (IOError, OSError):
+                pass
+            self.process.wait()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class CqlshSessions(object):
+    """
+    Persistent cqlsh sessions, one for each node process, cqlsh options and environment.
+
+    @param timeout Time, in seconds, to wait for a batch of commands to run
+    """
+
+    def __init__(self, timeout=600):
+        self.timeout = timeout
+        self._sessions = {}
+
+    def run(self, node, cmds, cqlsh_options=None, env_vars=None, keyspace=None):
+        """
+        Run cmds, a string of ';'-separated commands, through cqlsh.
+
+        @param keyspace Keyspace to USE before running cmds
+        @return (stdout, stderr), as cqlsh printed them
+        """
+        args, env = cqlsh_command(node, cqlsh_options, env_vars)
+        text = cqlsh_input(cmds, keyspace)
+        sys.stdout.flush()
+
+        if common.is_win() or is_stateful(cmds) or not is_complete(cmds):
+            p = subprocess.Popen(args, env=env, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+            return p.communicate(text + "quit;\n")
+
+        session = self._session(node, args, env, keyspace)
+        stdout, stderr, finished = session.run(text, self.timeout)
+        if keyspace:
+            session.keyspace = keyspace
+        if not finished:
+            debug("cqlsh session for {} exited, it will be restarted".format(node.name))
+            self._discard(session)
+        return stdout, stderr
+
+    def _session(self, node, args, env, keyspace):
+        # a restarted node gets new sessions, as the driver of the old ones may take a while to reconnect
+        key = (node.name, node.pid, tuple(args), tuple(sorted(env.items())))
+        session = self._sessions.get(key)
+        # a session can't go back to having no keyspace
+        if session is not None and (not session.alive or (session.keyspace and not keyspace)):
+            self._discard(session)
+            session = None
+        if session is None:
+            for stale_key in [k for k in self._sessions if k[0] == node.name and k[1] != node.pid]:
+                self._discard(self._sessions[stale_key])
+            session = self._sessions[key] = CqlshSession(args, env)
+        return session
+
+    def _discard(self, session):
+        for key, value in self._sessions.items():
+            if value is session:
+                del self._sessions[key]
+        session.close()
+
+    def close(self):
+        for session in list(self._sessions.values()):
+            self._discard(session)
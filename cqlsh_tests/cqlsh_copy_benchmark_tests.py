@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+Throughput benchmarks of cqlsh COPY TO and COPY FROM, over a table with all
+the CQL data types.
+
+Every COPY is run once per set of options in COPY_FROM_SWEEP and
+COPY_TO_SWEEP, for every number of rows in COPY_BENCHMARK_ROWS, and its
+rows/s, CPU time and peak memory, across cqlsh and its worker processes, are
+appended as a JSON line to COPY_BENCHMARK_RESULTS, so that runs against
+different versions of Cassandra can be compared.
+
+    COPY_BENCHMARK=yes COPY_BENCHMARK_ROWS=1000000,10000000 nosetests -vs cqlsh_tests/cqlsh_copy_benchmark_tests.py
+"""
+import csv
+import datetime
+import json
+import os
+import re
+from cStringIO import StringIO
+from unittest import skipUnless
+
+from ccmlib.common import is_win
+
+from cqlsh_copy_tests import CqlshCopyTester
+from cqlsh_sessions import cqlsh_command, cqlsh_input
+from dtest import LOG_SAVED_DIR, debug
+from tools import since
+from utils.resource_usage import run_and_measure
+
+COPY_BENCHMARK = os.environ.get('COPY_BENCHMARK', '').lower() in ('yes', 'true')
+COPY_BENCHMARK_ROWS = [int(rows) for rows in os.environ.get('COPY_BENCHMARK_ROWS', '1000000').split(',')]
+COPY_BENCHMARK_RESULTS = os.environ.get('COPY_BENCHMARK_RESULTS', os.path.join(LOG_SAVED_DIR, 'copy_benchmark_results.jsonl'))
+
+# options are varied one at a time from the defaults, to see the effect of each
+COPY_FROM_SWEEP = ({},
+                   {'NUMPROCESSES': 1}, {'NUMPROCESSES': 4}, {'NUMPROCESSES': 16},
+                   {'CHUNKSIZE': 1000}, {'CHUNKSIZE': 20000},
+                   {'MAXBATCHSIZE': 5}, {'MAXBATCHSIZE': 100},
+                   {'INGESTRATE': 50000}, {'INGESTRATE': 1000000})
+COPY_TO_SWEEP = ({},
+                 {'NUMPROCESSES': 1}, {'NUMPROCESSES': 4}, {'NUMPROCESSES': 16},
+                 {'PAGESIZE': 100}, {'PAGESIZE': 5000})
+
+# rows of a csv file generated at once
+CSV_BATCH_SIZE = 10000
+
+
+@skipUnless(COPY_BENCHMARK, 'set COPY_BENCHMARK=yes to run the COPY benchmarks')
+@skipUnless(not is_win(), 'resource usage is measured through wait4')
+@since('2.2.5')
+class CqlshCopyBenchmark(CqlshCopyTester):
+    """
+    Benchmarks of COPY TO and COPY FROM, for finding throughput regressions.
+    """
+
+    def write_benchmark_csv(self, filename, rows):
+        """
+        Write rows rows of self.data, with a different key for each, to filename.
+        """
+        data_set = list(self.data)
+        # serializing blob bytearray in friendly format
+        data_set[2] = '0x{}'.format(''.join('%02x' % c for c in self.data[2]))
+        line = StringIO()
+        csv.writer(line).writerow(data_set[1:])
+        rest_of_row = line.getvalue()
+
+        with open(filename, 'wb') as csvfile:
+            for start in xrange(0, rows, CSV_BATCH_SIZE):
+                csvfile.write(''.join('key{},{}'.format(i, rest_of_row) for i in xrange(start, min(rows, start + CSV_BATCH_SIZE))))
+
+    def run_copy(self, direction, filename, options, rows):
+        """
+        Run COPY ks.testdatatype FROM or TO filename with options, check it copied rows rows,
+        and record how long it took and what it used.
+
+        @return The result record
+        """
+        cmd = "COPY ks.testdatatype {} '{}'".format(direction, filename)
+        if options:
+            cmd += ' WITH ' + ' AND '.join("{}='{}'".format(name, value) for name, value in sorted(options.items()))
+        args, env = cqlsh_command(self.node1)
+        debug(cmd)
+        usage = run_and_measure(args, env=env, stdin=cqlsh_input(cmd) + 'quit;\n')
+
+        copied = re.search(r'(\d+) rows (?:imported|exported)', usage.stdout)
+        self.assertIsNotNone(copied, 'COPY did not complete. stdout: {}, stderr: {}'.format(usage.stdout[-2000:], usage.stderr))
+        self.assertEqual(rows, int(copied.group(1)), usage.stderr)
+
+        result = dict(usage.as_dict(),
+                      benchmark='COPY {}'.format(direction),
+                      options=options,
+                      rows=rows,
+                      rows_per_s=rows / usage.elapsed,
+                      cassandra_version=str(self.cluster.version()),
+                      install_dir=self.cluster.get_install_dir(),
+                      date=datetime.datetime.utcnow().isoformat())
+        debug('{benchmark} {options}: {rows_per_s:.0f} rows/s, {cpu:.1f}s CPU, {peak_rss_mb:.0f}MB peak RSS'.format(
+            cpu=usage.cpu_user + usage.cpu_system, peak_rss_mb=usage.peak_rss / 2.0 ** 20, **result))
+
+        results_dir = os.path.dirname(COPY_BENCHMARK_RESULTS)
+        if results_dir and not os.path.isdir(results_dir):
+            os.makedirs(results_dir)
+        with open(COPY_BENCHMARK_RESULTS, 'a') as f:
+            f.write(json.dumps(result, sort_keys=True) + '\n')
+        return result
+
+    def copy_from_benchmark_test(self):
+        """
+        Benchmark COPY FROM of csv files of all data types, with every set of options in COPY_FROM_SWEEP.
+        """
+        self.all_datatypes_prepare()
+        for rows in COPY_BENCHMARK_ROWS:
+            tempfile = self.get_temp_file(suffix='.csv')
+            self.write_benchmark_csv(tempfile.name, rows)
+            for options in COPY_FROM_SWEEP:
+                self.session.execute('TRUNCATE ks.testdatatype')
+                self.run_copy('FROM', tempfile.name, options, rows)
+            os.unlink(tempfile.name)
+
+    def copy_to_benchmark_test(self):
+        """
+        Benchmark COPY TO of tables of all data types, with every set of options in COPY_TO_SWEEP.
+        """
+        self.all_datatypes_prepare()
+        for rows in COPY_BENCHMARK_ROWS:
+            tempfile = self.get_temp_file(suffix='.csv')
+            self.write_benchmark_csv(tempfile.name, rows)
+            self.session.execute('TRUNCATE ks.testdatatype')
+            self.run_copy('FROM', tempfile.name, {}, rows)
+            for options in COPY_TO_SWEEP:
+                self.run_copy('TO', tempfile.name, options, rows)
+            os.unlink(tempfile.name)
@@ -22,10 +22,11 @@ from cassandra.util import SortedSet
 from ccmlib.common import is_win
 
 from cqlsh_tools import (DummyColorMap, assert_csvs_items_equal, csv_rows,
-                         monkeypatch_driver, random_list, unmonkeypatch_driver,
-                         write_rows_to_csv)
+                         differences_report, monkeypatch_driver,
+                         numbered_csv_rows, random_list, unmonkeypatch_driver,
+                         unordered_differences, write_rows_to_csv)
 from dtest import (DISABLE_VNODES, Tester, canReuseCluster, debug,
-                   freshCluster, warning)
+                   freshCluster)
 from tools import known_failure, rows_to_list, since
 from utils.metadata_wrapper import (UpdatingClusterMetadataWrapper,
                                     UpdatingTableMetadataWrapper)
@@ -53,11 +54,9 @@ class UTC(datetime.tzinfo):
         return datetime.timedelta(0)
 
 
-@canReuseCluster
-class CqlshCopyTest(Tester):
+class CqlshCopyTester(Tester):
     """
-    Tests the COPY TO and COPY FROM features in cqlsh.
-    @jira_ticket CASSANDRA-3906
+    Cluster, data and csv helpers for testing COPY TO and COPY FROM.
     """
 
     def __init__(self, *args, **kwargs):
@@ -74,7 +73,7 @@ class CqlshCopyTest(Tester):
 
     def tearDown(self):
         self.delete_temp_files()
-        super(CqlshCopyTest, self).tearDown()
+        super(CqlshCopyTester, self).tearDown()
 
     def get_temp_file(self, prefix=template, suffix=""):
         """
@@ -300,23 +299,11 @@ class CqlshCopyTest(Tester):
             else:
                 raise RuntimeError("table_name is required if cql_type_names are not specified")
 
-        processed_results = list(self.result_to_csv_rows(results, cql_type_names, nullval=nullval))
-        csv_results = list(csv_rows(csv_filename))
-
-        self.maxDiff = None
-        try:
-            self.assertItemsEqual(csv_results, processed_results)
-        except Exception as e:
-            if len(csv_results) != len(processed_results):
-                warning("Different # of entries. CSV: " + str(len(csv_results)) +
-                        " vs results: " + str(len(processed_results)))
-            elif csv_results[0] is not None:
-                for x in range(0, len(csv_results[0])):
-                    if csv_results[0][x] != processed_results[0][x]:
-                        warning("Mismatch at index: " + str(x))
-                        warning("Value in csv: " + str(csv_results[0][x]))
-                        warning("Value in result: " + str(processed_results[0][x]))
-            raise e
+        # stream both sides, so that large tables can be compared with bounded memory
+        processed_results = ((row, i) for i, row in enumerate(self.iter_result_csv_rows(results, cql_type_names, nullval=nullval), 1))
+        differences = unordered_differences(numbered_csv_rows(csv_filename), processed_results)
+        if differences[0] or differences[1]:
+            self.fail(differences_report((csv_filename, 'line'), ('results', 'row'), differences))
 
     def make_csv_formatter(self, time_format, nullval):
         with self._cqlshlib() as cqlshlib:  # noqa
@@ -380,13 +367,19 @@ class CqlshCopyTest(Tester):
         Given an object returned from a CQL query, returns a string formatted by
         the cqlsh formatting utilities.
         """
+        return list(self.iter_result_csv_rows(results, cql_type_names, time_format=time_format, nullval=nullval))
+
+    def iter_result_csv_rows(self, results, cql_type_names, time_format=None, nullval=''):
+        """
+        Like result_to_csv_rows, but yields the rows one by one, fetching
+        further pages of results as they are needed.
+        """
         # This has no real dependencies on Tester except that self._cqlshlib has
         # to grab self.cluster's install directory. This should be pulled out
         # into a bare function if cqlshlib is made easier to interact with.
         if not time_format:
             time_format = self.default_time_format
 
-        processed = []
         format_fn = self.make_csv_formatter(time_format, nullval)
 
         # build the typemap once ahead of time to speed up formatting
@@ -398,11 +391,16 @@ class CqlshCopyTest(Tester):
         except ImportError:
             cql_type_map = {}
 
-        for i, row in enumerate(results):
-            formatted_row = [format_fn(v, t, cql_type_map.get(t))
-                             for v, t in zip(row, cql_type_names)]
-            processed.append(formatted_row)
-        return processed
+        for row in results:
+            yield [format_fn(v, t, cql_type_map.get(t)) for v, t in zip(row, cql_type_names)]
+
+
+@canReuseCluster
+class CqlshCopyTest(CqlshCopyTester):
+    """
+    Tests the COPY TO and COPY FROM features in cqlsh.
+    @jira_ticket CASSANDRA-3906
+    """
 
     def test_list_data(self):
         """
@@ -5,7 +5,6 @@ import datetime
 import os
 import re
 import subprocess
-import sys
 from decimal import Decimal
 from distutils.version import LooseVersion
 from tempfile import NamedTemporaryFile
@@ -17,6 +16,7 @@ from cassandra.query import BatchStatement, BatchType
 from ccmlib import common
 
 from assertions import assert_all, assert_none
+from cqlsh_sessions import CqlshSessions
 from cqlsh_tools import monkeypatch_driver, unmonkeypatch_driver
 from dtest import Tester, debug
 from tools import (create_c1c2_table, insert_c1c2, rows_to_list, since, known_failure)
@@ -1635,28 +1635,10 @@ Tracing session:""")
         self.assertEqual(0, len(stdout), stdout)
 
     def run_cqlsh(self, node, cmds, cqlsh_options=None, env_vars=None):
-        if env_vars is None:
-            env_vars = {}
-        if cqlsh_options is None:
-            cqlsh_options = []
-        cdir = node.get_install_dir()
-        cli = os.path.join(cdir, 'bin', common.platform_binary('cqlsh'))
-        env = common.make_cassandra_env(cdir, node.get_path())
-        env['LANG'] = 'en_US.UTF-8'
-        env.update(env_vars)
-        if LooseVersion(self.cluster.version()) >= LooseVersion('2.1'):
-            host = node.network_interfaces['binary'][0]
-            port = node.network_interfaces['binary'][1]
-        else:
-            host = node.network_interfaces['thrift'][0]
-            port = node.network_interfaces['thrift'][1]
-        args = cqlsh_options + [host, str(port)]
-        sys.stdout.flush()
-        p = subprocess.Popen([cli] + args, env=env, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        for cmd in cmds.split(';'):
-            p.stdin.write(cmd + ';\n')
-        p.stdin.write("quit;\n")
-        return p.communicate()
+        if not hasattr(self, 'cqlsh_sessions'):
+            self.cqlsh_sessions = CqlshSessions()
+            self.addCleanup(self.cqlsh_sessions.close)
+        return self.cqlsh_sessions.run(node, cmds, cqlsh_options=cqlsh_options, env_vars=env_vars)
 
 
 class CqlshSmokeTest(Tester):
@@ -1,8 +1,16 @@
 import csv
+import heapq
+import marshal
 import random
+import tempfile
+from itertools import islice
 
 import cassandra
-from nose.tools import assert_items_equal
+
+# records sorted in memory at once by external_sort
+SORT_CHUNK_SIZE = 200000
+# sorted runs merged at once by external_sort
+MAX_MERGED_RUNS = 128
 
 
 class DummyColorMap(object):
@@ -23,9 +31,128 @@ def csv_rows(filename, delimiter=None):
             yield row
 
 
+def numbered_csv_rows(filename, delimiter=None):
+    """
+    Given a filename, opens a csv file and yields (row, line number) for each of its rows.
+    """
+    reader_opts = {}
+    if delimiter is not None:
+        reader_opts['delimiter'] = delimiter
+    with open(filename, 'rb') as csvfile:
+        reader = csv.reader(csvfile, **reader_opts)
+        for row in reader:
+            yield row, reader.line_num
+
+
+def _spill(sorted_items, directory):
+    run = tempfile.TemporaryFile(dir=directory)
+    for item in sorted_items:
+        marshal.dump(item, run)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    while True:
+        try:
+            yield marshal.load(run)
+        except EOFError:
+            return
+
+
+def external_sort(items, chunk_size=SORT_CHUNK_SIZE, max_merged_runs=MAX_MERGED_RUNS, directory=None):
+    """
+    Yields items in sorted order, holding at most chunk_size of them in memory.
+
+    Items are sorted chunk by chunk, and the sorted chunks are spilled to
+    temporary files and merged, in several passes if there are more than
+    max_merged_runs of them. Items have to be marshallable, e.g. tuples of
+    strings and numbers.
+    """
+    items = iter(items)
+    chunk = list(islice(items, chunk_size))
+    if len(chunk) < chunk_size:
+        # everything fits in memory
+        for item in sorted(chunk):
+            yield item
+        return
+
+    runs = []
+    try:
+        while chunk:
+            chunk.sort()
+            runs.append(_spill(chunk, directory))
+            chunk = list(islice(items, chunk_size))
+
+        while len(runs) > max_merged_runs:
+            merged = []
+            for start in xrange(0, len(runs), max_merged_runs):
+                group = runs[start:start + max_merged_runs]
+                merged.append(_spill(heapq.merge(*[_read_run(run) for run in group]), directory))
+                for run in group:
+                    run.close()
+            runs = merged
+
+        for item in heapq.merge(*[_read_run(run) for run in runs]):
+            yield item
+    finally:
+        for run in runs:
+            run.close()
+
+
+def unordered_differences(items1, items2, max_reported=10, **sort_options):
+    """
+    Compares two streams of (record, position) as multisets of records,
+    e.g. the rows of two csv files with their line numbers, with bounded memory.
+
+    @param sort_options Options of external_sort
+    @return The number of records only in items1, the number only in items2,
+            and the first max_reported differences, as (1 or 2, record, position)
+    """
+    sorted1, sorted2 = external_sort(items1, **sort_options), external_sort(items2, **sort_options)
+    missing = object()
+    only1, only2, reported = 0, 0, []
+    item1, item2 = next(sorted1, missing), next(sorted2, missing)
+    while item1 is not missing or item2 is not missing:
+        if item1 is not missing and item2 is not missing and item1[0] == item2[0]:
+            item1, item2 = next(sorted1, missing), next(sorted2, missing)
+        elif item2 is missing or (item1 is not missing and item1[0] < item2[0]):
+            only1 += 1
+            if len(reported) < max_reported:
+                reported.append((1, item1[0], item1[1]))
+            item1 = next(sorted1, missing)
+        else:
+            only2 += 1
+            if len(reported) < max_reported:
+                reported.append((2, item2[0], item2[1]))
+            item2 = next(sorted2, missing)
+    return only1, only2, reported
+
+
+def differences_report(name1, name2, differences):
+    """
+    Describes the result of unordered_differences between name1 and name2, e.g. 'line' numbers of csv files.
+
+    @param name1 Pair of the name of the first input and of its positions, like ('/tmp/a.csv', 'line')
+    @param name2 Same for the second input
+    """
+    only1, only2, reported = differences
+    lines = ['{} records only in {}, {} records only in {}. First differences:'.format(only1, name1[0], only2, name2[0])]
+    for side, record, position in sorted(reported, key=lambda difference: (difference[0], difference[2])):
+        name, position_name = name1 if side == 1 else name2
+        lines.append('  {} {} {}: {!r}'.format(name, position_name, position, record))
+    return '\n'.join(lines)
+
+
 def assert_csvs_items_equal(filename1, filename2):
+    """
+    Asserts that two csv files have the same lines, in any order, without loading them in memory.
+    """
     with open(filename1, 'r') as x, open(filename2, 'r') as y:
-        assert_items_equal(list(x.readlines()), list(y.readlines()))
+        differences = unordered_differences(((line, number) for number, line in enumerate(x, 1)),
+                                            ((line, number) for number, line in enumerate(y, 1)))
+    if differences[0] or differences[1]:
+        raise AssertionError(differences_report((filename1, 'line'), (filename2, 'line'), differences))
 
 
 def random_list(gen=None, n=None):
@@ -1,7 +1,7 @@
 import time
 
 from dtest import Tester
-from jmxutils import JolokiaAgent, make_mbean, remove_perf_disable_shared_mem
+from jmxutils import JolokiaAgent, enable_jolokia_agent, make_mbean
 from tools import known_failure, rows_to_list
 
 
@@ -52,7 +52,7 @@ class TestDeletion(Tester):
         self.cluster.populate(1)
         node1 = self.cluster.nodelist()[0]
 
-        remove_perf_disable_shared_mem(node1)
+        enable_jolokia_agent(node1)
 
         self.cluster.start(wait_for_binary_proto=True)
         [node1] = self.cluster.nodelist()
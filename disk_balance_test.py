@@ -3,8 +3,8 @@ import os.path
 
 from assertions import assert_almost_equal
 from dtest import DISABLE_VNODES, Tester
-from jmxutils import JolokiaAgent, make_mbean, remove_perf_disable_shared_mem
-from tools import (create_c1c2_table, insert_c1c2, new_node, query_c1c2, since)
+from jmxutils import JolokiaAgent, enable_jolokia_agent, make_mbean
+from tools import (create_c1c2_table, insert_c1c2, new_node, query_c1c2_keys, since)
 
 
 @since('3.2')
@@ -67,7 +67,7 @@ class TestDiskBalance(Tester):
         cluster.set_datadir_count(3)
         cluster.populate(1)
         [node] = cluster.nodelist()
-        remove_perf_disable_shared_mem(node)
+        enable_jolokia_agent(node)
         cluster.start(wait_for_binary_proto=True)
 
         session = self.patient_cql_connection(node)
@@ -75,21 +75,18 @@ class TestDiskBalance(Tester):
         create_c1c2_table(self, session)
         insert_c1c2(session, n=10000)
         node.flush()
-        for k in xrange(0, 10000):
-            query_c1c2(session, k)
+        query_c1c2_keys(session, xrange(0, 10000))
 
         node.compact()
         mbean = make_mbean('db', type='BlacklistedDirectories')
         with JolokiaAgent(node) as jmx:
             jmx.execute_method(mbean, 'markUnwritable', [os.path.join(node.get_path(), 'data0')])
 
-        for k in xrange(0, 10000):
-            query_c1c2(session, k)
+        query_c1c2_keys(session, xrange(0, 10000))
 
         node.nodetool('relocatesstables')
 
-        for k in xrange(0, 10000):
-            query_c1c2(session, k)
+        query_c1c2_keys(session, xrange(0, 10000))
 
     def alter_replication_factor_test(self):
         cluster = self.cluster
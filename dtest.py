@@ -49,6 +49,7 @@ except OSError:
     pass
 
 LAST_LOG = os.path.join(LOG_SAVED_DIR, "last")
+METRICS_SAVED_DIR = os.path.join(LOG_SAVED_DIR, "metrics")
 
 LAST_TEST_DIR = 'last_test_dir'
 
@@ -74,6 +75,7 @@ IGNORE_REQUIRE = os.environ.get('IGNORE_REQUIRE', '').lower() in ('yes', 'true')
 DATADIR_COUNT = os.environ.get('DATADIR_COUNT', '3')
 ENABLE_ACTIVE_LOG_WATCHING = os.environ.get('ENABLE_ACTIVE_LOG_WATCHING', '').lower() in ('yes', 'true')
 RUN_STATIC_UPGRADE_MATRIX = os.environ.get('RUN_STATIC_UPGRADE_MATRIX', '').lower() in ('yes', 'true')
+COLLECT_METRICS = os.environ.get('COLLECT_METRICS', '').lower() in ('yes', 'true')
 
 # devault values for configuration from configuration plugin
 _default_config = GlobalConfigObject(
@@ -293,6 +295,8 @@ class Tester(TestCase):
         # if False, then scan the log of each node for errors after every test.
         self.allow_log_errors = False
         self.cluster_options = kwargs.pop('cluster_options', None)
+        self.metrics_collector = None
+        self.jmx_nodetools = {}
         super(Tester, self).__init__(*argv, **kwargs)
 
     def set_node_to_current_version(self, node):
@@ -324,6 +328,12 @@ class Tester(TestCase):
         set_log_levels(self.cluster)
         self.connections = []
         self.runners = []
+        if COLLECT_METRICS:
+            # imported here, as it depends on dtest
+            from jmxutils import enable_jolokia_agent_on_populate
+            # the agent can't be attached to nodes started with the default JVM options
+            enable_jolokia_agent_on_populate(self.cluster)
+            self.collect_metrics()
 
     # this is intentionally spelled 'tst' instead of 'test' to avoid
     # making unittest think it's a test method
@@ -331,6 +341,54 @@ class Tester(TestCase):
         global CURRENT_TEST
         CURRENT_TEST = self.id() + self._testMethodName
 
+    def collect_metrics(self, metrics=None, interval=1.0):
+        """
+        Start sampling JMX metrics of the nodes of the cluster in the background, until the test ends.
+        The samples are saved with the logs of the test.
+
+        @param metrics List of metrics_collector.Metric; the default ones if None
+        @return The metrics_collector.MetricsCollector
+        """
+        # imported here, as the collector depends on dtest
+        from metrics_collector import MetricsCollector
+        if self.metrics_collector is not None:
+            self.metrics_collector.stop()
+        self.metrics_collector = MetricsCollector(self.cluster, metrics=metrics, interval=interval)
+        self.metrics_collector.start()
+        return self.metrics_collector
+
+    def stop_collecting_metrics(self):
+        if self.metrics_collector is not None:
+            self.metrics_collector.stop()
+
+    def save_metrics(self):
+        """
+        Save the samples of the metrics collected during the test in METRICS_SAVED_DIR, whether the test failed or not.
+        """
+        if self.metrics_collector is None:
+            return
+        try:
+            if not os.path.isdir(METRICS_SAVED_DIR):
+                os.makedirs(METRICS_SAVED_DIR)
+            self.metrics_collector.save(os.path.join(METRICS_SAVED_DIR, '{}_{}.json'.format(int(time.time() * 1000), self.id())))
+        except Exception as e:
+            print "Error saving metrics:", str(e)
+
+    def jmx_nodetool(self, node):
+        """
+        @return A nodetool_jmx.JmxNodetool for node, which runs the nodetool commands it can over JMX, until the test ends
+        """
+        # imported here, as it depends on dtest
+        from nodetool_jmx import JmxNodetool
+        if node.name not in self.jmx_nodetools:
+            self.jmx_nodetools[node.name] = JmxNodetool(node)
+        return self.jmx_nodetools[node.name]
+
+    def close_jmx_nodetools(self):
+        for nodetool in self.jmx_nodetools.values():
+            nodetool.close()
+        self.jmx_nodetools = {}
+
     def maybe_begin_active_log_watch(self):
         if ENABLE_ACTIVE_LOG_WATCHING:
             if not self.allow_log_errors:
@@ -448,6 +506,8 @@ class Tester(TestCase):
                 if os.path.exists(compactionlog):
                     self.assertGreaterEqual(os.path.getsize(compactionlog), 0)
                     shutil.copyfile(compactionlog, os.path.join(logdir, n + "_compaction.log"))
+            if self.metrics_collector is not None:
+                self.metrics_collector.save(os.path.join(logdir, "metrics.json"))
             if os.path.exists(name):
                 os.unlink(name)
             if not is_win():
@@ -656,6 +716,10 @@ class Tester(TestCase):
             except:
                 pass
 
+        self.stop_collecting_metrics()
+        self.save_metrics()
+        self.close_jmx_nodetools()
+
         failed = did_fail()
         try:
             if not self.allow_log_errors and self.check_logs_for_errors():
@@ -1021,6 +1085,8 @@ class ReusableClusterTester(Tester):
     def setUp(self):
         self.set_current_tst_name()
         self.connections = []
+        if COLLECT_METRICS:
+            self.collect_metrics()
 
         # TODO enable active log watching
         # This needs to happen in setUp() and not setUpClass() so that individual
@@ -1034,6 +1100,10 @@ class ReusableClusterTester(Tester):
         # test_is_ending prevents active log watching from being able to interrupt the test
         self.test_is_ending = True
 
+        self.stop_collecting_metrics()
+        self.save_metrics()
+        self.close_jmx_nodetools()
+
         failed = did_fail()
         try:
             if not self.allow_log_errors and self.check_logs_for_errors():
@@ -2,6 +2,7 @@ import time
 
 from cassandra.concurrent import execute_concurrent_with_args
 
+from cluster_ops import flush_nodes, stop_nodes
 from dtest import Tester, debug
 from tools import known_failure
 
@@ -60,8 +61,7 @@ class TestGlobalRowKeyCache(Tester):
                     concurrency=2)
 
                 # flush everything to get it into sstables
-                for node in cluster.nodelist():
-                    node.flush()
+                flush_nodes(cluster.nodelist())
 
                 # update the first 10 rows in every table
                 # on non-counter tables, delete the first (remaining) row each round
@@ -95,7 +95,7 @@ class TestGlobalRowKeyCache(Tester):
                 debug("Letting caches be saved to disk")
                 time.sleep(10)
                 debug("Stopping cluster")
-                cluster.stop()
+                stop_nodes(cluster.nodelist())
                 time.sleep(1)
                 debug("Starting cluster")
                 cluster.start()
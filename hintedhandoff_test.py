@@ -4,8 +4,9 @@ import time
 from cassandra import ConsistencyLevel
 
 from dtest import DISABLE_VNODES, Tester
+from jmxutils import enable_jolokia_agent
 from tools import (create_c1c2_table, insert_c1c2, known_failure, no_vnodes,
-                   query_c1c2, since)
+                   query_c1c2_keys, since)
 
 
 @since('3.0')
@@ -27,10 +28,14 @@ class TestHintedHandoffConfig(Tester):
             cluster.set_configuration_options(values=config_options)
 
         if DISABLE_VNODES:
-            cluster.populate([2]).start()
+            cluster.populate([2])
         else:
             tokens = cluster.balanced_tokens(2)
-            cluster.populate([2], tokens=tokens).start()
+            cluster.populate([2], tokens=tokens)
+        # loaded at node start, for jmx_nodetool
+        for node in cluster.nodelist():
+            enable_jolokia_agent(node)
+        cluster.start()
 
         return cluster.nodelist()
 
@@ -38,7 +43,7 @@ class TestHintedHandoffConfig(Tester):
         """
         Launch a nodetool command and check there is no error, return the result
         """
-        out, err = node.nodetool(cmd, capture_output=True)
+        out, err = self.jmx_nodetool(node).nodetool(cmd, capture_output=True)
         self.assertEqual('', err)
         return out
 
@@ -65,11 +70,7 @@ class TestHintedHandoffConfig(Tester):
 
         # Check node2 for all the keys that should have been delivered via HH if enabled or not if not enabled
         session = self.patient_exclusive_cql_connection(node2, keyspace='ks')
-        for n in xrange(0, 100):
-            if enabled:
-                query_c1c2(session, n, ConsistencyLevel.ONE)
-            else:
-                query_c1c2(session, n, ConsistencyLevel.ONE, tolerate_missing=True, must_be_missing=True)
+        query_c1c2_keys(session, xrange(0, 100), ConsistencyLevel.ONE, must_be_missing=not enabled)
 
     @known_failure(failure_source='test',
                    jira_url='https://issues.apache.org/jira/browse/CASSANDRA-11439',
@@ -185,5 +186,4 @@ class TestHintedHandoff(Tester):
         node2.decommission()
         node3.decommission()
         time.sleep(5)
-        for x in xrange(0, 100):
-            query_c1c2(session, x, ConsistencyLevel.ONE)
+        query_c1c2_keys(session, xrange(0, 100), ConsistencyLevel.ONE)
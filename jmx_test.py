@@ -6,7 +6,8 @@ import ccmlib.common
 from ccmlib.node import NodetoolError
 
 from dtest import Tester, debug
-from jmxutils import JolokiaAgent, enable_jmx_ssl, make_mbean, remove_perf_disable_shared_mem
+from jmxutils import (JolokiaAgent, enable_jmx_ssl, enable_jolokia_agent,
+                      make_mbean)
 from tools import known_failure, since, generate_ssl_stores
 
 
@@ -61,7 +62,7 @@ class TestJMX(Tester):
         cluster = self.cluster
         cluster.populate(3)
         node1, node2, node3 = cluster.nodelist()
-        remove_perf_disable_shared_mem(node1)
+        enable_jolokia_agent(node1)
         cluster.start(wait_for_binary_proto=True)
 
         version = cluster.version()
@@ -76,18 +77,14 @@ class TestJMX(Tester):
         sstable_count = make_mbean('metrics', type=typeName, keyspace='keyspace1', scope='standard1', name='LiveSSTableCount')
 
         with JolokiaAgent(node1) as jmx:
-            mem_size = jmx.read_attribute(memtable_size, "Value")
+            mem_size, on_disk_size = jmx.read_attributes([(memtable_size, "Value"), (disk_size, "Count")])
             self.assertGreater(int(mem_size), 10000)
-
-            on_disk_size = jmx.read_attribute(disk_size, "Count")
             self.assertEquals(int(on_disk_size), 0)
 
             node1.flush()
 
-            on_disk_size = jmx.read_attribute(disk_size, "Count")
+            on_disk_size, sstables = jmx.read_attributes([(disk_size, "Count"), (sstable_count, "Value")])
             self.assertGreater(int(on_disk_size), 10000)
-
-            sstables = jmx.read_attribute(sstable_count, "Value")
             self.assertGreaterEqual(int(sstables), 1)
 
     def test_compactionstats(self):
@@ -102,7 +99,7 @@ class TestJMX(Tester):
         cluster = self.cluster
         cluster.populate(1)
         node = cluster.nodelist()[0]
-        remove_perf_disable_shared_mem(node)
+        enable_jolokia_agent(node)
         cluster.start(wait_for_binary_proto=True)
 
         # Run a quick stress command to create the keyspace and table
@@ -1,14 +1,16 @@
+import httplib
 import json
 import os
+import socket
 import subprocess
-from urllib2 import urlopen
 
 import ccmlib.common as common
 
-from dtest import warning
+from dtest import debug, warning
 from distutils.version import LooseVersion
 
 JOLOKIA_JAR = os.path.join('lib', 'jolokia-jvm-1.2.3-agent.jar')
+JOLOKIA_PORT = 8778
 CLASSPATH_SEP = ';' if common.is_win() else ':'
 JVM_OPTIONS = "jvm.options"
 
@@ -160,11 +162,144 @@ def remove_perf_disable_shared_mem(node):
     common.replace_in_file(conf_file, pattern, replacement)
 
 
+def perf_shared_mem_disabled(node):
+    """
+    @return Whether the configuration of node still has the -XX:+PerfDisableSharedMem JVM option,
+            which keeps the Jolokia agent from being attached to it (see remove_perf_disable_shared_mem)
+    """
+    try:
+        if LooseVersion(node.cluster.version()) >= LooseVersion('3.2'):
+            with open(os.path.join(node.get_conf_dir(), JVM_OPTIONS)) as f:
+                return any(line.strip() == '-XX:+PerfDisableSharedMem' for line in f)
+        with open(node.envfilename()) as f:
+            return 'PerfDisableSharedMem' in f.read()
+    except IOError:
+        return False
+
+
+def start_agent(node, fallback):
+    """
+    Start a Jolokia agent for node, for code that does without one when it can't be started.
+    Attaching an agent is skipped, rather than tried and failed, when the JVM option keeping
+    it from attaching is set.
+
+    @param fallback What is done instead when there is no agent, for logs
+    @return The started JolokiaAgent, or None if it couldn't be started
+    """
+    agent = JolokiaAgent(node)
+    if not agent.is_running() and perf_shared_mem_disabled(node):
+        debug('The Jolokia agent can\'t be attached to {}, as -XX:+PerfDisableSharedMem is set; '
+              '{}. Call jmxutils.enable_jolokia_agent before starting it.'.format(node.name, fallback))
+        return None
+    try:
+        agent.start()
+    except Exception as e:
+        debug('Could not start a Jolokia agent on {}, {}: {}'.format(node.name, fallback, e))
+        return None
+    return agent
+
+
+def enable_jolokia_agent_on_populate(cluster):
+    """
+    Has enable_jolokia_agent called on the nodes of cluster once it is populated, for code that samples
+    every node of a test, like COLLECT_METRICS, and doesn't know when the test populates the cluster.
+    """
+    populate = cluster.populate
+
+    def populate_with_jolokia_agent(*args, **kwargs):
+        populated = populate(*args, **kwargs)
+        for node in cluster.nodelist():
+            enable_jolokia_agent(node)
+        return populated
+    cluster.populate = populate_with_jolokia_agent
+
+
+class NodeAgent(object):
+    """
+    The Jolokia agent of the current process of a node, started by start_agent() the first time it
+    is needed, and again once the node restarted. Starting it isn't tried again on a node process
+    it couldn't be started on, as attaching an agent takes a JVM of its own.
+
+    @param fallback What is done instead when there is no agent, for logs
+    """
+
+    def __init__(self, node, fallback):
+        self.node = node
+        self.fallback = fallback
+        self._pid = None
+        self._agent = None
+
+    def get(self):
+        """
+        @return The started JolokiaAgent of the current process of the node, or None if it couldn't be started
+        """
+        if self._pid != self.node.pid:
+            if self._agent is not None:
+                # the node restarted, and the agent with it
+                self._agent.close_connection()
+            self._agent = start_agent(self.node, self.fallback)
+            self._pid = self.node.pid
+        return self._agent
+
+    def stop(self):
+        if self._agent is not None:
+            try:
+                self._agent.stop()
+            except Exception as e:
+                debug('Could not stop the Jolokia agent of {}: {}'.format(self.node.name, e))
+            self._agent = None
+            self._pid = None
+
+
+def enable_jolokia_agent(node):
+    """
+    Has the Jolokia agent loaded when the node starts, through a -javaagent
+    JVM option, so that JolokiaAgent doesn't have to attach it to the running
+    node, and detach it, every time it's used. Call before starting the node.
+
+    The option goes in jvm.options on 3.2+, or cassandra-env.sh before that.
+    On Windows before 3.2, and on nodes whose configuration gets replaced, like
+    on upgrades, JolokiaAgent falls back to attaching the agent, for which
+    -XX:+PerfDisableSharedMem is removed too.
+    """
+    remove_perf_disable_shared_mem(node)
+
+    agent_option = '-javaagent:{jar}=host={host},port={port}'.format(
+        jar=os.path.abspath(JOLOKIA_JAR), host=node.network_interfaces['binary'][0], port=JOLOKIA_PORT)
+    if LooseVersion(node.cluster.version()) >= LooseVersion('3.2'):
+        conf_file, line = os.path.join(node.get_conf_dir(), JVM_OPTIONS), agent_option
+    elif not common.is_win():
+        conf_file, line = node.envfilename(), 'JVM_OPTS="$JVM_OPTS {}"'.format(agent_option)
+    else:
+        return
+
+    with open(conf_file) as f:
+        if 'jolokia' in f.read():
+            return
+    with open(conf_file, 'a') as f:
+        f.write('\n{}\n'.format(line))
+
+
+def _closed_before_responding(error):
+    """
+    @return Whether an error of httplib is that of a connection closed before a byte of response was read
+    """
+    if not isinstance(error, httplib.BadStatusLine):
+        return False
+    # BadStatusLine('') before python 2.7.13, with a message since
+    return error.line in ('', "''") or error.line.startswith('No status line received')
+
+
 class JolokiaAgent(object):
     """
     This class provides a simple way to read, write, and execute
     JMX attributes and methods through a Jolokia agent.
 
+    Requests go through a single HTTP connection, kept alive until stop().
+    If the agent was loaded at node start (see enable_jolokia_agent), start()
+    and stop() don't do anything else; otherwise they attach the agent to the
+    node and detach it.
+
     Example usage:
 
         node = cluster.nodelist()[0]
@@ -179,12 +314,27 @@ class JolokiaAgent(object):
 
     def __init__(self, node):
         self.node = node
+        self._connection = None
+        self._attached = False
+
+    def is_running(self):
+        """
+        Returns whether the agent is answering requests.
+        """
+        try:
+            self._query({'type': 'version'})
+            return True
+        except (httplib.HTTPException, socket.error):
+            return False
 
     def start(self):
         """
-        Starts the Jolokia agent.  The process will fork from the parent
-        and continue running until stop() is called.
+        Starts the Jolokia agent, unless it is already running.  The process
+        will fork from the parent and continue running until stop() is called.
         """
+        if self.is_running():
+            return
+
         args = (java_bin(),
                 '-cp', jolokia_classpath(),
                 'org.jolokia.jvmagent.client.AgentLauncher',
@@ -198,11 +348,16 @@ class JolokiaAgent(object):
             print "Exit status was: %d" % (exc.returncode,)
             print "Output was: %s" % (exc.output,)
             raise
+        self._attached = True
 
     def stop(self):
         """
-        Stops the Jolokia agent.
+        Closes the connection to the Jolokia agent, and stops the agent if start() attached it.
         """
+        self.close_connection()
+        if not self._attached:
+            return
+
         args = (java_bin(),
                 '-cp', jolokia_classpath(),
                 'org.jolokia.jvmagent.client.AgentLauncher',
@@ -214,16 +369,46 @@ class JolokiaAgent(object):
             print "Exit status was: %d" % (exc.returncode,)
             print "Output was: %s" % (exc.output,)
             raise
+        self._attached = False
 
-    def _query(self, body):
-        request_data = json.dumps(body)
-        url = 'http://%s:8778/jolokia/' % (self.node.network_interfaces['binary'][0],)
-        response = urlopen(url, data=request_data, timeout=10.0)
-        if response.code != 200:
-            raise Exception("Failed to query Jolokia agent; HTTP response code: %d; response: %s" % (response.code, response.readlines()))
+    def close_connection(self):
+        """
+        Closes the connection to the agent; the next request opens another one.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
 
-        raw_response = response.readline()
-        response = json.loads(raw_response)
+    def _post(self, body, timeout=10.0):
+        """
+        Posts a request, or a list of requests, to the agent, and returns the decoded response.
+        """
+        request_data = json.dumps(body)
+        while True:
+            # a kept-alive connection may have been closed by the agent, or the node restarted
+            reused = self._connection is not None
+            if not reused:
+                self._connection = httplib.HTTPConnection(self.node.network_interfaces['binary'][0], JOLOKIA_PORT, timeout=timeout)
+            sent = False
+            try:
+                if self._connection.sock is not None:
+                    self._connection.sock.settimeout(timeout)
+                self._connection.request('POST', '/jolokia/', request_data, {'Content-Type': 'application/json'})
+                sent = True
+                response = self._connection.getresponse()
+                raw_response = response.read()
+                break
+            except (httplib.HTTPException, socket.error) as e:
+                self.close_connection()
+                # the request is only sent again if the agent can't have run it: operations aren't idempotent
+                if not reused or isinstance(e, socket.timeout) or (sent and not _closed_before_responding(e)):
+                    raise
+
+        if response.status != 200:
+            raise Exception("Failed to query Jolokia agent; HTTP response code: %d; response: %s" % (response.status, raw_response))
+        return json.loads(raw_response)
+
+    def _check(self, response):
         if response['status'] != 200:
             stacktrace = response.get('stacktrace')
             if stacktrace:
@@ -233,6 +418,9 @@ class JolokiaAgent(object):
             raise Exception("Jolokia agent returned non-200 status: %s" % (response,))
         return response
 
+    def _query(self, body, timeout=10.0):
+        return self._check(self._post(body, timeout))
+
     def read_attribute(self, mbean, attribute, path=None):
         """
         Reads a single JMX attribute.
@@ -253,6 +441,34 @@ class JolokiaAgent(object):
         response = self._query(body)
         return response['value']
 
+    def read_attributes(self, reads, ignore_errors=False):
+        """
+        Reads many JMX attributes in a single request.
+
+        `reads` should be a list of (mbean, attribute) or (mbean, attribute, path)
+        tuples, with the same meaning as the arguments of read_attribute().
+
+        `ignore_errors` makes the attributes that can't be read, like those of
+        mbeans that aren't registered (yet), read as None instead of raising.
+
+        Returns the values of the attributes, in the same order.
+        """
+        bodies = []
+        for read in reads:
+            mbean, attribute = read[:2]
+            body = {'type': 'read',
+                    'mbean': mbean,
+                    'attribute': attribute}
+            if len(read) > 2 and read[2]:
+                body['path'] = read[2]
+            bodies.append(body)
+        if not bodies:
+            return []
+        responses = self._post(bodies)
+        if ignore_errors:
+            return [response.get('value') if response['status'] == 200 else None for response in responses]
+        return [self._check(response)['value'] for response in responses]
+
     def write_attribute(self, mbean, attribute, value, path=None):
         """
         Writes a values to a single JMX attribute.
@@ -276,16 +492,20 @@ class JolokiaAgent(object):
             body['path'] = path
         self._query(body)
 
-    def execute_method(self, mbean, operation, arguments=None):
+    def execute_method(self, mbean, operation, arguments=None, timeout=10.0):
         """
         Executes a method on a JMX mbean.
 
         `mbean` should be the full name of an mbean.  See the mbean() utility
         function for an easy way to create this.
 
-        `operation` should be the name of the method on the mbean.
+        `operation` should be the name of the method on the mbean.  Overloaded
+        methods need their signature, as in 'forceKeyspaceFlush(java.lang.String,[Ljava.lang.String;)'.
 
         `arguments` is an optional list of arguments to pass to the method.
+
+        `timeout` is how long, in seconds, to wait for the method to return,
+        or None to wait for as long as it takes, like for a major compaction.
         """
 
         if arguments is None:
@@ -296,7 +516,7 @@ class JolokiaAgent(object):
                 'operation': operation,
                 'arguments': arguments}
 
-        response = self._query(body)
+        response = self._query(body, timeout)
         return response['value']
 
     def __enter__(self):
@@ -2,13 +2,10 @@ import doctest
 import inspect
 import os
 import re
-import subprocess
-import sys
-from distutils.version import LooseVersion
 
-from ccmlib import common
 from ccmlib.common import is_win
 
+from cqlsh_sessions import CqlshSessions
 from dtest import Tester
 from tools import since
 
@@ -55,35 +52,19 @@ def build_doc_context(tester, test_name, prepare=True, connection=None, nodes=No
     def enabled_ks():
         return getattr(ks, 'current_ks', default_ks_name)
 
+    cqlsh_sessions = CqlshSessions()
+    tester.addCleanup(cqlsh_sessions.close)
+
     def _cqlsh(cmds):
         """
-        Modified from cqlsh_tests.py
-        Attempts to make direct cqlsh communication.
+        Runs cqlsh commands in the enabled keyspace, through a cqlsh process kept
+        running for the whole doctest.
         """
-        cdir = nodes[0].get_install_dir()
-        cli = os.path.join(cdir, 'bin', common.platform_binary('cqlsh'))
-        env = common.make_cassandra_env(cdir, nodes[0].get_path())
-        env['LANG'] = 'en_US.UTF-8'
-
         # CASSANDRA-10428 changes the default time format to include microseconds (%f) but only
         # for version 3.2 onwards, so we fix the default timestamp for the time-being, to
         # avoid having multiple versions of these tests since it would be a bit messy to change the docstrings
-        env['CQLSH_DEFAULT_TIMESTAMP_FORMAT'] = '%Y-%m-%d %H:%M:%S%z'
-
-        if LooseVersion(tester.cluster.version()) >= LooseVersion('2.1'):
-            host = nodes[0].network_interfaces['binary'][0]
-            port = nodes[0].network_interfaces['binary'][1]
-        else:
-            host = nodes[0].network_interfaces['thrift'][0]
-            port = nodes[0].network_interfaces['thrift'][1]
-        args = [host, str(port)]
-        sys.stdout.flush()
-        p = subprocess.Popen([cli] + args, env=env, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        p.stdin.write("USE {};".format(enabled_ks()))
-        for cmd in cmds.split(';'):
-            p.stdin.write(cmd + ';\n')
-        p.stdin.write("quit;\n")  # may not be necesary, things could simplify a bit if removed
-        return p.communicate()
+        return cqlsh_sessions.run(nodes[0], cmds, env_vars={'CQLSH_DEFAULT_TIMESTAMP_FORMAT': '%Y-%m-%d %H:%M:%S%z'},
+                                  keyspace=enabled_ks())
 
     def cqlsh(cmds, supress_err=False):
         """
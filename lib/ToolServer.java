@@ -0,0 +1,254 @@
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.File;
+import java.io.IOException;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.net.InetAddress;
+import java.net.ServerSocket;
+import java.net.Socket;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.security.Permission;
+import java.util.Properties;
+import java.util.concurrent.CountDownLatch;
+
+/**
+ * Runs the main classes of Cassandra's offline tools, one after the other, in
+ * a JVM that stays up between runs. See tool_runner.py, which starts it and
+ * talks to it.
+ *
+ * Every run gets a class loader of its own, so that the static state of
+ * Cassandra (configuration, schema, open sstables) doesn't leak from a run to
+ * the next one, and System.exit() only ends the run, not the JVM: the thread
+ * calling it is unwound with a ThreadDeath, as nothing would have run after
+ * it. Once a run ended, the threads it left behind are stopped and its class
+ * loader is closed, so that nothing of the run outlives it.
+ *
+ * Requests are read from a connection to the port printed on stdout at start:
+ * the classpath, whether assertions are enabled, system properties, the main
+ * class and its arguments. The response is the exit status of the run, and
+ * what it printed on stdout and stderr. The JVM halts when its stdin is
+ * closed, that is when the process that started it exits.
+ */
+public class ToolServer
+{
+    private static class Run
+    {
+        final ThreadGroup group = new ThreadGroup("tool");
+        final CountDownLatch done = new CountDownLatch(1);
+        volatile int status = 0;
+
+        Run()
+        {
+            // destroyed once its last thread is gone
+            group.setDaemon(true);
+        }
+
+        synchronized void end(int status)
+        {
+            if (done.getCount() > 0)
+            {
+                this.status = status;
+                done.countDown();
+            }
+        }
+    }
+
+    private static final long STOP_TIMEOUT_MILLIS = 10000;
+
+    private static volatile Run current;
+
+    public static void main(String[] args) throws Exception
+    {
+        System.setSecurityManager(new SecurityManager()
+        {
+            public void checkPermission(Permission perm)
+            {
+            }
+
+            public void checkPermission(Permission perm, Object context)
+            {
+            }
+
+            public void checkExit(int status)
+            {
+                Run run = current;
+                if (run == null || !run.group.parentOf(Thread.currentThread().getThreadGroup()))
+                    return;
+                run.end(status);
+                // ThreadDeath is not reported by ThreadGroup.uncaughtException
+                throw new ThreadDeath();
+            }
+        });
+
+        Thread watchdog = new Thread(new Runnable()
+        {
+            public void run()
+            {
+                try
+                {
+                    while (System.in.read() != -1)
+                    {
+                    }
+                }
+                catch (IOException e)
+                {
+                    // the parent is gone either way
+                }
+                Runtime.getRuntime().halt(0);
+            }
+        }, "watchdog");
+        watchdog.setDaemon(true);
+        watchdog.start();
+
+        ServerSocket server = new ServerSocket(0, 1, InetAddress.getByName("127.0.0.1"));
+        System.out.println(server.getLocalPort());
+        System.out.flush();
+        while (true)
+        {
+            Socket socket = server.accept();
+            try
+            {
+                serve(socket);
+            }
+            catch (EOFException e)
+            {
+                // the client went away
+            }
+            catch (IOException e)
+            {
+                e.printStackTrace();
+            }
+            finally
+            {
+                socket.close();
+            }
+        }
+    }
+
+    private static void serve(Socket socket) throws Exception
+    {
+        DataInputStream in = new DataInputStream(new BufferedInputStream(socket.getInputStream()));
+        DataOutputStream out = new DataOutputStream(new BufferedOutputStream(socket.getOutputStream()));
+        while (true)
+        {
+            URL[] classpath = new URL[in.readInt()];
+            for (int i = 0; i < classpath.length; i++)
+                classpath[i] = new File(in.readUTF()).toURI().toURL();
+            boolean assertions = in.readBoolean();
+            Properties properties = new Properties();
+            for (int i = in.readInt(); i > 0; i--)
+                properties.setProperty(in.readUTF(), in.readUTF());
+            String mainClass = in.readUTF();
+            String[] toolArgs = new String[in.readInt()];
+            for (int i = 0; i < toolArgs.length; i++)
+                toolArgs[i] = in.readUTF();
+
+            ByteArrayOutputStream toolOut = new ByteArrayOutputStream();
+            ByteArrayOutputStream toolErr = new ByteArrayOutputStream();
+            int status = run(classpath, assertions, properties, mainClass, toolArgs, toolOut, toolErr);
+
+            out.writeInt(status);
+            out.writeInt(toolOut.size());
+            toolOut.writeTo(out);
+            out.writeInt(toolErr.size());
+            toolErr.writeTo(out);
+            out.flush();
+        }
+    }
+
+    private static int run(URL[] classpath, boolean assertions, Properties properties, final String mainClass, final String[] args,
+                           ByteArrayOutputStream toolOut, ByteArrayOutputStream toolErr) throws InterruptedException
+    {
+        final URLClassLoader loader = new URLClassLoader(classpath, ClassLoader.getSystemClassLoader().getParent());
+        loader.setDefaultAssertionStatus(assertions);
+        final Run toolRun = new Run();
+
+        Properties savedProperties = (Properties) System.getProperties().clone();
+        PrintStream savedOut = System.out;
+        PrintStream savedErr = System.err;
+        System.getProperties().putAll(properties);
+        System.setOut(new PrintStream(toolOut, true));
+        System.setErr(new PrintStream(toolErr, true));
+        current = toolRun;
+        try
+        {
+            Thread thread = new Thread(toolRun.group, new Runnable()
+            {
+                public void run()
+                {
+                    int status = 0;
+                    try
+                    {
+                        Method main = loader.loadClass(mainClass).getMethod("main", String[].class);
+                        main.invoke(null, (Object) args);
+                    }
+                    catch (InvocationTargetException e)
+                    {
+                        // the run ended with System.exit(), or was stopped
+                        if (e.getCause() instanceof ThreadDeath)
+                            return;
+                        System.err.print("Exception in thread \"main\" ");
+                        e.getCause().printStackTrace();
+                        status = 1;
+                    }
+                    catch (ThreadDeath e)
+                    {
+                        return;
+                    }
+                    catch (Throwable t)
+                    {
+                        t.printStackTrace();
+                        status = 1;
+                    }
+                    toolRun.end(status);
+                }
+            }, "main");
+            thread.setContextClassLoader(loader);
+            thread.start();
+            toolRun.done.await();
+            return toolRun.status;
+        }
+        finally
+        {
+            current = null;
+            // before restoring System.out and System.err, so that the run's threads can't print to them
+            stop(toolRun.group);
+            try
+            {
+                loader.close();
+            }
+            catch (IOException e)
+            {
+                // only the jars of the run stay open
+            }
+            System.out.flush();
+            System.err.flush();
+            System.setOut(savedOut);
+            System.setErr(savedErr);
+            System.setProperties(savedProperties);
+        }
+    }
+
+    /**
+     * Stops the threads of a run that are still alive, like those of the executors Cassandra starts,
+     * or a thread still running after another one called System.exit(), so that they don't pin the
+     * class loader of the run, and the static state, threads and file handles of its classes.
+     */
+    @SuppressWarnings("deprecation")
+    private static void stop(ThreadGroup group) throws InterruptedException
+    {
+        group.interrupt();
+        group.stop();
+        Thread[] threads = new Thread[group.activeCount() + 16];
+        long deadline = System.currentTimeMillis() + STOP_TIMEOUT_MILLIS;
+        for (int i = group.enumerate(threads); i-- > 0;)
+            threads[i].join(Math.max(1, deadline - System.currentTimeMillis()));
+    }
+}
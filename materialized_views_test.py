@@ -16,6 +16,7 @@ from enum import Enum  # Remove when switching to py3
 from assertions import (assert_all, assert_crc_check_chance_equal,
                         assert_invalid, assert_none, assert_one,
                         assert_unavailable)
+from cluster_ops import nodetool_on_nodes
 from dtest import Tester, debug
 from tools import known_failure, new_node, require, since
 
@@ -69,9 +70,7 @@ class TestMaterializedViews(Tester):
 
     def _replay_batchlogs(self):
         debug("Replaying batchlog on all nodes")
-        for node in self.cluster.nodelist():
-            if node.is_running():
-                node.nodetool("replaybatchlog")
+        nodetool_on_nodes([node for node in self.cluster.nodelist() if node.is_running()], "replaybatchlog")
 
     def create_test(self):
         """Test the materialized view creation"""
@@ -1530,12 +1529,8 @@ class TestMaterializedViewsConsistency(Tester):
         while self.num_request_done < upper:
             time.sleep(1)
 
-        debug("Making sure all batchlogs are replayed on node1")
-        node1.nodetool("replaybatchlog")
-        debug("Making sure all batchlogs are replayed on node2")
-        node2.nodetool("replaybatchlog")
-        debug("Making sure all batchlogs are replayed on node3")
-        node3.nodetool("replaybatchlog")
+        debug("Making sure all batchlogs are replayed on node1, node2 and node3")
+        nodetool_on_nodes([node1, node2, node3], "replaybatchlog")
 
         debug("Finished writes, now verifying reads")
         self._populate_rows()
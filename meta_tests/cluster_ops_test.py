@@ -0,0 +1,82 @@
+import threading
+import time
+from unittest import TestCase
+
+from mock import Mock
+
+from cluster_ops import NodeOperationTimeout, run_on_nodes, stop_nodes
+from dtest import MultiError
+
+
+class ToolFailure(Exception):
+    """
+    Like ccm's NodetoolError, can't be built from a message alone.
+    """
+
+    def __init__(self, command, exit_status):
+        Exception.__init__(self, '{} exited with status {}'.format(command, exit_status))
+
+
+def fake_nodes(count):
+    nodes = []
+    for i in xrange(1, count + 1):
+        node = Mock()
+        node.name = 'node{}'.format(i)
+        nodes.append(node)
+    return nodes
+
+
+class TestRunOnNodes(TestCase):
+
+    def test_bounded_concurrency(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def operation(node):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return node.name
+
+        nodes = fake_nodes(6)
+        self.assertEqual(run_on_nodes(nodes, operation, max_concurrency=3), [node.name for node in nodes])
+        self.assertEqual(running[1], 3)
+
+    def test_errors_are_aggregated(self):
+        errors = {'node1': RuntimeError('broken'), 'node3': ToolFailure('nodetool flush', 1)}
+
+        def operation(node):
+            if node.name in errors:
+                raise errors[node.name]
+
+        with self.assertRaises(MultiError) as cm:
+            run_on_nodes(fake_nodes(3), operation, description='flush')
+        # the exceptions raised are kept, even those that can't be built from a message
+        self.assertEqual(sorted(cm.exception.exceptions), sorted(errors.values()))
+        self.assertEqual(sorted(tb.split(':')[0].strip() for tb in cm.exception.tracebacks), ['flush failed on node1', 'flush failed on node3'])
+
+    def test_timeout(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def operation(node):
+            if node.name == 'node1':
+                release.wait()
+
+        started = time.time()
+        with self.assertRaises(MultiError) as cm:
+            run_on_nodes(fake_nodes(2), operation, timeout=0.2, description='drain')
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(len(cm.exception.exceptions), 1)
+        self.assertIsInstance(cm.exception.exceptions[0], NodeOperationTimeout)
+        self.assertIn('drain did not complete on node1', str(cm.exception.exceptions[0]))
+
+    def test_stop_nodes(self):
+        nodes = fake_nodes(2)
+        stop_nodes(nodes, drain=True, gently=False)
+        for node in nodes:
+            node.drain.assert_called_once_with(block_on_log=True)
+            node.stop.assert_called_once_with(gently=False, wait_other_notice=False)
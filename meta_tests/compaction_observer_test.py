@@ -0,0 +1,114 @@
+from unittest import TestCase
+
+from ccmlib.node import TimeoutError
+from mock import Mock, patch
+
+from compaction_observer import (CompactionObserver, CompactionRecord,
+                                 LoggedCompaction, parse_compacted_lines,
+                                 parse_size)
+
+COMPACTIONSTATS = """pending tasks: 2
+                                     id   compaction type   keyspace       table   completed      total    unit   progress
+   1c6e2a70-8e7a-11e6-a0b5-5f3a7b1b2c3d        Compaction   keyspace1   standard1     1048576   10485760   bytes     10.00%
+   2c6e2a70-8e7a-11e6-a0b5-5f3a7b1b2c3d   Index summary redistribution   system   peers     0   10   bytes     0.00%
+Active compaction remaining time :   0h00m09s
+"""
+
+COMPACTED_LINES = [
+    # 2.1
+    "INFO  [CompactionExecutor:2] 2016-10-10 10:00:00,000 CompactionTask.java:274 - Compacted 4 sstables to "
+    "[/n/data0/ks/cf-0123/ks-cf-ka-5,].  41,943,040 bytes to 20,971,520 (~50% of original) in 1,024ms = 19.53MB/s.  "
+    "100 total partitions merged to 50.  Partition merge counts were {1:50, 2:50, }",
+    # 3.6+
+    "DEBUG [CompactionExecutor:2] 2016-10-10 10:00:00,000 CompactionTask.java:255 - Compacted (1c6e2a70-8e7a-11e6-a0b5-5f3a7b1b2c3d) "
+    "2 sstables to [/n/data0/ks/other-4567/mc-7-big,] to level=0.  2.000MiB to 1.500MiB (~75% of original) in 500ms.  "
+    "Read Throughput = 4.000MiB/s, Write Throughput = 3.000MiB/s, Row Throughput = ~1,000/s.  10 total partitions merged to 5.",
+    # everything expired
+    "DEBUG [CompactionExecutor:2] 2016-10-10 10:00:00,000 CompactionTask.java:255 - Compacted (2c6e2a70-8e7a-11e6-a0b5-5f3a7b1b2c3d) "
+    "1 sstables to [] to level=0.  100 bytes to 0 bytes (~0% of original) in 3ms.  Read Throughput = 32.552KiB/s",
+    "DEBUG [CompactionExecutor:2] 2016-10-10 10:00:00,000 CompactionTask.java:155 - Compacting (2c6e2a70) [/n/data0/ks/cf-0123/mc-1-big-Data.db,]",
+]
+
+
+def fake_node(version='3.0.9'):
+    node = Mock()
+    node.name = 'node1'
+    node.pid = 1234
+    node.get_cassandra_version.return_value = version
+    return node
+
+
+class TestCompactionObserver(TestCase):
+
+    def setUp(self):
+        patcher = patch('jmxutils.JolokiaAgent')
+        self.agent = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.node = fake_node()
+
+    def test_state_of_a_table(self):
+        compactions = [{'keyspace': 'ks', 'columnfamily': 'cf', 'taskType': 'COMPACTION'},
+                       {'keyspace': 'ks', 'columnfamily': 'other', 'taskType': 'COMPACTION'}]
+        self.agent.read_attributes.return_value = [5, 100, compactions, 1]
+        state = CompactionObserver(self.node).state('ks', 'cf')
+        self.assertEqual((state.pending, state.active, state.completed), (1, compactions[:1], 100))
+        reads = self.agent.read_attributes.call_args[0][0]
+        self.assertIn('type=Table', reads[3][0])
+        self.assertIn('name=PendingCompactions', reads[3][0])
+
+    def test_quiescence_needs_two_samples_without_completed_tasks(self):
+        self.agent.read_attributes.side_effect = [[1, 10, [], None], [0, 10, [], None], [0, 11, [], None], [0, 11, [], None]]
+        with patch('compaction_observer.time.sleep') as sleep:
+            CompactionObserver(self.node).wait_for_quiescence()
+        self.assertEqual(sleep.call_count, 3)
+
+    def test_quiescence_timeout(self):
+        self.agent.read_attributes.return_value = [0, 10, [{'keyspace': 'ks', 'columnfamily': 'cf'}], None]
+        observer = CompactionObserver(self.node, interval=0.01)
+        self.assertRaisesRegexp(TimeoutError, 'ks.cf still running', observer.wait_for_quiescence, 'ks', 'cf', timeout=0.05)
+
+    def test_compactions_since_mark(self):
+        session = Mock()
+        history = [('id1', 'ks', 'cf', 1, 10, 5, {}), ('id2', 'ks', 'other', 2, 10, 5, {})]
+        session.execute.side_effect = lambda query: list(history)
+        observer = CompactionObserver(self.node, session)
+        mark = observer.mark()
+        self.assertEqual(observer.compactions_since(mark), [])
+
+        history.append({'id': 'id3', 'keyspace_name': 'ks', 'columnfamily_name': 'cf', 'compacted_at': 3, 'bytes_in': 20,
+                        'bytes_out': 10, 'rows_merged': {}})
+        history.append(('id4', 'ks', 'other', 4, 10, 5, {}))
+        self.assertEqual(observer.wait_for_compactions_since(mark, 'ks', 'cf'), [CompactionRecord('id3', 'ks', 'cf', 3, 20, 10, {})])
+        self.assertEqual(len(observer.compactions_since(mark, 'ks')), 2)
+        with patch('compaction_observer.time.sleep'):
+            self.assertRaises(TimeoutError, observer.wait_for_compactions_since, mark, 'ks', 'cf', count=2, timeout=0)
+
+    def test_history_needs_a_session(self):
+        self.assertRaises(ValueError, CompactionObserver(self.node).mark)
+
+    def test_compactionstats_fallback(self):
+        self.agent.start.side_effect = RuntimeError('cannot attach')
+        self.node.nodetool.return_value = (COMPACTIONSTATS, '')
+        observer = CompactionObserver(self.node)
+        state = observer.state()
+        self.assertEqual((state.pending, len(state.active), state.completed), (2, 2, None))
+        self.assertEqual(observer.state('keyspace1', 'standard1').active, [{'keyspace': 'keyspace1', 'columnfamily': 'standard1'}])
+        self.assertFalse(observer.is_quiescent())
+        # the agent isn't attached again until the node restarts
+        self.assertEqual(self.agent.start.call_count, 1)
+
+
+class TestLoggedCompactions(TestCase):
+
+    def test_sizes(self):
+        self.assertEqual(parse_size('1,234 bytes'), 1234)
+        self.assertEqual(parse_size('1,234'), 1234)
+        self.assertEqual(parse_size('1.500KiB'), 1536)
+        self.assertEqual(parse_size('2.000 GiB'), 2 * 2 ** 30)
+
+    def test_compacted_lines(self):
+        self.assertEqual(parse_compacted_lines(COMPACTED_LINES),
+                         [LoggedCompaction('ks', 'cf', 41943040, 20971520, 1024),
+                          LoggedCompaction('ks', 'other', 2 * 2 ** 20, 3 * 2 ** 19, 500),
+                          LoggedCompaction(None, None, 100, 0, 3)])
+        self.assertEqual([compaction.bytes_in for compaction in parse_compacted_lines(COMPACTED_LINES, 'ks', 'cf')], [41943040])
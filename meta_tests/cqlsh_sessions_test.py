@@ -0,0 +1,117 @@
+import os
+import sys
+import tempfile
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from cqlsh_sessions import (CqlshSession, CqlshSessions, cqlsh_input,
+                            is_complete, is_stateful, split_statements)
+
+# stands in for cqlsh reading commands from a pipe: echoes statements, prints
+# errors for the ones starting with 'fail', and implements CAPTURE and SOURCE
+# as cqlsh does: CAPTURE prints the file it captures to, and query output goes
+# to it until CAPTURE OFF, which prints nothing
+FAKE_CQLSH = r'''
+import re, sys
+lineno = 0
+pending = ''
+out = sys.stdout
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    lineno += 1
+    pending += line
+    while ';' in pending:
+        statement, pending = pending.split(';', 1)
+        statement = statement.strip()
+        capture = re.match(r"CAPTURE '(.*)'", statement)
+        if capture:
+            print('Now capturing query output to %r.' % capture.group(1))
+            out = open(capture.group(1), 'a')
+        elif statement == 'CAPTURE OFF':
+            out.close()
+            out = sys.stdout
+        elif statement.startswith('SOURCE'):
+            name = statement.split("'")[1]
+            sys.stderr.write('<stdin>:%d:Could not open %r: No such file\n' % (lineno, name))
+        elif statement.startswith('fail'):
+            sys.stderr.write('<stdin>:%d:SyntaxException: %s\n' % (lineno, statement))
+        elif statement == 'crash':
+            sys.exit(1)
+        elif statement == 'quit':
+            sys.exit(0)
+        elif statement:
+            out.write(statement + '\n')
+'''
+
+
+class TestCqlshSessions(TestCase):
+
+    def setUp(self):
+        fd, self.script = tempfile.mkstemp(suffix='.py')
+        with os.fdopen(fd, 'w') as f:
+            f.write(FAKE_CQLSH)
+        self.addCleanup(os.remove, self.script)
+
+    def test_output_is_framed_by_batch(self):
+        """
+        Each batch gets the output of its own commands only, with errors numbered from its first line.
+        """
+        session = CqlshSession([sys.executable, self.script], dict(os.environ))
+        self.addCleanup(session.close)
+
+        self.assertEqual(session.run('select 1;\nfail 2;\n', timeout=10), ('select 1\n', '<stdin>:2:SyntaxException: fail 2\n', True))
+        self.assertEqual(session.run('\nfail 3;\nselect 4;\n', timeout=10), ('select 4\n', '<stdin>:2:SyntaxException: fail 3\n', True))
+        self.assertTrue(session.alive)
+
+    @patch('cqlsh_sessions.cqlsh_command')
+    def test_sessions_are_reused_and_restarted(self, mock_cqlsh_command):
+        """
+        Batches of a node share a process, which is replaced when it exits, or when the node restarts.
+        """
+        mock_cqlsh_command.return_value = [sys.executable, self.script], dict(os.environ)
+        node = Mock(pid=1)
+        node.name = 'node1'
+        sessions = CqlshSessions(timeout=10)
+        self.addCleanup(sessions.close)
+
+        self.assertEqual(sessions.run(node, 'select 1'), ('select 1\n', ''))
+        process = sessions._sessions.values()[0].process
+        self.assertEqual(sessions.run(node, 'select 2; fail'), ('select 2\n', '<stdin>:2:SyntaxException: fail\n'))
+        self.assertIs(sessions._sessions.values()[0].process, process)
+
+        self.assertEqual(sessions.run(node, 'select 3; crash'), ('select 3\n', ''))
+        self.assertEqual(sessions._sessions, {})
+        self.assertEqual(sessions.run(node, 'select 4'), ('select 4\n', ''))
+
+        node.pid = 2
+        sessions.run(node, 'select 5')
+        self.assertEqual(len(sessions._sessions), 1)
+        self.assertIsNot(sessions._sessions.values()[0].process, process)
+
+    def test_is_stateful(self):
+        self.assertFalse(is_stateful("INSERT INTO ks.t (k) VALUES (1); SELECT * FROM ks.t"))
+        self.assertTrue(is_stateful("SELECT * FROM ks.t;\n  consistency ALL"))
+        self.assertTrue(is_stateful("DESCRIBE ks"))
+
+    def test_statements(self):
+        self.assertEqual(split_statements("INSERT INTO t (k, v) VALUES (1, 'a;''b'); SELECT \"c;d\" FROM t"),
+                         ["INSERT INTO t (k, v) VALUES (1, 'a;''b')", ' SELECT "c;d" FROM t'])
+        self.assertEqual(split_statements("SELECT 1 -- one; two\n; /* three; */ SELECT $$;$$"),
+                         ['SELECT 1 -- one; two\n', ' /* three; */ SELECT $$;$$'])
+        self.assertEqual(cqlsh_input("SELECT 'a;b'", keyspace='ks'), "USE ks;SELECT 'a;b';\n")
+        self.assertTrue(is_complete("SELECT 1; -- the end"))
+        self.assertFalse(is_complete("INSERT INTO t (k, v) VALUES (1, 'a;b)"))
+        self.assertFalse(is_stateful("INSERT INTO t (k, v) VALUES (1, 'a; consistency ALL')"))
+
+    @patch('cqlsh_sessions.cqlsh_command')
+    def test_unterminated_statements_get_a_process_of_their_own(self, mock_cqlsh_command):
+        mock_cqlsh_command.return_value = [sys.executable, self.script], dict(os.environ)
+        node = Mock(pid=1)
+        node.name = 'node1'
+        sessions = CqlshSessions(timeout=10)
+        self.addCleanup(sessions.close)
+        self.assertEqual(sessions.run(node, "select 'unterminated"), ("select 'unterminated\n", ''))
+        self.assertEqual(sessions._sessions, {})
@@ -0,0 +1,47 @@
+import os
+import random
+import tempfile
+from unittest import TestCase
+
+from cqlsh_tests.cqlsh_tools import (assert_csvs_items_equal, external_sort,
+                                     unordered_differences)
+
+
+class TestCsvComparison(TestCase):
+
+    def test_external_sort(self):
+        """
+        Items are sorted through as many merge passes as needed, or in memory if they fit.
+        """
+        rnd = random.Random(0)
+        items = [(str(rnd.randrange(500)), i) for i in range(1000)]
+        self.assertEqual(list(external_sort(items, chunk_size=7, max_merged_runs=3)), sorted(items))
+        self.assertEqual(list(external_sort(items, chunk_size=2000)), sorted(items))
+        self.assertEqual(list(external_sort([], chunk_size=7)), [])
+
+    def test_unordered_differences(self):
+        """
+        Records are compared as multisets, and the first differences are reported with their positions.
+        """
+        rows = [['a', '1'], ['b', '2'], ['a', '1'], ['c', '3']]
+        shuffled = [(row, i) for i, row in enumerate(reversed(rows), 1)]
+        numbered = [(row, i) for i, row in enumerate(rows, 1)]
+        self.assertEqual(unordered_differences(numbered, shuffled, chunk_size=2), (0, 0, []))
+
+        fewer = [(row, i) for i, row in enumerate(rows[1:], 1)]
+        self.assertEqual(unordered_differences(numbered, fewer, chunk_size=2), (1, 0, [(1, ['a', '1'], 3)]))
+        self.assertEqual(unordered_differences(fewer + [(['d', '4'], 9)], numbered, max_reported=1, chunk_size=2),
+                         (1, 1, [(2, ['a', '1'], 3)]))
+
+    def test_assert_csvs_items_equal(self):
+        files = []
+        for content in ('x,1\ny,2\n', 'y,2\nx,1\n', 'y,2\nx,2\n'):
+            fd, name = tempfile.mkstemp(suffix='.csv')
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            self.addCleanup(os.remove, name)
+            files.append(name)
+
+        assert_csvs_items_equal(files[0], files[1])
+        with self.assertRaisesRegexp(AssertionError, r"1 records only in .*, 1 records only in .*\n  .* line 1: 'x,1\\n'\n  .* line 2: 'x,2\\n'"):
+            assert_csvs_items_equal(files[0], files[2])
@@ -0,0 +1,181 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from unittest import TestCase
+
+from mock import Mock, patch
+
+import jmxutils
+from jmxutils import (JolokiaAgent, NodeAgent, enable_jolokia_agent,
+                      enable_jolokia_agent_on_populate,
+                      perf_shared_mem_disabled)
+
+
+class FakeJolokiaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.server.connections.add(self.client_address)
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+
+        def answer(request):
+            if request['type'] == 'version':
+                return {'status': 200, 'value': {'agent': '1.2.3'}}
+            if request['type'] == 'exec':
+                time.sleep(0.5)
+                return {'status': 200, 'value': None}
+            if request['mbean'] == 'missing':
+                return {'status': 404, 'error': 'no such mbean'}
+            return {'status': 200, 'value': '{}.{}'.format(request['mbean'], request['attribute'])}
+
+        response = json.dumps([answer(r) for r in body] if isinstance(body, list) else answer(body))
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeJolokiaServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestJolokiaAgent(TestCase):
+
+    def setUp(self):
+        self.server = FakeJolokiaServer(('127.0.0.1', 0), FakeJolokiaHandler)
+        self.server.connections, self.server.requests = set(), []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.shutdown)
+
+        patcher = patch.object(jmxutils, 'JOLOKIA_PORT', self.server.server_address[1])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.node = Mock(network_interfaces={'binary': ('127.0.0.1', 9042)})
+
+    @patch('jmxutils.subprocess')
+    def test_running_agent_is_reused(self, mock_subprocess):
+        """
+        An agent loaded at node start isn't attached or detached, and requests share a connection.
+        """
+        with JolokiaAgent(self.node) as jmx:
+            self.assertEqual(jmx.read_attribute('a', 'x'), 'a.x')
+            self.assertEqual(jmx.read_attributes([('a', 'x'), ('b', 'y', 'path')]), ['a.x', 'b.y'])
+            self.assertEqual(jmx.read_attributes([]), [])
+
+        self.assertFalse(mock_subprocess.check_output.called)
+        self.assertEqual(len(self.server.connections), 1)
+        self.assertEqual(self.server.requests[-1][1], {'type': 'read', 'mbean': 'b', 'attribute': 'y', 'path': 'path'})
+
+    def test_errors_and_reconnection(self):
+        """
+        Failed reads raise, and a connection closed by the agent is reopened.
+        """
+        jmx = JolokiaAgent(self.node)
+        self.assertRaises(Exception, jmx.read_attributes, [('a', 'x'), ('missing', 'y')])
+        self.assertEqual(jmx.read_attributes([('a', 'x'), ('missing', 'y')], ignore_errors=True), ['a.x', None])
+
+        jmx._connection.sock.close()
+        self.assertEqual(jmx.read_attribute('a', 'x'), 'a.x')
+        self.assertEqual(len(self.server.connections), 2)
+        jmx.stop()
+
+    def test_requests_that_may_have_run_are_not_sent_again(self):
+        """
+        A request whose response timed out on a kept-alive connection isn't sent again.
+        """
+        jmx = JolokiaAgent(self.node)
+        jmx.read_attribute('a', 'x')
+        self.assertRaises(socket.timeout, jmx.execute_method, 'a', 'slow()', timeout=0.1)
+        self.assertEqual(len([request for request in self.server.requests if request['type'] == 'exec']), 1)
+        jmx.stop()
+
+
+def node_with_jvm_options(test, options):
+    conf_dir = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, conf_dir)
+    with open(os.path.join(conf_dir, 'jvm.options'), 'w') as f:
+        f.write(options)
+    node = Mock(network_interfaces={'binary': ('127.0.0.2', 9042)}, pid=1)
+    node.name = 'node1'
+    node.cluster.version.return_value = '3.9'
+    node.get_conf_dir.return_value = conf_dir
+    return node
+
+
+class TestNodeAgent(TestCase):
+
+    def setUp(self):
+        patcher = patch('jmxutils.JolokiaAgent')
+        self.agent_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.agent = self.agent_class.return_value
+        self.agent.is_running.return_value = False
+
+    def test_agent_per_node_process(self):
+        node = node_with_jvm_options(self, '-Xss256k\n')
+        agent = NodeAgent(node, 'falling back')
+        self.assertIs(agent.get(), self.agent)
+        self.assertIs(agent.get(), self.agent)
+        self.assertEqual(self.agent.start.call_count, 1)
+
+        node.pid = 2
+        agent.get()
+        self.assertTrue(self.agent.close_connection.called)
+        self.assertEqual(self.agent.start.call_count, 2)
+        agent.stop()
+        self.assertTrue(self.agent.stop.called)
+
+    def test_failures_are_not_retried(self):
+        self.agent.start.side_effect = RuntimeError('cannot attach')
+        agent = NodeAgent(node_with_jvm_options(self, ''), 'falling back')
+        self.assertIsNone(agent.get())
+        self.assertIsNone(agent.get())
+        self.assertEqual(self.agent.start.call_count, 1)
+
+    def test_no_attach_with_perf_shared_mem_disabled(self):
+        node = node_with_jvm_options(self, '-XX:+PerfDisableSharedMem\n')
+        self.assertTrue(perf_shared_mem_disabled(node))
+        self.assertIsNone(NodeAgent(node, 'falling back').get())
+        self.assertFalse(self.agent.start.called)
+
+        # unless the agent was loaded at node start
+        self.agent.is_running.return_value = True
+        self.assertIs(NodeAgent(node, 'falling back').get(), self.agent)
+
+
+class TestEnableJolokiaAgent(TestCase):
+
+    def test_adds_agent_once(self):
+        node = node_with_jvm_options(self, '-XX:+PerfDisableSharedMem\n')
+        conf_dir = node.get_conf_dir()
+        enable_jolokia_agent(node)
+        self.assertFalse(perf_shared_mem_disabled(node))
+        enable_jolokia_agent(node)
+
+        with open(os.path.join(conf_dir, 'jvm.options')) as f:
+            lines = f.read().split()
+        self.assertEqual(lines, ['#-XX:+PerfDisableSharedMem',
+                                 '-javaagent:{}=host=127.0.0.2,port=8778'.format(os.path.abspath(jmxutils.JOLOKIA_JAR))])
+
+    @patch('jmxutils.enable_jolokia_agent')
+    def test_on_populate(self, enable):
+        cluster = Mock()
+        populate = cluster.populate
+        cluster.nodelist.return_value = ['node1', 'node2']
+        enable_jolokia_agent_on_populate(cluster)
+        self.assertFalse(enable.called)
+        self.assertEqual(cluster.populate(2, tokens=[0, 1]), populate.return_value)
+        populate.assert_called_once_with(2, tokens=[0, 1])
+        self.assertEqual([args[0] for args, _ in enable.call_args_list], ['node1', 'node2'])
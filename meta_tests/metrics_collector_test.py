@@ -0,0 +1,110 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from metrics_collector import Metric, MetricsCollector, default_metrics
+
+METRICS = [Metric('pending', 'org.apache.cassandra.metrics:type=Compaction,name=PendingTasks', 'Value'),
+           Metric('missing', 'org.apache.cassandra.metrics:type=Table,name=Missing', 'Value')]
+
+
+def fake_node(name, pid, running=True):
+    node = Mock()
+    node.name = name
+    node.pid = pid
+    node.is_running.return_value = running
+    return node
+
+
+class TestMetricsCollector(TestCase):
+
+    def setUp(self):
+        self.nodes = [fake_node('node1', 1), fake_node('node2', 2), fake_node('node3', 3, running=False)]
+        cluster = Mock()
+        cluster.nodelist.return_value = self.nodes
+        self.collector = MetricsCollector(cluster, metrics=METRICS)
+        self.collector.started_at = 0
+        self.values = {'node1': [[5, None], [0, None]], 'node2': [[3, 'n/a'], [2, 1], [0, 1]]}
+        self.times = iter(xrange(1, 100))
+
+        def agent(node):
+            agent = Mock()
+            agent.node = node
+            agent.read_attributes.side_effect = lambda reads, ignore_errors: self.values[node.name].pop(0)
+            return agent
+
+        patcher = patch('jmxutils.JolokiaAgent', side_effect=agent)
+        self.agent_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('metrics_collector.time.time', side_effect=lambda: next(self.times))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sampling_and_queries(self):
+        self.collector.sample()
+        self.collector.sample()
+        self.assertEqual(self.collector.node_names(), ['node1', 'node2'])
+        self.assertEqual(self.collector.series('node1', 'pending'), [(1, 5), (3, 0)])
+        self.assertTrue(all(math.isnan(value) for _, value in self.collector.series('node2', 'missing')[:1]))
+        self.assertEqual(self.collector.latest('node2', 'missing'), 1)
+        self.assertIsNone(self.collector.latest('node1', 'missing'))
+        # agents are started once per node process
+        self.assertEqual(self.agent_class.call_count, 2)
+        self.assertRaises(KeyError, self.collector.series, 'node1', 'unknown')
+
+        self.assertEqual(self.collector.time_until('pending', lambda v: v == 0, node_name='node1'), 3)
+        self.assertIsNone(self.collector.time_until('pending', lambda v: v == 0))
+        self.collector.sample()
+        self.assertEqual(self.collector.time_until('pending', lambda v: v == 0), 6)
+        self.assertEqual(self.collector.time_until('pending', lambda v: v == 0, since=2), 4)
+        self.collector.assert_reaches('pending', lambda v: v == 0, within=6)
+        self.assertRaisesRegexp(AssertionError, r'pending did not reach .* within 5s \(took 6.0s\)',
+                                self.collector.assert_reaches, 'pending', lambda v: v == 0, within=5)
+        self.assertRaisesRegexp(AssertionError, 'took forever',
+                                self.collector.assert_reaches, 'missing', lambda v: v > 1, within=60)
+
+    def test_restarted_and_unreachable_nodes(self):
+        self.values['node1'] = [[5, None]] * 3
+        self.nodes[1].is_running.return_value = False
+        self.collector.sample()
+        self.nodes[0].pid = 10
+        self.collector.sample()
+        self.assertEqual(self.agent_class.call_count, 2)
+
+        # an agent that can't be started isn't tried again until the node restarts
+        self.agent_class.side_effect = None
+        self.agent_class.return_value.start.side_effect = Exception('could not attach')
+        self.nodes[0].pid = 11
+        with patch('metrics_collector.warning') as warning:
+            self.collector.sample()
+            self.collector.sample()
+        # once per node process
+        self.assertEqual(warning.call_count, 1)
+        self.assertIn('No metrics of node1 are being sampled', warning.call_args[0][0])
+        self.assertEqual(self.agent_class.call_count, 3)
+        self.assertEqual(len(self.collector.series('node1', 'pending')), 2)
+        self.collector.stop()
+
+    def test_save(self):
+        self.collector.sample()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.collector.save(os.path.join(directory, 'metrics.json'))
+        with open(os.path.join(directory, 'metrics.json')) as f:
+            saved = json.load(f)
+        self.assertEqual(saved['nodes']['node1'], {'timestamps': [1], 'values': {'pending': [5], 'missing': [None]}})
+        self.assertEqual(saved['metrics'][0]['name'], 'pending')
+
+    def test_default_metrics(self):
+        names = [metric.name for metric in default_metrics('2.2.8', tables=[('ks', 'cf')])]
+        self.assertEqual(len(names), len(set(names)))
+        self.assertIn('pending_compactions', names)
+        table_mbeans = [metric.mbean for metric in default_metrics('2.2.8', tables=[('ks', 'cf')]) if metric.name.startswith('ks.cf')]
+        self.assertTrue(all('type=ColumnFamily' in mbean for mbean in table_mbeans))
+        table_mbeans = [metric.mbean for metric in default_metrics('3.0.10', tables=[('ks', 'cf')]) if metric.name.startswith('ks.cf')]
+        self.assertTrue(all('type=Table,keyspace=ks,' in mbean and mbean.endswith(',scope=cf') for mbean in table_mbeans), table_mbeans)
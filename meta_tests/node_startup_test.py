@@ -0,0 +1,150 @@
+import socket
+import struct
+import threading
+from unittest import TestCase
+
+from ccmlib.node import TimeoutError
+from mock import Mock, patch
+
+import node_startup
+from node_startup import (AUTHENTICATE, ERROR, OPTIONS, READY, STARTUP,
+                          SUPPORTED, NativeProtocolError,
+                          native_protocol_version, native_transport_ready,
+                          start_cluster, wait_for_gossip)
+
+
+class FakeNativeTransport(object):
+    """
+    Answers the requests of one connection with the opcodes of responses, and records the opcodes of the requests.
+    """
+
+    def __init__(self, responses, version=4):
+        self.responses = responses
+        self.version = version
+        self.requests = []
+        self.server = socket.socket()
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve(self):
+        conn, _ = self.server.accept()
+        for opcode, body in self.responses:
+            header = conn.recv(9)
+            length = struct.unpack('>i', header[-4:])[0]
+            if length:
+                conn.recv(length)
+            self.requests.append(ord(header[4]))
+            conn.sendall(struct.pack('>BBhBi', 0x80 | self.version, 0, 0, opcode, len(body)) + body)
+        conn.close()
+        self.server.close()
+
+
+def error_body(code, message):
+    return struct.pack('>iH', code, len(message)) + message
+
+
+class TestNativeTransportProbe(TestCase):
+
+    def test_ready(self):
+        for startup_response in (READY, AUTHENTICATE):
+            transport = FakeNativeTransport([(SUPPORTED, '\x00\x00'), (startup_response, '')])
+            self.assertTrue(native_transport_ready('127.0.0.1', transport.port, 4))
+            transport.thread.join()
+            self.assertEqual(transport.requests, [OPTIONS, STARTUP])
+
+    def test_not_listening(self):
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        port = server.getsockname()[1]
+        server.close()
+        self.assertFalse(native_transport_ready('127.0.0.1', port, 4))
+
+    def test_closed_connection(self):
+        transport = FakeNativeTransport([])
+        self.assertFalse(native_transport_ready('127.0.0.1', transport.port, 4))
+
+    def test_errors(self):
+        transport = FakeNativeTransport([(ERROR, error_body(0x000A, 'Invalid or unsupported protocol version'))])
+        self.assertRaisesRegexp(NativeProtocolError, 'unsupported protocol version', native_transport_ready, '127.0.0.1', transport.port, 4)
+
+    def test_protocol_versions(self):
+        self.assertEqual([native_protocol_version(version) for version in ('1.2.19', '2.0.17', '2.1.16', '2.2.8', '3.0.9', '4.0')], [1, 2, 3, 4, 4, 4])
+
+
+def fake_node(name, address, running=False):
+    node = Mock()
+    node.name = name
+    node.address.return_value = address
+    node.is_running.return_value = running
+    return node
+
+
+class TestStartCluster(TestCase):
+
+    def setUp(self):
+        self.nodes = [fake_node('node1', '127.0.0.1'), fake_node('node2', '127.0.0.2'), fake_node('node3', '127.0.0.3', running=True)]
+        self.cluster = Mock()
+        self.cluster.nodelist.return_value = self.nodes
+        self.cluster.get_seeds.return_value = ['127.0.0.1']
+        self.events = []
+        for node in self.nodes:
+            node.start.side_effect = lambda node=node, **kwargs: self.events.append(('start', node.name))
+
+        patcher = patch('node_startup.wait_for_native_transport', side_effect=lambda node, timeout: self.events.append(('native', node.name)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('node_startup.wait_for_gossip')
+        self.wait_for_gossip = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_seeds_first(self):
+        startups = start_cluster(self.cluster, jvm_args=['-Dfoo=bar'])
+        self.assertEqual(self.events, [('start', 'node1'), ('native', 'node1'), ('start', 'node2'), ('native', 'node2')])
+        self.assertEqual([startup.node for startup in startups], ['node1', 'node2'])
+        self.assertTrue(all(startup.gossip is not None for startup in startups))
+        self.nodes[0].start.assert_called_once_with(wait_for_binary_proto=False, wait_other_notice=False, jvm_args=['-Dfoo=bar'])
+        self.assertFalse(self.nodes[2].start.called)
+        # the log of a node is read from before it started
+        self.nodes[1].mark_log.return_value = 42
+        start_cluster(self.cluster, [self.nodes[1]])
+        self.wait_for_gossip.assert_called_with(self.nodes[1], ['127.0.0.3'], timeout=120, from_mark=42)
+
+    def test_without_gossip(self):
+        startups = start_cluster(self.cluster, [self.nodes[1]], wait_for_gossip_state=False)
+        self.assertEqual(self.events, [('start', 'node2'), ('native', 'node2')])
+        self.assertIsNone(startups[0].gossip)
+        self.assertFalse(self.wait_for_gossip.called)
+
+
+class TestWaitForGossip(TestCase):
+
+    def setUp(self):
+        patcher = patch('jmxutils.JolokiaAgent')
+        self.agent = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.node = fake_node('node1', '127.0.0.1', running=True)
+
+    def test_sees_every_node_up(self):
+        self.agent.read_attributes.side_effect = [['STARTING', {'/127.0.0.1': 'UP'}],
+                                                  ['NORMAL', {'/127.0.0.1': 'UP', '/127.0.0.2': 'DOWN'}],
+                                                  ['NORMAL', {'/127.0.0.1': 'UP', '/127.0.0.2': 'UP'}]]
+        with patch('node_startup.time.sleep') as sleep:
+            wait_for_gossip(self.node, ['127.0.0.1', '127.0.0.2'])
+        self.assertEqual(sleep.call_count, 2)
+        self.assertTrue(self.agent.stop.called)
+
+    def test_timeout(self):
+        self.agent.read_attributes.return_value = ['JOINING', {'/127.0.0.2': 'DOWN'}]
+        with patch.object(node_startup, 'PROBE_INTERVAL', 0.01):
+            self.assertRaisesRegexp(TimeoutError, 'see 127.0.0.2 up nor reach NORMAL mode', wait_for_gossip, self.node, ['127.0.0.2'], timeout=0.05)
+
+    def test_log_fallback(self):
+        self.agent.start.side_effect = RuntimeError('cannot attach')
+        wait_for_gossip(self.node, ['127.0.0.1', '127.0.0.2', '127.0.0.3'], timeout=30, from_mark=42)
+        self.node.watch_log_for.assert_called_once_with(['127.0.0.2.* now UP', '127.0.0.3.* now UP'], from_mark=42, timeout=30)
+        self.assertFalse(self.node.nodetool.called)
+        self.assertFalse(self.agent.read_attributes.called)
@@ -0,0 +1,88 @@
+from unittest import TestCase
+
+from mock import Mock, call, patch
+
+from nodetool_jmx import BATCHLOG_MANAGER, STORAGE_SERVICE, JmxNodetool
+
+
+class TestJmxNodetool(TestCase):
+
+    def setUp(self):
+        self.node = Mock()
+        self.node.name = 'node1'
+        self.node.pid = 1
+        self.node.is_running.return_value = True
+        self.node.get_cassandra_version.return_value = '3.0.10'
+        self.node.nodetool.return_value = ('from nodetool', '')
+        patcher = patch('jmxutils.JolokiaAgent')
+        self.agent_class = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jmx = self.agent_class.return_value
+        self.jmx.read_attribute.return_value = ['ks', 'system']
+        self.nodetool = JmxNodetool(self.node)
+
+    def test_operations_over_jmx(self):
+        self.assertEqual(self.nodetool.nodetool('flush'), ('', ''))
+        self.nodetool.nodetool('flush ks t1 t2')
+        self.nodetool.compact(['-s', 'ks'])
+        self.nodetool.nodetool('replaybatchlog')
+        self.nodetool.nodetool('setcompactionthroughput 0')
+        flush = 'forceKeyspaceFlush(java.lang.String,[Ljava.lang.String;)'
+        self.assertEqual(self.jmx.execute_method.call_args_list, [
+            call(STORAGE_SERVICE, flush, ['ks', []], timeout=None),
+            call(STORAGE_SERVICE, flush, ['system', []], timeout=None),
+            call(STORAGE_SERVICE, flush, ['ks', ['t1', 't2']], timeout=None),
+            call(STORAGE_SERVICE, 'forceKeyspaceCompaction(boolean,java.lang.String,[Ljava.lang.String;)', [True, 'ks', []], timeout=None),
+            call(BATCHLOG_MANAGER, 'forceBatchlogReplay()', [], timeout=None),
+            call(STORAGE_SERVICE, 'setCompactionThroughputMbPerSec(int)', [0])])
+        self.assertFalse(self.node.nodetool.called)
+        # one agent for all the commands of a node process
+        self.assertEqual(self.agent_class.call_count, 1)
+
+        self.jmx.execute_method.return_value = [{'hostAddress': '127.0.0.1'}, '/127.0.0.2']
+        self.assertEqual(self.nodetool.nodetool('getendpoints ks t key'), ('127.0.0.1\n127.0.0.2\n', ''))
+
+    def test_fallback_to_nodetool(self):
+        self.assertEqual(self.nodetool.nodetool('status'), ('from nodetool', ''))
+        self.nodetool.nodetool('-u cassandra -pw cassandra flush')
+        self.nodetool.nodetool('setcompactionthroughput fast')
+        self.node.get_cassandra_version.return_value = '2.1.16'
+        self.nodetool.nodetool('compact -s ks')
+        # the keyspaces couldn't be read, so nothing was flushed
+        self.jmx.read_attribute.side_effect = Exception('connection refused')
+        self.nodetool.flush()
+        self.assertEqual(self.node.nodetool.call_args_list, [
+            call('status', capture_output=True),
+            call('-u cassandra -pw cassandra flush', capture_output=True),
+            call('setcompactionthroughput fast', capture_output=True),
+            call('compact -s ks', capture_output=True),
+            call('flush', capture_output=True)])
+
+    def test_failed_operations_are_not_run_again(self):
+        self.jmx.execute_method.side_effect = [None, Exception('timed out')]
+        self.assertRaisesRegexp(Exception, 'timed out', self.nodetool.flush)
+        self.jmx.execute_method.side_effect = Exception('drain failed')
+        self.assertRaisesRegexp(Exception, 'drain failed', self.nodetool.drain)
+        self.assertFalse(self.node.nodetool.called)
+
+    def test_no_agent_for_unsupported_commands(self):
+        self.nodetool.nodetool('status')
+        self.nodetool.nodetool('statushandoff')
+        self.nodetool.nodetool('scrub -ns ks cf')
+        self.assertEqual(self.node.nodetool.call_count, 3)
+        self.assertFalse(self.agent_class.called)
+
+    def test_agent_per_node_process(self):
+        self.jmx.start.side_effect = Exception('could not attach')
+        self.nodetool.flush()
+        self.nodetool.flush()
+        self.assertEqual(self.node.nodetool.call_count, 2)
+        self.assertEqual(self.agent_class.call_count, 1)
+
+        self.jmx.start.side_effect = None
+        self.node.pid = 2
+        self.nodetool.flush()
+        self.assertEqual(self.node.nodetool.call_count, 2)
+        self.assertEqual(self.agent_class.call_count, 2)
+        self.nodetool.close()
+        self.assertTrue(self.jmx.stop.called)
@@ -0,0 +1,79 @@
+import threading
+from unittest import TestCase
+
+from mock import patch
+
+from page_fetcher import Page, PageFetcher
+
+
+class FakeResponseFuture(object):
+    """
+    Delivers the given pages from another thread, like the driver's ResponseFuture.
+    """
+
+    def __init__(self, pages, error=None):
+        self._pages = list(pages)
+        self._error = error
+        self.has_more_pages = True
+
+    def add_callbacks(self, callback, errback):
+        self._callback, self._errback = callback, errback
+        self.start_fetching_next_page()
+
+    def _deliver(self):
+        if self._error is not None:
+            self._errback(self._error)
+            return
+        page = self._pages.pop(0)
+        self.has_more_pages = bool(self._pages)
+        self._callback(page)
+
+    def start_fetching_next_page(self):
+        threading.Timer(0.01, self._deliver).start()
+
+
+class TestPageFetcher(TestCase):
+
+    def test_pages_and_metrics(self):
+        """
+        Every page is waited for, and its rows and metrics are kept.
+        """
+        pf = PageFetcher(FakeResponseFuture([[[1, 'a'], [2, 'b']], [[3, 'c']], []])).request_all()
+        self.assertEqual(pf.num_results_all(), [2, 1])
+        self.assertEqual(pf.retrieved_empty_pages, 1)
+        self.assertEqual(pf.all_data(), [[1, 'a'], [2, 'b'], [3, 'c']])
+        self.assertEqual([row_count for row_count, _, _ in pf.page_metrics()], [2, 1])
+        for _, size, latency in pf.page_metrics():
+            self.assertGreater(size, 0)
+            self.assertGreaterEqual(latency, 0)
+
+    def test_rows_kept_are_encoded_when_asked_for(self):
+        """
+        Rows aren't encoded in the callbacks of pages when they are kept, only when their size or digest is needed.
+        """
+        with patch('page_fetcher.encode_row', side_effect=lambda row: repr(row)) as encode_row:
+            pf = PageFetcher(FakeResponseFuture([[[1, 'a'], [2, 'b']], [[3, 'c']]])).request_all()
+            self.assertFalse(encode_row.called)
+            self.assertEqual(pf.digest(), pf.digest())
+            self.assertEqual(encode_row.call_count, 3)
+
+    def test_streaming_keeps_digest_only(self):
+        """
+        In streaming mode rows aren't kept, but their digest matches the one of the expected rows.
+        """
+        pf = PageFetcher(FakeResponseFuture([[{'k': 1}, {'k': 2}], [{'k': 3}]]), streaming=True).request_all()
+        self.assertEqual(pf.num_results_all(), [2, 1])
+        self.assertRaises(RuntimeError, pf.all_data)
+
+        expected = Page()
+        for k in (3, 2, 1):
+            expected.add_row({u'k': k})
+        self.assertEqual(pf.digest(), expected.digest)
+
+    def test_error_is_raised_by_wait(self):
+        """
+        A failed page raises its error right away instead of waiting for the timeout.
+        """
+        error = ValueError('page failed')
+        with self.assertRaises(ValueError):
+            PageFetcher(FakeResponseFuture([], error=error))
@@ -0,0 +1,105 @@
+import errno
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from snapshot_utils import (SSTableLoaderError, link_tree, load_sstables,
+                            table_directories)
+
+
+class TestLinkTree(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.source = os.path.join(self.directory, 'ks')
+        os.makedirs(os.path.join(self.source, 'cf-1', 'snapshots', 'snap'))
+        os.makedirs(os.path.join(self.source, 'cf2-2'))
+        for path in ('cf-1/mc-1-big-Data.db', 'cf-1/snapshots/snap/mc-1-big-Data.db', 'cf2-2/mc-3-big-Data.db'):
+            with open(os.path.join(self.source, path), 'w') as f:
+                f.write(path)
+
+    def assert_copied(self, destination):
+        for path in ('cf-1/mc-1-big-Data.db', 'cf-1/snapshots/snap/mc-1-big-Data.db', 'cf2-2/mc-3-big-Data.db'):
+            with open(os.path.join(destination, path)) as f:
+                self.assertEqual(f.read(), path)
+
+    def test_hard_links(self):
+        destination = os.path.join(self.directory, 'copy', 'ks')
+        self.assertEqual(link_tree(self.source, destination), {'link': 3, 'reflink': 0, 'copy': 0})
+        self.assert_copied(destination)
+        self.assertEqual(os.stat(os.path.join(destination, 'cf2-2', 'mc-3-big-Data.db')).st_nlink, 2)
+        self.assertEqual(table_directories(os.path.join(self.directory, 'copy'), 'ks'),
+                         [os.path.join(destination, 'cf-1'), os.path.join(destination, 'cf2-2')])
+        self.assertEqual(table_directories(self.directory, 'missing'), [])
+
+    def test_copies_across_filesystems(self):
+        destination = os.path.join(self.directory, 'copy')
+        with patch('os.link', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link')) as link:
+            counts = link_tree(self.source, destination)
+        # hard links aren't tried again after the first failure
+        self.assertEqual(link.call_count, 1)
+        self.assertEqual(counts['link'], 0)
+        self.assertEqual(counts['reflink'] + counts['copy'], 3)
+        self.assert_copied(destination)
+        self.assertEqual(os.stat(os.path.join(destination, 'cf2-2', 'mc-3-big-Data.db')).st_nlink, 1)
+
+    def test_existing_destination(self):
+        destination = os.path.join(self.directory, 'copy')
+        link_tree(self.source, destination)
+        with open(os.path.join(self.source, 'cf2-2', 'mc-4-big-Data.db'), 'w') as f:
+            f.write('cf2-2/mc-4-big-Data.db')
+        self.assertEqual(link_tree(self.source, destination), {'link': 4, 'reflink': 0, 'copy': 0})
+        self.assert_copied(destination)
+
+        # files of destination linked to source are replaced by copies, and not written through
+        other = os.path.join(self.directory, 'other')
+        os.makedirs(os.path.join(other, 'cf2-2'))
+        with open(os.path.join(other, 'cf2-2', 'mc-3-big-Data.db'), 'w') as f:
+            f.write('other')
+        with patch('os.link', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link')):
+            link_tree(other, destination)
+        self.assert_copied(self.source)
+        with open(os.path.join(destination, 'cf2-2', 'mc-3-big-Data.db')) as f:
+            self.assertEqual(f.read(), 'other')
+
+    def test_other_link_errors_are_raised(self):
+        with patch('os.link', side_effect=OSError(errno.EACCES, 'Permission denied')):
+            self.assertRaises(OSError, link_tree, self.source, os.path.join(self.directory, 'copy'))
+
+
+class TestLoadSSTables(TestCase):
+
+    def setUp(self):
+        self.node = Mock()
+        self.node.get_tool.return_value = '/cassandra/bin/sstableloader'
+        self.node.address.return_value = '127.0.0.1'
+        patcher = patch('snapshot_utils.common.make_cassandra_env', return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def popen(self, args, **kwargs):
+        process = Mock()
+        process.returncode = 1 if args[-1] == '/copy/ks/broken' else 0
+        process.communicate.return_value = ('out ' + args[-1], 'err')
+        return process
+
+    def test_loads_every_directory(self):
+        with patch('snapshot_utils.subprocess.Popen', side_effect=self.popen) as popen:
+            results = load_sstables(self.node, ['/copy/ks/cf1', '/copy/ks/cf2'])
+        self.assertEqual([(result.directory, result.exit_status) for result in results], [('/copy/ks/cf1', 0), ('/copy/ks/cf2', 0)])
+        self.assertEqual(sorted(call[0][0] for call in popen.call_args_list),
+                         [['/cassandra/bin/sstableloader', '--nodes', '127.0.0.1', '/copy/ks/cf{}'.format(i)] for i in (1, 2)])
+
+    def test_failures(self):
+        with patch('snapshot_utils.subprocess.Popen', side_effect=self.popen):
+            with self.assertRaises(SSTableLoaderError) as cm:
+                load_sstables(self.node, ['/copy/ks/cf1', '/copy/ks/broken'])
+            self.assertEqual([result.directory for result in cm.exception.failures], ['/copy/ks/broken'])
+            self.assertIn('out /copy/ks/broken', str(cm.exception))
+
+            results = load_sstables(self.node, ['/copy/ks/broken'], check=False)
+            self.assertEqual(results[0].exit_status, 1)
@@ -0,0 +1,100 @@
+from unittest import TestCase
+
+from cassandra import InvalidRequest, OperationTimedOut
+from cassandra.query import SimpleStatement
+from mock import Mock
+
+from statement_cache import PreparedStatementCache, parameterize
+
+
+class TestParameterize(TestCase):
+
+    def test_replaces_strings_and_numbers(self):
+        """
+        String and numeric literals become bind markers, with their values returned in order.
+        """
+        self.assertEqual(parameterize("UPDATE t SET v = 'a''b', w = -2.5 WHERE k = 12"),
+                         ('UPDATE t SET v = ?, w = ? WHERE k = ?', ["a'b", -2.5, 12]))
+
+    def test_leaves_identifiers_uuids_and_blobs(self):
+        """
+        Digits in identifiers, quoted identifiers, UUIDs and blobs are not taken for literals.
+        """
+        query = 'SELECT c1 FROM "Table 1" WHERE k = 550e8400-e29b-41d4-a716-446655440000 AND b = 0xff'
+        self.assertEqual(parameterize(query), (query, []))
+
+    def test_only_dml_without_bind_markers(self):
+        """
+        Schema statements and queries that already have bind markers aren't rewritten.
+        """
+        self.assertIsNone(parameterize('CREATE TABLE t (k int PRIMARY KEY)'))
+        self.assertIsNone(parameterize('SELECT * FROM t WHERE k = ?'))
+
+
+class TestPreparedStatementCache(TestCase):
+
+    def _session(self, keyspace='ks'):
+        session = Mock()
+        session.keyspace = keyspace
+        return session
+
+    def test_prepares_each_query_once(self):
+        """
+        Preparing the same query again on the same session is served from the cache.
+        """
+        cache, session = PreparedStatementCache(), self._session()
+        first = cache.prepare(session, 'SELECT * FROM t WHERE k = ?')
+        self.assertIs(cache.prepare(session, 'SELECT * FROM t WHERE k = ?'), first)
+        self.assertEqual(session.prepare.call_count, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_keyed_by_session_and_keyspace(self):
+        """
+        The same query text is prepared again for another session or keyspace.
+        """
+        cache, session, other = PreparedStatementCache(), self._session(), self._session()
+        cache.prepare(session, 'SELECT * FROM t')
+        cache.prepare(other, 'SELECT * FROM t')
+        session.keyspace = 'other_ks'
+        cache.prepare(session, 'SELECT * FROM t')
+        self.assertEqual(session.prepare.call_count, 2)
+        self.assertEqual(other.prepare.call_count, 1)
+
+    def test_evicts_least_recently_used(self):
+        """
+        Once full, the statement used least recently is evicted first.
+        """
+        cache, session = PreparedStatementCache(max_size=2), self._session()
+        for query in ('q1', 'q2', 'q1', 'q3'):
+            cache.prepare(session, query)
+        self.assertEqual(len(cache), 2)
+        cache.prepare(session, 'q1')
+        self.assertEqual(session.prepare.call_count, 3)
+        cache.prepare(session, 'q2')
+        self.assertEqual(session.prepare.call_count, 4)
+
+    def test_unpreparable_queries_fall_back_to_simple_statements(self):
+        """
+        A query shape that fails to prepare runs as a SimpleStatement, and isn't prepared again.
+        """
+        cache, session = PreparedStatementCache(), self._session()
+        session.prepare.side_effect = InvalidRequest('invalid')
+        for _ in range(2):
+            statement = cache.statement_for(session, "SELECT * FROM t WHERE k = 1", parameterize_literals=True)
+            self.assertIsInstance(statement, SimpleStatement)
+            self.assertEqual(statement.query_string, "SELECT * FROM t WHERE k = 1")
+        self.assertEqual(session.prepare.call_count, 1)
+
+    def test_transient_errors(self):
+        """
+        A query shape that failed to prepare for another reason than being invalid is prepared again next time,
+        and values that can't be bound fall back to a SimpleStatement only for that query.
+        """
+        cache, session = PreparedStatementCache(), self._session()
+        session.prepare.side_effect = OperationTimedOut('timed out')
+        self.assertRaises(OperationTimedOut, cache.statement_for, session, "SELECT * FROM t WHERE k = 1", parameterize_literals=True)
+        session.prepare.side_effect = None
+        cache.bind = Mock(side_effect=[TypeError('a string is not a timestamp'), 'bound'])
+        self.assertIsInstance(cache.statement_for(session, "SELECT * FROM t WHERE k = 'now'", parameterize_literals=True), SimpleStatement)
+        self.assertEqual(cache.statement_for(session, "SELECT * FROM t WHERE k = 1", parameterize_literals=True), 'bound')
+        self.assertEqual(session.prepare.call_count, 2)
@@ -0,0 +1,114 @@
+from unittest import TestCase
+
+from mock import Mock
+
+from token_ranges import (DEFAULT_NUM_RANGES, MURMUR3_PARTITIONER, RangeDigest,
+                          encode_row, range_locator, ring_token_ranges,
+                          split_token_space)
+
+
+class TestSplitTokenSpace(TestCase):
+
+    def test_ranges_cover_murmur3_ring(self):
+        """
+        The ranges are contiguous and together cover the whole Murmur3 token space.
+        """
+        ranges = split_token_space(MURMUR3_PARTITIONER, 7)
+        self.assertEqual(len(ranges), 7)
+        self.assertEqual(ranges[0][0], -2 ** 63)
+        self.assertEqual(ranges[-1][1], 2 ** 63 - 1)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+
+    def test_unknown_partitioner_is_one_range(self):
+        """
+        Partitioners whose tokens can't be split numerically are read as a single range.
+        """
+        ranges = split_token_space('org.apache.cassandra.dht.ByteOrderedPartitioner', 16)
+        self.assertEqual(ranges, [(None, None)])
+        self.assertEqual(range_locator(ranges)('anything'), 0)
+
+    def test_locator_respects_exclusive_start(self):
+        """
+        A token equal to a range's end belongs to that range, not to the next one.
+        """
+        ranges = split_token_space(MURMUR3_PARTITIONER, 4)
+        locate = range_locator(ranges)
+        self.assertEqual(locate(ranges[1][1]), 1)
+        self.assertEqual(locate(ranges[1][1] + 1), 2)
+        self.assertEqual(locate(2 ** 63 - 1), 3)
+
+
+class TestRingTokenRanges(TestCase):
+
+    def _session(self, tokens, partitioner=MURMUR3_PARTITIONER):
+        session = Mock()
+        session.cluster.metadata.partitioner = partitioner
+        session.cluster.metadata.token_map.ring = [Mock(value=t) for t in tokens]
+        return session
+
+    def test_ranges_follow_node_tokens(self):
+        """
+        Owned ranges end at node tokens, and the wrapping range is split at the ring's bounds.
+        """
+        ranges = ring_token_ranges(self._session([-100, 0, 100]))
+        self.assertEqual(ranges, [(-2 ** 63, -100), (-100, 0), (0, 100), (100, 2 ** 63 - 1)])
+
+    def test_splits_per_range(self):
+        """
+        Each owned range can be split further, keeping the ranges contiguous.
+        """
+        ranges = ring_token_ranges(self._session([0, 100]), splits_per_range=4)
+        self.assertEqual(len(ranges), 12)
+        self.assertIn((0, 25), ranges)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+
+    def test_default_splits(self):
+        """
+        Without a number of splits, each owned range is split into enough pieces for DEFAULT_NUM_RANGES ranges.
+        """
+        ranges = ring_token_ranges(self._session([-100, 0, 100]), splits_per_range=None)
+        self.assertEqual(len(ranges), DEFAULT_NUM_RANGES)
+        self.assertEqual((ranges[0][0], ranges[-1][1]), (-2 ** 63, 2 ** 63 - 1))
+        self.assertEqual(len(ring_token_ranges(self._session(range(0, 1000, 2)), splits_per_range=None)), 501)
+
+    def test_unknown_ring_falls_back_to_even_split(self):
+        """
+        Without token metadata, the token space is split evenly.
+        """
+        self.assertEqual(ring_token_ranges(self._session([])), split_token_space(MURMUR3_PARTITIONER))
+
+
+class TestRangeDigest(TestCase):
+
+    def _digest(self, rows):
+        digest = RangeDigest()
+        for row in rows:
+            digest.add(row)
+        return digest
+
+    def test_order_independent(self):
+        """
+        Folding the same rows in a different order gives the same digest.
+        """
+        rows = [[str(i), 'col', i] for i in range(100)]
+        self.assertEqual(self._digest(rows), self._digest(reversed(rows)))
+
+    def test_detects_missing_duplicate_and_changed_rows(self):
+        """
+        Missing, duplicated and changed rows all change the digest.
+        """
+        rows = [[str(i), 'col', i] for i in range(10)]
+        expected = self._digest(rows)
+        self.assertNotEqual(expected, self._digest(rows[1:]))
+        self.assertNotEqual(expected, self._digest(rows + rows[:1]))
+        self.assertNotEqual(expected, self._digest(rows[1:] + [['0', 'col', 1]]))
+
+    def test_encoding_ignores_string_and_integer_types(self):
+        """
+        Values read back by the driver encode like the native values a test generated.
+        """
+        self.assertEqual(encode_row([u'k', 1, {u'a': 1}]), encode_row(['k', 1, {'a': 1}]))
+        self.assertNotEqual(encode_row(['1']), encode_row([1]))
+        self.assertNotEqual(encode_row(['ab', 'c']), encode_row(['a', 'bc']))
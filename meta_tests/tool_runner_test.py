@@ -0,0 +1,114 @@
+import os
+import shutil
+import sys
+import tempfile
+from unittest import TestCase
+
+from mock import Mock, patch
+
+import tool_runner
+from tool_runner import ToolRunner, parse_java_command
+
+# what the scripts of the tools look like, once cassandra.in.sh is sourced
+FAKE_TOOL = """#!/bin/sh
+CLASSPATH=/cassandra/conf:/cassandra/lib/a.jar
+JAVA="$JAVA_HOME/bin/java"
+"$JAVA" -javaagent:/cassandra/lib/jamm.jar -ea -cp "$CLASSPATH" -Xmx256M \\
+        -Dcassandra.storagedir=/cassandra/data -Dlogback.configurationFile=logback-tools.xml \\
+        org.apache.cassandra.tools.StandaloneSSTableUtil "$@"
+"""
+
+
+class TestToolRunner(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.tool = os.path.join(self.directory, 'sstableutil')
+        with open(self.tool, 'w') as f:
+            f.write(FAKE_TOOL)
+        os.chmod(self.tool, 0755)
+        self.node = Mock()
+        self.node.get_tool.return_value = self.tool
+        self.node.get_install_dir.return_value = self.directory
+        patcher = patch('tool_runner.common.make_cassandra_env', return_value=dict(os.environ))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parse_java_command(self):
+        command = parse_java_command(['-ea', '-cp', '/a.jar:/b.jar', '-Dx=1', '-Dy', 'Main', 'fixed', tool_runner._PROBE_ARG])
+        self.assertEqual(command.classpath, ['/a.jar', '/b.jar'])
+        self.assertEqual(command.properties, {'x': '1', 'y': ''})
+        self.assertEqual((command.main_class, command.args, command.assertions), ('Main', ['fixed'], True))
+        self.assertIsNone(parse_java_command(['-cp', '/a.jar', tool_runner._PROBE_ARG]))
+        self.assertIsNone(parse_java_command(['-cp', '/a.jar', 'Main']))
+
+    def test_probe(self):
+        runner = ToolRunner()
+        self.addCleanup(runner.close)
+        command = runner._command(self.tool, dict(os.environ))
+        self.assertEqual(command.classpath, ['/cassandra/conf', '/cassandra/lib/a.jar'])
+        self.assertEqual(command.properties, {'cassandra.storagedir': '/cassandra/data', 'logback.configurationFile': 'logback-tools.xml'})
+        self.assertEqual(command.main_class, 'org.apache.cassandra.tools.StandaloneSSTableUtil')
+        self.assertEqual(command.java_agents, ['-javaagent:/cassandra/lib/jamm.jar'])
+
+    @patch('tool_runner._compile_tool_server', return_value=None)
+    def test_runs_script_without_tool_server(self, _):
+        runner = ToolRunner()
+        self.addCleanup(runner.close)
+        # the fake tool runs the real java, if any, which fails to find the main class
+        with patch.dict(os.environ, {'JAVA_HOME': self.directory}):
+            stdout, stderr, rc = runner.run(self.node, 'sstableutil', ['ks', 'cf'])
+        self.assertNotEqual(rc, 0)
+        self.assertEqual(runner._daemons, {})
+
+
+# answers requests as ToolServer does, with the main class and arguments as stdout, and the properties as stderr
+# run by the python running the tests, whatever python is on the PATH
+FAKE_TOOL_SERVER = """#!{python}
+import socket, struct, sys
+server = socket.socket()
+server.bind(('127.0.0.1', 0))
+server.listen(1)
+sys.stdout.write('%d\\n' % server.getsockname()[1])
+sys.stdout.flush()
+connection = server.accept()[0].makefile('rwb')
+
+def read_int():
+    data = connection.read(4)
+    if len(data) < 4:
+        sys.exit(0)
+    return struct.unpack('>i', data)[0]
+
+def read_string():
+    return connection.read(struct.unpack('>H', connection.read(2))[0])
+
+while True:
+    classpath = [read_string() for _ in range(read_int())]
+    assertions = struct.unpack('>?', connection.read(1))[0]
+    properties = sorted((read_string(), read_string()) for _ in range(read_int()))
+    main_class = read_string()
+    args = [read_string() for _ in range(read_int())]
+    stdout, stderr = ' '.join([main_class] + args), repr(properties)
+    connection.write(struct.pack('>ii', 3, len(stdout)) + stdout + struct.pack('>i', len(stderr)) + stderr)
+    connection.flush()
+"""
+
+
+class TestToolDaemon(TestCase):
+
+    def test_protocol(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        fake_java = os.path.join(directory, 'java')
+        with open(fake_java, 'w') as f:
+            f.write(FAKE_TOOL_SERVER.format(python=sys.executable))
+        os.chmod(fake_java, 0755)
+
+        command = parse_java_command(['-cp', '/a.jar', '-Dx=1', 'Main', 'fixed', tool_runner._PROBE_ARG])
+        with patch('tool_runner.java_bin', return_value=fake_java):
+            daemon = tool_runner.ToolDaemon(directory, timeout=10)
+        self.addCleanup(daemon.close)
+        self.assertEqual(daemon.run(command, [u'ks\xe9', 'cf']), ('Main fixed ks\xc3\xa9 cf', "[('x', '1')]", 3))
+        self.assertEqual(daemon.run(command, []), ('Main fixed', "[('x', '1')]", 3))
+        self.assertEqual(daemon.runs, 2)
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock
+
+from upgrade_tests.upgrade_state_cache import UpgradeStateCache, _clone_tree
+
+
+class TestCloneTree(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'source')
+        self.files = {
+            'cluster.conf': 'path: {path}\n',
+            'node1/conf/cassandra.yaml': 'data_file_directories: [{path}/node1/data0]\n',
+            'node1/data0/ks/cf-1234/ks-cf-ka-1-Data.db': 'data',
+            'node1/data0/ks/cf-1234/ks-cf-ka-1-Summary.db': 'summary',
+            'node1/commitlogs/CommitLog-5-1.log': 'commitlog',
+            'node1/logs/system.log': 'ERROR from a previous run',
+        }
+        for name, content in self.files.items():
+            path = os.path.join(self.source, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(content.format(path=self.source))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _read(self, path, name):
+        with open(os.path.join(path, name)) as f:
+            return f.read()
+
+    def test_clone(self):
+        """
+        Configuration is rewritten to the clone's path, data files are linked or copied, and logs are left behind.
+        """
+        destination = os.path.join(self.root, 'destination')
+        _clone_tree(self.source, destination, self.source, destination)
+
+        self.assertEqual(self._read(destination, 'cluster.conf'), 'path: {}\n'.format(destination))
+        self.assertIn(destination, self._read(destination, 'node1/conf/cassandra.yaml'))
+
+        data = 'node1/data0/ks/cf-1234/ks-cf-ka-1-Data.db'
+        self.assertTrue(os.path.samefile(os.path.join(self.source, data), os.path.join(destination, data)))
+        for copied in ('node1/data0/ks/cf-1234/ks-cf-ka-1-Summary.db', 'node1/commitlogs/CommitLog-5-1.log'):
+            self.assertFalse(os.path.samefile(os.path.join(self.source, copied), os.path.join(destination, copied)))
+            self.assertEqual(self._read(destination, copied), self.files[copied])
+
+        self.assertEqual(os.listdir(os.path.join(destination, 'node1/logs')), [])
+
+
+class TestUpgradeStateCacheKey(TestCase):
+
+    def _cluster(self, **kwargs):
+        cluster = Mock(partitioner=None, use_vnodes=True, data_dir_count=3, _config_options={'a': 1})
+        cluster.version.return_value = '2.1.15'
+        cluster.get_install_dir.return_value = '/repository/2.1.15'
+        cluster.nodelist.return_value = [Mock(), Mock()]
+        for name, value in kwargs.items():
+            setattr(cluster, name, value)
+        return cluster
+
+    def test_key_depends_on_state(self):
+        """
+        Clusters that would be prepared into the same state share a key, others don't.
+        """
+        cache = UpgradeStateCache('/cache')
+        key = cache.key(self._cluster(), rf=1)
+        self.assertEqual(key, cache.key(self._cluster(), rf=1))
+        self.assertNotEqual(key, cache.key(self._cluster(), rf=2))
+        self.assertNotEqual(key, cache.key(self._cluster(_config_options={'a': 2}), rf=1))
+        self.assertNotEqual(key, cache.key(self._cluster(partitioner='org.apache.cassandra.dht.ByteOrderedPartitioner'), rf=1))
@@ -0,0 +1,174 @@
+import multiprocessing
+import threading
+import uuid
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from upgrade_tests.upgrade_workload import (ContinuousWorkload, CounterSpec,
+                                            DataSpec, RecordRing,
+                                            WorkloadStats,
+                                            verify_continuously)
+from utils.latency_histogram import LatencyHistogram
+
+
+def _histogram(seconds, count):
+    histogram = LatencyHistogram()
+    histogram.record(seconds, count)
+    return histogram
+
+
+def _consume(ring, count, results):
+    received = []
+    while len(received) < count:
+        received.extend(ring.pop_many(64, timeout=5))
+    results.put(received)
+
+
+class TestRecordRing(TestCase):
+
+    def _records(self, n):
+        return [DataSpec().encode((uuid.UUID(int=i), uuid.UUID(int=i + 1))) for i in range(n)]
+
+    def test_fifo_and_bounded(self):
+        """
+        Records come out in order, and no more than the ring's capacity are kept.
+        """
+        ring = RecordRing(3)
+        records = self._records(5)
+        self.assertEqual(ring.put_many(records, timeout=0.01), 3)
+        self.assertEqual(ring.pop_many(2), records[:2])
+        self.assertEqual(ring.put_many(records[3:], drop=True), 2)
+        self.assertEqual(ring.pop_many(10), records[2:5])
+        self.assertEqual(ring.pop_many(10, timeout=0), [])
+        self.assertEqual(ring.pushed, 5)
+
+    def test_hands_records_to_another_process(self):
+        """
+        A writer blocked on a full ring resumes as soon as another process pops records.
+        """
+        ring, results = RecordRing(50), multiprocessing.Queue()
+        consumer = multiprocessing.Process(target=_consume, args=(ring, 1000, results))
+        consumer.start()
+
+        records = self._records(1000)
+        remaining = records
+        while remaining:
+            remaining = remaining[ring.put_many(remaining, timeout=5):]
+
+        self.assertEqual(results.get(timeout=10), records)
+        consumer.join()
+        self.assertTrue(ring.wait_for(lambda pushed, size: size == 0, timeout=1))
+
+    def test_spec_encoding(self):
+        """
+        Records survive the round trip through their fixed-size encoding.
+        """
+        for spec, record in ((DataSpec(), (uuid.uuid4(), uuid.uuid4())), (CounterSpec(), (uuid.uuid4(), 42))):
+            self.assertEqual(spec.decode(spec.encode(record)), record)
+
+
+class TestPhases(TestCase):
+
+    def test_stats_merge_histograms_across_processes(self):
+        """
+        Latencies added to the shared stats by other processes show up in snapshots.
+        """
+        stats = WorkloadStats()
+        process = multiprocessing.Process(target=stats.add, kwargs={'writes': 5, 'write_latency': _histogram(0.002, 5)})
+        process.start()
+        process.join()
+        stats.add(reads=1, read_latency=_histogram(0.01, 1))
+
+        snapshot = stats.snapshot()
+        self.assertEqual((snapshot['writes'], snapshot['reads']), (5, 1))
+        self.assertEqual(snapshot['write_latency'].total_count, 5)
+        self.assertAlmostEqual(snapshot['read_latency'].percentile(99), 0.01, delta=0.0005)
+
+    @patch('upgrade_tests.upgrade_workload.time')
+    def test_degradations(self, mock_time):
+        """
+        Steady-state phases are compared with the first one, and other phases are only reported.
+        """
+        mock_time.time.return_value = 0
+        workload = ContinuousWorkload(Mock(), DataSpec(), pairs=1)
+
+        def phase(label, latency, writes, steady_state=True):
+            mock_time.time.return_value += 10
+            workload.stats.add(writes=writes, reads=writes,
+                               write_latency=_histogram(latency, writes), read_latency=_histogram(0.001, writes))
+            workload.report_phase(label, steady_state=steady_state)
+
+        phase('warm-up', 0.5, 10, steady_state=False)
+        phase('before upgrade', 0.002, 1000)
+        phase('upgrading node1', 1, 10, steady_state=False)
+        phase('mixed versions', 0.004, 900)
+        self.assertEqual(workload.degradations(max_p99_ratio=10, min_throughput_ratio=0.5), [])
+
+        phase('after upgrade', 0.05, 100)
+        messages = workload.degradations(max_p99_ratio=10, min_throughput_ratio=0.5)
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(all(m.startswith('data workload, after upgrade: ') for m in messages))
+        self.assertEqual(workload.degradations(), [])
+
+        report = workload.phase_report().splitlines()
+        self.assertEqual(len(report), 2 + 5)
+        self.assertIn('before upgrade *', report[3])
+        self.assertIn('50.2ms', report[6])
+
+
+class TestVerifier(TestCase):
+
+    def setUp(self):
+        patcher = patch('upgrade_tests.upgrade_workload._connect', return_value=(Mock(), Mock()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('upgrade_tests.upgrade_workload.RETRY_BACKOFF', 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.spec = DataSpec()
+        self.to_verify, self.rewritable = RecordRing(10), RecordRing(10)
+        self.stats = WorkloadStats()
+        self.stop = threading.Event()
+        self.records = [(uuid.UUID(int=i), uuid.UUID(int=i + 1)) for i in range(2)]
+        self.to_verify.put_many([self.spec.encode(record) for record in self.records])
+
+    def _verify(self, max_read_retries=3):
+        verifier = threading.Thread(target=verify_continuously, args=(Mock(), self.spec, self.to_verify, self.rewritable, self.stats,
+                                                                      self.stop, 8, 10, max_read_retries))
+        verifier.start()
+        return verifier
+
+    def test_failed_reads_are_retried_up_to_a_limit(self):
+        """
+        A record always failing to be read is tried again a bounded number of times, and counted as unverified.
+        """
+        def execute(session, prepared, parameters, window):
+            return [(key != self.records[0][0], Exception('timeout') if key == self.records[0][0] else [(self.records[1][1],)])
+                    for key, in parameters], _histogram(0.001, len(parameters))
+
+        with patch('upgrade_tests.upgrade_workload.execute_timed', side_effect=execute) as execute_timed:
+            verifier = self._verify()
+            while self.stats.snapshot()['unverified'] == 0:
+                verifier.join(0.01)
+            self.stop.set()
+            verifier.join(5)
+        self.assertFalse(verifier.is_alive())
+        snapshot = self.stats.snapshot()
+        self.assertEqual((snapshot['reads'], snapshot['read_errors'], snapshot['unverified']), (1, 4, 1))
+        self.assertEqual(execute_timed.call_count, 4)
+        self.assertEqual(len(self.rewritable), 1)
+
+    def test_exits_once_stopped(self):
+        """
+        Records still to be retried when the verifier is stopped get a last try, and the verifier returns.
+        """
+        with patch('upgrade_tests.upgrade_workload.execute_timed',
+                   side_effect=lambda session, prepared, parameters, window: ([(False, Exception('timeout'))] * len(parameters), LatencyHistogram())):
+            verifier = self._verify(max_read_retries=1000)
+            while self.stats.snapshot()['read_errors'] < 2:
+                verifier.join(0.01)
+            self.stop.set()
+            verifier.join(5)
+        self.assertFalse(verifier.is_alive())
+        self.assertEqual(self.stats.snapshot()['unverified'], 2)
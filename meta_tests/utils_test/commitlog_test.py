@@ -0,0 +1,135 @@
+import binascii
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from unittest import TestCase
+
+from utils.commitlog import (CommitLogSegment, UnsupportedSegment, cdc_index,
+                             commitlog_segments, segment_id,
+                             segment_statistics)
+
+SEGMENT_ID = 1478000000000 + (1 << 32)
+
+
+def crc(data, value=0):
+    return binascii.crc32(data, value) & 0xffffffff
+
+
+def id_ints():
+    return struct.pack('>II', SEGMENT_ID & 0xffffffff, SEGMENT_ID >> 32)
+
+
+def header(version, parameters=''):
+    if version < 5:
+        return struct.pack('>iq', version, SEGMENT_ID) + struct.pack('>I', crc(struct.pack('>i', version) + id_ints()))
+    checksum = crc(parameters, crc(struct.pack('>i', version) + id_ints() + struct.pack('>i', len(parameters))))
+    return struct.pack('>iqH', version, SEGMENT_ID, len(parameters)) + parameters + struct.pack('>I', checksum)
+
+
+def mutation(data):
+    size = struct.pack('>i', len(data))
+    return size + struct.pack('>I', crc(size)) + data + struct.pack('>I', crc(data, crc(size)))
+
+
+def segment(version, sections, parameters='', compress=None, padding=0):
+    """
+    @return A segment of sections, each a list of mutations, as Cassandra writes it
+    """
+    data = header(version, parameters)
+    for mutations in sections:
+        content = ''.join(mutation(m) for m in mutations)
+        if compress is not None:
+            content = struct.pack('>i', len(content)) + compress(content)
+        else:
+            # the end of the section
+            content += struct.pack('>i', 0)
+        end = len(data) + 8 + len(content)
+        data += struct.pack('>iI', end, crc(id_ints() + struct.pack('>i', len(data)))) + content
+    return data + '\0' * padding
+
+
+class TestCommitLog(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, data, version=6):
+        path = os.path.join(self.directory, 'CommitLog-{}-{}.log'.format(version, SEGMENT_ID))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_segment_id(self):
+        self.assertEqual(segment_id('/cl/CommitLog-6-1478000000001.log'), (6, 1478000000001))
+        self.assertRaises(ValueError, segment_id, 'CommitLog-6-1_cdc.idx')
+
+    def test_read_2_1_segment(self):
+        path = self.write(segment(4, [['a' * 10, 'b' * 20], ['c']], padding=100), version=4)
+        with CommitLogSegment(path) as s:
+            self.assertEqual((s.version, s.id, s.compression, s.header_size), (4, SEGMENT_ID, None, 16))
+            self.assertTrue(s.header_crc_valid())
+            sections = list(s.sync_sections())
+            self.assertEqual([section.position for section in sections], [16, sections[0].end])
+            self.assertTrue(all(section.crc_valid for section in sections))
+            self.assertEqual(s.bytes_used(), s.size - 100)
+            mutations = list(s.mutations(check_crc=True))
+            self.assertEqual([s.read(m) for m in mutations], ['a' * 10, 'b' * 20, 'c'])
+            self.assertTrue(all(m.crc_valid for m in mutations))
+
+    def test_read_3_0_segment_with_parameters(self):
+        parameters = json.dumps({'compressionClass': 'DeflateCompressor', 'compressionParameters': {}})
+        path = self.write(segment(6, [['x' * 100, 'y'], ['z' * 5]], parameters=parameters, compress=zlib.compress))
+        statistics = segment_statistics(path)
+        self.assertEqual(statistics['compression'], 'DeflateCompressor')
+        self.assertEqual((statistics['sync_sections'], statistics['mutations'], statistics['bytes_used']), (2, 3, statistics['size']))
+        self.assertTrue(statistics['header_crc_valid'])
+        self.assertIsNone(statistics['cdc_index'])
+        with CommitLogSegment(path) as s:
+            self.assertEqual([s.read(m) for m in s.mutations()], ['x' * 100, 'y', 'z' * 5])
+
+    def test_unknown_compressor(self):
+        parameters = json.dumps({'compressionClass': 'LZ5Compressor', 'compressionParameters': {}})
+        path = self.write(segment(6, [['x']], parameters=parameters, compress=zlib.compress))
+        with CommitLogSegment(path) as s:
+            self.assertRaises(UnsupportedSegment, list, s.mutations())
+        self.assertIsNone(segment_statistics(path)['mutations'])
+
+    def test_corrupt_sections_and_mutations(self):
+        data = segment(6, [['a'], ['b'], ['c']], padding=50)
+        path = self.write(data)
+        with CommitLogSegment(path) as s:
+            second = list(s.sync_sections())[1].position
+            first_mutation = list(s.mutations())[0]
+        # corrupt the CRC of the second sync marker, and the content of the first mutation
+        data = data[:second + 4] + 'xxxx' + data[second + 8:]
+        data = data[:first_mutation.offset] + 'z' + data[first_mutation.offset + 1:]
+        path = self.write(data)
+        with CommitLogSegment(path) as s:
+            self.assertEqual([section.crc_valid for section in s.sync_sections()], [True, False])
+            self.assertEqual(s.bytes_used(), second)
+            self.assertEqual([m.crc_valid for m in s.mutations(check_crc=True)], [False])
+
+    def test_rewrite_header(self):
+        parameters = json.dumps({'compressionClass': 'LZ4Compressor', 'compressionParameters': {}})
+        path = self.write(segment(6, [['x']], parameters=parameters, compress=zlib.compress))
+        with CommitLogSegment(path, writable=True) as s:
+            s.rewrite_header(crc=123456)
+            self.assertEqual(s.header_crc, 123456)
+            self.assertFalse(s.header_crc_valid())
+            s.rewrite_header(parameters=parameters.replace('LZ4Compressor', 'LZ5Compressor'))
+            self.assertRaises(ValueError, s.rewrite_header, parameters='{}')
+        with CommitLogSegment(path) as s:
+            self.assertEqual(s.compression, 'LZ5Compressor')
+            self.assertTrue(s.header_crc_valid())
+
+    def test_cdc_index_and_listing(self):
+        path = self.write(segment(6, [['x']]))
+        self.write(segment(6, [['x']]), version=5)
+        with open(os.path.join(self.directory, 'CommitLog-6-{}_cdc.idx'.format(SEGMENT_ID)), 'w') as f:
+            f.write('42\nCOMPLETED')
+        self.assertEqual(cdc_index(path), (42, True))
+        self.assertEqual(len(commitlog_segments(self.directory)), 2)
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import Mock
+
+from utils.dirwatch import DirectoryWatcher, node_directories
+
+
+class TestDirectoryWatcher(TestCase):
+    use_inotify = True
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.table_dir = os.path.join(self.directory, 'data', 'ks', 'cf-0123')
+        os.makedirs(self.table_dir)
+        os.makedirs(os.path.join(self.directory, 'commitlogs'))
+        self.write(os.path.join(self.table_dir, 'mc-1-big-Data.db'), 10)
+
+        roots = {os.path.join(self.directory, 'data'): 'data',
+                 os.path.join(self.directory, 'commitlogs'): 'commitlog',
+                 os.path.join(self.directory, 'cdc_raw'): 'cdc_raw'}
+        self.watcher = DirectoryWatcher(roots, poll_interval=0.01, use_inotify=self.use_inotify).start()
+        self.addCleanup(self.watcher.stop)
+
+    def write(self, path, size):
+        with open(path, 'wb') as f:
+            f.write('x' * size)
+
+    def test_counts_files_already_there(self):
+        self.assertEqual(self.watcher.sstable_count('ks', 'cf'), 1)
+        self.assertEqual(self.watcher.file_count('data', 'ks'), 1)
+        self.assertEqual(self.watcher.total_bytes('data', 'ks', 'cf'), 10)
+        self.assertEqual(self.watcher.file_count('commitlog'), 0)
+
+    def test_tracks_changes(self):
+        self.write(os.path.join(self.table_dir, 'mc-2-big-Data.db'), 20)
+        self.write(os.path.join(self.table_dir, 'mc-2-big-Index.db'), 5)
+        self.write(os.path.join(self.directory, 'commitlogs', 'CommitLog-6-1.log'), 100)
+        self.watcher.wait_until(lambda w: w.sstable_count('ks', 'cf') == 2 and w.total_bytes('data') == 35, timeout=5)
+        self.watcher.wait_until(lambda w: w.total_bytes('commitlog') == 100, timeout=5)
+
+        os.remove(os.path.join(self.table_dir, 'mc-1-big-Data.db'))
+        self.watcher.wait_until(lambda w: w.sstable_count('ks', 'cf') == 1, timeout=5)
+        self.assertEqual(self.watcher.total_bytes('data', 'ks', 'cf'), 25)
+        self.assertEqual(self.watcher.peak_bytes('data', 'ks', 'cf'), 35)
+        self.assertEqual(self.watcher.peak_bytes('data'), 35)
+        self.assertEqual(self.watcher.max_sstable_count('ks', 'cf'), 2)
+        self.assertEqual([count for _, count in self.watcher.sstable_count_history('ks', 'cf')], [0, 1, 2, 1])
+
+    def test_missing_roots_and_new_directories(self):
+        os.makedirs(os.path.join(self.directory, 'cdc_raw'))
+        self.write(os.path.join(self.directory, 'cdc_raw', 'CommitLog-6-1.log'), 50)
+        snapshot_dir = os.path.join(self.table_dir, 'snapshots', 'snap')
+        os.makedirs(snapshot_dir)
+        self.write(os.path.join(snapshot_dir, 'mc-1-big-Data.db'), 10)
+        self.watcher.wait_until(lambda w: w.total_bytes('cdc_raw') == 50 and w.file_count('snapshots', 'ks', 'cf') == 1, timeout=5)
+        # snapshots aren't live sstables
+        self.assertEqual(self.watcher.sstable_count('ks', 'cf'), 1)
+
+        shutil.rmtree(os.path.join(self.table_dir, 'snapshots'))
+        self.watcher.wait_until(lambda w: w.file_count('snapshots') == 0, timeout=5)
+
+    def test_wait_until_times_out(self):
+        with self.assertRaisesRegexp(AssertionError, 'cdc_raw full'):
+            self.watcher.wait_until(lambda w: w.total_bytes('cdc_raw') > 0, timeout=0.1, description='cdc_raw full')
+
+
+class TestPollingDirectoryWatcher(TestDirectoryWatcher):
+    use_inotify = False
+
+
+class TestInotifyDirectoryWatcher(TestCase):
+
+    def test_records_short_lived_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        table_dir = os.path.join(directory, 'ks', 'cf-0123')
+        os.makedirs(table_dir)
+        watcher = DirectoryWatcher({directory: 'data'}).start()
+        self.addCleanup(watcher.stop)
+        if not watcher.using_inotify:
+            self.skipTest('inotify is not available')
+
+        for generation in range(5):
+            path = os.path.join(table_dir, 'mc-{}-big-Data.db'.format(generation))
+            open(path, 'w').close()
+            os.remove(path)
+        watcher.wait_until(lambda w: len(w.sstable_count_history('ks', 'cf')) == 11, timeout=5)
+        self.assertEqual(watcher.max_sstable_count('ks', 'cf'), 1)
+        self.assertEqual(watcher.sstable_count('ks', 'cf'), 0)
+
+    def test_node_directories(self):
+        node = Mock(data_directories=lambda: ['/n/data0', '/n/data1'], get_path=lambda: '/n')
+        self.assertEqual(node_directories(node), {'/n/data0': 'data', '/n/data1': 'data', '/n/commitlogs': 'commitlog',
+                                                  '/n/hints': 'hints', '/n/cdc_raw': 'cdc_raw'})
@@ -0,0 +1,51 @@
+import random
+from unittest import TestCase
+
+from utils.latency_histogram import (NUM_BUCKETS, LatencyHistogram,
+                                     bucket_highest, bucket_index,
+                                     bucket_lowest)
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_buckets_are_contiguous(self):
+        """
+        Every latency falls in exactly one bucket, within about 3% of its bounds.
+        """
+        for index in xrange(NUM_BUCKETS - 1):
+            self.assertEqual(bucket_highest(index) + 1, bucket_lowest(index + 1))
+            self.assertEqual(bucket_index(bucket_lowest(index)), index)
+            self.assertEqual(bucket_index(bucket_highest(index)), index)
+            self.assertLessEqual(bucket_highest(index) - bucket_lowest(index), bucket_lowest(index) * 0.032)
+        self.assertEqual(bucket_index(10 ** 30), NUM_BUCKETS - 1)
+
+    def test_percentiles(self):
+        """
+        Percentiles are within the precision of the buckets of the exact ones.
+        """
+        rnd = random.Random(0)
+        samples = sorted(rnd.expovariate(1 / 0.005) for _ in xrange(10000))
+        histogram = LatencyHistogram()
+        for sample in samples:
+            histogram.record(sample)
+
+        self.assertEqual(histogram.total_count, len(samples))
+        for percentile in (50, 90, 99, 99.9, 100):
+            exact = samples[int(-(-len(samples) * percentile // 100)) - 1]
+            self.assertAlmostEqual(histogram.percentile(percentile), exact, delta=exact * 0.035 + 1e-6)
+        self.assertIsNone(LatencyHistogram().percentile(99))
+
+    def test_merge_and_since(self):
+        """
+        Histograms recorded separately merge exactly, and can be diffed with an earlier copy.
+        """
+        first, second = LatencyHistogram(), LatencyHistogram()
+        first.record(0.001, count=3)
+        second.record(0.2)
+        earlier = LatencyHistogram(first.counts)
+
+        first.merge(second)
+        self.assertEqual(first.total_count, 4)
+        self.assertEqual(first.since(earlier).counts, second.counts)
+        self.assertEqual(first.summary()['p50'], bucket_highest(bucket_index(1000)) / 1e6)
+        self.assertRaises(ValueError, LatencyHistogram, [0])
@@ -0,0 +1,115 @@
+import random
+from unittest import TestCase
+
+from utils.linearizability import (CASRegister, HistoryRecorder, Register,
+                                   assert_linearizable, check_linearizable)
+
+
+def simulated_history(num_ops, num_keys, num_processes, seed=0):
+    """
+    Generate the history of processes concurrently running reads, writes and
+    compare-and-sets against in-memory registers, with random overlaps.
+    """
+    rnd = random.Random(seed)
+    history = HistoryRecorder()
+    registers = dict((key, 0) for key in range(num_keys))
+    # process -> [operation, result once applied]
+    in_flight = {}
+    invoked = 0
+    while invoked < num_ops or in_flight:
+        process = rnd.randrange(num_processes)
+        if process not in in_flight:
+            if invoked < num_ops:
+                key, f = rnd.randrange(num_keys), rnd.choice(['read', 'write', 'cas'])
+                value = {'read': None, 'write': rnd.randrange(5), 'cas': (rnd.randrange(5), rnd.randrange(5))}[f]
+                in_flight[process] = [history.invoke(process, f, value, key=key), None]
+                invoked += 1
+        elif in_flight[process][1] is None:
+            op = in_flight[process][0]
+            if op.f == 'read':
+                result = registers[op.key]
+            elif op.f == 'write':
+                registers[op.key], result = op.value, None
+            else:
+                result = registers[op.key] == op.value[0]
+                if result:
+                    registers[op.key] = op.value[1]
+            in_flight[process][1] = (result,)
+        else:
+            op, (result,) = in_flight.pop(process)
+            history.complete(op, result)
+    return history
+
+
+class TestLinearizability(TestCase):
+
+    def test_sequential_history(self):
+        """
+        Operations that don't overlap are linearizable in their real-time order only.
+        """
+        history = HistoryRecorder()
+        history.complete(history.invoke(0, 'write', 1), None)
+        history.complete(history.invoke(1, 'read'), 1)
+        self.assertEqual(check_linearizable(history, Register(initial=0)), [])
+
+        history.complete(history.invoke(1, 'read'), 0)
+        self.assertEqual(check_linearizable(history, Register(initial=0)), [None])
+
+    def test_concurrent_read_sees_either_value(self):
+        """
+        A read concurrent with a write may return the old value or the new one.
+        """
+        for read_value in (0, 1):
+            history = HistoryRecorder()
+            write = history.invoke(0, 'write', 1)
+            read = history.invoke(1, 'read')
+            history.complete(read, read_value)
+            history.complete(write, None)
+            self.assertEqual(check_linearizable(history, Register(initial=0)), [])
+
+    def test_indeterminate_cas(self):
+        """
+        A cas that timed out may or may not have been applied, at any time after it was invoked.
+        """
+        for read_value in (0, 1):
+            history = HistoryRecorder()
+            history.info(history.invoke(0, 'cas', (0, 1)))
+            history.complete(history.invoke(1, 'read'), read_value)
+            self.assertEqual(check_linearizable(history, CASRegister(initial=0)), [])
+
+        history = HistoryRecorder()
+        history.info(history.invoke(0, 'cas', (0, 1)))
+        history.complete(history.invoke(1, 'read'), 2)
+        self.assertEqual(check_linearizable(history, CASRegister(initial=0)), [None])
+
+    def test_cas_not_applied_with_current_value(self):
+        """
+        A cas that wasn't applied must have seen the current value it returned.
+        """
+        history = HistoryRecorder()
+        history.complete(history.invoke(0, 'cas', (0, 1), key='k'), True)
+        history.complete(history.invoke(1, 'cas', (0, 1), key='k'), (False, 1))
+        self.assertEqual(check_linearizable(history, CASRegister(initial=0)), [])
+
+        history.complete(history.invoke(1, 'cas', (1, 2), key='k'), (False, 0))
+        self.assertEqual(check_linearizable(history, CASRegister(initial=0)), ['k'])
+
+    def test_only_bad_keys_are_reported(self):
+        """
+        Keys are checked separately, and only the ones with a violation are reported.
+        """
+        history = simulated_history(2000, num_keys=10, num_processes=5)
+        self.assertEqual(check_linearizable(history, CASRegister(initial=0)), [])
+
+        reads = [op for op in history.operations if op.f == 'read' and op.key == 3]
+        reads[-1].result = 'never written'
+        self.assertEqual(check_linearizable(history, CASRegister(initial=0)), [3])
+        with self.assertRaisesRegexp(AssertionError, r'for 1 key\(s\): \[3\]'):
+            assert_linearizable(history, CASRegister(initial=0))
+
+    def test_long_concurrent_history(self):
+        """
+        Long histories of concurrent operations are checked quickly.
+        """
+        history = simulated_history(50000, num_keys=50, num_processes=8, seed=1)
+        self.assertEqual(check_linearizable(history, CASRegister(initial=0)), [])
@@ -0,0 +1,20 @@
+import sys
+from unittest import TestCase
+
+from utils.resource_usage import run_and_measure
+
+CHILD = 'import sys; x = "a" * (64 * 2 ** 20); sum(xrange(3000000)); sys.exit(3)'
+PARENT = 'import subprocess, sys; sys.stdout.write(sys.stdin.read()); sys.exit(subprocess.call([sys.executable, "-c", {!r}]))'.format(CHILD)
+
+
+class TestResourceUsage(TestCase):
+
+    def test_measures_process_tree(self):
+        """
+        CPU time and memory of the processes started by the command are included.
+        """
+        usage = run_and_measure([sys.executable, '-c', PARENT], stdin='hello', interval=0.01)
+        self.assertEqual((usage.returncode, usage.stdout, usage.stderr), (3, 'hello', ''))
+        self.assertGreater(usage.cpu_user + usage.cpu_system, 0.05)
+        self.assertGreater(usage.peak_rss, 64 * 2 ** 20)
+        self.assertGreater(usage.elapsed, 0)
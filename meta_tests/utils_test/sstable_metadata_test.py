@@ -0,0 +1,109 @@
+import os
+import shutil
+import struct
+import tempfile
+from unittest import TestCase
+
+from utils.sstable_metadata import (INT_MAX, read_directory_statistics,
+                                    read_statistics, sstable_version)
+
+
+def estimated_histogram(counts):
+    """
+    @return An EstimatedHistogram with bucket offsets 1, 2, 3..., the first one written twice
+    """
+    data = struct.pack('>i', len(counts))
+    for i, count in enumerate(counts):
+        data += struct.pack('>qq', max(1, i), count)
+    return data
+
+
+def statistics_component(version, level, repaired_at, column_counts=(1, 0, 0), tombstone_drop_times=()):
+    """
+    @return A Statistics.db component, as MetadataSerializer writes it
+    """
+    stores_rows = version >= 'ma'
+    partitioner = 'org.apache.cassandra.dht.Murmur3Partitioner'
+    validation = struct.pack('>H', len(partitioner)) + partitioner + struct.pack('>d', 0.01)
+    compaction = struct.pack('>i', 0)
+    stats = (estimated_histogram([5, 6, 7, 0])
+             + estimated_histogram(column_counts)
+             + struct.pack('>qi', 1, 100)
+             + struct.pack('>qq', 1000, 2000)
+             + (struct.pack('>i', 10) if stores_rows else '')
+             + struct.pack('>i', 20)
+             + (struct.pack('>ii', 30, 40) if stores_rows else '')
+             + struct.pack('>d', 0.5)
+             + struct.pack('>ii', 100, len(tombstone_drop_times))
+             + ''.join(struct.pack('>dq', point, count) for point, count in tombstone_drop_times)
+             + struct.pack('>iq', level, repaired_at)
+             + struct.pack('>ii?', 0, 0, True))
+    components = [(0, validation), (1, compaction), (2, stats)]
+    offset = 4 + 8 * len(components)
+    toc = struct.pack('>i', len(components))
+    for component_type, data in components:
+        toc += struct.pack('>ii', component_type, offset)
+        offset += len(data)
+    return toc + ''.join(data for _, data in components)
+
+
+class TestSSTableMetadata(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, data, keyspace='ks', table='cf-0123'):
+        table_dir = os.path.join(self.directory, keyspace, table)
+        if not os.path.isdir(table_dir):
+            os.makedirs(table_dir)
+        path = os.path.join(table_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_versions(self):
+        self.assertEqual(sstable_version('/data/ks/cf-1/ks-cf-ka-12-Statistics.db'), 'ka')
+        self.assertEqual(sstable_version('mc-3-big-Statistics.db'), 'mc')
+        self.assertRaises(ValueError, sstable_version, 'mc-3-big-Data.db')
+
+    def test_read_2_1_and_3_0_formats(self):
+        path = self.write('ks-cf-ka-1-Statistics.db', statistics_component('ka', 2, 0))
+        self.assertEqual(read_statistics(path, fields=('level', 'repaired_at', 'min_ttl', 'max_local_deletion_time')),
+                         {'level': 2, 'repaired_at': 0, 'min_ttl': 0, 'max_local_deletion_time': 20})
+        self.assertEqual(read_statistics(path, fields=('min_local_deletion_time', 'partitioner', 'bloom_filter_fp_chance')),
+                         {'min_local_deletion_time': INT_MAX, 'partitioner': 'org.apache.cassandra.dht.Murmur3Partitioner', 'bloom_filter_fp_chance': 0.01})
+
+        path = self.write('mc-1-big-Statistics.db', statistics_component('mc', 1, 1234567))
+        statistics = read_statistics(path)
+        self.assertEqual(dict((field, statistics[field]) for field in ('min_timestamp', 'max_timestamp', 'min_local_deletion_time',
+                                                                       'max_local_deletion_time', 'min_ttl', 'max_ttl', 'compression_ratio',
+                                                                       'level', 'repaired_at')),
+                         {'min_timestamp': 1000, 'max_timestamp': 2000, 'min_local_deletion_time': 10, 'max_local_deletion_time': 20,
+                          'min_ttl': 30, 'max_ttl': 40, 'compression_ratio': 0.5, 'level': 1, 'repaired_at': 1234567})
+        self.assertRaises(ValueError, read_statistics, path, fields=('unknown',))
+
+    def test_droppable_tombstone_ratio(self):
+        # 10 cells with 1 column, 10 with 2: 30 columns, by mean * count, as Cassandra estimates them
+        data = statistics_component('ma', 0, 0, column_counts=(10, 10, 0), tombstone_drop_times=((100.0, 4), (200.0, 6), (300.0, 2)))
+        path = self.write('ma-1-big-Statistics.db', data)
+
+        def ratio(gc_before):
+            return read_statistics(path, fields=('droppable_tombstone_ratio',), gc_before=gc_before)['droppable_tombstone_ratio']
+
+        # mean is ceil(30 / 20) = 2, for 20 cells
+        self.assertEqual(ratio(50), 0)
+        self.assertEqual(ratio(1000), 12 / 40.0)
+        # halfway between bins: (4 + 5) * 0.5 / 2 + 4 / 2
+        self.assertAlmostEqual(ratio(150), 4.25 / 40.0)
+        self.assertAlmostEqual(ratio(250), (6 + 4) * 0.5 / 2 / 40.0 + (6 / 2.0 + 4) / 40.0)
+
+    def test_read_directory(self):
+        ka = self.write('ks-cf-ka-1-Statistics.db', statistics_component('ka', 1, 0))
+        self.write('ks-cf-tmp-ka-2-Statistics.db', '')
+        self.write('ks-cf-ka-1-Data.db', '')
+        other = self.write('mc-1-big-Statistics.db', statistics_component('mc', 3, 5), keyspace='ks2', table='other-4567')
+
+        self.assertEqual(read_directory_statistics(self.directory, fields=('level',)), {ka: {'level': 1}, other: {'level': 3}})
+        self.assertEqual(read_directory_statistics([self.directory], keyspace='ks', table='cf', fields=('repaired_at',)), {ka: {'repaired_at': 0}})
+        self.assertEqual(read_directory_statistics(self.directory, table='other', fields=('level',)), {other: {'level': 3}})
@@ -0,0 +1,230 @@
+"""
+A background sampler of JMX metrics of every node of a cluster.
+
+    collector = self.collect_metrics()  # from a dtest.Tester
+    ... run the test ...
+    collector.assert_reaches('pending_compactions', lambda pending: pending == 0, within=60)
+
+Every `interval` seconds, the metrics of every running node are read in a
+single bulk Jolokia request, and appended to one array of floats per node
+and metric; metrics that can't be read, like those of tables that don't
+exist yet, are recorded as NaN. The samples are saved as json in
+logs/metrics at the end of every test, and with the logs of the test, when
+they are kept.
+
+Set COLLECT_METRICS=yes to collect the default metrics in every test; the
+Jolokia agent is then loaded by the nodes the test populates.
+"""
+import json
+import math
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from dtest import debug, warning
+from jmxutils import NodeAgent, make_mbean
+
+Metric = namedtuple('Metric', ('name', 'mbean', 'attribute'))
+
+THREAD_POOLS = (('request', 'MutationStage'), ('request', 'ReadStage'), ('request', 'CounterMutationStage'),
+                ('request', 'RequestResponseStage'), ('internal', 'CompactionExecutor'), ('internal', 'MemtableFlushWriter'))
+DROPPED_MESSAGES = ('MUTATION', 'COUNTER_MUTATION', 'READ', 'RANGE_SLICE')
+
+
+def default_metrics(version, tables=()):
+    """
+    Metrics of compactions, thread pools, dropped messages, caches, streaming and client request latencies.
+    Latencies are in microseconds.
+
+    @param version The Cassandra version of the cluster
+    @param tables (keyspace, table) pairs whose latencies, sstable counts and pending compactions to sample too
+    """
+    metrics = [Metric('pending_compactions', make_mbean('metrics', type='Compaction', name='PendingTasks'), 'Value'),
+               Metric('completed_compactions', make_mbean('metrics', type='Compaction', name='CompletedTasks'), 'Value')]
+    for path, pool in THREAD_POOLS:
+        for name in ('PendingTasks', 'ActiveTasks'):
+            metrics.append(Metric('{}_{}'.format(pool, name), make_mbean('metrics', type='ThreadPools', path=path, scope=pool, name=name), 'Value'))
+    for verb in DROPPED_MESSAGES:
+        metrics.append(Metric('dropped_{}'.format(verb), make_mbean('metrics', type='DroppedMessage', scope=verb, name='Dropped'), 'Count'))
+    for cache in ('KeyCache', 'RowCache'):
+        metrics.append(Metric('{}_hit_rate'.format(cache), make_mbean('metrics', type='Cache', scope=cache, name='HitRate'), 'Value'))
+    for name in ('TotalIncomingBytes', 'TotalOutgoingBytes'):
+        metrics.append(Metric('streaming_{}'.format(name), make_mbean('metrics', type='Streaming', name=name), 'Count'))
+    for scope in ('Read', 'Write', 'RangeSlice'):
+        metrics.append(Metric('client_{}_p99'.format(scope), make_mbean('metrics', type='ClientRequest', scope=scope, name='Latency'), '99thPercentile'))
+
+    type_name = 'ColumnFamily' if version < '3.0' else 'Table'
+    for keyspace, table in tables:
+        for name, attribute in (('ReadLatency', '99thPercentile'), ('WriteLatency', '99thPercentile'),
+                                ('LiveSSTableCount', 'Value'), ('PendingCompactions', 'Value')):
+            metrics.append(Metric('{}.{}_{}'.format(keyspace, table, name),
+                                  make_mbean('metrics', type=type_name, keyspace=keyspace, scope=table, name=name), attribute))
+    return metrics
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+class MetricsCollector(object):
+    """
+    Samples metrics of every running node of a cluster in a background thread.
+
+    @param cluster The ccm cluster. Nodes added after the collector started are sampled too.
+    @param metrics List of Metric. Defaults to default_metrics().
+    @param interval Time, in seconds, between samples
+    """
+
+    def __init__(self, cluster, metrics=None, interval=1.0):
+        self.cluster = cluster
+        self.metrics = list(metrics) if metrics is not None else default_metrics(cluster.version())
+        self.interval = interval
+        self.started_at = None
+        # node name -> array of sample times, and list of arrays of values, one per metric
+        self._timestamps = {}
+        self._values = {}
+        # node name -> jmxutils.NodeAgent
+        self._agents = {}
+        # (node name, pid) of the node processes that can't be sampled
+        self._unsampled = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='metrics-collector')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        next_sample = time.time()
+        while not self._stopped.is_set():
+            self.sample()
+            next_sample += self.interval
+            self._stopped.wait(max(0, next_sample - time.time()))
+
+    def _agent(self, node):
+        """
+        @return The agent of the current process of node, or None if it couldn't be started
+        """
+        if node.name not in self._agents:
+            self._agents[node.name] = NodeAgent(node, 'its metrics won\'t be collected')
+        agent = self._agents[node.name].get()
+        if agent is None and (node.name, node.pid) not in self._unsampled:
+            self._unsampled.add((node.name, node.pid))
+            warning('No metrics of {} are being sampled, as no Jolokia agent could be started for it. '
+                    'Call jmxutils.enable_jolokia_agent before starting it.'.format(node.name))
+        return agent
+
+    def sample(self):
+        """
+        Read every metric of every running node once.
+        """
+        reads = [(metric.mbean, metric.attribute) for metric in self.metrics]
+        for node in self.cluster.nodelist():
+            if not node.is_running():
+                continue
+            agent = self._agent(node)
+            if agent is None:
+                continue
+            try:
+                values = agent.read_attributes(reads, ignore_errors=True)
+            except Exception as e:
+                debug('Could not sample the metrics of {}: {}'.format(node.name, e))
+                continue
+
+            with self._lock:
+                if node.name not in self._timestamps:
+                    self._timestamps[node.name] = array('d')
+                    self._values[node.name] = [array('d') for _ in self.metrics]
+                self._timestamps[node.name].append(time.time())
+                for series, value in zip(self._values[node.name], values):
+                    series.append(_to_float(value))
+
+    def stop(self):
+        """
+        Stop sampling, and detach the Jolokia agents the collector attached.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        for agent in self._agents.values():
+            agent.stop()
+        self._agents = {}
+
+    def _metric_index(self, metric_name):
+        for i, metric in enumerate(self.metrics):
+            if metric.name == metric_name:
+                return i
+        raise KeyError('Unknown metric {}'.format(metric_name))
+
+    def node_names(self):
+        with self._lock:
+            return sorted(self._timestamps)
+
+    def series(self, node_name, metric_name):
+        """
+        @return The (time, value) samples of a metric on a node, NaN where it couldn't be read
+        """
+        index = self._metric_index(metric_name)
+        with self._lock:
+            if node_name not in self._timestamps:
+                return []
+            return zip(self._timestamps[node_name], self._values[node_name][index])
+
+    def latest(self, node_name, metric_name):
+        """
+        @return The last value of a metric that could be read on a node, or None
+        """
+        for _, value in reversed(self.series(node_name, metric_name)):
+            if not math.isnan(value):
+                return value
+        return None
+
+    def time_until(self, metric_name, predicate, node_name=None, since=None):
+        """
+        @param predicate Function of a metric's value
+        @param node_name The node to check, or None for every node
+        @param since Time, as returned by time.time(), from which samples count. Defaults to when collection started.
+        @return Seconds from since until predicate first held on the node, or on every node, in which case
+                it's the longest of their times; None if it never did
+        """
+        since = self.started_at if since is None else since
+        times = []
+        for name in ([node_name] if node_name is not None else self.node_names()):
+            reached = [t for t, value in self.series(name, metric_name) if t >= since and not math.isnan(value) and predicate(value)]
+            if not reached:
+                return None
+            times.append(reached[0] - since)
+        return max(times) if times else None
+
+    def assert_reaches(self, metric_name, predicate, within, node_name=None, since=None):
+        """
+        Assert that predicate held for a metric within `within` seconds, on node_name or on every node.
+        """
+        elapsed = self.time_until(metric_name, predicate, node_name=node_name, since=since)
+        if elapsed is None or elapsed > within:
+            latest = dict((name, self.latest(name, metric_name)) for name in ([node_name] if node_name else self.node_names()))
+            raise AssertionError('{} did not reach the expected value within {}s (took {}); latest values: {}'.format(
+                metric_name, within, 'forever' if elapsed is None else '{:.1f}s'.format(elapsed), latest))
+
+    def save(self, path):
+        """
+        Save the metrics and their samples as json, with a list of times and a list of values per metric for every node.
+        Values that couldn't be read are saved as null.
+        """
+        with self._lock:
+            data = {'interval': self.interval,
+                    'started_at': self.started_at,
+                    'metrics': [metric._asdict() for metric in self.metrics],
+                    'nodes': dict((name, {'timestamps': list(self._timestamps[name]),
+                                          'values': dict((metric.name, [None if math.isnan(value) else value for value in values])
+                                                         for metric, values in zip(self.metrics, self._values[name]))})
+                                  for name in self._timestamps)}
+        with open(path, 'w') as f:
+            json.dump(data, f)
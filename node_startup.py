@@ -0,0 +1,236 @@
+"""
+Start nodes at once, and know they are ready from the nodes themselves,
+rather than from their logs and sleeps.
+
+    startups = start_cluster(cluster)
+    startups = start_cluster(cluster, [node2, node3], jvm_args=['-Dcassandra.foo=bar'])
+
+The JVMs of the seeds among the nodes are launched first, all at once, then
+those of the other nodes, all at once, once the seeds accept CQL clients. A
+node accepts CQL clients once it answers an OPTIONS then a STARTUP request on
+its native transport port. Once every node does, the nodes are up when every
+one of them is in NORMAL mode, and sees every running node of the cluster up,
+through its FailureDetector, read over JMX. If the Jolokia agent can't be
+attached, a node is waited for to log that it sees the others up instead: it
+is in NORMAL mode already, as it starts its native transport once it joined
+the ring.
+
+How long every step took, for every node, is returned and logged, as
+NodeStartups.
+
+Nodes that bootstrap can't be started at the same time: start those one at a
+time.
+"""
+import socket
+import struct
+import time
+from collections import namedtuple
+
+from ccmlib.node import NodeError, TimeoutError
+
+from cluster_ops import run_on_nodes
+from dtest import debug
+from jmxutils import make_mbean, start_agent
+
+STARTUP_TIMEOUT = 120
+PROBE_INTERVAL = 0.1
+
+STORAGE_SERVICE = make_mbean('db', 'StorageService')
+FAILURE_DETECTOR = make_mbean('net', 'FailureDetector')
+
+# opcodes of the native protocol
+ERROR, STARTUP, READY, AUTHENTICATE, OPTIONS, SUPPORTED = 0x00, 0x01, 0x02, 0x03, 0x05, 0x06
+
+# seconds from the start of start_cluster() until the JVM of the node was launched, until it
+# accepted CQL clients and until it saw the cluster up; None for the steps that weren't run
+NodeStartup = namedtuple('NodeStartup', ['node', 'launched', 'native_transport', 'gossip'])
+
+
+class NativeProtocolError(Exception):
+    pass
+
+
+def native_protocol_version(cassandra_version):
+    """
+    @return The highest version of the native protocol a version of Cassandra supports, up to 4
+    """
+    if cassandra_version < '2.0':
+        return 1
+    if cassandra_version < '2.1':
+        return 2
+    if cassandra_version < '2.2':
+        return 3
+    return 4
+
+
+def _frame(version, opcode, body=''):
+    # the stream id is a byte before version 3, a short since
+    header = struct.pack('>BBhBi' if version >= 3 else '>BBbBi', version, 0, 0, opcode, len(body))
+    return header + body
+
+
+def _string_map(values):
+    body = struct.pack('>H', len(values))
+    for key, value in sorted(values.items()):
+        body += struct.pack('>H', len(key)) + key + struct.pack('>H', len(value)) + value
+    return body
+
+
+def _recv_exactly(sock, size):
+    data = ''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise socket.error('Connection closed')
+        data += chunk
+    return data
+
+
+def _read_frame(sock):
+    """
+    @return (opcode, body) of the next frame of sock
+    """
+    first = _recv_exactly(sock, 1)
+    version = ord(first) & 0x7f
+    header = first + _recv_exactly(sock, 8 if version >= 3 else 7)
+    opcode, length = struct.unpack('>Bi', header[-5:])
+    return opcode, _recv_exactly(sock, length)
+
+
+def _error_message(body):
+    code, length = struct.unpack('>iH', body[:6])
+    return '0x{:04x} {}'.format(code, body[6:6 + length])
+
+
+def native_transport_ready(address, port, protocol_version, timeout=5):
+    """
+    @return Whether the native transport at address:port answers an OPTIONS request, then a STARTUP request,
+            with a READY or, when clients must authenticate, with an AUTHENTICATE
+    @throws NativeProtocolError If it answers with an error, like when it doesn't support protocol_version
+    """
+    try:
+        sock = socket.create_connection((address, port), timeout)
+    except socket.error:
+        return False
+    try:
+        for opcode, body, expected in ((OPTIONS, '', (SUPPORTED,)),
+                                       (STARTUP, _string_map({'CQL_VERSION': '3.0.0'}), (READY, AUTHENTICATE))):
+            sock.sendall(_frame(protocol_version, opcode, body))
+            response, response_body = _read_frame(sock)
+            if response == ERROR:
+                raise NativeProtocolError('{}:{} answered an error to a native protocol v{} request: {}'.format(
+                    address, port, protocol_version, _error_message(response_body)))
+            if response not in expected:
+                raise NativeProtocolError('{}:{} answered with opcode 0x{:02x}, expected {}'.format(
+                    address, port, response, ' or '.join('0x{:02x}'.format(opcode) for opcode in expected)))
+        return True
+    except socket.error:
+        # not listening yet, or closing connections while still starting
+        return False
+    finally:
+        sock.close()
+
+
+def wait_for_native_transport(node, timeout=STARTUP_TIMEOUT):
+    """
+    Block until node accepts CQL clients.
+
+    @throws NodeError If node dies before
+    @throws TimeoutError If node doesn't accept CQL clients within timeout seconds
+    """
+    address, port = node.network_interfaces['binary']
+    protocol_version = native_protocol_version(node.get_cassandra_version())
+    deadline = time.time() + timeout
+    while not native_transport_ready(address, port, protocol_version):
+        if not node.is_running():
+            raise NodeError('{} died before accepting CQL clients'.format(node.name))
+        if time.time() > deadline:
+            raise TimeoutError('{} did not accept CQL clients on {}:{} within {}s'.format(node.name, address, port, timeout))
+        time.sleep(PROBE_INTERVAL)
+
+
+def _gossip_state(agent):
+    """
+    @return (whether the node of agent is in NORMAL mode, the addresses it sees up)
+    """
+    mode, states = agent.read_attributes([(STORAGE_SERVICE, 'OperationMode'), (FAILURE_DETECTOR, 'SimpleStates')], ignore_errors=True)
+    # endpoints are named /<address>
+    return mode == 'NORMAL', set(endpoint.lstrip('/') for endpoint, state in (states or {}).items() if state == 'UP')
+
+
+def wait_for_gossip(node, addresses, timeout=STARTUP_TIMEOUT, from_mark=None):
+    """
+    Block until node is in NORMAL mode, and sees every address of addresses up.
+
+    Without a Jolokia agent, node is waited for to log that it sees them up, and must accept CQL clients already.
+
+    @param from_mark Mark of the log of node from which it logs seeing the others up, when read from its log
+    @throws TimeoutError If it doesn't within timeout seconds
+    """
+    others = set(addresses) - set([node.address()])
+    agent = start_agent(node, 'gossip will be read from the log')
+    if agent is None:
+        if others:
+            node.watch_log_for(['{}.* now UP'.format(address) for address in sorted(others)], from_mark=from_mark, timeout=timeout)
+        return
+
+    deadline = time.time() + timeout
+    try:
+        while True:
+            normal, up = _gossip_state(agent)
+            if normal and others <= up:
+                return
+            if time.time() > deadline:
+                missing = ['see {} up'.format(', '.join(sorted(others - up)))] if others - up else []
+                raise TimeoutError('{} did not {} within {}s'.format(node.name, ' nor '.join(missing + ([] if normal else ['reach NORMAL mode'])), timeout))
+            time.sleep(PROBE_INTERVAL)
+    finally:
+        try:
+            agent.stop()
+        except Exception as e:
+            debug('Could not stop the Jolokia agent of {}: {}'.format(node.name, e))
+
+
+def start_cluster(cluster, nodes=None, jvm_args=None, wait_for_gossip_state=True, timeout=STARTUP_TIMEOUT, **kwargs):
+    """
+    Start every node of nodes, seeds first, and wait for them to accept CQL clients, and to see each other up.
+
+    @param nodes The nodes of cluster to start; defaults to those that aren't running
+    @param wait_for_gossip_state Whether to wait for the nodes to see each other up, and not only to accept CQL clients
+    @param timeout Time, in seconds, every node has to accept CQL clients, and to see the others up
+    @param kwargs Passed to cluster_ops.run_on_nodes: max_concurrency
+    @return A NodeStartup for every node of nodes, in the order of nodes
+    @throws dtest.MultiError With an error for every node that failed to start
+    """
+    nodes = [node for node in (nodes if nodes is not None else cluster.nodelist()) if not node.is_running()]
+    seeds = set(cluster.get_seeds())
+    marks = dict((node.name, node.mark_log()) for node in nodes)
+    start = time.time()
+    startups = {}
+
+    def launch(node):
+        node.start(wait_for_binary_proto=False, wait_other_notice=False, jvm_args=jvm_args)
+        launched = time.time() - start
+        wait_for_native_transport(node, timeout=timeout)
+        startups[node.name] = NodeStartup(node.name, launched, time.time() - start, None)
+
+    # the seeds are waited for, so the other nodes don't wait for them to gossip; if none of the nodes is a seed,
+    # the seeds are running already
+    for group in ([node for node in nodes if node.address() in seeds], [node for node in nodes if node.address() not in seeds]):
+        if group:
+            run_on_nodes(group, launch, description='start', timeout=None, **kwargs)
+
+    if wait_for_gossip_state and nodes:
+        addresses = [node.address() for node in cluster.nodelist() if node.is_running()]
+
+        def gossip(node):
+            wait_for_gossip(node, addresses, timeout=timeout, from_mark=marks[node.name])
+            startups[node.name] = startups[node.name]._replace(gossip=time.time() - start)
+
+        run_on_nodes(nodes, gossip, description='wait for gossip', timeout=None, **kwargs)
+
+    for node in nodes:
+        debug('{} launched in {:.1f}s, accepted CQL clients in {:.1f}s{}'.format(
+            node.name, startups[node.name].launched, startups[node.name].native_transport,
+            ', saw the cluster up in {:.1f}s'.format(startups[node.name].gossip) if startups[node.name].gossip is not None else ''))
+    return [startups[node.name] for node in nodes]
@@ -0,0 +1,201 @@
+"""
+Run common nodetool commands through the Jolokia agent of a node, instead of
+starting a nodetool JVM for each of them.
+
+    nodetool = JmxNodetool(node)
+    nodetool.flush()
+    out, err = nodetool.nodetool('disableautocompaction ks cf')
+    nodetool.close()
+
+Commands run over JMX call the same StorageService, StorageProxy and
+BatchlogManager operations as nodetool does, and print nothing, as nodetool
+does when they succeed. Everything else, like commands with output to parse
+(status, repair, ...), commands with options, and commands that couldn't be
+sent to the agent, are run by the nodetool binary, so that callers get
+nodetool's output and errors. Commands whose operation was sent and failed
+raise, as running them again could run them twice.
+"""
+import shlex
+
+from dtest import debug
+from jmxutils import NodeAgent, make_mbean
+
+STORAGE_SERVICE = make_mbean('db', 'StorageService')
+STORAGE_PROXY = make_mbean('db', 'StorageProxy')
+BATCHLOG_MANAGER = make_mbean('db', 'BatchlogManager')
+
+KEYSPACE_TABLES = 'java.lang.String,[Ljava.lang.String;'
+
+# commands taking an optional keyspace and tables -> operation run for each keyspace
+KEYSPACE_OPERATIONS = {
+    'flush': 'forceKeyspaceFlush({})'.format(KEYSPACE_TABLES),
+    'enableautocompaction': 'enableAutoCompaction({})'.format(KEYSPACE_TABLES),
+    'disableautocompaction': 'disableAutoCompaction({})'.format(KEYSPACE_TABLES),
+}
+
+# commands without arguments -> (mbean, operation, arguments)
+OPERATIONS = {
+    'drain': (STORAGE_SERVICE, 'drain()', []),
+    'enablebinary': (STORAGE_SERVICE, 'startNativeTransport()', []),
+    'disablebinary': (STORAGE_SERVICE, 'stopNativeTransport()', []),
+    'enablethrift': (STORAGE_SERVICE, 'startRPCServer()', []),
+    'disablethrift': (STORAGE_SERVICE, 'stopRPCServer()', []),
+    'enablegossip': (STORAGE_SERVICE, 'startGossiping()', []),
+    'disablegossip': (STORAGE_SERVICE, 'stopGossiping()', []),
+    'enablebackup': (STORAGE_SERVICE, 'setIncrementalBackupsEnabled(boolean)', [True]),
+    'disablebackup': (STORAGE_SERVICE, 'setIncrementalBackupsEnabled(boolean)', [False]),
+    'enablehandoff': (STORAGE_PROXY, 'setHintedHandoffEnabled(boolean)', [True]),
+    'disablehandoff': (STORAGE_PROXY, 'setHintedHandoffEnabled(boolean)', [False]),
+    'replaybatchlog': (BATCHLOG_MANAGER, 'forceBatchlogReplay()', []),
+}
+
+# commands setting a number -> (mbean, operation)
+SETTERS = {
+    'setcompactionthroughput': (STORAGE_SERVICE, 'setCompactionThroughputMbPerSec(int)'),
+    'setstreamthroughput': (STORAGE_SERVICE, 'setStreamThroughputMbPerSec(int)'),
+}
+
+
+class Unsupported(Exception):
+    """
+    Raised for commands, or arguments of commands, that are left to the nodetool binary.
+    """
+
+
+class _ExecutionCounter(object):
+    """
+    A JolokiaAgent that counts the operations it was asked to execute.
+    """
+
+    def __init__(self, jmx):
+        self.jmx = jmx
+        self.executions = 0
+
+    def read_attribute(self, *args, **kwargs):
+        return self.jmx.read_attribute(*args, **kwargs)
+
+    def execute_method(self, *args, **kwargs):
+        self.executions += 1
+        return self.jmx.execute_method(*args, **kwargs)
+
+
+def _host_address(endpoint):
+    """
+    @return The address of an InetAddress, as serialized by Jolokia
+    """
+    if isinstance(endpoint, dict):
+        return endpoint['hostAddress']
+    # InetAddress.toString() is hostname/address
+    return endpoint.split('/')[-1]
+
+
+class JmxNodetool(object):
+    """
+    A nodetool for a node, that runs the commands it can over a persistent Jolokia connection.
+
+    The Jolokia agent is the one loaded at node start by jmxutils.enable_jolokia_agent,
+    or else it is attached to the node the first time it is needed. If it can't be,
+    every command of that node process is run by the nodetool binary.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self._jmx = NodeAgent(node, 'nodetool commands will be run by nodetool')
+
+    def nodetool(self, cmd, capture_output=True):
+        """
+        Run a nodetool command, like node.nodetool(cmd) does.
+
+        @return (stdout, stderr)
+        """
+        args = shlex.split(cmd)
+        try:
+            operation = self._operation(args[0], args[1:]) if args else None
+        except Unsupported:
+            operation = None
+        # the agent is only attached for the commands it can run
+        jmx = self._jmx.get() if operation is not None and self.node.is_running() else None
+        if jmx is not None:
+            counter = _ExecutionCounter(jmx)
+            try:
+                return operation(counter) or '', ''
+            except Exception as e:
+                if counter.executions:
+                    # the operation, or some of its operations, may have run, and would run again
+                    raise
+                debug('nodetool {} failed over JMX on {}, running nodetool: {}'.format(cmd, self.node.name, e))
+        return self.node.nodetool(cmd, capture_output=capture_output)
+
+    def _operation(self, command, args):
+        """
+        @return A function running command over a Jolokia connection, and returning what nodetool prints for it
+        @throws Unsupported If command is left to the nodetool binary
+        """
+        if any(arg.startswith('-') for arg in args) and command != 'compact':
+            raise Unsupported()
+
+        if command in KEYSPACE_OPERATIONS:
+            def run(jmx):
+                for keyspace, tables in self._keyspaces_and_tables(jmx, args):
+                    jmx.execute_method(STORAGE_SERVICE, KEYSPACE_OPERATIONS[command], [keyspace, tables], timeout=None)
+            return run
+        if command == 'compact':
+            return self._compact(args)
+        if command in OPERATIONS and not args:
+            mbean, operation, arguments = OPERATIONS[command]
+            return lambda jmx: jmx.execute_method(mbean, operation, arguments, timeout=None)
+        if command in SETTERS and len(args) == 1 and args[0].isdigit():
+            mbean, operation = SETTERS[command]
+            return lambda jmx: jmx.execute_method(mbean, operation, [int(args[0])])
+        if command == 'getendpoints' and len(args) == 3:
+            def getendpoints(jmx):
+                endpoints = jmx.execute_method(STORAGE_SERVICE, 'getNaturalEndpoints(java.lang.String,java.lang.String,java.lang.String)', args)
+                return ''.join(_host_address(endpoint) + '\n' for endpoint in endpoints)
+            return getendpoints
+        raise Unsupported()
+
+    def _keyspaces_and_tables(self, jmx, args):
+        """
+        @return (keyspace, tables) pairs a command with an optional keyspace and tables applies to
+        """
+        if args:
+            return [(args[0], args[1:])]
+        return [(keyspace, []) for keyspace in jmx.read_attribute(STORAGE_SERVICE, 'Keyspaces')]
+
+    def _compact(self, args):
+        """
+        @return A function running compact over a Jolokia connection
+        @throws Unsupported If the options of compact are left to the nodetool binary
+        """
+        split_output = False
+        if args and args[0] in ('-s', '--split-output'):
+            split_output = True
+            args = args[1:]
+        # splitting the output came in 2.2
+        before_split_output = self.node.get_cassandra_version() < '2.2'
+        if any(arg.startswith('-') for arg in args) or (split_output and before_split_output):
+            raise Unsupported()
+
+        def compact(jmx):
+            for keyspace, tables in self._keyspaces_and_tables(jmx, args):
+                if before_split_output:
+                    jmx.execute_method(STORAGE_SERVICE, 'forceKeyspaceCompaction({})'.format(KEYSPACE_TABLES), [keyspace, tables], timeout=None)
+                else:
+                    jmx.execute_method(STORAGE_SERVICE, 'forceKeyspaceCompaction(boolean,{})'.format(KEYSPACE_TABLES),
+                                       [split_output, keyspace, tables], timeout=None)
+        return compact
+
+    def flush(self, options=None):
+        self.nodetool(' '.join(['flush'] + (options or [])))
+
+    def compact(self, options=None):
+        self.nodetool(' '.join(['compact'] + (options or [])))
+
+    def drain(self, block_on_log=False):
+        mark = self.node.mark_log()
+        self.nodetool('drain')
+        if block_on_log:
+            self.node.watch_log_for('DRAINED', from_mark=mark)
+
+    def close(self):
+        self._jmx.stop()
@@ -2,12 +2,12 @@ import json
 import os
 import random
 import re
-import subprocess
-
-from ccmlib import common
 
+from compaction_observer import CompactionObserver
 from dtest import Tester, debug
+from tool_runner import run_tool
 from tools import known_failure, since
+from utils.sstable_metadata import sstable_statistics
 
 
 class TestOfflineTools(Tester):
@@ -68,9 +68,9 @@ class TestOfflineTools(Tester):
         self.wait_for_compactions(node1)
         cluster.stop()
 
-        initial_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
+        initial_levels = self.get_levels(node1)
         (output, error, rc) = node1.run_sstablelevelreset("keyspace1", "standard1", output=True)
-        final_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
+        final_levels = self.get_levels(node1)
         self._check_stderr_error(error)
         self.assertEqual(rc, 0, msg=str(rc))
 
@@ -83,16 +83,12 @@ class TestOfflineTools(Tester):
         # let's check all sstables are on L0 after sstablelevelreset
         self.assertTrue(max(final_levels) == 0)
 
-    def get_levels(self, data):
-        (out, err, rc) = data
-        return map(int, re.findall("SSTable Level: ([0-9])", out))
+    def get_levels(self, node):
+        return [statistics['level'] for statistics in sstable_statistics(node, 'keyspace1', 'standard1', fields=('level',)).values()]
 
     def wait_for_compactions(self, node):
-        pattern = re.compile("pending tasks: 0")
-        while True:
-            output, err = node.nodetool("compactionstats", capture_output=True)
-            if pattern.search(output):
-                break
+        with CompactionObserver(node) as observer:
+            observer.wait_for_quiescence()
 
     @known_failure(failure_source='test',
                    jira_url='https://issues.apache.org/jira/browse/CASSANDRA-12275',
@@ -171,14 +167,14 @@ class TestOfflineTools(Tester):
 
         # Let's reset all sstables to L0
         debug("Getting initial levels")
-        initial_levels = list(self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"])))
+        initial_levels = self.get_levels(node1)
         self.assertNotEqual([], initial_levels)
         debug('initial_levels:')
         debug(initial_levels)
         debug("Running sstablelevelreset")
         (output, error, rc) = node1.run_sstablelevelreset("keyspace1", "standard1", output=True)
         debug("Getting final levels")
-        final_levels = list(self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"])))
+        final_levels = self.get_levels(node1)
         self.assertNotEqual([], final_levels)
         debug('final levels:')
         debug(final_levels)
@@ -190,11 +186,11 @@ class TestOfflineTools(Tester):
 
         # time to relevel sstables
         debug("Getting initial levels")
-        initial_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
+        initial_levels = self.get_levels(node1)
         debug("Running sstableofflinerelevel")
         (output, error, rc) = node1.run_sstableofflinerelevel("keyspace1", "standard1", output=True)
         debug("Getting final levels")
-        final_levels = self.get_levels(node1.run_sstablemetadata(keyspace="keyspace1", column_families=["standard1"]))
+        final_levels = self.get_levels(node1)
 
         debug(output)
         debug(error)
@@ -420,10 +416,7 @@ class TestOfflineTools(Tester):
         # Remove any temporary files
         tool_bin = node.get_tool('sstableutil')
         if os.path.isfile(tool_bin):
-            args = [tool_bin, '--type', 'tmp', ks, table]
-            env = common.make_cassandra_env(node.get_install_cassandra_root(), node.get_node_cassandra_root())
-            p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            (stdout, stderr) = p.communicate()
+            (stdout, stderr, _) = run_tool(node, 'sstableutil', ['--type', 'tmp', ks, table])
             tmpsstables = map(os.path.normcase, stdout.splitlines())
 
             ret = list(set(allsstables) - set(tmpsstables))
@@ -0,0 +1,250 @@
+"""
+Fetch the pages of a paged query one at a time, for tests of paging.
+"""
+import threading
+import time
+
+from token_ranges import RangeDigest, encode_row
+
+
+class Page(object):
+    """
+    One non-empty page of results, with its metrics.
+
+    `row_count` is the number of rows on the page, `size` the approximate
+    size of their values in bytes and `latency` the time, in seconds, between
+    requesting the page and receiving it. Unless the page was fetched in
+    streaming mode, `data` holds its rows, and their size and digest are only
+    computed when asked for; in streaming mode, they are computed as rows are
+    added, in place of keeping them.
+    """
+    data = None
+
+    def __init__(self, keep_rows=True, latency=None):
+        self.data = [] if keep_rows else None
+        self.row_count = 0
+        self.latency = latency
+        self._size = 0
+        self._digest = RangeDigest()
+        # rows of data already accounted for in _size and _digest
+        self._encoded_rows = 0
+
+    def add_row(self, row):
+        self.row_count += 1
+        if self.data is not None:
+            self.data.append(row)
+        else:
+            self._encode(row)
+
+    def _encode(self, row):
+        # dict_factory rows are encoded as maps rather than by their keys
+        encoded = encode_row([row] if isinstance(row, dict) else row)
+        self._size += len(encoded)
+        self._digest.add_encoded(encoded)
+
+    def _encode_kept_rows(self):
+        if self.data is not None:
+            for row in self.data[self._encoded_rows:]:
+                self._encode(row)
+            self._encoded_rows = len(self.data)
+
+    @property
+    def size(self):
+        self._encode_kept_rows()
+        return self._size
+
+    @property
+    def digest(self):
+        self._encode_kept_rows()
+        return self._digest
+
+
+class PageFetcher(object):
+    """
+    Requests pages, handles their receipt,
+    and provides paged data for testing.
+
+    The first page is automatically retrieved, so an initial
+    call to request_one is actually getting the *second* page!
+
+    With streaming=True rows aren't kept: only the metrics and digest of each
+    page are, so that very large results can be paged through. page_data and
+    all_data aren't available in that mode; compare digest() to a RangeDigest
+    of the expected rows instead.
+    """
+    pages = None
+    error = None
+    future = None
+    requested_pages = None
+    retrieved_pages = None
+    retrieved_empty_pages = None
+
+    def __init__(self, future, streaming=False):
+        self.pages = []
+        self.streaming = streaming
+        self._condition = threading.Condition()
+
+        # the first page is automagically returned (eventually)
+        # so we'll count this as a request, but the retrieved count
+        # won't be incremented until it actually arrives
+        self.requested_pages = 1
+        self.retrieved_pages = 0
+        self.retrieved_empty_pages = 0
+        self._requested_at = time.time()
+
+        self.future = future
+        self.future.add_callbacks(
+            callback=self.handle_page,
+            errback=self.handle_error
+        )
+
+        # wait for the first page to arrive, otherwise we may call
+        # future.has_more_pages too early, since it should only be
+        # called after the first page is returned
+        self.wait(seconds=30)
+
+    def handle_page(self, rows):
+        latency = time.time() - self._requested_at
+
+        # occasionally get a final blank page that is useless
+        if not rows:
+            with self._condition:
+                self.retrieved_empty_pages += 1
+                self._condition.notify_all()
+            return
+
+        page = Page(keep_rows=not self.streaming, latency=latency)
+        for row in rows:
+            page.add_row(row)
+
+        with self._condition:
+            self.pages.append(page)
+            self.retrieved_pages += 1
+            self._condition.notify_all()
+
+    def handle_error(self, exc):
+        with self._condition:
+            self.error = exc
+            self._condition.notify_all()
+
+    def _request_next_page(self, timeout):
+        with self._condition:
+            self.requested_pages += 1
+            self._requested_at = time.time()
+        self.future.start_fetching_next_page()
+        self.wait(seconds=timeout)
+
+    def request_one(self, timeout=None):
+        """
+        Requests the next page if there is one.
+
+        If the future is exhausted, this is a no-op.
+        @param timeout Time, in seconds, to wait for the page.
+        """
+        if self.future.has_more_pages:
+            self._request_next_page(timeout)
+
+        return self
+
+    def request_all(self, timeout=None):
+        """
+        Requests any remaining pages.
+
+        If the future is exhausted, this is a no-op.
+        @param timeout Time, in seconds, to wait for each page.
+        """
+        while self.future.has_more_pages:
+            self._request_next_page(timeout)
+
+        return self
+
+    def wait(self, seconds=None):
+        """
+        Blocks until all *requested* pages have been returned.
+
+        Requests are made by calling request_one and/or request_all.
+
+        Raises the query's error if fetching a page failed, and RuntimeError
+        if seconds is exceeded.
+        """
+        expiry = time.time() + (5 if seconds is None else seconds)
+
+        with self._condition:
+            while self.error is None and self.requested_pages != (self.retrieved_pages + self.retrieved_empty_pages):
+                remaining = expiry - time.time()
+                if remaining <= 0:
+                    raise RuntimeError(
+                        "Requested pages were not delivered before timeout. "
+                        + "Requested: %d; retrieved: %d; empty retrieved: %d"
+                        % (self.requested_pages, self.retrieved_pages, self.retrieved_empty_pages))
+                self._condition.wait(remaining)
+
+            if self.error is not None:
+                raise self.error
+
+        return self
+
+    def pagecount(self):
+        """
+        Returns count of *retrieved* pages which were not empty.
+
+        Pages are retrieved by requesting them with request_one and/or request_all.
+        """
+        return len(self.pages)
+
+    def num_results(self, page_num):
+        """
+        Returns the number of results found at page_num
+        """
+        return self.pages[page_num - 1].row_count
+
+    def num_results_all(self):
+        return [page.row_count for page in self.pages]
+
+    def page_metrics(self):
+        """
+        Returns a (row count, size in bytes, latency in seconds) tuple for each retrieved page.
+        """
+        return [(page.row_count, page.size, page.latency) for page in self.pages]
+
+    def digest(self):
+        """
+        Returns a RangeDigest of all retrieved rows, available in streaming mode too.
+        """
+        digest = RangeDigest()
+        for page in self.pages:
+            digest.merge(page.digest)
+        return digest
+
+    def _check_rows_kept(self):
+        if self.streaming:
+            raise RuntimeError("Rows are not kept when paging in streaming mode; use digest() or num_results_all() instead.")
+
+    def page_data(self, page_num):
+        """
+        Returns retreived data found at pagenum.
+
+        The page should have already been requested with request_one and/or request_all.
+        """
+        self._check_rows_kept()
+        return self.pages[page_num - 1].data
+
+    def all_data(self):
+        """
+        Returns all retrieved data flattened into a single list (instead of separated into Page objects).
+
+        The page(s) should have already been requested with request_one and/or request_all.
+        """
+        self._check_rows_kept()
+        all_pages_combined = []
+        for page in self.pages:
+            all_pages_combined.extend(page.data[:])
+
+        return all_pages_combined
+
+    @property  # make property to match python driver api
+    def has_more_pages(self):
+        """
+        Returns bool indicating if there are any pages not retrieved.
+        """
+        return self.future.has_more_pages
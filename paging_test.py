@@ -2,7 +2,10 @@ import time
 import uuid
 
 from cassandra import ConsistencyLevel as CL
-from cassandra import InvalidRequest, ReadFailure, ReadTimeout
+from cassandra import (InvalidRequest, OperationTimedOut, ReadFailure,
+                       ReadTimeout, Unavailable)
+from cassandra.cluster import NoHostAvailable
+from cassandra.concurrent import execute_concurrent_with_args
 from cassandra.policies import FallthroughRetryPolicy
 from cassandra.query import (SimpleStatement, dict_factory,
                              named_tuple_factory, tuple_factory)
@@ -10,165 +13,10 @@ from cassandra.query import (SimpleStatement, dict_factory,
 from assertions import assert_invalid, assert_all, assert_one, assert_length_equal
 from datahelp import create_rows, flatten_into_set, parse_data_into_dicts
 from dtest import debug, Tester, run_scenarios
+from page_fetcher import Page, PageFetcher
 from tools import known_failure, rows_to_list, since
 
 
-class Page(object):
-    data = None
-
-    def __init__(self):
-        self.data = []
-
-    def add_row(self, row):
-        self.data.append(row)
-
-
-class PageFetcher(object):
-    """
-    Requests pages, handles their receipt,
-    and provides paged data for testing.
-
-    The first page is automatically retrieved, so an initial
-    call to request_one is actually getting the *second* page!
-    """
-    pages = None
-    error = None
-    future = None
-    requested_pages = None
-    retrieved_pages = None
-    retrieved_empty_pages = None
-
-    def __init__(self, future):
-        self.pages = []
-
-        # the first page is automagically returned (eventually)
-        # so we'll count this as a request, but the retrieved count
-        # won't be incremented until it actually arrives
-        self.requested_pages = 1
-        self.retrieved_pages = 0
-        self.retrieved_empty_pages = 0
-
-        self.future = future
-        self.future.add_callbacks(
-            callback=self.handle_page,
-            errback=self.handle_error
-        )
-
-        # wait for the first page to arrive, otherwise we may call
-        # future.has_more_pages too early, since it should only be
-        # called after the first page is returned
-        self.wait(seconds=30)
-
-    def handle_page(self, rows):
-        # occasionally get a final blank page that is useless
-        if rows == []:
-            self.retrieved_empty_pages += 1
-            return
-
-        page = Page()
-        self.pages.append(page)
-
-        for row in rows:
-            page.add_row(row)
-
-        self.retrieved_pages += 1
-
-    def handle_error(self, exc):
-        self.error = exc
-        raise exc
-
-    def request_one(self):
-        """
-        Requests the next page if there is one.
-
-        If the future is exhausted, this is a no-op.
-        """
-        if self.future.has_more_pages:
-            self.future.start_fetching_next_page()
-            self.requested_pages += 1
-            self.wait()
-
-        return self
-
-    def request_all(self):
-        """
-        Requests any remaining pages.
-
-        If the future is exhausted, this is a no-op.
-        """
-        while self.future.has_more_pages:
-            self.future.start_fetching_next_page()
-            self.requested_pages += 1
-            self.wait()
-
-        return self
-
-    def wait(self, seconds=5):
-        """
-        Blocks until all *requested* pages have been returned.
-
-        Requests are made by calling request_one and/or request_all.
-
-        Raises RuntimeError if seconds is exceeded.
-        """
-        expiry = time.time() + seconds
-
-        while time.time() < expiry:
-            if self.requested_pages == (self.retrieved_pages + self.retrieved_empty_pages):
-                return self
-            # small wait so we don't need excess cpu to keep checking
-            time.sleep(0.1)
-
-        raise RuntimeError(
-            "Requested pages were not delivered before timeout." +
-            "Requested: %d; retrieved: %d; empty retrieved: %d" %
-            (self.requested_pages, self.retrieved_pages, self.retrieved_empty_pages))
-
-    def pagecount(self):
-        """
-        Returns count of *retrieved* pages which were not empty.
-
-        Pages are retrieved by requesting them with request_one and/or request_all.
-        """
-        return len(self.pages)
-
-    def num_results(self, page_num):
-        """
-        Returns the number of results found at page_num
-        """
-        return len(self.pages[page_num - 1].data)
-
-    def num_results_all(self):
-        return [len(page.data) for page in self.pages]
-
-    def page_data(self, page_num):
-        """
-        Returns retreived data found at pagenum.
-
-        The page should have already been requested with request_one and/or request_all.
-        """
-        return self.pages[page_num - 1].data
-
-    def all_data(self):
-        """
-        Returns all retrieved data flattened into a single list (instead of separated into Page objects).
-
-        The page(s) should have already been requested with request_one and/or request_all.
-        """
-        all_pages_combined = []
-        for page in self.pages:
-            all_pages_combined.extend(page.data[:])
-
-        return all_pages_combined
-
-    @property  # make property to match python driver api
-    def has_more_pages(self):
-        """
-        Returns bool indicating if there are any pages not retrieved.
-        """
-        return self.future.has_more_pages
-
-
 class PageAssertionMixin(object):
     """Can be added to subclasses of unittest.Tester"""
 
@@ -330,6 +178,35 @@ class TestPagingSize(BasePagingTester, PageAssertionMixin):
         # make sure expected and actual have same data elements (ignoring order)
         self.assertEqualIgnoreOrder(pf.all_data(), expected_data)
 
+    def test_streaming_through_large_partition(self):
+        """
+        Paging through a wide partition without keeping its rows returns
+        full pages of the requested size, and the rows that were written.
+        """
+        session = self.prepare()
+        self.create_ks(session, 'test_paging_size', 2)
+        session.execute("CREATE TABLE paging_test ( id int, c int, value text, PRIMARY KEY (id, c) )")
+
+        value = 'x' * 1024
+        insert = session.prepare("INSERT INTO paging_test (id, c, value) VALUES (1, ?, ?)")
+        insert.consistency_level = CL.ALL
+        execute_concurrent_with_args(session, insert, [(c, value) for c in xrange(20000)])
+
+        future = session.execute_async(
+            SimpleStatement("select * from paging_test where id = 1", fetch_size=1000, consistency_level=CL.ALL)
+        )
+        pf = PageFetcher(future, streaming=True).request_all(timeout=30)
+
+        self.assertEqual(pf.num_results_all(), [1000] * 20)
+        for row_count, size, latency in pf.page_metrics():
+            debug("Fetched page of {} rows, ~{} bytes in {:.3f}s".format(row_count, size, latency))
+            self.assertGreater(size, row_count * len(value))
+
+        expected = Page()
+        for c in xrange(20000):
+            expected.add_row({u'id': 1, u'c': c, u'value': unicode(value)})
+        self.assertEqual(pf.digest(), expected.digest)
+
 
 @since('2.0')
 class TestPagingWithModifiers(BasePagingTester, PageAssertionMixin):
@@ -977,102 +854,102 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
             assert_all(session, "SELECT * FROM test WHERE c = 2 ALLOW FILTERING", [[1, 2, 1, 2, 3],
                                                                                    [0, 2, 0, 2, 2],
                                                                                    [4, 2, 4, 2, 6],
-                                                                                   [3, 2, 3, 2, 5]])
+                                                                                   [3, 2, 3, 2, 5]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE c > 1 AND c <= 2 ALLOW FILTERING", [[1, 2, 1, 2, 3],
                                                                                               [0, 2, 0, 2, 2],
                                                                                               [4, 2, 4, 2, 6],
-                                                                                              [3, 2, 3, 2, 5]])
+                                                                                              [3, 2, 3, 2, 5]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE c = 2 AND d > 4 ALLOW FILTERING", [[4, 2, 4, 2, 6],
-                                                                                             [3, 2, 3, 2, 5]])
+                                                                                             [3, 2, 3, 2, 5]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE c = 2 AND s > 1 ALLOW FILTERING", [[4, 2, 4, 2, 6],
-                                                                                             [3, 2, 3, 2, 5]])
+                                                                                             [3, 2, 3, 2, 5]], prepared=True)
 
             # Range queries with LIMIT
             assert_all(session, "SELECT * FROM test WHERE c = 2 LIMIT 2 ALLOW FILTERING", [[1, 2, 1, 2, 3],
-                                                                                           [0, 2, 0, 2, 2]])
+                                                                                           [0, 2, 0, 2, 2]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE c = 2 AND s >= 1 LIMIT 2 ALLOW FILTERING", [[1, 2, 1, 2, 3],
-                                                                                                      [4, 2, 4, 2, 6]])
+                                                                                                      [4, 2, 4, 2, 6]], prepared=True)
 
             # Range query with DISTINCT
             assert_all(session, "SELECT DISTINCT a, s FROM test WHERE s >= 1 ALLOW FILTERING", [[1, 1],
                                                                                                 [2, 2],
                                                                                                 [4, 4],
-                                                                                                [3, 3]])
+                                                                                                [3, 3]], prepared=True)
 
             # Range query with DISTINCT and LIMIT
             assert_all(session, "SELECT DISTINCT a, s FROM test WHERE s >= 1 LIMIT 2 ALLOW FILTERING", [[1, 1],
-                                                                                                        [2, 2]])
+                                                                                                        [2, 2]], prepared=True)
 
             # Single partition queries
             assert_all(session, "SELECT * FROM test WHERE a = 0 AND c >= 1 ALLOW FILTERING", [[0, 1, 0, 1, 1],
                                                                                               [0, 2, 0, 2, 2],
-                                                                                              [0, 3, 0, 3, 3]])
+                                                                                              [0, 3, 0, 3, 3]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a= 0 AND c >= 1 AND c <=2 ALLOW FILTERING", [[0, 1, 0, 1, 1],
-                                                                                                       [0, 2, 0, 2, 2]])
+                                                                                                       [0, 2, 0, 2, 2]], prepared=True)
 
-            assert_one(session, "SELECT * FROM test WHERE a = 0 AND c >= 1 AND d = 1 ALLOW FILTERING", [0, 1, 0, 1, 1])
+            assert_one(session, "SELECT * FROM test WHERE a = 0 AND c >= 1 AND d = 1 ALLOW FILTERING", [0, 1, 0, 1, 1], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 3 AND c >= 1 AND s > 1 ALLOW FILTERING", [[3, 1, 3, 1, 4],
                                                                                                         [3, 2, 3, 2, 5],
-                                                                                                        [3, 3, 3, 3, 6]])
+                                                                                                        [3, 3, 3, 3, 6]], prepared=True)
 
             # Single partition queries with LIMIT
             assert_all(session, "SELECT * FROM test WHERE a = 0 AND c >= 1 LIMIT 2 ALLOW FILTERING", [[0, 1, 0, 1, 1],
-                                                                                                      [0, 2, 0, 2, 2]])
+                                                                                                      [0, 2, 0, 2, 2]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 3 AND c >= 1 AND s > 1 LIMIT 2 ALLOW FILTERING", [[3, 1, 3, 1, 4],
-                                                                                                                [3, 2, 3, 2, 5]])
+                                                                                                                [3, 2, 3, 2, 5]], prepared=True)
 
             #  Single partition query with DISTINCT
-            assert_one(session, "SELECT DISTINCT a, s FROM test WHERE a = 2 AND s >= 1 ALLOW FILTERING", [2, 2])
+            assert_one(session, "SELECT DISTINCT a, s FROM test WHERE a = 2 AND s >= 1 ALLOW FILTERING", [2, 2], prepared=True)
 
             # Single partition query with ORDER BY
             assert_all(session, "SELECT * FROM test WHERE a = 0 AND c >= 1 ORDER BY b DESC ALLOW FILTERING", [[0, 3, 0, 3, 3],
                                                                                                               [0, 2, 0, 2, 2],
-                                                                                                              [0, 1, 0, 1, 1]])
+                                                                                                              [0, 1, 0, 1, 1]], prepared=True)
 
             # Single partition query with ORDER BY and LIMIT
             assert_all(session, "SELECT * FROM test WHERE a = 0 AND c >= 1 ORDER BY b DESC LIMIT 2 ALLOW FILTERING", [[0, 3, 0, 3, 3],
-                                                                                                                      [0, 2, 0, 2, 2]])
+                                                                                                                      [0, 2, 0, 2, 2]], prepared=True)
 
             # Multi-partitions queries
             assert_all(session, "SELECT * FROM test WHERE a IN (0, 1, 2, 3, 4) AND  c = 2 ALLOW FILTERING", [[0, 2, 0, 2, 2],
                                                                                                              [1, 2, 1, 2, 3],
                                                                                                              [3, 2, 3, 2, 5],
-                                                                                                             [4, 2, 4, 2, 6]])
+                                                                                                             [4, 2, 4, 2, 6]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a IN (0, 1, 2, 3, 4) AND c > 1 AND c <=2 ALLOW FILTERING", [[0, 2, 0, 2, 2],
                                                                                                                       [1, 2, 1, 2, 3],
                                                                                                                       [3, 2, 3, 2, 5],
-                                                                                                                      [4, 2, 4, 2, 6]])
+                                                                                                                      [4, 2, 4, 2, 6]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a IN (0, 1, 2, 3, 4) AND c = 2 AND d > 4 ALLOW FILTERING", [[3, 2, 3, 2, 5],
-                                                                                                                      [4, 2, 4, 2, 6]])
+                                                                                                                      [4, 2, 4, 2, 6]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a IN (0, 1, 2, 3, 4) AND c = 2 AND s > 1 ALLOW FILTERING", [[3, 2, 3, 2, 5],
-                                                                                                                      [4, 2, 4, 2, 6]])
+                                                                                                                      [4, 2, 4, 2, 6]], prepared=True)
 
             # Multi-partitions queries with LIMIT
             assert_all(session, "SELECT * FROM test WHERE a IN (0, 1, 2, 3, 4) AND c = 2 LIMIT 2 ALLOW FILTERING", [[0, 2, 0, 2, 2],
-                                                                                                                    [1, 2, 1, 2, 3]])
+                                                                                                                    [1, 2, 1, 2, 3]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a IN (0, 1, 2, 3, 4) AND c = 2 AND s >= 1 LIMIT 2 ALLOW FILTERING", [[1, 2, 1, 2, 3],
-                                                                                                                               [3, 2, 3, 2, 5]])
+                                                                                                                               [3, 2, 3, 2, 5]], prepared=True)
 
             # Multi-partitions query with DISTINCT
             assert_all(session, "SELECT DISTINCT a, s FROM test WHERE a IN (0, 1, 2, 3, 4) AND s >= 1 ALLOW FILTERING", [[1, 1],
                                                                                                                          [2, 2],
                                                                                                                          [3, 3],
-                                                                                                                         [4, 4]])
+                                                                                                                         [4, 4]], prepared=True)
 
             # Multi-partitions query with DISTINCT and LIMIT
             assert_all(session, "SELECT DISTINCT a, s FROM test WHERE a IN (0, 1, 2, 3, 4) AND s >= 1 LIMIT 2 ALLOW FILTERING", [[1, 1],
-                                                                                                                                 [2, 2]])
+                                                                                                                                 [2, 2]], prepared=True)
 
     def _test_paging_with_filtering_on_counter_columns(self, session, with_compact_storage):
         if with_compact_storage:
@@ -1167,55 +1044,55 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                                                        [4, 6, 7, 8],
                                                                                                        [4, 7, 8, 9],
                                                                                                        [4, 8, 9, 10],
-                                                                                                       [4, 9, 10, 11]])
+                                                                                                       [4, 9, 10, 11]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 4 AND b > 3 AND c > 3 LIMIT 4 ALLOW FILTERING", [[4, 4, 5, 6],
                                                                                                                [4, 5, 6, 7],
                                                                                                                [4, 6, 7, 8],
-                                                                                                               [4, 7, 8, 9]])
+                                                                                                               [4, 7, 8, 9]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 4 AND b > 3 AND c > 3 ORDER BY b DESC ALLOW FILTERING", [[4, 9, 10, 11],
                                                                                                                        [4, 8, 9, 10],
                                                                                                                        [4, 7, 8, 9],
                                                                                                                        [4, 6, 7, 8],
                                                                                                                        [4, 5, 6, 7],
-                                                                                                                       [4, 4, 5, 6]])
+                                                                                                                       [4, 4, 5, 6]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE b > 7 AND c > 9 ALLOW FILTERING", [[0, 9, 10, 11],
                                                                                              [1, 9, 10, 11],
                                                                                              [2, 9, 10, 11],
                                                                                              [3, 9, 10, 11],
-                                                                                             [4, 9, 10, 11]], ignore_order=True)
+                                                                                             [4, 9, 10, 11]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE b > 4 AND b < 6 AND c > 3 ALLOW FILTERING", [[0, 5, 6, 7],
                                                                                                        [1, 5, 6, 7],
                                                                                                        [2, 5, 6, 7],
                                                                                                        [3, 5, 6, 7],
-                                                                                                       [4, 5, 6, 7]], ignore_order=True)
+                                                                                                       [4, 5, 6, 7]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE d = 5 ALLOW FILTERING", [[0, 3, 4, 5],
                                                                                    [1, 3, 4, 5],
                                                                                    [2, 3, 4, 5],
                                                                                    [3, 3, 4, 5],
-                                                                                   [4, 3, 4, 5]], ignore_order=True)
+                                                                                   [4, 3, 4, 5]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE (b, c) > (4, 3) AND (b, c) < (5, 6) ALLOW FILTERING", [[0, 4, 5, 6],
                                                                                                                  [1, 4, 5, 6],
                                                                                                                  [2, 4, 5, 6],
                                                                                                                  [3, 4, 5, 6],
-                                                                                                                 [4, 4, 5, 6]], ignore_order=True)
+                                                                                                                 [4, 4, 5, 6]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE (b, c) > (2, 3) AND b < 4 ALLOW FILTERING", [[0, 3, 4, 5],
                                                                                                        [1, 3, 4, 5],
                                                                                                        [2, 3, 4, 5],
                                                                                                        [3, 3, 4, 5],
-                                                                                                       [4, 3, 4, 5]], ignore_order=True)
+                                                                                                       [4, 3, 4, 5]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test where (b, c) > (2, 2) AND b < 8 AND d = 5 ALLOW FILTERING", [[0, 3, 4, 5],
                                                                                                                  [1, 3, 4, 5],
                                                                                                                  [2, 3, 4, 5],
                                                                                                                  [3, 3, 4, 5],
-                                                                                                                 [4, 3, 4, 5]], ignore_order=True)
+                                                                                                                 [4, 3, 4, 5]], ignore_order=True, prepared=True)
 
     @since('3.6')
     def test_paging_with_filtering_on_clustering_columns(self):
@@ -1253,61 +1130,61 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                                                 [1, 9, [10, 11], 12],
                                                                                                 [2, 9, [10, 11], 12],
                                                                                                 [3, 9, [10, 11], 12],
-                                                                                                [4, 9, [10, 11], 12]], ignore_order=True)
+                                                                                                [4, 9, [10, 11], 12]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_map WHERE c CONTAINS KEY 10 ALLOW FILTERING", [[0, 9, {10: 11}, 12],
                                                                                                    [1, 9, {10: 11}, 12],
                                                                                                    [2, 9, {10: 11}, 12],
                                                                                                    [3, 9, {10: 11}, 12],
-                                                                                                   [4, 9, {10: 11}, 12]], ignore_order=True)
+                                                                                                   [4, 9, {10: 11}, 12]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_list WHERE c CONTAINS 2 AND c CONTAINS 3 ALLOW FILTERING", [[0, 1, [2, 3], 4],
                                                                                                                 [1, 1, [2, 3], 4],
                                                                                                                 [2, 1, [2, 3], 4],
                                                                                                                 [3, 1, [2, 3], 4],
-                                                                                                                [4, 1, [2, 3], 4]], ignore_order=True)
+                                                                                                                [4, 1, [2, 3], 4]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_map WHERE c CONTAINS KEY 2 AND c CONTAINS 3 ALLOW FILTERING", [[0, 1, {2: 3}, 4],
                                                                                                                    [1, 1, {2: 3}, 4],
                                                                                                                    [2, 1, {2: 3}, 4],
                                                                                                                    [3, 1, {2: 3}, 4],
-                                                                                                                   [4, 1, {2: 3}, 4]], ignore_order=True)
+                                                                                                                   [4, 1, {2: 3}, 4]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_list WHERE c CONTAINS 2 AND d = 4 ALLOW FILTERING", [[0, 1, [2, 3], 4],
                                                                                                          [1, 1, [2, 3], 4],
                                                                                                          [2, 1, [2, 3], 4],
                                                                                                          [3, 1, [2, 3], 4],
-                                                                                                         [4, 1, [2, 3], 4]], ignore_order=True)
+                                                                                                         [4, 1, [2, 3], 4]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_map WHERE c CONTAINS KEY 2 AND d = 4 ALLOW FILTERING", [[0, 1, {2: 3}, 4],
                                                                                                             [1, 1, {2: 3}, 4],
                                                                                                             [2, 1, {2: 3}, 4],
                                                                                                             [3, 1, {2: 3}, 4],
-                                                                                                            [4, 1, {2: 3}, 4]], ignore_order=True)
+                                                                                                            [4, 1, {2: 3}, 4]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_list WHERE c CONTAINS 2 AND d = 4 ALLOW FILTERING", [[0, 1, [2, 3], 4],
                                                                                                          [1, 1, [2, 3], 4],
                                                                                                          [2, 1, [2, 3], 4],
                                                                                                          [3, 1, [2, 3], 4],
-                                                                                                         [4, 1, [2, 3], 4]], ignore_order=True)
+                                                                                                         [4, 1, [2, 3], 4]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_map WHERE c CONTAINS KEY 2 AND d = 4 ALLOW FILTERING", [[0, 1, {2: 3}, 4],
                                                                                                             [1, 1, {2: 3}, 4],
                                                                                                             [2, 1, {2: 3}, 4],
                                                                                                             [3, 1, {2: 3}, 4],
-                                                                                                            [4, 1, {2: 3}, 4]], ignore_order=True)
+                                                                                                            [4, 1, {2: 3}, 4]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_list WHERE c CONTAINS 2 AND d < 4 ALLOW FILTERING", [[0, 0, [1, 2], 3],
                                                                                                          [1, 0, [1, 2], 3],
                                                                                                          [2, 0, [1, 2], 3],
                                                                                                          [3, 0, [1, 2], 3],
-                                                                                                         [4, 0, [1, 2], 3]], ignore_order=True)
+                                                                                                         [4, 0, [1, 2], 3]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test_map WHERE c CONTAINS KEY 1 AND d < 4 ALLOW FILTERING", [[0, 0, {1: 2}, 3],
                                                                                                             [1, 0, {1: 2}, 3],
                                                                                                             [2, 0, {1: 2}, 3],
                                                                                                             [3, 0, {1: 2}, 3],
-                                                                                                            [4, 0, {1: 2}, 3]], ignore_order=True)
+                                                                                                            [4, 0, {1: 2}, 3]], ignore_order=True, prepared=True)
 
     @since('3.6')
     def test_paging_with_filtering_on_static_columns(self):
@@ -1331,24 +1208,24 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
             assert_all(session, "SELECT * FROM test WHERE s > 1 AND b > 8 ALLOW FILTERING", [[1, 9, 2, 10],
                                                                                              [2, 9, 3, 10],
                                                                                              [3, 9, 4, 10],
-                                                                                             [4, 9, 5, 10]], ignore_order=True)
+                                                                                             [4, 9, 5, 10]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE s > 1 AND b > 5 AND b < 7 ALLOW FILTERING", [[1, 6, 2, 7],
                                                                                                        [2, 6, 3, 7],
                                                                                                        [4, 6, 5, 7],
-                                                                                                       [3, 6, 4, 7]], ignore_order=True)
+                                                                                                       [3, 6, 4, 7]], ignore_order=True, prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE s > 1 AND a = 3 AND b > 4 ALLOW FILTERING", [[3, 5, 4, 6],
                                                                                                        [3, 6, 4, 7],
                                                                                                        [3, 7, 4, 8],
                                                                                                        [3, 8, 4, 9],
-                                                                                                       [3, 9, 4, 10]])
+                                                                                                       [3, 9, 4, 10]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE s > 1 AND a = 3 AND b > 4 ORDER BY b DESC ALLOW FILTERING", [[3, 9, 4, 10],
                                                                                                                        [3, 8, 4, 9],
                                                                                                                        [3, 7, 4, 8],
                                                                                                                        [3, 6, 4, 7],
-                                                                                                                       [3, 5, 4, 6]])
+                                                                                                                       [3, 5, 4, 6]], prepared=True)
 
     @since('2.1.14')
     def test_paging_on_compact_table_with_tombstone_on_first_column(self):
@@ -1373,7 +1250,7 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                        [0, None, 1],
                                                        [2, None, 1],
                                                        [4, None, 1],
-                                                       [3, None, 1]])
+                                                       [3, None, 1]], prepared=True)
 
     def test_paging_with_no_clustering_columns(self):
         """
@@ -1400,46 +1277,46 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                        [0, 0],
                                                                        [2, 2],
                                                                        [4, 4],
-                                                                       [3, 3]])
+                                                                       [3, 3]], prepared=True)
 
                 # Range query with LIMIT
                 assert_all(session, "SELECT * FROM {} LIMIT 3".format(table), [[1, 1],
                                                                                [0, 0],
-                                                                               [2, 2]])
+                                                                               [2, 2]], prepared=True)
 
                 # Range query with DISTINCT
                 assert_all(session, "SELECT DISTINCT a FROM {}".format(table), [[1],
                                                                                 [0],
                                                                                 [2],
                                                                                 [4],
-                                                                                [3]])
+                                                                                [3]], prepared=True)
 
                 # Range query with DISTINCT and LIMIT
                 assert_all(session, "SELECT DISTINCT a FROM {} LIMIT 3".format(table), [[1],
                                                                                         [0],
-                                                                                        [2]])
+                                                                                        [2]], prepared=True)
 
                 # Multi-partition query
                 assert_all(session, "SELECT * FROM {} WHERE a IN (1, 2, 3, 4)".format(table), [[1, 1],
                                                                                                [2, 2],
                                                                                                [3, 3],
-                                                                                               [4, 4]])
+                                                                                               [4, 4]], prepared=True)
 
                 # Multi-partition query with LIMIT
                 assert_all(session, "SELECT * FROM {} WHERE a IN (1, 2, 3, 4) LIMIT 3".format(table), [[1, 1],
                                                                                                        [2, 2],
-                                                                                                       [3, 3]])
+                                                                                                       [3, 3]], prepared=True)
 
                 # Multi-partition query with DISTINCT
                 assert_all(session, "SELECT DISTINCT a FROM {} WHERE a IN (1, 2, 3, 4)".format(table), [[1],
                                                                                                         [2],
                                                                                                         [3],
-                                                                                                        [4]])
+                                                                                                        [4]], prepared=True)
 
                 # Multi-partition query with DISTINCT and LIMIT
                 assert_all(session, "SELECT DISTINCT a FROM {} WHERE a IN (1, 2, 3, 4) LIMIT 3".format(table), [[1],
                                                                                                                 [2],
-                                                                                                                [3]])
+                                                                                                                [3]], prepared=True)
 
     @since('3.6')
     def test_per_partition_limit_paging(self):
@@ -1468,7 +1345,7 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                              [3, 0, 0],
                                                                              [3, 1, 1],
                                                                              [4, 0, 0],
-                                                                             [4, 1, 1]], ignore_order=True)
+                                                                             [4, 1, 1]], ignore_order=True, prepared=True)
 
             res = rows_to_list(session.execute("SELECT * FROM test PER PARTITION LIMIT 2 LIMIT 6"))
             assert_length_equal(res, 6)
@@ -1491,7 +1368,7 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                                                 [2, 2, 2],
                                                                                                 [3, 0, 0],
                                                                                                 [3, 1, 1],
-                                                                                                [3, 2, 2]])
+                                                                                                [3, 2, 2]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a IN (1,2,3) PER PARTITION LIMIT 3 LIMIT 7", [[1, 0, 0],
                                                                                                         [1, 1, 1],
@@ -1499,31 +1376,31 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                                                         [2, 0, 0],
                                                                                                         [2, 1, 1],
                                                                                                         [2, 2, 2],
-                                                                                                        [3, 0, 0]])
+                                                                                                        [3, 0, 0]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 1 PER PARTITION LIMIT 4", [[1, 0, 0],
                                                                                          [1, 1, 1],
                                                                                          [1, 2, 2],
-                                                                                         [1, 3, 3]])
+                                                                                         [1, 3, 3]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 1 PER PARTITION LIMIT 3", [[1, 0, 0],
                                                                                          [1, 1, 1],
-                                                                                         [1, 2, 2]])
+                                                                                         [1, 2, 2]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 1 ORDER BY b DESC PER PARTITION LIMIT 4", [[1, 4, 4],
                                                                                                          [1, 3, 3],
                                                                                                          [1, 2, 2],
-                                                                                                         [1, 1, 1]])
+                                                                                                         [1, 1, 1]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 1 PER PARTITION LIMIT 4 LIMIT 3", [[1, 0, 0],
                                                                                                  [1, 1, 1],
-                                                                                                 [1, 2, 2]])
+                                                                                                 [1, 2, 2]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 1 AND b > 1 PER PARTITION LIMIT 2 ALLOW FILTERING", [[1, 2, 2],
-                                                                                                                   [1, 3, 3]])
+                                                                                                                   [1, 3, 3]], prepared=True)
 
             assert_all(session, "SELECT * FROM test WHERE a = 1 AND b > 1 ORDER BY b DESC PER PARTITION LIMIT 2 ALLOW FILTERING", [[1, 4, 4],
-                                                                                                                                   [1, 3, 3]])
+                                                                                                                                   [1, 3, 3]], prepared=True)
 
     def test_paging_for_range_name_queries(self):
         """
@@ -1550,7 +1427,7 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                 assert_all(session, "SELECT * FROM {} WHERE b = 1 AND c = 1  ALLOW FILTERING".format(table), [[1, 1, 1, 2],
                                                                                                               [0, 1, 1, 1],
                                                                                                               [2, 1, 1, 3],
-                                                                                                              [3, 1, 1, 4]])
+                                                                                                              [3, 1, 1, 4]], prepared=True)
 
                 assert_all(session, "SELECT * FROM {} WHERE b = 1 AND c IN (1, 2) ALLOW FILTERING".format(table), [[1, 1, 1, 2],
                                                                                                                    [1, 1, 2, 2],
@@ -1559,7 +1436,7 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                                                                    [2, 1, 1, 3],
                                                                                                                    [2, 1, 2, 3],
                                                                                                                    [3, 1, 1, 4],
-                                                                                                                   [3, 1, 2, 4]])
+                                                                                                                   [3, 1, 2, 4]], prepared=True)
 
                 if self.cluster.version() >= '2.2':
                     assert_all(session, "SELECT * FROM {} WHERE b IN (1, 2) AND c IN (1, 2)  ALLOW FILTERING".format(table), [[1, 1, 1, 2],
@@ -1577,7 +1454,7 @@ class TestPagingData(BasePagingTester, PageAssertionMixin):
                                                                                                                               [3, 1, 1, 4],
                                                                                                                               [3, 1, 2, 4],
                                                                                                                               [3, 2, 1, 5],
-                                                                                                                              [3, 2, 2, 5]])
+                                                                                                                              [3, 2, 2, 5]], prepared=True)
 
 
 @since('2.0')
@@ -1791,9 +1668,10 @@ class TestPagingDatasetChanges(BasePagingTester, PageAssertionMixin):
         pf = PageFetcher(future)
         # no need to request page here, because the first page is automatically retrieved
 
-        # stop a node and make sure we get an error trying to page the rest
+        # stop a node and make sure we get an error trying to page the rest: the error of the failed
+        # page, as CL.ALL can't be met without node1
         node1.stop()
-        with self.assertRaisesRegexp(RuntimeError, 'Requested pages were not delivered before timeout'):
+        with self.assertRaises((Unavailable, ReadTimeout, OperationTimedOut, NoHostAvailable)):
             pf.request_all()
 
         # TODO: can we resume the node and expect to get more results from the result set or is it done?
@@ -9,6 +9,7 @@ from cassandra.query import SimpleStatement
 from assertions import assert_unavailable
 from dtest import Tester
 from tools import no_vnodes, since
+from utils.linearizability import CASRegister, HistoryRecorder, assert_linearizable
 
 
 @since('2.0.6')
@@ -90,6 +91,9 @@ class TestPaxos(Tester):
     def _contention_test(self, threads, iterations):
         """
         Test threads repeatedly contending on the same row.
+
+        Every CAS the workers issue is recorded, and the history of the row's
+        value is checked to be linearizable on top of the final value being right.
         """
 
         verbose = False
@@ -97,6 +101,7 @@ class TestPaxos(Tester):
         session = self.prepare(nodes=3)
         session.execute("CREATE TABLE test (k int, v int static, id int, PRIMARY KEY (k, id))")
         session.execute("INSERT INTO test(k, v) VALUES (0, 0)")
+        history = HistoryRecorder()
 
         class Worker(Thread):
 
@@ -116,14 +121,17 @@ class TestPaxos(Tester):
                 while i < self.iterations:
                     done = False
                     while not done:
+                        op = history.invoke(self.wid, 'cas', (prev, prev + 1))
                         try:
                             res = self.session.execute(self.query, (prev + 1, prev, self.wid))
                             if verbose:
                                 print "[%3d] CAS %3d -> %3d (res: %s)" % (self.wid, prev, prev + 1, str(res))
                             if res[0][0] is True:
+                                history.complete(op, True)
                                 done = True
                                 prev = prev + 1
                             else:
+                                history.complete(op, (False, res[0][3]))
                                 self.retries = self.retries + 1
                                 # There is 2 conditions, so 2 reasons to fail: if we failed because the row with our
                                 # worker ID already exists, it means we timeout earlier but our update did went in,
@@ -134,12 +142,14 @@ class TestPaxos(Tester):
                                         print "[%3d] Update was inserted on previous try (res = %s)" % (self.wid, str(res))
                                     done = True
                         except WriteTimeout as e:
+                            history.info(op)
                             if verbose:
                                 print "[%3d] TIMEOUT (%s)" % (self.wid, str(e))
                             # This means a timeout: just retry, if it happens that our update was indeed persisted,
                             # we'll figure it out on the next run.
                             self.retries = self.retries + 1
                         except Exception as e:
+                            history.info(op)
                             if verbose:
                                 print "[%3d] ERROR: %s" % (self.wid, str(e))
                             self.errors = self.errors + 1
@@ -180,8 +190,10 @@ class TestPaxos(Tester):
             print "runtime:", runtime
 
         query = SimpleStatement("SELECT v FROM test WHERE k = 0", consistency_level=ConsistencyLevel.ALL)
+        read = history.invoke(None, 'read')
         rows = session.execute(query)
         value = rows[0][0]
+        history.complete(read, value)
 
         errors = 0
         retries = 0
@@ -190,3 +202,8 @@ class TestPaxos(Tester):
             retries = retries + w.retries
 
         self.assertTrue((value == threads * iterations) and (errors == 0), "value={}, errors={}, retries={}".format(value, errors, retries))
+
+        start = time.time()
+        assert_linearizable(history, CASRegister(initial=0))
+        if verbose:
+            print "checked", len(history), "operations for linearizability in", time.time() - start
@@ -59,8 +59,7 @@ class TestPutGet(Tester):
 
         # insert and get at CL.QUORUM (since RF=2, node1 won't have all key locally)
         tools.insert_c1c2(session, n=1000, consistency=ConsistencyLevel.QUORUM)
-        for n in xrange(0, 1000):
-            tools.query_c1c2(session, n, ConsistencyLevel.QUORUM)
+        tools.query_c1c2_keys(session, xrange(0, 1000), ConsistencyLevel.QUORUM)
 
     def rangeputget_test(self):
         """ Simple put/get on ranges of rows, hitting multiple sstables """
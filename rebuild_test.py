@@ -5,7 +5,7 @@ from cassandra import ConsistencyLevel
 from ccmlib.node import NodetoolError
 
 from dtest import Tester
-from tools import insert_c1c2, query_c1c2, since
+from tools import insert_c1c2, query_c1c2_keys, since
 
 
 class TestRebuild(Tester):
@@ -52,8 +52,7 @@ class TestRebuild(Tester):
         insert_c1c2(session, n=keys, consistency=ConsistencyLevel.LOCAL_ONE)
 
         # check data
-        for i in xrange(0, keys):
-            query_c1c2(session, i, ConsistencyLevel.LOCAL_ONE)
+        query_c1c2_keys(session, xrange(0, keys), ConsistencyLevel.LOCAL_ONE)
         session.shutdown()
 
         # Bootstrapping a new node in dc2 with auto_bootstrap: false
@@ -129,8 +128,7 @@ class TestRebuild(Tester):
                          msg='rebuild errors should be 1, but found {}. Concurrent rebuild should not be allowed, but one rebuild command should have succeeded.'.format(self.rebuild_errors))
 
         # check data
-        for i in xrange(0, keys):
-            query_c1c2(session, i, ConsistencyLevel.LOCAL_ONE)
+        query_c1c2_keys(session, xrange(0, keys), ConsistencyLevel.LOCAL_ONE)
 
     @since('3.6')
     def rebuild_ranges_test(self):
@@ -190,9 +188,7 @@ class TestRebuild(Tester):
 
         # check data is sent by stopping node1
         node1.stop()
-        for i in xrange(0, keys):
-            query_c1c2(session, i, ConsistencyLevel.ONE)
+        query_c1c2_keys(session, xrange(0, keys), ConsistencyLevel.ONE)
         # ks2 should not be streamed
         session.execute('USE ks2')
-        for i in xrange(0, keys):
-            query_c1c2(session, i, ConsistencyLevel.ONE, tolerate_missing=True, must_be_missing=True)
+        query_c1c2_keys(session, xrange(0, keys), ConsistencyLevel.ONE, must_be_missing=True)
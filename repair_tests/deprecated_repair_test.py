@@ -2,7 +2,7 @@ from cassandra import ConsistencyLevel
 from ccmlib.common import is_win
 
 from dtest import Tester, debug
-from jmxutils import JolokiaAgent, make_mbean, remove_perf_disable_shared_mem
+from jmxutils import JolokiaAgent, enable_jolokia_agent, make_mbean
 from tools import insert_c1c2, since
 
 
@@ -133,7 +133,7 @@ class TestDeprecatedRepairAPI(Tester):
         debug("Starting cluster..")
         cluster.populate([1, 1])
         node1, node2 = cluster.nodelist()
-        remove_perf_disable_shared_mem(node1)
+        enable_jolokia_agent(node1)
         cluster.start()
 
         session = self.patient_cql_connection(node1)
@@ -12,6 +12,7 @@ from nose.plugins.attrib import attr
 from assertions import assert_almost_equal, assert_one
 from dtest import Tester, debug
 from tools import insert_c1c2, known_failure, since
+from utils.sstable_metadata import sstable_statistics
 
 
 class TestIncRepair(Tester):
@@ -34,7 +35,7 @@ class TestIncRepair(Tester):
         * Write 10K rows with stress
         * Start node3
         * Issue an incremental repair, and wait for it to finish
-        * Run sstablemetadata on every node, assert that all sstables are marked as repaired
+        * Read the metadata of the sstables of every node, assert that all of them are marked as repaired
         """
         cluster = self.cluster
         # hinted handoff can create SSTable that we don't need after node3 restarted
@@ -56,17 +57,11 @@ class TestIncRepair(Tester):
         else:
             node3.nodetool("repair -par -inc")
 
-        with open('sstables.txt', 'w') as f:
-            node1.run_sstablemetadata(output_file=f, keyspace='keyspace1')
-            node2.run_sstablemetadata(output_file=f, keyspace='keyspace1')
-            node3.run_sstablemetadata(output_file=f, keyspace='keyspace1')
-
-        with open("sstables.txt", 'r') as r:
-            output = r.read().replace('\n', '')
-
-        self.assertNotIn('Repaired at: 0', output)
-
-        os.remove('sstables.txt')
+        for node in (node1, node2, node3):
+            statistics = sstable_statistics(node, 'keyspace1', fields=('repaired_at',))
+            self.assertNotEqual({}, statistics)
+            for path, values in statistics.items():
+                self.assertNotEqual(0, values['repaired_at'], msg='{} is not marked as repaired'.format(path))
 
     @known_failure(failure_source='test',
                    jira_url='https://issues.apache.org/jira/browse/CASSANDRA-11268',
@@ -7,7 +7,7 @@ from cassandra import ConsistencyLevel
 from cassandra.query import SimpleStatement
 
 from dtest import Tester, debug, FlakyRetryPolicy
-from tools import insert_c1c2, known_failure, no_vnodes, query_c1c2, since
+from tools import insert_c1c2, known_failure, no_vnodes, query_c1c2_keys, since
 
 
 def _repair_options(version, ks='', cf=None, sequential=True):
@@ -66,8 +66,7 @@ class BaseRepairTest(Tester):
         result = list(session.execute("SELECT * FROM cf LIMIT {}".format(rows * 2)))
         self.assertEqual(len(result), rows)
 
-        for k in found:
-            query_c1c2(session, k, ConsistencyLevel.ONE)
+        query_c1c2_keys(session, found, ConsistencyLevel.ONE)
 
         for k in missings:
             query = SimpleStatement("SELECT c1, c2 FROM cf WHERE key='k{}'".format(k), consistency_level=ConsistencyLevel.ONE)
@@ -1,7 +1,6 @@
 import glob
 import os
 import re
-import subprocess
 import time
 import uuid
 
@@ -9,6 +8,8 @@ from ccmlib import common
 from assertions import assert_length_equal
 
 from dtest import Tester, debug
+from jmxutils import enable_jolokia_agent
+from tool_runner import run_tool
 from tools import known_failure, since
 
 KEYSPACE = 'ks'
@@ -26,6 +27,14 @@ class TestHelper(Tester):
         super(TestHelper, self).setUp()
         self.cluster.set_datadir_count(1)
 
+    def start_single_node_cluster(self):
+        """
+        Start a cluster of one node, with the Jolokia agent loaded at node start, for jmx_nodetool
+        """
+        self.cluster.populate(1)
+        enable_jolokia_agent(self.cluster.nodelist()[0])
+        self.cluster.start()
+
     def get_table_paths(self, table):
         """
         Return the path where the table sstables are located
@@ -100,7 +109,7 @@ class TestHelper(Tester):
         Launch a nodetool command and check the result is empty (no error)
         """
         node1 = self.cluster.nodelist()[0]
-        response = node1.nodetool(cmd, capture_output=True)[0]
+        response = self.jmx_nodetool(node1).nodetool(cmd, capture_output=True)[0]
         if not common.is_win():  # nodetool always prints out on windows
             assert_length_equal(response, 0)  # nodetool does not print anything unless there is an error
 
@@ -109,13 +118,7 @@ class TestHelper(Tester):
         Launch the standalone scrub
         """
         node1 = self.cluster.nodelist()[0]
-        env = common.make_cassandra_env(node1.get_install_cassandra_root(), node1.get_node_cassandra_root())
-        scrub_bin = node1.get_tool('sstablescrub')
-        debug(scrub_bin)
-
-        args = [scrub_bin, ks, cf]
-        p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out, err = p.communicate()
+        out, err, _ = run_tool(node1, 'sstablescrub', [ks, cf])
         debug(out)
         # if we have less than 64G free space, we get this warning - ignore it
         if err and "Consider adding more capacity" not in err:
@@ -217,7 +220,7 @@ class TestScrubIndexes(TestHelper):
                    notes='windows')
     def test_scrub_static_table(self):
         cluster = self.cluster
-        cluster.populate(1).start()
+        self.start_single_node_cluster()
         node1 = cluster.nodelist()[0]
 
         session = self.patient_cql_connection(node1)
@@ -263,7 +266,7 @@ class TestScrubIndexes(TestHelper):
                    notes='windows')
     def test_standalone_scrub(self):
         cluster = self.cluster
-        cluster.populate(1).start()
+        self.start_single_node_cluster()
         node1 = cluster.nodelist()[0]
 
         session = self.patient_cql_connection(node1)
@@ -294,7 +297,7 @@ class TestScrubIndexes(TestHelper):
                    notes='windows')
     def test_scrub_collections_table(self):
         cluster = self.cluster
-        cluster.populate(1).start()
+        self.start_single_node_cluster()
         node1 = cluster.nodelist()[0]
 
         session = self.patient_cql_connection(node1)
@@ -370,7 +373,7 @@ class TestScrub(TestHelper):
                    notes='windows')
     def test_nodetool_scrub(self):
         cluster = self.cluster
-        cluster.populate(1).start()
+        self.start_single_node_cluster()
         node1 = cluster.nodelist()[0]
         # we don't want automatic minor compaction because we want to block on
         # compactions
@@ -416,7 +419,7 @@ class TestScrub(TestHelper):
                    notes='windows')
     def test_standalone_scrub(self):
         cluster = self.cluster
-        cluster.populate(1).start()
+        self.start_single_node_cluster()
         node1 = cluster.nodelist()[0]
 
         session = self.patient_cql_connection(node1)
@@ -447,7 +450,7 @@ class TestScrub(TestHelper):
                    notes='windows')
     def test_standalone_scrub_essential_files_only(self):
         cluster = self.cluster
-        cluster.populate(1).start()
+        self.start_single_node_cluster()
         node1 = cluster.nodelist()[0]
 
         session = self.patient_cql_connection(node1)
@@ -479,7 +482,7 @@ class TestScrub(TestHelper):
         @jira_ticket CASSANDRA-7665
         """
         cluster = self.cluster
-        cluster.populate(1).start()
+        self.start_single_node_cluster()
         node1 = cluster.nodelist()[0]
 
         session = self.patient_cql_connection(node1)
@@ -1,13 +1,12 @@
-import distutils.dir_util
 import glob
 import os
 import shutil
-import subprocess
 import time
 
 from cassandra.concurrent import execute_concurrent_with_args
 
 from dtest import Tester, debug, create_ccm_cluster, cleanup_cluster, get_test_path
+from snapshot_utils import link_tree, load_sstables
 from tools import known_failure, replace_in_file, safe_mkdtemp
 
 
@@ -46,26 +45,15 @@ class SnapshotTester(Tester):
             debug("snapshot copy is : " + tmpdir)
 
             # Copy files from the snapshot dir to existing temp dir
-            distutils.dir_util.copy_tree(str(snapshot_dir), os.path.join(tmpdir, str(x), ks, cf))
+            link_tree(str(snapshot_dir), os.path.join(tmpdir, str(x), ks, cf))
             x += 1
 
         return tmpdir
 
     def restore_snapshot(self, snapshot_dir, node, ks, cf):
         debug("Restoring snapshot....")
-        for x in xrange(0, self.cluster.data_dir_count):
-            snap_dir = os.path.join(snapshot_dir, str(x), ks, cf)
-            if os.path.exists(snap_dir):
-                ip = node.address()
-
-                args = [node.get_tool('sstableloader'), '-d', ip, snap_dir]
-                p = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                stdout, stderr = p.communicate()
-                exit_status = p.wait()
-
-                if exit_status != 0:
-                    raise Exception("sstableloader command '%s' failed; exit status: %d'; stdout: %s; stderr: %s" %
-                                    (" ".join(args), exit_status, stdout, stderr))
+        snap_dirs = [os.path.join(snapshot_dir, str(x), ks, cf) for x in xrange(0, self.cluster.data_dir_count)]
+        load_sstables(node, [snap_dir for snap_dir in snap_dirs if os.path.exists(snap_dir)])
 
 
 class TestSnapshot(SnapshotTester):
@@ -122,7 +110,7 @@ class TestArchiveCommitlog(SnapshotTester):
             tmpdir = os.path.join(base_tmpdir, str(x))
             os.mkdir(tmpdir)
             # Copy files from the snapshot dir to existing temp dir
-            distutils.dir_util.copy_tree(os.path.join(node.get_path(), 'data{0}'.format(x), ks), tmpdir)
+            link_tree(os.path.join(node.get_path(), 'data{0}'.format(x), ks), tmpdir)
             tmpdirs.append(tmpdir)
 
         return tmpdirs
@@ -142,7 +130,7 @@ class TestArchiveCommitlog(SnapshotTester):
                 os.mkdir(os.path.join(data_dir, ks, cf_id))
 
                 debug("snapshot_dir is : " + snapshot_dir)
-                distutils.dir_util.copy_tree(snapshot_dir, os.path.join(data_dir, ks, cf_id))
+                link_tree(snapshot_dir, os.path.join(data_dir, ks, cf_id))
 
     @known_failure(failure_source='test',
                    jira_url='https://issues.apache.org/jira/browse/CASSANDRA-11811',
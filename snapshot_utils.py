@@ -0,0 +1,146 @@
+"""
+Copy snapshots and sstables around, and load them back, without the cost of
+copying their bytes and of loading one table after the other.
+
+    link_tree(snapshot_dir, copy_dir)
+    load_sstables(node, table_directories(copy_root, 'ks'))
+    refresh_tables(node, 'ks', ['cf1', 'cf2'])
+
+sstables are never modified once written, so a copy of them can share their
+bytes: link_tree() hard links files, or, when the destination is on another
+filesystem, clones them (reflinks, on btrfs or xfs), and only copies their
+bytes if neither is possible. The sstables of snapshots are hard links
+already, for the same reason.
+"""
+import errno
+import os
+import shutil
+import subprocess
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+
+from ccmlib import common
+
+from cluster_ops import run_concurrently
+from dtest import debug
+
+# ioctl cloning a file into another, of linux/fs.h
+FICLONE = 0x40049409
+
+LoaderResult = namedtuple('LoaderResult', ['directory', 'exit_status', 'stdout', 'stderr'])
+
+
+class SSTableLoaderError(Exception):
+
+    def __init__(self, failures):
+        self.failures = failures
+        Exception.__init__(self, '\n'.join("sstableloader failed on {}; exit status: {}; stdout: {}; stderr: {}".format(
+            result.directory, result.exit_status, result.stdout, result.stderr) for result in failures))
+
+
+def _clone_file(source, destination):
+    """
+    Clone source into destination when the filesystem supports it, or else copy its bytes.
+
+    @return 'reflink' or 'copy'
+    """
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        method = 'copy'
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                method = 'reflink'
+            except (IOError, OSError):
+                pass
+        if method == 'copy':
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    shutil.copystat(source, destination)
+    return method
+
+
+def link_tree(source, destination, allow_links=True):
+    """
+    Copy the directory tree source into destination, which may exist already, sharing the
+    bytes of files with the originals when possible. Files of destination that source has too
+    are replaced, and never written through, as they may be links to other files.
+
+    @param allow_links Whether files may be hard linked. Files whose copy is modified in place,
+                       like configuration files, need a copy of their own, that can still be a reflink.
+    @return Dict of the number of files linked, reflinked and copied
+    """
+    counts = {'link': 0, 'reflink': 0, 'copy': 0}
+    link = allow_links and hasattr(os, 'link')
+    for dirpath, dirnames, filenames in os.walk(source):
+        target_dir = os.path.join(destination, os.path.relpath(dirpath, source))
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        for filename in filenames:
+            src, dst = os.path.join(dirpath, filename), os.path.join(target_dir, filename)
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            if link:
+                try:
+                    os.link(src, dst)
+                    counts['link'] += 1
+                    continue
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                        raise
+                    # another filesystem, or one without hard links: don't try again
+                    link = False
+            counts[_clone_file(src, dst)] += 1
+    debug('Copied {} to {} ({})'.format(source, destination, ', '.join('{}: {}'.format(method, count) for method, count in sorted(counts.items()))))
+    return counts
+
+
+def table_directories(root, keyspace):
+    """
+    @return The table directories of keyspace under a data directory, or under a copy of one
+    """
+    keyspace_dir = os.path.join(root, keyspace)
+    if not os.path.isdir(keyspace_dir):
+        return []
+    return [os.path.join(keyspace_dir, name) for name in sorted(os.listdir(keyspace_dir)) if os.path.isdir(os.path.join(keyspace_dir, name))]
+
+
+def load_sstables(node, directories, host=None, check=True, **kwargs):
+    """
+    Stream the sstables of every directory of directories to the cluster of node, with the
+    sstableloader of node, running a loader for every directory at once.
+
+    sstableloader takes the keyspace and table to load into from the last two directories of
+    their path, so directories must be laid out as <keyspace>/<table>.
+
+    @param host The address of the node to load through, defaults to the one of node
+    @param check Whether to raise an SSTableLoaderError if any loader failed
+    @param kwargs Passed to cluster_ops.run_concurrently: max_concurrency, timeout
+    @return A LoaderResult for every directory, in the order of directories
+    """
+    sstableloader = node.get_tool('sstableloader')
+    env = common.make_cassandra_env(node.get_install_cassandra_root(), node.get_node_cassandra_root())
+    host = host or node.address()
+
+    def load(directory):
+        p = subprocess.Popen([sstableloader, '--nodes', host, directory], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        return LoaderResult(directory, p.returncode, stdout, stderr)
+
+    results = run_concurrently(directories, load, description='sstableloader', **kwargs)
+    failures = [result for result in results if result.exit_status != 0]
+    if check and failures:
+        raise SSTableLoaderError(failures)
+    return results
+
+
+def refresh_tables(node, keyspace, tables, **kwargs):
+    """
+    Load the sstables added to the data directories of node for tables of keyspace, with
+    nodetool refresh, for every table at once.
+    """
+    run_concurrently(tables, lambda table: node.nodetool('refresh {} {}'.format(keyspace, table)),
+                     description='nodetool refresh on {}'.format(node.name), **kwargs)
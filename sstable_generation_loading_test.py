@@ -1,12 +1,10 @@
 import os
-import subprocess
 import time
-from distutils import dir_util
 
-from ccmlib import common as ccmcommon
-
-from assertions import assert_one
 from dtest import Tester, debug
+from node_startup import start_cluster
+from snapshot_utils import link_tree, load_sstables, table_directories
+from token_ranges import verify_table_checksums
 from tools import known_failure
 
 
@@ -154,7 +152,7 @@ class BaseSStableLoaderTest(Tester):
                 keyspace_dir = os.path.join(data_dir, ddir)
                 if os.path.isdir(keyspace_dir) and ddir != 'system':
                     copy_dir = os.path.join(copy_root, ddir)
-                    dir_util.copy_tree(keyspace_dir, copy_dir)
+                    link_tree(keyspace_dir, copy_dir)
 
         debug("Wiping out the data and restarting cluster")
         # wipe out the node data.
@@ -165,8 +163,7 @@ class BaseSStableLoaderTest(Tester):
             # Return to previous version
             cluster.set_install_dir(install_dir=default_install_dir)
 
-        cluster.start(jvm_args=self.jvm_args)
-        time.sleep(5)  # let gossip figure out what is going on
+        start_cluster(cluster, jvm_args=self.jvm_args)
 
         debug("re-creating the keyspace and column families.")
         session = self.cql_connection(node1)
@@ -175,27 +172,17 @@ class BaseSStableLoaderTest(Tester):
 
         debug("Calling sstableloader")
         # call sstableloader to re-load each cf.
-        cdir = node1.get_install_dir()
-        sstableloader = os.path.join(cdir, 'bin', ccmcommon.platform_binary('sstableloader'))
-        env = ccmcommon.make_cassandra_env(cdir, node1.get_path())
-        host = node1.address()
-        for x in xrange(0, cluster.data_dir_count):
-            sstablecopy_dir = os.path.join(node1.get_path(), 'data{0}_copy'.format(x), ks.strip('"'))
-            for cf_dir in os.listdir(sstablecopy_dir):
-                full_cf_dir = os.path.join(sstablecopy_dir, cf_dir)
-                if os.path.isdir(full_cf_dir):
-                    cmd_args = [sstableloader, '--nodes', host, full_cf_dir]
-                    p = subprocess.Popen(cmd_args, env=env)
-                    exit_status = p.wait()
-                    self.assertEqual(0, exit_status,
-                                     "sstableloader exited with a non-zero status: {}".format(exit_status))
+        cf_dirs = [cf_dir for x in xrange(0, cluster.data_dir_count)
+                   for cf_dir in table_directories(os.path.join(node1.get_path(), 'data{0}_copy'.format(x)), ks.strip('"'))]
+        for result in load_sstables(node1, cf_dirs, check=False):
+            self.assertEqual(0, result.exit_status,
+                             "sstableloader exited with a non-zero status: {}; stdout: {}; stderr: {}".format(result.exit_status, result.stdout, result.stderr))
 
         def read_and_validate_data(session):
-            for i in range(NUM_KEYS):
-                query = "SELECT * FROM standard1 WHERE KEY='{}'".format(i)
-                assert_one(session, query, [str(i), 'col', str(i)])
-                query = "SELECT * FROM counter1 WHERE KEY='{}'".format(i)
-                assert_one(session, query, [str(i), 1])
+            verify_table_checksums(session, ks.strip('"'), 'standard1', ['key', 'c', 'v'],
+                                   lambda: ([str(i), 'col', str(i)] for i in range(NUM_KEYS)))
+            verify_table_checksums(session, ks.strip('"'), 'counter1', ['key', 'v'],
+                                   lambda: ([str(i), 1] for i in range(NUM_KEYS)))
 
         debug("Reading data back")
         # Now we should have sstables with the loaded data, and the existing
@@ -1,11 +1,10 @@
 import glob
 import os
-import subprocess
 
-from ccmlib import common
 from ccmlib.node import NodetoolError
 
 from dtest import Tester, debug
+from tool_runner import run_tool
 from tools import InterruptCompaction, since
 
 # These must match the stress schema names
@@ -153,10 +152,7 @@ class SSTableUtilTest(Tester):
         """
         debug("About to invoke sstableutil with type {}...".format(type))
         node1 = self.cluster.nodelist()[0]
-        env = common.make_cassandra_env(node1.get_install_cassandra_root(), node1.get_node_cassandra_root())
-        tool_bin = node1.get_tool('sstableutil')
-
-        args = [tool_bin, '--type', type]
+        args = ['--type', type]
 
         if oplogs:
             args.extend(['--oplog'])
@@ -165,11 +161,9 @@ class SSTableUtilTest(Tester):
 
         args.extend([ks, table])
 
-        p = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        (stdout, stderr) = p.communicate()
+        (stdout, stderr, rc) = run_tool(node1, 'sstableutil', args)
 
-        self.assertEqual(p.returncode, 0, "Error invoking sstableutil; returned {code}".format(code=p.returncode))
+        self.assertEqual(rc, 0, "Error invoking sstableutil; returned {code}".format(code=rc))
 
         if stdout:
             debug(stdout)
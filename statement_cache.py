@@ -0,0 +1,167 @@
+"""
+A cache of prepared statements shared by the assertion and tools helpers.
+
+Helpers that run the same statement shapes many times, like
+tools.insert_c1c2 or assertions used in loops, would otherwise have Cassandra
+parse every query they send, or prepare the same query again on every call.
+
+    statement = STATEMENT_CACHE.prepare(session, "INSERT INTO cf (key, c1) VALUES (?, ?)")
+    session.execute(STATEMENT_CACHE.bind(statement, ['k0', 'v0'], consistency_level=ConsistencyLevel.ALL))
+
+Cached statements are shared, so options like consistency level should be
+set on the statements returned by bind(), never on the prepared statements
+themselves.
+"""
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+from cassandra import InvalidRequest
+from cassandra.protocol import SyntaxException
+from cassandra.query import BoundStatement, SimpleStatement
+
+# Literals that can be replaced by bind markers, in the order they must be
+# tried: quoted strings (with '' escapes), then quoted identifiers, UUIDs and
+# hex blobs, which are left alone but must not be mistaken for strings or
+# numbers, then numbers that aren't part of an identifier.
+_LITERAL_PATTERN = re.compile(r"""
+    (?P<string>'(?:[^']|'')*')
+  | (?P<other>"(?:[^"]|"")*"
+      |\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b
+      |\b0[xX][0-9a-fA-F]*\b)
+  | (?P<number>(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.]))
+""", re.VERBOSE)
+
+_PARAMETERIZABLE_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def parameterize(query):
+    """
+    Replace the string and numeric literals of a DML query with bind markers.
+
+    @param query The text of a SELECT, INSERT, UPDATE or DELETE query
+    @return A (query, values) tuple, where query has a `?` in place of each
+            literal and values are the literals' values, in order; or None for
+            queries of other kinds and queries that already contain bind
+            markers.
+
+    Examples:
+    >>> parameterize("SELECT * FROM test WHERE k = 1 AND v = 'it''s'")
+    ('SELECT * FROM test WHERE k = ? AND v = ?', [1, "it's"])
+    """
+    if query.lstrip().split(None, 1)[0].upper() not in _PARAMETERIZABLE_STATEMENTS or '?' in query:
+        return None
+
+    values = []
+
+    def replace(match):
+        if match.group('string') is not None:
+            values.append(match.group('string')[1:-1].replace("''", "'"))
+        elif match.group('number') is not None:
+            number = match.group('number')
+            values.append(float(number) if any(c in number for c in '.eE') else int(number))
+        else:
+            return match.group(0)
+        return '?'
+
+    return _LITERAL_PATTERN.sub(replace, query), values
+
+
+class PreparedStatementCache(object):
+    """
+    A thread-safe LRU cache of prepared statements, keyed by session, the
+    session's current keyspace and query text.
+
+    `hits` and `misses` count how many calls to prepare() were served from
+    the cache and how many had to prepare the statement.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._statements = OrderedDict()
+        # shapes that Cassandra refused to prepare once aren't tried again
+        self._unpreparable = set()
+        self._lock = threading.Lock()
+
+    def _key(self, session, query):
+        return id(session), session.keyspace, query
+
+    def prepare(self, session, query):
+        """
+        Return a prepared statement for `query` on `session`, preparing it
+        only if it isn't already cached.
+        """
+        key = self._key(session, query)
+        with self._lock:
+            entry = self._statements.pop(key, None)
+            # ids can be reused once a session is garbage collected, so make
+            # sure the cached statement was prepared on this very session
+            if entry is not None and entry[0]() is session:
+                self._statements[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        statement = session.prepare(query)
+        with self._lock:
+            self._statements[key] = (weakref.ref(session), statement)
+            while len(self._statements) > self.max_size:
+                self._statements.popitem(last=False)
+        return statement
+
+    def bind(self, statement, values, consistency_level=None):
+        """
+        Bind `values` to a cached prepared statement, setting per-execution
+        options on the new bound statement only.
+        """
+        return BoundStatement(statement, consistency_level=consistency_level).bind(values)
+
+    def statement_for(self, session, query, consistency_level=None, parameterize_literals=False):
+        """
+        Return a statement that can be passed to session.execute() to run
+        `query`.
+
+        If `parameterize_literals` is True, the literals of the query are
+        replaced by bind markers (see parameterize()), so that queries that
+        only differ by their literals share one cached prepared statement.
+        Queries that can't be prepared that way fall back to a
+        SimpleStatement: shapes Cassandra refuses to prepare, which aren't
+        prepared again, and values that can't be bound, like a string literal
+        standing for a timestamp. Other errors of preparing, like timeouts,
+        are raised.
+        """
+        parameterized = parameterize(query) if parameterize_literals else None
+        if parameterized is not None:
+            shape, values = parameterized
+            unpreparable_key = self._key(session, shape)
+            if unpreparable_key not in self._unpreparable:
+                try:
+                    statement = self.prepare(session, shape)
+                except (InvalidRequest, SyntaxException):
+                    with self._lock:
+                        self._unpreparable.add(unpreparable_key)
+                else:
+                    try:
+                        return self.bind(statement, values, consistency_level=consistency_level)
+                    except Exception:
+                        pass
+        return SimpleStatement(query, consistency_level=consistency_level)
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+            self._unpreparable.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._statements)
+
+    def __repr__(self):
+        return '{cls_name}(max_size={max_size}, size={size}, hits={hits}, misses={misses})'.format(
+            cls_name=self.__class__.__name__, max_size=self.max_size, size=len(self), hits=self.hits, misses=self.misses)
+
+
+STATEMENT_CACHE = PreparedStatementCache()
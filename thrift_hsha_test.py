@@ -8,7 +8,7 @@ import unittest
 import pycassa
 
 from dtest import DEFAULT_DIR, Tester, debug
-from jmxutils import JolokiaAgent, make_mbean, remove_perf_disable_shared_mem
+from jmxutils import JolokiaAgent, enable_jolokia_agent, make_mbean
 
 JNA_PATH = '/usr/share/java/jna.jar'
 ATTACK_JAR = 'lib/cassandra-attack.jar'
@@ -46,7 +46,7 @@ class ThriftHSHATest(Tester):
 
         cluster.populate(1)
         (node1,) = cluster.nodelist()
-        remove_perf_disable_shared_mem(node1)
+        enable_jolokia_agent(node1)
         cluster.start(wait_for_binary_proto=True)
 
         session = self.patient_cql_connection(node1)
@@ -0,0 +1,486 @@
+"""
+Helpers for reading and checking whole tables one token range at a time.
+
+TokenRangeScanner reads or counts a table by splitting the token ring into
+contiguous ranges and scanning them concurrently with `token(pk) > ? AND
+token(pk) <= ?` restrictions, so no single query has to walk the whole ring.
+
+Checking that a table holds exactly the data a test wrote by issuing one
+SELECT per key costs a network round-trip per key. verify_table_checksums
+instead folds the rows of each range into an order-independent digest. Only
+the ranges whose digests disagree with the expected data are then read back
+in full to report the offending rows.
+
+An example, checking the contents of a table written by a deterministic loop:
+
+    def expected_rows():
+        return ([str(i), 'col', str(i)] for i in range(NUM_KEYS))
+
+    verify_table_checksums(session, 'ks', 'standard1', ['key', 'c', 'v'], expected_rows)
+"""
+import hashlib
+import time
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import six
+from cassandra import (ConsistencyLevel, OperationTimedOut, ReadFailure,
+                       ReadTimeout, Unavailable)
+from cassandra.metadata import protect_name
+
+from dtest import debug
+
+MURMUR3_PARTITIONER = 'org.apache.cassandra.dht.Murmur3Partitioner'
+RANDOM_PARTITIONER = 'org.apache.cassandra.dht.RandomPartitioner'
+
+# Token bounds are expressed as exclusive minimums and inclusive maximums, so
+# that every possible token t satisfies min < t <= max. Murmur3Partitioner
+# never produces its minimum token, so this covers the whole ring.
+TOKEN_BOUNDS = {
+    MURMUR3_PARTITIONER: (-2 ** 63, 2 ** 63 - 1),
+    RANDOM_PARTITIONER: (-1, 2 ** 127),
+}
+
+DEFAULT_NUM_RANGES = 256
+
+
+def split_token_space(partitioner, num_ranges=DEFAULT_NUM_RANGES):
+    """
+    Split the token space of a partitioner into contiguous, non-overlapping
+    ranges.
+
+    @param partitioner The partitioner's class name, as reported by the driver's cluster metadata
+    @param num_ranges The number of ranges to split the token space into
+    @return A sorted list of (start, end) tuples, with start exclusive and end
+            inclusive. If the partitioner's tokens can't be split numerically
+            (e.g. ByteOrderedPartitioner), returns [(None, None)], meaning the
+            whole table must be read as one range.
+    """
+    if partitioner not in TOKEN_BOUNDS:
+        return [(None, None)]
+    if num_ranges < 1:
+        raise ValueError('num_ranges must be positive; got {}'.format(num_ranges))
+
+    lower, upper = TOKEN_BOUNDS[partitioner]
+    width = upper - lower
+    boundaries = [lower + (width * i) // num_ranges for i in range(num_ranges)] + [upper]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def range_locator(ranges):
+    """
+    Return a function mapping a token to the index of the range in `ranges`
+    (as returned by split_token_space) that contains it.
+    """
+    if ranges == [(None, None)]:
+        return lambda token: 0
+    ends = [end for _, end in ranges]
+    return lambda token: bisect_left(ends, token)
+
+
+def _encode_value(value):
+    """
+    Encode a value read from (or expected to be read from) Cassandra into a
+    deterministic byte string.
+
+    Encoding is driven by the kind of the value rather than its exact type, so
+    that e.g. str and unicode, or int and long, values that compare equal also
+    encode equally. Every item is prefixed with its kind and length so that
+    encodings of distinct values can't collide by concatenation.
+    """
+    if value is None:
+        kind, data = 'n', b''
+    elif isinstance(value, bool):
+        kind, data = 'b', b'1' if value else b'0'
+    elif isinstance(value, six.integer_types):
+        kind, data = 'i', str(value).encode('ascii')
+    elif isinstance(value, float):
+        kind, data = 'f', repr(value).encode('ascii')
+    elif isinstance(value, six.text_type):
+        kind, data = 's', value.encode('utf-8')
+    elif isinstance(value, six.binary_type):
+        kind, data = 's', value
+    elif isinstance(value, (list, tuple)):
+        kind, data = 'l', b''.join(_encode_value(v) for v in value)
+    elif isinstance(value, (set, frozenset)) or type(value).__name__ == 'SortedSet':
+        kind, data = 'e', b''.join(sorted(_encode_value(v) for v in value))
+    elif isinstance(value, dict) or hasattr(value, 'items'):
+        kind, data = 'm', b''.join(sorted(_encode_value(k) + _encode_value(v) for k, v in value.items()))
+    else:
+        kind, data = 'o', six.text_type(value).encode('utf-8')
+    return '{}{}:'.format(kind, len(data)).encode('ascii') + data
+
+
+def encode_row(row):
+    """
+    Encode a row (any sequence of column values) into a deterministic byte
+    string. Rows that are equal up to str/unicode and int/long differences
+    encode equally.
+    """
+    return _encode_value(tuple(row))
+
+
+class RangeDigest(object):
+    """
+    An order-independent digest of a multiset of rows.
+
+    Each row is hashed with MD5 and the hashes are summed modulo 2^128, so
+    folding the same rows in any order gives the same digest, and a row that
+    is missing, duplicated or different changes it.
+    """
+    MODULUS = 2 ** 128
+
+    def __init__(self):
+        self.count = 0
+        self.hash_sum = 0
+
+    def add(self, row):
+        self.add_encoded(encode_row(row))
+
+    def add_encoded(self, encoded_row):
+        """
+        Fold in a row already encoded with encode_row.
+        """
+        self.count += 1
+        self.hash_sum = (self.hash_sum + int(hashlib.md5(encoded_row).hexdigest(), 16)) % self.MODULUS
+
+    def merge(self, other):
+        """
+        Fold in all the rows of another digest.
+        """
+        self.count += other.count
+        self.hash_sum = (self.hash_sum + other.hash_sum) % self.MODULUS
+
+    def __eq__(self, other):
+        return isinstance(other, RangeDigest) and (self.count, self.hash_sum) == (other.count, other.hash_sum)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{cls_name}(count={count}, hash_sum={hash_sum:032x})'.format(
+            cls_name=self.__class__.__name__, count=self.count, hash_sum=self.hash_sum)
+
+
+def _partition_key_expression(table_meta):
+    return ', '.join(protect_name(c.name) for c in table_meta.partition_key)
+
+
+def ring_token_ranges(session, splits_per_range=1):
+    """
+    Discover the token ranges owned by the cluster's nodes from the driver's
+    token metadata.
+
+    @param session Session whose cluster metadata to use
+    @param splits_per_range Number of equal ranges to split each owned range into, or None for
+                            as many as make DEFAULT_NUM_RANGES ranges in total, at least
+    @return A sorted list of contiguous (start, end) tuples covering the whole
+            ring, in the same format as split_token_space. The range wrapping
+            around the end of the ring is split in two at the partitioner's
+            bounds. If the ring isn't known or the partitioner's tokens can't
+            be split, falls back to split_token_space.
+    """
+    metadata = session.cluster.metadata
+    partitioner = metadata.partitioner
+    token_map = metadata.token_map
+    if partitioner not in TOKEN_BOUNDS or token_map is None or not token_map.ring:
+        return split_token_space(partitioner, DEFAULT_NUM_RANGES)
+
+    lower, upper = TOKEN_BOUNDS[partitioner]
+    boundaries = sorted(set([lower, upper] + [t.value for t in token_map.ring]))
+    owned = list(zip(boundaries[:-1], boundaries[1:]))
+    if splits_per_range is None:
+        splits_per_range = max(1, -(-DEFAULT_NUM_RANGES // len(owned)))
+    ranges = []
+    for start, end in owned:
+        width = end - start
+        pieces = [start + (width * i) // splits_per_range for i in range(splits_per_range)] + [end]
+        ranges.extend((s, e) for s, e in zip(pieces[:-1], pieces[1:]) if s < e)
+    return ranges
+
+
+class TokenRangeScanner(object):
+    """
+    Read or count the rows of a table by scanning its token ranges
+    concurrently.
+
+    A single `SELECT COUNT(*)` or unrestricted `SELECT *` over a large table is
+    served by one coordinator that has to walk the whole ring, which times out
+    on tables bigger than a few hundred thousand rows. The scanner instead
+    issues one query per token range, restricted with `token(pk) > ? AND
+    token(pk) <= ?`, runs up to `concurrency` of them at once, and retries a
+    range from its start if it fails.
+
+    Example usage:
+
+        scanner = TokenRangeScanner(session, 'ks', 'cf', consistency_level=ConsistencyLevel.ALL)
+        self.assertEqual(scanner.count(), 500000)
+        for row in scanner.rows():
+            ...
+    """
+
+    RETRYABLE_ERRORS = (OperationTimedOut, ReadTimeout, ReadFailure, Unavailable)
+
+    def __init__(self, session, keyspace, table, columns=None, ranges=None, consistency_level=ConsistencyLevel.ONE,
+                 fetch_size=5000, concurrency=16, max_retries=3, splits_per_range=1, progress_interval=10):
+        """
+        @param session Session to use
+        @param keyspace Name of the keyspace containing the table
+        @param table Name of the table to scan
+        @param columns Names of the columns to read. Defaults to all columns.
+        @param ranges The (start, end) token ranges to scan. Defaults to the ranges owned by the cluster's nodes.
+        @param consistency_level Consistency level for the range queries
+        @param fetch_size Page size for the range queries
+        @param concurrency Maximum number of ranges read at once
+        @param max_retries Number of times a failing range is retried before giving up
+        @param splits_per_range Number of pieces to split each owned range into, when `ranges` isn't given,
+                                or None for as many as make DEFAULT_NUM_RANGES ranges in total, at least
+        @param progress_interval Minimum number of seconds between two progress messages
+        """
+        session.cluster.refresh_table_metadata(keyspace, table)
+        self.table_meta = session.cluster.metadata.keyspaces[keyspace].tables[table]
+        self.session = session
+        self.keyspace = keyspace
+        self.table = table
+        self.columns = list(columns) if columns is not None else list(self.table_meta.columns)
+        self.ranges = ranges if ranges is not None else ring_token_ranges(session, splits_per_range)
+        self.consistency_level = consistency_level
+        self.fetch_size = fetch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self._statements = {}
+
+    def _statement(self, selection):
+        """
+        Prepare (once) the ranged and unranged statements selecting `selection`.
+        """
+        if selection not in self._statements:
+            query = 'SELECT {selection} FROM {ks}.{table}'.format(
+                selection=selection, ks=protect_name(self.keyspace), table=protect_name(self.table))
+            ranged = self.session.prepare(query + ' WHERE token({pk}) > ? AND token({pk}) <= ?'.format(
+                pk=_partition_key_expression(self.table_meta)))
+            unranged = self.session.prepare(query)
+            for statement in (ranged, unranged):
+                statement.consistency_level = self.consistency_level
+                statement.fetch_size = self.fetch_size
+            self._statements[selection] = ranged, unranged
+        return self._statements[selection]
+
+    def _execute_range(self, selection, token_range):
+        ranged, unranged = self._statement(selection)
+        start, end = token_range
+        return self.session.execute(unranged) if start is None else self.session.execute(ranged, (start, end))
+
+    def _run_with_retries(self, func, selection, index):
+        token_range = self.ranges[index]
+        for attempt in range(self.max_retries + 1):
+            try:
+                # iterating the result set fetches the following pages, so
+                # a failure on any page restarts the range from its start
+                return func(self._execute_range(selection, token_range))
+            except self.RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                debug('Retrying token range {} of {}.{} after {} (attempt {}/{})'.format(
+                    token_range, self.keyspace, self.table, e.__class__.__name__, attempt + 1, self.max_retries))
+                time.sleep(0.5 * (attempt + 1))
+
+    def _map(self, func, selection, indexes):
+        """
+        Call func(rows) on the rows of each range in `indexes` concurrently,
+        yielding (index, result) pairs in completion order. At most twice
+        `concurrency` ranges are in flight or waiting to be consumed at any
+        time, so memory use doesn't grow with the size of the table.
+        """
+        indexes = list(range(len(self.ranges))) if indexes is None else list(indexes)
+        progress = _ScanProgress(self, len(indexes))
+        indexes = iter(indexes)
+        self._statement(selection)
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            def submit_next():
+                for i in indexes:
+                    pending[executor.submit(self._run_with_retries, func, selection, i)] = i
+                    return
+
+            for _ in range(2 * self.concurrency):
+                submit_next()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    result = future.result()
+                    progress.range_done()
+                    submit_next()
+                    yield i, result
+
+    def map_ranges(self, func, indexes=None):
+        """
+        Call func(rows) on the rows of each token range concurrently. `func`
+        is called again with fresh rows if its range has to be retried, so it
+        shouldn't have side effects.
+
+        @param func A function taking an iterable of rows
+        @param indexes Indexes in self.ranges of the ranges to read. Defaults to all of them.
+        @return A list of the results of func, in the same order as the ranges they were computed for
+        """
+        results = dict(self._map(func, ', '.join(protect_name(c) for c in self.columns), indexes))
+        return [results[i] for i in sorted(results)]
+
+    def rows(self):
+        """
+        Generate every row of the table. Rows are generated a whole range at a
+        time, in no particular order.
+        """
+        for _, rows in self._map(list, ', '.join(protect_name(c) for c in self.columns), None):
+            for row in rows:
+                yield row
+
+    def range_counts(self):
+        """
+        @return A list with the number of rows in each token range, as counted by Cassandra
+        """
+        results = dict(self._map(lambda rows: rows[0][0], 'count(*)', None))
+        return [results[i] for i in sorted(results)]
+
+    def count(self):
+        """
+        @return The number of rows in the table
+        """
+        return sum(self.range_counts())
+
+
+class _ScanProgress(object):
+    """
+    Periodically report how far a TokenRangeScanner has got.
+    """
+
+    def __init__(self, scanner, total):
+        self.description = '{}.{}'.format(scanner.keyspace, scanner.table)
+        self.interval = scanner.progress_interval
+        self.total = total
+        self.done = 0
+        self.started = self.last_report = time.time()
+
+    def range_done(self):
+        self.done += 1
+        now = time.time()
+        if self.done == self.total or now - self.last_report >= self.interval:
+            self.last_report = now
+            debug('Scanned {done}/{total} token ranges of {table} in {elapsed:.1f}s'.format(
+                done=self.done, total=self.total, table=self.description, elapsed=now - self.started))
+
+
+def _token_for_row_function(session, keyspace, table_meta, columns):
+    """
+    Return a function that computes the token of the partition containing a
+    row given as a sequence of values for `columns`.
+    """
+    partition_key = [c.name for c in table_meta.partition_key]
+    missing = [name for name in partition_key if name not in columns]
+    if missing:
+        raise ValueError('columns {} must include every partition key column; missing {}'.format(columns, missing))
+    key_positions = [columns.index(name) for name in partition_key]
+
+    # binding a statement restricted on the whole partition key is the
+    # cheapest way to get the driver to serialize the routing key for us
+    routing_statement = session.prepare('SELECT {pk} FROM {ks}.{table} WHERE {restrictions}'.format(
+        pk=_partition_key_expression(table_meta),
+        ks=protect_name(keyspace),
+        table=protect_name(table_meta.name),
+        restrictions=' AND '.join('{} = ?'.format(protect_name(name)) for name in partition_key)))
+    token_class = session.cluster.metadata.token_map.token_class
+
+    def token_for_row(row):
+        routing_key = routing_statement.bind([row[i] for i in key_positions]).routing_key
+        return token_class.from_key(routing_key).value
+
+    return token_for_row
+
+
+def verify_table_checksums(session, keyspace, table, columns, expected_rows,
+                           num_ranges=DEFAULT_NUM_RANGES, consistency_level=ConsistencyLevel.ONE,
+                           concurrency=16, fetch_size=5000, max_reported_rows=20):
+    """
+    Assert a table contains exactly the rows produced by a deterministic
+    generator, checking digests of token ranges instead of individual keys.
+
+    The token ring is split into `num_ranges` ranges that are scanned
+    concurrently, each range's rows being folded into a RangeDigest. The
+    expected rows are assigned to the same ranges by computing their tokens on
+    the client. If any range's digests disagree, only the mismatching ranges
+    are read again and compared row by row for reporting.
+
+    @param session Session to use
+    @param keyspace Name of the keyspace containing the table
+    @param table Name of the table to check
+    @param columns Names of the columns to read. These must include every partition key column.
+    @param expected_rows A zero-argument callable returning an iterable of
+           expected rows, each row being a sequence of values for `columns`.
+           It may be called twice: once to build digests, and once more to
+           drill into mismatching ranges.
+    @param num_ranges Number of token ranges to split the ring into
+    @param consistency_level Consistency level for the range reads
+    @param concurrency Maximum number of ranges read at once
+    @param fetch_size Page size for the range reads
+    @param max_reported_rows Maximum number of missing and unexpected rows to include in the failure message
+    @throws AssertionError If the table's contents differ from the expected rows
+
+    Examples:
+    verify_table_checksums(session, 'ks', 'counter1', ['key', 'v'], lambda: ([str(i), 1] for i in range(1000)))
+    """
+    scanner = TokenRangeScanner(session, keyspace, table, columns=columns,
+                                ranges=split_token_space(session.cluster.metadata.partitioner, num_ranges),
+                                consistency_level=consistency_level, fetch_size=fetch_size, concurrency=concurrency)
+    ranges = scanner.ranges
+    token_for_row = _token_for_row_function(session, keyspace, scanner.table_meta, scanner.columns)
+    locate = range_locator(ranges)
+
+    debug('Computing expected digests of {} token ranges of {}.{}'.format(len(ranges), keyspace, table))
+    expected_digests = [RangeDigest() for _ in ranges]
+    for row in expected_rows():
+        expected_digests[locate(token_for_row(row))].add(row)
+
+    def digest_rows(rows):
+        digest = RangeDigest()
+        for row in rows:
+            digest.add(row)
+        return digest
+
+    debug('Reading {} token ranges of {}.{} with concurrency {}'.format(len(ranges), keyspace, table, concurrency))
+    actual_digests = scanner.map_ranges(digest_rows)
+
+    mismatched = [i for i, (expected, actual) in enumerate(zip(expected_digests, actual_digests)) if expected != actual]
+    if not mismatched:
+        return
+
+    debug('{} of {} token ranges of {}.{} do not match, reading them row by row'.format(len(mismatched), len(ranges), keyspace, table))
+    mismatched_set = set(mismatched)
+    expected_counts, actual_counts, originals = Counter(), Counter(), {}
+
+    def count_into(counter, row):
+        encoded = encode_row(row)
+        counter[encoded] += 1
+        originals.setdefault(encoded, list(row))
+
+    for row in expected_rows():
+        if locate(token_for_row(row)) in mismatched_set:
+            count_into(expected_counts, row)
+    for rows in scanner.map_ranges(list, indexes=mismatched):
+        for row in rows:
+            count_into(actual_counts, row)
+
+    missing = sorted(originals[k] for k in (expected_counts - actual_counts).elements())
+    unexpected = sorted(originals[k] for k in (actual_counts - expected_counts).elements())
+    raise AssertionError(
+        '{num_ranges} token range(s) of {ks}.{table} do not match the expected data: {ranges}\n'
+        '{num_missing} missing row(s), first {n}: {missing}\n'
+        '{num_unexpected} unexpected row(s), first {n}: {unexpected}'.format(
+            num_ranges=len(mismatched), ks=keyspace, table=table,
+            ranges=[ranges[i] for i in mismatched][:max_reported_rows],
+            num_missing=len(missing), missing=missing[:max_reported_rows],
+            num_unexpected=len(unexpected), unexpected=unexpected[:max_reported_rows],
+            n=max_reported_rows))
@@ -0,0 +1,301 @@
+"""
+Run Cassandra's offline tools (sstableutil, sstabledump, sstablelevelreset,
+sstableverify, ...) in a JVM that stays up between runs, rather than in a
+new JVM for every run.
+
+    stdout, stderr, rc = run_tool(node, 'sstableutil', ['--type', 'final', 'ks', 'cf'])
+
+run_tool() shares a ToolRunner across the tests of a run, so its daemons get
+warm; a ToolRunner of your own can be closed when you're done with it.
+
+Each install dir gets a daemon JVM running lib/ToolServer.java, compiled once
+with javac. To run a tool, its script is first run with a fake java that only
+records the command line the script built (classpath, system properties and
+main class); the daemon then runs that main class with the same classpath
+and properties, in a class loader of its own, so that runs don't share any
+Cassandra state. What stays warm is the JVM itself, and the jars in the page
+cache.
+
+Tools run by their script, as usual, when the daemon can't be used: on
+Windows, without javac, or if the daemon failed.
+"""
+import atexit
+import hashlib
+import os
+import shutil
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+
+from ccmlib import common
+
+from dtest import debug
+from jmxutils import java_bin
+
+TOOL_SERVER_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib', 'ToolServer.java')
+# threads of a run that survive being stopped outlive it, with its class loader, so daemons are replaced after that many runs
+MAX_RUNS_PER_DAEMON = 50
+DAEMON_HEAP = '1024M'
+
+_FAKE_JAVA = """#!/bin/sh
+for arg in "$@"; do
+    printf '%s\\0' "$arg"
+done
+"""
+_PROBE_ARG = '--dtest-tool-runner-probe'
+
+
+class ToolCommand(object):
+    """
+    The java command line a tool script runs.
+    """
+
+    def __init__(self, classpath, properties, main_class, args, assertions, java_agents):
+        self.classpath = classpath
+        self.properties = properties
+        self.main_class = main_class
+        self.args = args
+        self.assertions = assertions
+        self.java_agents = java_agents
+
+
+def parse_java_command(argv):
+    """
+    @param argv The arguments passed to java by a tool script run with the single argument _PROBE_ARG
+    @return A ToolCommand, or None if argv doesn't look like one
+    """
+    if _PROBE_ARG not in argv:
+        return None
+    classpath, properties, assertions, java_agents = None, {}, False, []
+    i = 0
+    while i < len(argv) and argv[i].startswith('-'):
+        option = argv[i]
+        if option in ('-cp', '-classpath'):
+            i += 1
+            classpath = argv[i].split(os.pathsep)
+        elif option.startswith('-D'):
+            name, _, value = option[2:].partition('=')
+            properties[name] = value
+        elif option in ('-ea', '-enableassertions'):
+            assertions = True
+        elif option.startswith('-javaagent:'):
+            java_agents.append(option)
+        i += 1
+    if classpath is None or i >= argv.index(_PROBE_ARG):
+        return None
+    return ToolCommand(classpath, properties, argv[i], argv[i + 1:argv.index(_PROBE_ARG)], assertions, java_agents)
+
+
+def _compile_tool_server():
+    """
+    @return The directory of the compiled ToolServer class, or None if it can't be compiled
+    """
+    with open(TOOL_SERVER_SOURCE) as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:12]
+    classes_dir = os.path.join(tempfile.gettempdir(), 'dtest-tool-server-{}'.format(digest))
+    if os.path.exists(os.path.join(classes_dir, 'ToolServer.class')):
+        return classes_dir
+
+    javac = os.path.join(os.environ['JAVA_HOME'], 'bin', 'javac') if 'JAVA_HOME' in os.environ else 'javac'
+    build_dir = tempfile.mkdtemp(prefix='dtest-tool-server-')
+    try:
+        subprocess.check_output([javac, '-d', build_dir, TOOL_SERVER_SOURCE], stderr=subprocess.STDOUT)
+        # the rename is atomic, should another test process compile it too
+        os.rename(build_dir, classes_dir)
+    except (OSError, subprocess.CalledProcessError) as e:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        if not os.path.exists(os.path.join(classes_dir, 'ToolServer.class')):
+            debug('Could not compile {}, tools will run in JVMs of their own: {}'.format(TOOL_SERVER_SOURCE, getattr(e, 'output', e)))
+            return None
+    return classes_dir
+
+
+def _encode_string(value):
+    encoded = value.encode('utf-8') if isinstance(value, unicode) else value
+    return struct.pack('>H', len(encoded)) + encoded
+
+
+def _encode_strings(values):
+    return struct.pack('>i', len(values)) + ''.join(_encode_string(value) for value in values)
+
+
+class ToolDaemon(object):
+    """
+    A JVM running ToolServer, and a connection to it.
+    """
+
+    def __init__(self, classes_dir, java_agents=(), timeout=600):
+        args = [java_bin(), '-Xmx' + DAEMON_HEAP] + list(java_agents) + ['-cp', classes_dir, 'ToolServer']
+        # the daemon exits when its stdin is closed
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        port = self.process.stdout.readline()
+        if not port.strip().isdigit():
+            self.close()
+            raise RuntimeError('The tool server did not start: {}{}'.format(port, self.process.stdout.read()))
+        # anything the tools print once their run is over ends up here
+        output_thread = threading.Thread(target=self._log_output, name='tool-server-output')
+        output_thread.daemon = True
+        output_thread.start()
+
+        self.socket = socket.create_connection(('127.0.0.1', int(port)), timeout=timeout)
+        self._input = self.socket.makefile('rb')
+        self.runs = 0
+
+    def _log_output(self):
+        for line in iter(self.process.stdout.readline, ''):
+            debug('tool server: ' + line.rstrip())
+
+    def _read(self, size):
+        data = self._input.read(size)
+        if len(data) != size:
+            raise IOError('The tool server closed the connection')
+        return data
+
+    def _read_bytes(self):
+        return self._read(struct.unpack('>i', self._read(4))[0])
+
+    def run(self, command, args):
+        """
+        @return (stdout, stderr, exit status) of a run of command, with args appended to its arguments
+        """
+        request = (_encode_strings(command.classpath)
+                   + struct.pack('>?', command.assertions)
+                   + struct.pack('>i', len(command.properties))
+                   + ''.join(_encode_string(name) + _encode_string(value) for name, value in sorted(command.properties.items()))
+                   + _encode_string(command.main_class)
+                   + _encode_strings(list(command.args) + list(args)))
+        self.socket.sendall(request)
+        self.runs += 1
+        rc = struct.unpack('>i', self._read(4))[0]
+        stdout = self._read_bytes()
+        stderr = self._read_bytes()
+        return stdout, stderr, rc
+
+    def close(self):
+        for closeable in (getattr(self, '_input', None), getattr(self, 'socket', None)):
+            if closeable is not None:
+                closeable.close()
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.kill()
+            self.process.wait()
+
+
+class ToolRunner(object):
+    """
+    Runs offline tools through one daemon JVM per install dir.
+
+    @param timeout Time, in seconds, to wait for a tool to run
+    """
+
+    def __init__(self, timeout=600):
+        self.timeout = timeout
+        self._commands = {}
+        self._daemons = {}
+        self._classes_dir = None
+        self._fake_java_home = None
+
+    def run(self, node, toolname, args=()):
+        """
+        Run a tool of node, like its script does, for its data and configuration.
+
+        @return (stdout, stderr, exit status)
+        """
+        tool = node.get_tool(toolname)
+        env = common.make_cassandra_env(node.get_install_cassandra_root(), node.get_node_cassandra_root())
+
+        if not common.is_win():
+            command = self._command(tool, env)
+            daemon = self._daemon(node.get_install_dir(), command) if command is not None else None
+            if daemon is not None:
+                try:
+                    return daemon.run(command, args)
+                except socket.timeout:
+                    self._discard(daemon)
+                    raise RuntimeError("{} didn't finish running in {}s".format(toolname, self.timeout))
+                except (IOError, socket.error) as e:
+                    debug('The tool server failed running {}, running it in a JVM of its own: {}'.format(toolname, e))
+                    self._discard(daemon)
+
+        p = subprocess.Popen([tool] + list(args), env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        return stdout, stderr, p.returncode
+
+    def _command(self, tool, env):
+        key = (tool, env.get('CASSANDRA_CONF'), env.get('CASSANDRA_HOME'))
+        if key not in self._commands:
+            self._commands[key] = self._probe(tool, env)
+        return self._commands[key]
+
+    def _probe(self, tool, env):
+        """
+        @return The ToolCommand the script of tool runs, or None if it couldn't be found
+        """
+        if self._fake_java_home is None:
+            self._fake_java_home = tempfile.mkdtemp(prefix='dtest-fake-java-')
+            os.mkdir(os.path.join(self._fake_java_home, 'bin'))
+            fake_java = os.path.join(self._fake_java_home, 'bin', 'java')
+            with open(fake_java, 'w') as f:
+                f.write(_FAKE_JAVA)
+            os.chmod(fake_java, 0755)
+
+        fake_env = dict(env, JAVA_HOME=self._fake_java_home, JAVA=os.path.join(self._fake_java_home, 'bin', 'java'),
+                        PATH=os.path.join(self._fake_java_home, 'bin') + os.pathsep + env.get('PATH', os.environ.get('PATH', '')))
+        p = subprocess.Popen([tool, _PROBE_ARG], env=fake_env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        command = parse_java_command(stdout.split('\0')[:-1]) if p.returncode == 0 else None
+        if command is None:
+            debug('Could not find the java command of {}, it will run in a JVM of its own: {}'.format(tool, stderr))
+        return command
+
+    def _daemon(self, install_dir, command):
+        key = (install_dir, tuple(command.java_agents))
+        daemon = self._daemons.get(key)
+        if daemon is not None and (daemon.runs >= MAX_RUNS_PER_DAEMON or daemon.process.poll() is not None):
+            self._discard(daemon)
+            daemon = None
+        if daemon is None:
+            if self._classes_dir is None:
+                self._classes_dir = _compile_tool_server() or False
+            if not self._classes_dir:
+                return None
+            try:
+                daemon = self._daemons[key] = ToolDaemon(self._classes_dir, command.java_agents, self.timeout)
+            except (RuntimeError, OSError, socket.error) as e:
+                debug('Could not start the tool server, tools will run in JVMs of their own: {}'.format(e))
+                self._classes_dir = False
+                return None
+        return daemon
+
+    def _discard(self, daemon):
+        for key, value in self._daemons.items():
+            if value is daemon:
+                del self._daemons[key]
+        daemon.close()
+
+    def close(self):
+        for daemon in list(self._daemons.values()):
+            self._discard(daemon)
+        if self._fake_java_home is not None:
+            shutil.rmtree(self._fake_java_home, ignore_errors=True)
+            self._fake_java_home = None
+
+
+_shared_runner = None
+_shared_runner_lock = threading.Lock()
+
+
+def run_tool(node, toolname, args=()):
+    """
+    Run a tool of node through a ToolRunner shared by all tests, closed at exit.
+
+    @return (stdout, stderr, exit status)
+    """
+    global _shared_runner
+    with _shared_runner_lock:
+        if _shared_runner is None:
+            _shared_runner = ToolRunner()
+            atexit.register(_shared_runner.close)
+        return _shared_runner.run(node, toolname, args)
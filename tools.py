@@ -13,13 +13,14 @@ from threading import Thread
 
 import assertions
 from cassandra import ConsistencyLevel
-from cassandra.concurrent import execute_concurrent_with_args
+from cassandra.concurrent import execute_concurrent
 from cassandra.query import SimpleStatement
 from ccmlib.node import Node
 from nose.plugins.attrib import attr
 from nose.tools import assert_equal, assert_in, assert_true, assert_is_instance
 
 from dtest import CASSANDRA_DIR, DISABLE_VNODES, IGNORE_REQUIRE, debug
+from statement_cache import STATEMENT_CACHE
 
 
 class RerunTestException(Exception):
@@ -72,15 +73,14 @@ def insert_c1c2(session, keys=None, n=None, consistency=ConsistencyLevel.QUORUM)
     if n:
         keys = list(range(n))
 
-    statement = session.prepare("INSERT INTO cf (key, c1, c2) VALUES (?, 'value1', 'value2')")
-    statement.consistency_level = consistency
+    statement = STATEMENT_CACHE.prepare(session, "INSERT INTO cf (key, c1, c2) VALUES (?, 'value1', 'value2')")
 
-    execute_concurrent_with_args(session, statement, [['k{}'.format(k)] for k in keys])
+    execute_concurrent(session, [(STATEMENT_CACHE.bind(statement, ['k{}'.format(k)], consistency_level=consistency), None) for k in keys])
 
 
 def query_c1c2(session, key, consistency=ConsistencyLevel.QUORUM, tolerate_missing=False, must_be_missing=False):
-    query = SimpleStatement('SELECT c1, c2 FROM cf WHERE key=\'k%d\'' % key, consistency_level=consistency)
-    rows = list(session.execute(query))
+    statement = STATEMENT_CACHE.prepare(session, "SELECT c1, c2 FROM cf WHERE key=?")
+    rows = list(session.execute(STATEMENT_CACHE.bind(statement, ['k{}'.format(key)], consistency_level=consistency)))
     if not tolerate_missing:
         assertions.assert_length_equal(rows, 1)
         res = rows[0]
@@ -89,6 +89,72 @@ def query_c1c2(session, key, consistency=ConsistencyLevel.QUORUM, tolerate_missi
         assertions.assert_length_equal(rows, 0)
 
 
+def verify_reads(session, statement, keys, expected, concurrency=100, max_reported=20, consistency_level=None):
+    """
+    Read many keys concurrently and compare each result to what is expected,
+    raising a single AssertionError that reports every mismatch.
+
+    Checking keys with one synchronous query each costs one round-trip per
+    key; this keeps up to `concurrency` reads in flight instead, and carries
+    on past the first bad key so a failing run shows all of them.
+
+    @param session Session to use
+    @param statement Prepared statement to bind each key to
+    @param keys Iterable of keys. A key that is a tuple is bound as the
+           statement's parameters, any other key is bound as its only parameter.
+    @param expected Function taking a key and returning the expected rows, as a list of lists
+    @param concurrency Maximum number of reads in flight at once
+    @param max_reported Maximum number of mismatches described in detail in the failure message
+    @param consistency_level Optional consistency level for the reads, set on each
+           bound statement so that a shared prepared statement is left untouched
+    @throws AssertionError If any read fails or returns rows other than the expected ones
+
+    Examples:
+    statement = STATEMENT_CACHE.prepare(session, "SELECT k, v FROM test WHERE k = ?")
+    verify_reads(session, statement, range(10000), lambda k: [[k, str(k)]])
+    """
+    keys = list(keys)
+    bound = (STATEMENT_CACHE.bind(statement, k if isinstance(k, tuple) else (k,), consistency_level=consistency_level) for k in keys)
+    results = execute_concurrent(session, ((b, None) for b in bound), concurrency=concurrency,
+                                 raise_on_first_error=False, results_generator=True)
+
+    mismatches = []
+    for key, (success, result) in zip(keys, results):
+        if not success:
+            mismatches.append((key, 'query failed: {}'.format(repr(result))))
+            continue
+        actual, wanted = rows_to_list(result), expected(key)
+        if actual != wanted:
+            mismatches.append((key, 'expected {} but got {}'.format(wanted, actual)))
+
+    if mismatches:
+        details = '\n'.join('  {}: {}'.format(key, description) for key, description in mismatches[:max_reported])
+        raise AssertionError('{bad} of {total} keys read with "{query}" did not match.\n'
+                             'Bad keys: {bad_keys}\n'
+                             'First {n} mismatches:\n{details}'.format(bad=len(mismatches), total=len(keys),
+                                                                       query=statement.query_string,
+                                                                       bad_keys=[key for key, _ in mismatches],
+                                                                       n=max_reported, details=details))
+
+
+def query_c1c2_keys(session, keys, consistency=ConsistencyLevel.QUORUM, must_be_missing=False, concurrency=100):
+    """
+    Check many keys written by insert_c1c2 at once, the way query_c1c2 checks
+    a single key. The reads are run concurrently and every bad key is reported
+    in a single AssertionError.
+
+    @param session Session to use
+    @param keys Iterable of integer keys, as given to insert_c1c2
+    @param consistency Consistency level for the reads
+    @param must_be_missing If True, assert the keys are missing instead of present
+    @param concurrency Maximum number of reads in flight at once
+    """
+    statement = STATEMENT_CACHE.prepare(session, "SELECT c1, c2 FROM cf WHERE key=?")
+    expected = [] if must_be_missing else [['value1', 'value2']]
+    verify_reads(session, statement, ('k{}'.format(k) for k in keys), lambda key: expected,
+                 concurrency=concurrency, consistency_level=consistency)
+
+
 # work for cluster started by populate
 def new_node(cluster, bootstrap=True, token=None, remote_debug_port='0', data_center=None):
     i = len(cluster.nodes) + 1
@@ -7,7 +7,7 @@ from ccmlib.node import NodetoolError, TimeoutError
 
 from assertions import assert_almost_equal
 from dtest import Tester
-from tools import (debug, insert_c1c2, known_failure, no_vnodes, query_c1c2,
+from tools import (debug, insert_c1c2, known_failure, no_vnodes, query_c1c2_keys,
                    since)
 
 
@@ -84,8 +84,7 @@ class TestTopology(Tester):
         cluster.cleanup()
 
         # Check we can get all the keys
-        for n in xrange(0, 30000):
-            query_c1c2(session, n, ConsistencyLevel.ONE)
+        query_c1c2_keys(session, xrange(0, 30000), ConsistencyLevel.ONE)
 
         # Now the load should be basically even
         sizes = [node.data_size() for node in [node1, node2, node3]]
@@ -120,8 +119,7 @@ class TestTopology(Tester):
         time.sleep(.5)
 
         # Check we can get all the keys
-        for n in xrange(0, 30000):
-            query_c1c2(session, n, ConsistencyLevel.QUORUM)
+        query_c1c2_keys(session, xrange(0, 30000), ConsistencyLevel.QUORUM)
 
         sizes = [node.data_size() for node in cluster.nodelist() if node.is_running()]
         debug(sizes)
@@ -153,8 +151,7 @@ class TestTopology(Tester):
         cluster.cleanup()
 
         # Check we can get all the keys
-        for n in xrange(0, 10000):
-            query_c1c2(session, n, ConsistencyLevel.ONE)
+        query_c1c2_keys(session, xrange(0, 10000), ConsistencyLevel.ONE)
 
     @known_failure(failure_source='test',
                    jira_url='https://issues.apache.org/jira/browse/CASSANDRA-12260',
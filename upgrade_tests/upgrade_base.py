@@ -7,6 +7,11 @@ from unittest import skipIf
 from ccmlib.common import get_version_from_build, is_win
 
 from dtest import DEBUG, Tester, debug
+from node_startup import start_cluster
+from upgrade_state_cache import UpgradeStateCache
+
+# set to a directory to share prepared starting-version clusters between tests, see upgrade_state_cache
+UPGRADE_STATE_CACHE_DIR = os.environ.get('UPGRADE_STATE_CACHE_DIR')
 
 
 def switch_jdks(major_version_int):
@@ -85,15 +90,31 @@ class UpgradeTester(Tester):
         cluster.populate(nodes)
         node1 = cluster.nodelist()[0]
         cluster.set_install_dir(version=self.UPGRADE_PATH.starting_version)
-        cluster.start(wait_for_binary_proto=True)
+
+        state_cache, state_key, restored = None, None, False
+        if UPGRADE_STATE_CACHE_DIR:
+            state_cache = UpgradeStateCache(UPGRADE_STATE_CACHE_DIR)
+            state_key = state_cache.key(cluster, protocol_version=protocol_version, rf=rf, create_keyspace=create_keyspace)
+            if state_key in state_cache:
+                self.cluster = cluster = state_cache.restore(state_key, cluster)
+                restored = True
+
+        start_cluster(cluster)
 
         node1 = cluster.nodelist()[0]
-        time.sleep(0.2)
 
         session = self.patient_cql_connection(node1, protocol_version=protocol_version)
-        if create_keyspace:
+        if create_keyspace and not restored:
             self.create_ks(session, 'ks', rf)
 
+        if state_cache is not None and not restored:
+            session.cluster.shutdown()
+            state_cache.save(state_key, cluster)
+            session = self.patient_cql_connection(node1, protocol_version=protocol_version)
+
+        if create_keyspace and state_cache is not None:
+            session.set_keyspace('ks')
+
         if cl:
             session.default_consistency_level = cl
 
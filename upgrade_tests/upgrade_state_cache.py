@@ -0,0 +1,130 @@
+"""
+A cache of populated, not-yet-upgraded ccm clusters, shared by upgrade tests
+that start from the same state.
+
+Many generated upgrade test classes start from the same version, node count
+and configuration, and every one of their tests pays for creating and first
+starting that cluster. The first test to prepare a given state saves a copy
+of the stopped cluster; the next ones clone it and start it straight away.
+
+Clones hardlink the large sstable components, which Cassandra never modifies
+in place, and copy the rest. Absolute paths in the cluster's configuration
+files are rewritten to the clone's path.
+"""
+import errno
+import hashlib
+import json
+import os
+import shutil
+
+from ccmlib.cluster_factory import ClusterFactory
+
+from dtest import debug
+
+_CLUSTER_PATH_PLACEHOLDER = '@@CCM_CLUSTER_PATH@@'
+# directories of a node that hold Cassandra's state rather than its configuration
+_STATE_DIRS = ('data', 'commitlogs', 'saved_caches', 'hints', 'cdc_raw')
+_LOG_DIR = 'logs'
+# sstable components that are only ever written once
+_IMMUTABLE_SUFFIXES = ('-Data.db', '-Index.db')
+
+
+def _clone_tree(source, destination, old_path, new_path):
+    """
+    Clone a ccm cluster directory, hardlinking immutable sstable components,
+    copying other state, leaving logs behind and replacing old_path with
+    new_path in every configuration file.
+    """
+    for root, dirs, files in os.walk(source):
+        relative_parts = os.path.relpath(root, source).split(os.sep)
+        # node directories are at the top of the cluster directory
+        node_subdir = relative_parts[1] if len(relative_parts) > 1 else ''
+        target_dir = os.path.normpath(os.path.join(destination, os.path.relpath(root, source)))
+        os.makedirs(target_dir)
+
+        if node_subdir == _LOG_DIR:
+            del dirs[:]
+            continue
+
+        for name in files:
+            source_file, target_file = os.path.join(root, name), os.path.join(target_dir, name)
+            if node_subdir.startswith(_STATE_DIRS):
+                if name.endswith(_IMMUTABLE_SUFFIXES):
+                    try:
+                        os.link(source_file, target_file)
+                        continue
+                    except OSError as e:
+                        # hardlinks can't cross filesystems
+                        if e.errno != errno.EXDEV:
+                            raise
+                shutil.copy2(source_file, target_file)
+            else:
+                with open(source_file, 'rb') as f:
+                    content = f.read()
+                with open(target_file, 'wb') as f:
+                    f.write(content.replace(old_path, new_path))
+                shutil.copymode(source_file, target_file)
+
+
+class UpgradeStateCache(object):
+    """
+    Saved cluster states under root, keyed by everything that determines a
+    freshly prepared cluster's state.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def key(self, cluster, **params):
+        """
+        Return the key of the state `cluster` will be in once prepared.
+
+        @param cluster A populated ccm cluster, set to its starting version
+        @param params Anything else that determines the prepared state, like the keyspaces created
+        """
+        state = dict(params,
+                     version=str(cluster.version()),
+                     install_dir=cluster.get_install_dir(),
+                     nodes=len(cluster.nodelist()),
+                     partitioner=cluster.partitioner,
+                     use_vnodes=cluster.use_vnodes,
+                     data_dir_count=cluster.data_dir_count,
+                     config_options=cluster._config_options)
+        return hashlib.sha1(json.dumps(state, sort_keys=True, default=str)).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.isdir(self.path(key))
+
+    def save(self, key, cluster):
+        """
+        Save the state of `cluster`, then start it again.
+        """
+        cluster.flush()
+        cluster.stop()
+
+        # copy aside first, so concurrent test runs never see a partial state
+        temporary_path = '{}.tmp-{}'.format(self.path(key), os.getpid())
+        _clone_tree(cluster.get_path(), temporary_path, cluster.get_path(), _CLUSTER_PATH_PLACEHOLDER)
+        try:
+            os.rename(temporary_path, self.path(key))
+            debug('Saved the pre-upgrade cluster state to {}'.format(self.path(key)))
+        except OSError:
+            # another run saved the same state first
+            shutil.rmtree(temporary_path, ignore_errors=True)
+
+        cluster.start(wait_for_binary_proto=True)
+
+    def restore(self, key, cluster):
+        """
+        Replace `cluster`, populated but not started, with a clone of the saved state.
+
+        @return The ccm cluster loaded from the clone
+        """
+        path = cluster.get_path()
+        shutil.rmtree(path)
+        _clone_tree(self.path(key), path, _CLUSTER_PATH_PLACEHOLDER, path)
+        debug('Restored the pre-upgrade cluster state from {}'.format(self.path(key)))
+        return ClusterFactory.load(*os.path.split(path))
@@ -1,13 +1,9 @@
-import operator
 import os
 import pprint
 import random
-import signal
 import time
 import uuid
 from collections import defaultdict, namedtuple
-from multiprocessing import Process, Queue
-from Queue import Empty, Full
 from unittest import skipUnless
 
 import psutil
@@ -15,209 +11,15 @@ from cassandra import ConsistencyLevel, WriteTimeout
 from cassandra.query import SimpleStatement
 from six import print_
 
+from assertions import assert_row_count_by_token_range
 from dtest import RUN_STATIC_UPGRADE_MATRIX, Tester, debug
+from token_ranges import verify_table_checksums
 from tools import generate_ssl_stores, known_failure, new_node
 from upgrade_base import switch_jdks
 from upgrade_manifest import (build_upgrade_pairs, current_2_0_x,
                               current_2_1_x, current_2_2_x, current_3_0_x,
                               indev_2_2_x, indev_3_x)
-
-
-def data_writer(tester, to_verify_queue, verification_done_queue, rewrite_probability=0):
-    """
-    Process for writing/rewriting data continuously.
-
-    Pushes to a queue to be consumed by data_checker.
-
-    Pulls from a queue of already-verified rows written by data_checker that it can overwrite.
-
-    Intended to be run using multiprocessing.
-    """
-    # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
-    session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
-
-    prepared = session.prepare("UPDATE cf SET v=? WHERE k=?")
-    prepared.consistency_level = ConsistencyLevel.QUORUM
-
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        to_verify_queue.close()
-        exit(0)
-
-    signal.signal(signal.SIGTERM, handle_sigterm)
-
-    while True:
-        try:
-            key = None
-
-            if (rewrite_probability > 0) and (random.randint(0, 100) <= rewrite_probability):
-                try:
-                    key = verification_done_queue.get_nowait()
-                except Empty:
-                    # we wanted a re-write but the re-writable queue was empty. oh well.
-                    pass
-
-            key = key or uuid.uuid4()
-
-            val = uuid.uuid4()
-
-            session.execute(prepared, (val, key))
-
-            to_verify_queue.put_nowait((key, val,))
-        except Exception:
-            debug("Error in data writer process!")
-            to_verify_queue.close()
-            raise
-
-
-def data_checker(tester, to_verify_queue, verification_done_queue):
-    """
-    Process for checking data continuously.
-
-    Pulls from a queue written to by data_writer to know what to verify.
-
-    Pushes to a queue to tell data_writer what's been verified and could be a candidate for re-writing.
-
-    Intended to be run using multiprocessing.
-    """
-    # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
-    session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
-
-    prepared = session.prepare("SELECT v FROM cf WHERE k=?")
-    prepared.consistency_level = ConsistencyLevel.QUORUM
-
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        verification_done_queue.close()
-        exit(0)
-
-    signal.signal(signal.SIGTERM, handle_sigterm)
-
-    while True:
-        try:
-            # here we could block, but if the writer process terminates early with an empty queue
-            # we would end up blocking indefinitely
-            (key, expected_val) = to_verify_queue.get_nowait()
-
-            actual_val = session.execute(prepared, (key,))[0][0]
-        except Empty:
-            time.sleep(0.1)  # let's not eat CPU if the queue is empty
-            continue
-        except Exception:
-            debug("Error in data verifier process!")
-            verification_done_queue.close()
-            raise
-        else:
-            try:
-                verification_done_queue.put_nowait(key)
-            except Full:
-                # the rewritable queue is full, not a big deal. drop this one.
-                # we keep the rewritable queue held to a modest max size
-                # and allow dropping some rewritables because we don't want to
-                # rewrite rows in the same sequence as originally written
-                pass
-
-        tester.assertEqual(expected_val, actual_val, "Data did not match expected value!")
-
-
-def counter_incrementer(tester, to_verify_queue, verification_done_queue, rewrite_probability=0):
-    """
-    Process for incrementing counters continuously.
-
-    Pushes to a queue to be consumed by counter_checker.
-
-    Pulls from a queue of already-verified rows written by data_checker that it can increment again.
-
-    Intended to be run using multiprocessing.
-    """
-    # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
-    session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
-
-    prepared = session.prepare("UPDATE countertable SET c = c + 1 WHERE k1=?")
-    prepared.consistency_level = ConsistencyLevel.QUORUM
-
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        to_verify_queue.close()
-        exit(0)
-
-    signal.signal(signal.SIGTERM, handle_sigterm)
-
-    while True:
-        try:
-            key = None
-            count = 0  # this will get set to actual last known count if we do a re-write
-
-            if (rewrite_probability > 0) and (random.randint(0, 100) <= rewrite_probability):
-                try:
-                    key, count = verification_done_queue.get_nowait()
-                except Empty:
-                    # we wanted a re-write but the re-writable queue was empty. oh well.
-                    pass
-
-            key = key or uuid.uuid4()
-
-            session.execute(prepared, (key))
-
-            to_verify_queue.put_nowait((key, count + 1,))
-        except Exception:
-            debug("Error in counter incrementer process!")
-            to_verify_queue.close()
-            raise
-
-
-def counter_checker(tester, to_verify_queue, verification_done_queue):
-    """
-    Process for checking counters continuously.
-
-    Pulls from a queue written to by counter_incrementer to know what to verify.
-
-    Pushes to a queue to tell counter_incrementer what's been verified and could be a candidate for incrementing again.
-
-    Intended to be run using multiprocessing.
-    """
-    # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
-    session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
-
-    prepared = session.prepare("SELECT c FROM countertable WHERE k1=?")
-    prepared.consistency_level = ConsistencyLevel.QUORUM
-
-    def handle_sigterm(signum, frame):
-        # need to close queue gracefully if possible, or the data_checker process
-        # can't seem to empty the queue and test failures result.
-        verification_done_queue.close()
-        exit(0)
-
-    signal.signal(signal.SIGTERM, handle_sigterm)
-
-    while True:
-        try:
-            # here we could block, but if the writer process terminates early with an empty queue
-            # we would end up blocking indefinitely
-            (key, expected_count) = to_verify_queue.get_nowait()
-
-            actual_count = session.execute(prepared, (key,))[0][0]
-        except Empty:
-            time.sleep(0.1)  # let's not eat CPU if the queue is empty
-            continue
-        except Exception:
-            debug("Error in counter verifier process!")
-            verification_done_queue.close()
-            raise
-        else:
-            tester.assertEqual(expected_count, actual_count, "Data did not match expected value!")
-
-            try:
-                verification_done_queue.put_nowait((key, actual_count))
-            except Full:
-                # the rewritable queue is full, not a big deal. drop this one.
-                # we keep the rewritable queue held to a modest max size
-                # and allow dropping some rewritables because we don't want to
-                # rewrite rows in the same sequence as originally written
-                pass
+from upgrade_workload import ContinuousWorkload, CounterSpec, DataSpec
 
 
 class UpgradeTester(Tester):
@@ -227,6 +29,11 @@ class UpgradeTester(Tester):
     test_version_metas = None  # set on init to know which versions to use
     subprocs = None  # holds any subprocesses, for status checking and cleanup
     extra_config = None  # holds a non-mutable structure that can be cast as dict()
+    # rolling upgrades fail when, while the cluster is left alone between node upgrades or after them, the background
+    # workload's p99 latency grows, or its throughput drops, by more than these factors of what they were before the upgrade.
+    # The checks are off unless set, e.g. UPGRADE_MAX_P99_DEGRADATION=10 UPGRADE_MIN_THROUGHPUT_RATIO=0.2.
+    max_p99_degradation = float(os.environ['UPGRADE_MAX_P99_DEGRADATION']) if os.environ.get('UPGRADE_MAX_P99_DEGRADATION') else None
+    min_throughput_ratio = float(os.environ['UPGRADE_MIN_THROUGHPUT_RATIO']) if os.environ.get('UPGRADE_MIN_THROUGHPUT_RATIO') else None
     __test__ = False  # this is a base class only
 
     def __init__(self, *args, **kwargs):
@@ -336,8 +143,12 @@ class UpgradeTester(Tester):
 
         if rolling:
             # start up processes to write and verify data
-            write_proc, verify_proc, verification_queue = self._start_continuous_write_and_verify(wait_for_rowcount=5000)
-            increment_proc, incr_verify_proc, incr_verify_queue = self._start_continuous_counter_increment_and_verify(wait_for_rowcount=5000)
+            workloads = [ContinuousWorkload(self, DataSpec()), ContinuousWorkload(self, CounterSpec())]
+            for workload in workloads:
+                workload.start(wait_for_rowcount=5000)
+
+            for workload in workloads:
+                workload.report_phase('warm-up')
 
             # upgrade through versions
             for version_meta in self.test_version_metas[1:]:
@@ -347,24 +158,41 @@ class UpgradeTester(Tester):
                     # additionally this should provide more time for timeouts and other issues to crop up as well, which we could
                     # possibly "speed past" in an overly fast upgrade test
                     time.sleep(60)
+                    for workload in workloads:
+                        workload.report_phase('before upgrading {} to {}'.format(node.name, version_meta.version), steady_state=True)
 
                     self.upgrade_to_version(version_meta, partial=True, nodes=(node,))
 
                     self._check_on_subprocs(self.subprocs)
                     debug('Successfully upgraded %d of %d nodes to %s' %
                           (num + 1, len(self.cluster.nodelist()), version_meta.version))
+                    for workload in workloads:
+                        workload.report_phase('upgrading {} to {}'.format(node.name, version_meta.version))
 
                 self.cluster.set_install_dir(version=version_meta.version)
-
-            # Stop write processes
-            write_proc.terminate()
-            increment_proc.terminate()
-            # wait for the verification queue's to empty (and check all rows) before continuing
-            self._wait_until_queue_condition('writes pending verification', verification_queue, operator.le, 0, max_wait_s=1200)
-            self._wait_until_queue_condition('counters pending verification', incr_verify_queue, operator.le, 0, max_wait_s=1200)
-            self._check_on_subprocs([verify_proc, incr_verify_proc])  # make sure the verification processes are running still
+                self._log_current_ver(version_meta)
+
+            # when the workload is checked for degradations, let the fully upgraded cluster run it for as long
+            # as each mixed-version one did
+            if self.max_p99_degradation is not None or self.min_throughput_ratio is not None:
+                time.sleep(60)
+            self._check_on_subprocs(self.subprocs)
+            for workload in workloads:
+                workload.report_phase('after upgrading to {}'.format(version_meta.version), steady_state=True)
+
+            # Stop write processes, and wait for the verifiers to check all rows before continuing
+            for workload in workloads:
+                workload.stop(max_wait_s=1200)
+
+            degradations = []
+            for workload in workloads:
+                debug(workload.phase_report())
+                degradations.extend(workload.degradations(max_p99_ratio=self.max_p99_degradation,
+                                                          min_throughput_ratio=self.min_throughput_ratio))
 
             self._terminate_subprocs()
+            if degradations:
+                self.fail('The workload degraded during the upgrade:\n{}'.format('\n'.join(degradations)))
         # not a rolling upgrade, do everything in parallel:
         else:
             # upgrade through versions
@@ -511,102 +339,9 @@ class UpgradeTester(Tester):
         for node in self.cluster.nodelist():
             session = self.patient_cql_connection(node, protocol_version=self.protocol_version)
             session.execute("use upgrade")
-            for x in self.row_values:
-                query = SimpleStatement("SELECT k,v FROM cf WHERE k=%d" % x, consistency_level=consistency_level)
-                result = session.execute(query)
-                k, v = result[0]
-                self.assertEqual(x, k)
-                self.assertEqual(str(x), v)
-
-    def _wait_until_queue_condition(self, label, queue, opfunc, required_len, max_wait_s=600):
-        """
-        Waits up to max_wait_s for queue size to return True when evaluated against a condition function from the operator module.
-
-        Label is just a string identifier for easier debugging.
-
-        On Mac OS X may not be able to check queue size, in which case it will not block.
-
-        If time runs out, raises RuntimeError.
-        """
-        wait_end_time = time.time() + max_wait_s
-
-        while time.time() < wait_end_time:
-            try:
-                qsize = queue.qsize()
-            except NotImplementedError:
-                debug("Queue size may not be checkable on Mac OS X. Test will continue without waiting.")
-                break
-            if opfunc(qsize, required_len):
-                debug("{} queue size ({}) is '{}' to {}. Continuing.".format(label, qsize, opfunc.__name__, required_len))
-                break
-
-            if divmod(round(time.time()), 30)[1] == 0:
-                debug("{} queue size is at {}, target is to reach '{}' {}".format(label, qsize, opfunc.__name__, required_len))
-
-            time.sleep(0.1)
-            continue
-        else:
-            raise RuntimeError("Ran out of time waiting for queue size ({}) to be '{}' to {}. Aborting.".format(qsize, opfunc.__name__, required_len))
-
-    def _start_continuous_write_and_verify(self, wait_for_rowcount=0, max_wait_s=600):
-        """
-        Starts a writer process, a verifier process, a queue to track writes,
-        and a queue to track successful verifications (which are rewrite candidates).
-
-        wait_for_rowcount provides a number of rows to write before unblocking and continuing.
-
-        Returns the writer process, verifier process, and the to_verify_queue.
-        """
-        # queue of writes to be verified
-        to_verify_queue = Queue()
-        # queue of verified writes, which are update candidates
-        verification_done_queue = Queue(maxsize=500)
-
-        writer = Process(target=data_writer, args=(self, to_verify_queue, verification_done_queue, 25))
-        # daemon subprocesses are killed automagically when the parent process exits
-        writer.daemon = True
-        self.subprocs.append(writer)
-        writer.start()
-
-        if wait_for_rowcount > 0:
-            self._wait_until_queue_condition('rows written (but not verified)', to_verify_queue, operator.ge, wait_for_rowcount, max_wait_s=max_wait_s)
-
-        verifier = Process(target=data_checker, args=(self, to_verify_queue, verification_done_queue))
-        # daemon subprocesses are killed automagically when the parent process exits
-        verifier.daemon = True
-        self.subprocs.append(verifier)
-        verifier.start()
-
-        return writer, verifier, to_verify_queue
-
-    def _start_continuous_counter_increment_and_verify(self, wait_for_rowcount=0, max_wait_s=600):
-        """
-        Starts a counter incrementer process, a verifier process, a queue to track writes,
-        and a queue to track successful verifications (which are re-increment candidates).
-
-        Returns the writer process, verifier process, and the to_verify_queue.
-        """
-        # queue of writes to be verified
-        to_verify_queue = Queue()
-        # queue of verified writes, which are update candidates
-        verification_done_queue = Queue(maxsize=500)
-
-        incrementer = Process(target=data_writer, args=(self, to_verify_queue, verification_done_queue, 25))
-        # daemon subprocesses are killed automagically when the parent process exits
-        incrementer.daemon = True
-        self.subprocs.append(incrementer)
-        incrementer.start()
-
-        if wait_for_rowcount > 0:
-            self._wait_until_queue_condition('counters incremented (but not verified)', to_verify_queue, operator.ge, wait_for_rowcount, max_wait_s=max_wait_s)
-
-        count_verifier = Process(target=data_checker, args=(self, to_verify_queue, verification_done_queue))
-        # daemon subprocesses are killed automagically when the parent process exits
-        count_verifier.daemon = True
-        self.subprocs.append(count_verifier)
-        count_verifier.start()
-
-        return incrementer, count_verifier, to_verify_queue
+            verify_table_checksums(session, 'upgrade', 'cf', ['k', 'v'],
+                                   lambda: ([x, str(x)] for x in self.row_values),
+                                   consistency_level=consistency_level)
 
     def _increment_counters(self, opcount=25000):
         debug("performing {opcount} counter increments".format(opcount=opcount))
@@ -658,20 +393,14 @@ class UpgradeTester(Tester):
                 self.assertEqual(actual_value, expected_value)
 
     def _check_select_count(self, consistency_level=ConsistencyLevel.ALL):
-        debug("Checking SELECT COUNT(*)")
+        debug("Checking the row count")
         session = self.patient_cql_connection(self.node2, protocol_version=self.protocol_version)
         session.execute("use upgrade;")
 
         expected_num_rows = len(self.row_values)
 
-        countquery = SimpleStatement("SELECT COUNT(*) FROM cf;", consistency_level=consistency_level)
-        result = session.execute(countquery)
-
-        if result is not None:
-            actual_num_rows = result[0][0]
-            self.assertEqual(actual_num_rows, expected_num_rows, "SELECT COUNT(*) returned %s when expecting %s" % (actual_num_rows, expected_num_rows))
-        else:
-            self.fail("Count query did not return")
+        # count each token range separately, a single SELECT COUNT(*) at ALL times out on large tables
+        assert_row_count_by_token_range(session, 'upgrade', 'cf', expected_num_rows, cl=consistency_level)
 
 
 class BootstrapMixin(object):
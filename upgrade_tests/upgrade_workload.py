@@ -0,0 +1,542 @@
+"""
+Continuous write-and-verify workloads, run in subprocesses while a cluster is
+being upgraded.
+
+Each workload runs pairs of writer and verifier processes. Writers keep a
+window of asynchronous writes in flight and hand the (key, value) records
+they wrote to their verifier in batches, through a ring buffer in shared
+memory. Verifiers read the records back and hand the ones they verified to
+their writer, as candidates for being rewritten. Every request is timed, and
+the latencies are kept in histograms shared by all the processes, so that
+each phase of the test can be compared with the ones before it.
+
+    workload = ContinuousWorkload(tester, DataSpec())
+    workload.start(wait_for_rowcount=5000)
+    ... upgrade nodes, calling workload.report_phase('...') along the way ...
+    workload.stop()
+    debug(workload.phase_report())
+"""
+import ctypes
+import multiprocessing
+import random
+import struct
+import threading
+import time
+import uuid
+
+from cassandra import ConsistencyLevel
+
+from dtest import debug
+from utils.latency_histogram import NUM_BUCKETS, LatencyHistogram
+
+RECORD_SIZE = 32
+# seconds before a failed read is tried again, times the number of times it failed, up to MAX_RETRY_BACKOFF
+RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 5
+
+
+class RecordRing(object):
+    """
+    A bounded FIFO of RECORD_SIZE-byte records in shared memory.
+
+    Records are copied in and out in batches under a single lock acquisition,
+    instead of being pickled through a pipe one at a time like with a
+    multiprocessing.Queue, and waiting processes are woken through a condition
+    variable rather than polling.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buffer = multiprocessing.RawArray(ctypes.c_char, capacity * RECORD_SIZE)
+        # total numbers of records ever pushed and popped
+        self._pushed = multiprocessing.RawValue(ctypes.c_longlong, 0)
+        self._popped = multiprocessing.RawValue(ctypes.c_longlong, 0)
+        self._condition = multiprocessing.Condition()
+
+    def _size(self):
+        return self._pushed.value - self._popped.value
+
+    def __len__(self):
+        with self._condition:
+            return self._size()
+
+    @property
+    def pushed(self):
+        with self._condition:
+            return self._pushed.value
+
+    def _wait(self, predicate, deadline):
+        while not predicate():
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._condition.wait(remaining)
+        return True
+
+    def put_many(self, records, timeout=None, drop=False):
+        """
+        Append records to the ring.
+
+        @param records List of RECORD_SIZE-byte strings
+        @param timeout Time, in seconds, to wait for room in the ring. None waits for as long as it takes.
+        @param drop If True, drop the records that don't fit instead of waiting for room
+        @return The number of records added, from the start of records
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        added = 0
+        with self._condition:
+            while added < len(records):
+                if drop and self._size() == self.capacity:
+                    break
+                if not self._wait(lambda: self._size() < self.capacity, deadline):
+                    break
+                batch = records[added:added + self.capacity - self._size()]
+                for record in batch:
+                    offset = (self._pushed.value % self.capacity) * RECORD_SIZE
+                    self._buffer[offset:offset + RECORD_SIZE] = record
+                    self._pushed.value += 1
+                added += len(batch)
+                self._condition.notify_all()
+        return added
+
+    def pop_many(self, max_records, timeout=None):
+        """
+        Remove up to max_records records from the ring, waiting up to timeout
+        seconds for there to be any.
+
+        @return A possibly empty list of RECORD_SIZE-byte strings
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        records = []
+        with self._condition:
+            if max_records > 0 and self._wait(lambda: self._size() > 0, deadline):
+                for _ in xrange(min(max_records, self._size())):
+                    offset = (self._popped.value % self.capacity) * RECORD_SIZE
+                    records.append(self._buffer[offset:offset + RECORD_SIZE])
+                    self._popped.value += 1
+                self._condition.notify_all()
+        return records
+
+    def wait_for(self, predicate, timeout=None):
+        """
+        Wait until predicate(pushed, size) is True, where pushed is the number of
+        records ever added to the ring and size the number currently in it.
+
+        @return Whether predicate was satisfied before timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            return self._wait(lambda: predicate(self._pushed.value, self._size()), deadline)
+
+
+class WorkloadStats(object):
+    """
+    Counters and latency histograms shared by all the processes of a workload.
+    """
+    # unverified: records whose reads failed every time they were tried
+    FIELDS = ('writes', 'write_errors', 'reads', 'read_errors', 'unverified', 'mismatches')
+    HISTOGRAMS = ('write_latency', 'read_latency')
+
+    def __init__(self):
+        # the counters, then the buckets of each histogram
+        self._counts = multiprocessing.Array(ctypes.c_longlong, len(self.FIELDS) + len(self.HISTOGRAMS) * NUM_BUCKETS)
+
+    def _histogram_offset(self, name):
+        return len(self.FIELDS) + self.HISTOGRAMS.index(name) * NUM_BUCKETS
+
+    def add(self, **counts):
+        """
+        Add to counters, and merge LatencyHistograms into the shared ones, e.g. add(writes=200, write_latency=histogram).
+        """
+        with self._counts.get_lock():
+            for field, count in counts.items():
+                if field in self.HISTOGRAMS:
+                    offset = self._histogram_offset(field)
+                    for index, bucket_count in count.nonzero():
+                        self._counts[offset + index] += bucket_count
+                else:
+                    self._counts[self.FIELDS.index(field)] += count
+
+    def snapshot(self):
+        """
+        @return A dict of the counters, and of copies of the histograms
+        """
+        with self._counts.get_lock():
+            values = self._counts[:]
+        snapshot = dict(zip(self.FIELDS, values))
+        for name in self.HISTOGRAMS:
+            offset = self._histogram_offset(name)
+            snapshot[name] = LatencyHistogram(values[offset:offset + NUM_BUCKETS])
+        return snapshot
+
+
+class DataSpec(object):
+    """
+    Writes random uuid values to random uuid keys of upgrade.cf, and reads them back.
+    """
+    name = 'data'
+    write_query = "UPDATE cf SET v=? WHERE k=?"
+    read_query = "SELECT v FROM cf WHERE k=?"
+
+    def next_record(self, rewritten=None):
+        return (uuid.uuid4() if rewritten is None else rewritten[0]), uuid.uuid4()
+
+    def write_params(self, record):
+        key, value = record
+        return value, key
+
+    def encode(self, record):
+        key, value = record
+        return key.bytes + value.bytes
+
+    def decode(self, data):
+        return uuid.UUID(bytes=data[:16]), uuid.UUID(bytes=data[16:])
+
+
+class CounterSpec(DataSpec):
+    """
+    Increments counters of upgrade.countertable, and reads them back.
+    """
+    name = 'counter'
+    write_query = "UPDATE countertable SET c = c + 1 WHERE k1=?"
+    read_query = "SELECT c FROM countertable WHERE k1=?"
+
+    def next_record(self, rewritten=None):
+        return (uuid.uuid4(), 1) if rewritten is None else (rewritten[0], rewritten[1] + 1)
+
+    def write_params(self, record):
+        return record[0],
+
+    def encode(self, record):
+        key, count = record
+        return key.bytes + struct.pack('>qq', 0, count)
+
+    def decode(self, data):
+        return uuid.UUID(bytes=data[:16]), struct.unpack('>qq', data[16:])[1]
+
+
+def _connect(tester, query):
+    # 'tester' is a cloned object so we shouldn't be inappropriately sharing anything with another process
+    session = tester.patient_cql_connection(tester.node1, keyspace="upgrade", protocol_version=tester.protocol_version)
+    prepared = session.prepare(query)
+    prepared.consistency_level = ConsistencyLevel.QUORUM
+    return session, prepared
+
+
+def execute_timed(session, statement, parameters, window):
+    """
+    Execute statement once for each set of parameters, with at most window
+    requests in flight, like execute_concurrent(raise_on_first_error=False),
+    timing every request.
+
+    @return The list of (success, rows or exception) tuples, in the order of
+            parameters, and the LatencyHistogram of the requests, failed ones included
+    """
+    results = [None] * len(parameters)
+    histogram = LatencyHistogram()
+    if not parameters:
+        return results, histogram
+
+    lock = threading.Lock()
+    done = threading.Event()
+    state = {'next': min(window, len(parameters)), 'pending': len(parameters)}
+
+    def finish(result, index, started, success):
+        results[index] = (success, result)
+        with lock:
+            histogram.record(time.time() - started)
+            next_index = state['next']
+            state['next'] += 1
+            state['pending'] -= 1
+            if state['pending'] == 0:
+                done.set()
+        if next_index < len(parameters):
+            send(next_index)
+
+    def send(index):
+        started = time.time()
+        try:
+            future = session.execute_async(statement, parameters[index])
+        except Exception as e:
+            finish(e, index, started, False)
+            return
+        future.add_callbacks(callback=finish, callback_args=(index, started, True),
+                             errback=finish, errback_args=(index, started, False))
+
+    for index in xrange(state['next']):
+        send(index)
+    done.wait()
+    return results, histogram
+
+
+def write_continuously(tester, spec, to_verify, rewritable, stats, stop, window, batch_size, rewrite_probability):
+    """
+    Process for writing/rewriting data continuously, until stop is set.
+
+    Pushes what it wrote to the to_verify ring, and pulls keys to rewrite from
+    the rewritable ring. Writes that fail aren't verified, since they may or
+    may not have been applied.
+
+    Intended to be run using multiprocessing.
+    """
+    session, prepared = _connect(tester, spec.write_query)
+
+    while not stop.is_set():
+        num_rewrites = sum(1 for _ in xrange(batch_size) if random.randint(0, 100) < rewrite_probability)
+        records = [spec.next_record(spec.decode(data)) for data in rewritable.pop_many(num_rewrites, timeout=0)]
+        records.extend(spec.next_record() for _ in xrange(batch_size - len(records)))
+
+        results, latencies = execute_timed(session, prepared, [spec.write_params(r) for r in records], window)
+        written = [spec.encode(r) for r, (success, _) in zip(records, results) if success]
+        stats.add(writes=len(written), write_errors=len(records) - len(written), write_latency=latencies)
+
+        while written and not stop.is_set():
+            written = written[to_verify.put_many(written, timeout=1):]
+
+
+def verify_continuously(tester, spec, to_verify, rewritable, stats, stop, window, batch_size, max_read_retries):
+    """
+    Process for checking data continuously, until stop is set, once everything
+    written has been pulled from the to_verify ring.
+
+    Pulls what to verify from the to_verify ring, and pushes what it verified
+    to the rewritable ring, dropping records when it's full. Reads that fail
+    are tried again, after a backoff, up to max_read_retries times; once stop
+    is set, they are tried one last time. Records that couldn't be read are
+    counted as unverified.
+
+    Intended to be run using multiprocessing.
+    """
+    session, prepared = _connect(tester, spec.read_query)
+
+    # (time of the next try, number of failed tries, record)
+    retries = []
+    while True:
+        stopping = stop.is_set()
+        now = time.time()
+        due = [retry for retry in retries if stopping or retry[0] <= now]
+        if not stopping:
+            due = due[:batch_size]
+        retries = [retry for retry in retries if retry not in due]
+        wait = 0 if due or stopping else min([1] + [next_try - now for next_try, _, _ in retries])
+        records = [(failures, data) for _, failures, data in due]
+        records.extend((0, data) for data in to_verify.pop_many(batch_size - len(records), timeout=wait))
+        if not records:
+            if stopping:
+                return
+            continue
+
+        decoded = [spec.decode(data) for _, data in records]
+        results, latencies = execute_timed(session, prepared, [(record[0],) for record in decoded], window)
+
+        failed, unverified, verified, mismatches = 0, 0, [], []
+        for (failures, data), (key, expected), (success, result) in zip(records, decoded, results):
+            if not success:
+                failed += 1
+                if stopping or failures >= max_read_retries:
+                    unverified += 1
+                else:
+                    retries.append((time.time() + min(RETRY_BACKOFF * (failures + 1), MAX_RETRY_BACKOFF), failures + 1, data))
+                continue
+            rows = list(result)
+            actual = rows[0][0] if rows else None
+            if actual == expected:
+                verified.append(data)
+            else:
+                mismatches.append((key, expected, actual))
+
+        stats.add(reads=len(records) - failed, read_errors=failed, unverified=unverified, mismatches=len(mismatches), read_latency=latencies)
+        rewritable.put_many(verified, drop=True)
+
+        if mismatches:
+            raise AssertionError("Data did not match expected value! (key, expected, actual): {}".format(mismatches[:20]))
+
+
+def _format_latency(seconds):
+    return '-' if seconds is None else '{:.1f}ms'.format(seconds * 1000)
+
+
+class ContinuousWorkload(object):
+    """
+    Runs pairs of writer and verifier processes against the 'upgrade' keyspace
+    of a tester's cluster, and reports their throughput, error rates and
+    latencies by phase of the test.
+
+    @param tester The UpgradeTester. Its processes are added to tester.subprocs.
+    @param spec DataSpec or CounterSpec
+    @param pairs Number of writer/verifier pairs. Defaults to one per 4 cores, between 1 and 4.
+    @param window Maximum number of requests in flight in each process
+    @param batch_size Number of records handed from process to process at once
+    @param ring_capacity Maximum number of records waiting to be verified, per pair
+    @param rewrite_probability Percentage of writes that rewrite an already verified key
+    @param max_read_retries Number of times a failed read of a record is tried again, before the record counts as unverified
+    """
+
+    def __init__(self, tester, spec, pairs=None, window=64, batch_size=200, ring_capacity=100000, rewrite_probability=25,
+                 max_read_retries=10):
+        self.tester = tester
+        self.spec = spec
+        self.pairs = pairs or max(1, min(4, multiprocessing.cpu_count() // 4))
+        self.window = window
+        self.batch_size = batch_size
+        self.rewrite_probability = rewrite_probability
+        self.max_read_retries = max_read_retries
+
+        self.stats = WorkloadStats()
+        self.to_verify = [RecordRing(ring_capacity) for _ in xrange(self.pairs)]
+        self.rewritable = [RecordRing(max(batch_size, ring_capacity // 100)) for _ in xrange(self.pairs)]
+        self.writers_stop = multiprocessing.Event()
+        self.verifiers_stop = multiprocessing.Event()
+        self.writers, self.verifiers = [], []
+        self.phases = []
+        self._last_snapshot = (time.time(), self.stats.snapshot())
+
+    def _start_process(self, target, args, name):
+        process = multiprocessing.Process(target=target, args=(self.tester, self.spec) + args, name=name)
+        # daemon subprocesses are killed automagically when the parent process exits
+        process.daemon = True
+        self.tester.subprocs.append(process)
+        process.start()
+        return process
+
+    def start(self, wait_for_rowcount=0, max_wait_s=600):
+        """
+        Start the writers, wait for them to write wait_for_rowcount rows, then start the verifiers.
+        """
+        for i in xrange(self.pairs):
+            self.writers.append(self._start_process(
+                write_continuously, (self.to_verify[i], self.rewritable[i], self.stats, self.writers_stop,
+                                     self.window, self.batch_size, self.rewrite_probability),
+                '{}-writer-{}'.format(self.spec.name, i)))
+
+        if wait_for_rowcount > 0:
+            self.wait_for_writes(wait_for_rowcount, max_wait_s=max_wait_s)
+
+        for i in xrange(self.pairs):
+            self.verifiers.append(self._start_process(
+                verify_continuously, (self.to_verify[i], self.rewritable[i], self.stats, self.verifiers_stop,
+                                      self.window, self.batch_size, self.max_read_retries),
+                '{}-verifier-{}'.format(self.spec.name, i)))
+
+    def _wait_for_rings(self, label, predicate, max_wait_s):
+        deadline = time.time() + max_wait_s
+        for ring in self.to_verify:
+            if not ring.wait_for(predicate, timeout=max(0, deadline - time.time())):
+                raise RuntimeError("Ran out of time waiting for {} {}. Aborting. Stats: {}".format(self.spec.name, label, self.stats.snapshot()))
+
+    def wait_for_writes(self, count, max_wait_s=600):
+        """
+        Wait until at least count rows have been written, across all writers.
+        """
+        per_writer = -(-count // self.pairs)
+        self._wait_for_rings('rows to be written', lambda pushed, size: pushed >= per_writer, max_wait_s)
+        debug("{} rows written (but not verified): {}".format(self.spec.name, sum(ring.pushed for ring in self.to_verify)))
+
+    def report_phase(self, label, steady_state=False):
+        """
+        Log the throughput, error rates and latencies of the workload since
+        the previous phase, and keep them in self.phases.
+
+        @param label What the cluster was going through during the phase
+        @param steady_state Whether the cluster was left alone during the phase, in which case
+                            it's compared with the first such phase by degradations()
+        @return The phase's dict of counters, 'write_latency' and 'read_latency' summaries,
+                'label', 'elapsed' time and 'steady_state'
+        """
+        now, snapshot = time.time(), self.stats.snapshot()
+        start, previous = self._last_snapshot
+        self._last_snapshot = now, snapshot
+
+        elapsed = max(now - start, 1e-6)
+        phase = dict((field, snapshot[field] - previous[field]) for field in WorkloadStats.FIELDS)
+        for name in WorkloadStats.HISTOGRAMS:
+            phase[name] = snapshot[name].since(previous[name]).summary()
+        phase.update(label=label, elapsed=elapsed, steady_state=steady_state)
+        self.phases.append(phase)
+
+        def rate(errors, successes):
+            return float(errors) / (errors + successes) if errors + successes else 0.0
+
+        debug("{workload} workload, {label}: {writes:.0f} writes/s ({write_error_rate:.2%} errors, p99 {write_p99}), "
+              "{reads:.0f} verifications/s ({read_error_rate:.2%} errors, p99 {read_p99}), {unverified} unverified, {mismatches} mismatches over {elapsed:.1f}s"
+              .format(workload=self.spec.name, label=label, elapsed=elapsed, unverified=phase['unverified'], mismatches=phase['mismatches'],
+                      writes=phase['writes'] / elapsed, write_error_rate=rate(phase['write_errors'], phase['writes']),
+                      write_p99=_format_latency(phase['write_latency']['p99']),
+                      reads=phase['reads'] / elapsed, read_error_rate=rate(phase['read_errors'], phase['reads']),
+                      read_p99=_format_latency(phase['read_latency']['p99'])))
+        return phase
+
+    def phase_report(self):
+        """
+        @return A table comparing the throughput and latencies of all the phases so far
+        """
+        columns = ('writes/s', 'write p50', 'write p99', 'write max', 'reads/s', 'read p50', 'read p99', 'read max')
+        rows = []
+        for phase in self.phases:
+            write, read = phase['write_latency'], phase['read_latency']
+            rows.append(('{:.0f}'.format(phase['writes'] / phase['elapsed']),
+                         _format_latency(write['p50']), _format_latency(write['p99']), _format_latency(write['max']),
+                         '{:.0f}'.format(phase['reads'] / phase['elapsed']),
+                         _format_latency(read['p50']), _format_latency(read['p99']), _format_latency(read['max'])))
+
+        label_width = max([len('phase')] + [len(phase['label']) + 2 for phase in self.phases])
+        lines = ['{} workload phases (* = steady state):'.format(self.spec.name),
+                 '{:<{width}} '.format('phase', width=label_width) + ' '.join('{:>10}'.format(c) for c in columns)]
+        for phase, row in zip(self.phases, rows):
+            label = '{}{}'.format(phase['label'], ' *' if phase['steady_state'] else '')
+            lines.append('{:<{width}} '.format(label, width=label_width) + ' '.join('{:>10}'.format(v) for v in row))
+        return '\n'.join(lines)
+
+    def degradations(self, max_p99_ratio=None, min_throughput_ratio=None):
+        """
+        Compare every steady-state phase with the first one, the baseline.
+
+        @param max_p99_ratio Maximum ratio of a phase's p99 write or read latency to the baseline's. None to not check.
+        @param min_throughput_ratio Minimum ratio of a phase's write or read throughput to the baseline's. None to not check.
+        @return A list of messages describing the phases that degraded beyond either ratio
+        """
+        steady = [phase for phase in self.phases if phase['steady_state']]
+        if len(steady) < 2:
+            return []
+        baseline = steady[0]
+
+        def throughput(phase, op):
+            return phase[op + 's'] / phase['elapsed']
+
+        messages = []
+        for phase in steady[1:]:
+            for op in ('write', 'read'):
+                baseline_p99, p99 = baseline[op + '_latency']['p99'], phase[op + '_latency']['p99']
+                if max_p99_ratio is not None and baseline_p99 and p99 and p99 > baseline_p99 * max_p99_ratio:
+                    messages.append("{} workload, {}: {} p99 latency went from {} ({}) to {}, more than {}x".format(
+                        self.spec.name, phase['label'], op, _format_latency(baseline_p99), baseline['label'],
+                        _format_latency(p99), max_p99_ratio))
+                if min_throughput_ratio is not None and throughput(phase, op) < throughput(baseline, op) * min_throughput_ratio:
+                    messages.append("{} workload, {}: {} throughput went from {:.0f}/s ({}) to {:.0f}/s, less than {}x".format(
+                        self.spec.name, phase['label'], op, throughput(baseline, op), baseline['label'],
+                        throughput(phase, op), min_throughput_ratio))
+        return messages
+
+    def stop(self, max_wait_s=1200):
+        """
+        Stop the writers, wait for the verifiers to check everything that was
+        written, and stop them.
+
+        @throws RuntimeError If a process exited with an error, data didn't match, or couldn't be read
+        """
+        self.writers_stop.set()
+        for writer in self.writers:
+            writer.join(max_wait_s)
+        # the verifiers have to be running still to empty the rings
+        self.tester._check_on_subprocs(self.verifiers)
+        self._wait_for_rings('writes pending verification', lambda pushed, size: size == 0, max_wait_s)
+
+        self.verifiers_stop.set()
+        for verifier in self.verifiers:
+            verifier.join(max_wait_s)
+        self.report_phase('stopping')
+
+        failed = [p.name for p in self.writers + self.verifiers if p.exitcode != 0]
+        stats = self.stats.snapshot()
+        if failed or stats['mismatches'] or stats['unverified']:
+            raise RuntimeError("{} workload failed: processes {} exited with errors; stats: {}".format(self.spec.name, failed, stats))
@@ -0,0 +1,329 @@
+"""
+Inspect commitlog segments, like the ones in the commitlogs and cdc_raw
+directories of a node, without starting the node or parsing its logs.
+
+    with CommitLogSegment(path) as segment:
+        segment.version, segment.id, segment.compression, segment.header_crc_valid()
+        for mutation in segment.mutations():
+            ...
+    segment_statistics(path)  # the same, as a dict
+
+Supports the segments of Cassandra 2.1 to 3.x (descriptor versions 4 to 6).
+Segments are memory mapped and read lazily: sync sections and mutations are
+found one after the other as they are iterated over, and the bytes of a
+mutation are only copied if asked for.
+
+A segment starts with a descriptor header: the version, the id, from 2.2 the
+parameters (compression) as json, and a CRC of all of them. Then come sync
+sections, each starting with a sync marker: the position of the next marker,
+and a CRC of the segment id and of the position of the marker. Sections
+contain mutations, each an int size, a CRC of the size, the serialized
+mutation, and a CRC of the size and the mutation. Sections of compressed
+segments are compressed as a whole, after their marker and their
+uncompressed length.
+"""
+import binascii
+import glob
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+from collections import namedtuple
+
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
+
+VERSION_21 = 4
+VERSION_22 = 5
+VERSION_30 = 6
+
+SYNC_MARKER_SIZE = 8
+COMPRESSED_MARKER_SIZE = SYNC_MARKER_SIZE + 4
+ENTRY_OVERHEAD_SIZE = 12
+
+_INT = struct.Struct('>i')
+_LONG = struct.Struct('>q')
+_SHORT = struct.Struct('>H')
+_TWO_INTS = struct.Struct('>ii')
+
+_FILENAME = re.compile(r'^CommitLog-(\d+)-(\d+)\.log$')
+
+SyncSection = namedtuple('SyncSection', ['position', 'end', 'crc_valid'])
+Mutation = namedtuple('Mutation', ['section', 'offset', 'size', 'crc_valid'])
+
+
+class UnsupportedSegment(Exception):
+    """
+    Raised when the mutations of a segment can't be read, like when it is compressed with a compressor that isn't installed.
+    """
+
+
+def _crc_of_ints(*values):
+    return binascii.crc32(struct.pack('>{}i'.format(len(values)), *values)) & 0xffffffff
+
+
+def _id_halves(segment_id):
+    # the CRCs of Cassandra have the least significant half of the id first
+    return segment_id & 0xffffffff, (segment_id >> 32) & 0xffffffff
+
+
+def _signed(value):
+    return value - (1 << 32) if value >= (1 << 31) else value
+
+
+def header_crc(version, segment_id, parameters=''):
+    """
+    @return The CRC of a descriptor header, as Cassandra computes it
+    """
+    low, high = _id_halves(segment_id)
+    ints = [version, _signed(low), _signed(high)]
+    if version < VERSION_22:
+        return _crc_of_ints(*ints)
+    ints.append(len(parameters))
+    return binascii.crc32(parameters, binascii.crc32(struct.pack('>4i', *ints))) & 0xffffffff
+
+
+def sync_marker_crc(segment_id, position):
+    """
+    @return The CRC of the sync marker at position of a segment
+    """
+    low, high = _id_halves(segment_id)
+    return _crc_of_ints(_signed(low), _signed(high), position)
+
+
+def segment_id(path):
+    """
+    @return (descriptor version, id) of a segment, from its file name
+    """
+    match = _FILENAME.match(os.path.basename(path))
+    if match is None:
+        raise ValueError('Not a commitlog segment: {}'.format(path))
+    return int(match.group(1)), int(match.group(2))
+
+
+def _decompress(compressor, data):
+    name = compressor.split('.')[-1]
+    if name == 'DeflateCompressor':
+        return zlib.decompress(data)
+    # LZ4Compressor prefixes blocks with their little-endian length, as lz4.block does
+    if name == 'LZ4Compressor' and lz4_block is not None:
+        return lz4_block.decompress(data)
+    if name == 'SnappyCompressor' and snappy is not None:
+        return snappy.uncompress(data)
+    raise UnsupportedSegment('Cannot decompress segments compressed with {}'.format(compressor))
+
+
+class CommitLogSegment(object):
+    """
+    A commitlog segment, memory mapped read-only, or read-write if writable.
+
+    The descriptor header is read on open; sync sections and mutations as they are iterated over.
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        with open(path, 'r+b' if writable else 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _INT.size:
+                raise ValueError('Not a commitlog segment, {} bytes long: {}'.format(size, path))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except (struct.error, ValueError):
+            self.close()
+            raise
+
+    def _read_header(self):
+        self.version = _INT.unpack_from(self._map, 0)[0]
+        if not VERSION_21 <= self.version <= VERSION_30:
+            raise ValueError('Unsupported commitlog descriptor version {}: {}'.format(self.version, self.path))
+        self.id = _LONG.unpack_from(self._map, 4)[0]
+        position = 12
+        self.raw_parameters = ''
+        if self.version >= VERSION_22:
+            length = _SHORT.unpack_from(self._map, position)[0]
+            position += _SHORT.size
+            self.raw_parameters = self._map[position:position + length]
+            position += length
+        self.parameters_position = position - len(self.raw_parameters)
+        self.crc_position = position
+        self.header_crc = _INT.unpack_from(self._map, position)[0] & 0xffffffff
+        self.header_size = position + _INT.size
+
+        try:
+            self.parameters = json.loads(self.raw_parameters) if self.raw_parameters else {}
+        except ValueError:
+            # the header CRC would tell it is corrupt
+            self.parameters = {}
+        self.compression = self.parameters.get('compressionClass')
+        self.encrypted = any(key.startswith('enc') for key in self.parameters)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @property
+    def size(self):
+        return len(self._map)
+
+    def header_crc_valid(self):
+        return self.header_crc == header_crc(self.version, self.id, self.raw_parameters)
+
+    def sync_sections(self):
+        """
+        Iterate over the sync sections of the segment, up to the first invalid sync marker, or to its end.
+
+        @return SyncSections, with the position of their marker, and the position their data ends at
+        """
+        position = self.header_size
+        while position + SYNC_MARKER_SIZE <= self.size:
+            end, crc = _TWO_INTS.unpack_from(self._map, position)
+            crc_valid = (crc & 0xffffffff) == sync_marker_crc(self.id, position)
+            # unused, zeroed, space of a segment
+            if end == 0 and crc == 0:
+                return
+            if end <= position or end > self.size:
+                return
+            yield SyncSection(position, end, crc_valid)
+            if not crc_valid:
+                return
+            position = end
+
+    def bytes_used(self):
+        """
+        @return The number of bytes of the segment written and synced: its header and its valid sync sections
+        """
+        used = self.header_size
+        for section in self.sync_sections():
+            if section.crc_valid:
+                used = section.end
+        return used
+
+    def _section_data(self, section):
+        """
+        @return (buffer, start, end) holding the mutations of a sync section
+        """
+        if self.encrypted:
+            raise UnsupportedSegment('Cannot read the mutations of encrypted segment {}'.format(self.path))
+        if self.compression is None:
+            return self._map, section.position + SYNC_MARKER_SIZE, section.end
+        uncompressed_length = _INT.unpack_from(self._map, section.position + SYNC_MARKER_SIZE)[0]
+        data = _decompress(self.compression, self._map[section.position + COMPRESSED_MARKER_SIZE:section.end])
+        return data, 0, min(uncompressed_length, len(data))
+
+    def mutations(self, check_crc=False):
+        """
+        Iterate over the mutations of the valid sync sections of the segment.
+
+        @param check_crc Whether to check the CRC of the content of every mutation, and not only the one of its size
+        @return Mutations, with the position of their section, and the offset and size of their serialized bytes;
+                the offset is in the file for uncompressed segments, in the uncompressed section otherwise
+        @throws UnsupportedSegment If the segment is encrypted, or compressed with a compressor that isn't installed
+        """
+        for section in self.sync_sections():
+            if not section.crc_valid:
+                return
+            data, position, end = self._section_data(section)
+            while position + ENTRY_OVERHEAD_SIZE <= end:
+                size, size_crc = _TWO_INTS.unpack_from(data, position)
+                # the end of the section, or of the segment for 2.1
+                if size == 0 or (size_crc & 0xffffffff) != binascii.crc32(data[position:position + 4]) & 0xffffffff:
+                    break
+                offset = position + 8
+                if offset + size + _INT.size > end:
+                    break
+                crc_valid = True
+                if check_crc:
+                    claimed = _INT.unpack_from(data, offset + size)[0] & 0xffffffff
+                    crc_valid = claimed == binascii.crc32(data[offset:offset + size], binascii.crc32(data[position:position + 4])) & 0xffffffff
+                yield Mutation(section.position, offset, size, crc_valid)
+                position = offset + size + _INT.size
+
+    def read(self, mutation):
+        """
+        @return The serialized bytes of a mutation
+        """
+        if self.compression is None:
+            return self._map[mutation.offset:mutation.offset + mutation.size]
+        data, _, _ = self._section_data(SyncSection(mutation.section, _INT.unpack_from(self._map, mutation.section)[0], True))
+        return data[mutation.offset:mutation.offset + mutation.size]
+
+    def rewrite_header(self, parameters=None, crc=None):
+        """
+        Overwrite the header of a segment opened writable, to corrupt it on purpose.
+
+        @param parameters New raw json parameters, as long as the current ones, so that the sections don't move
+        @param crc The header CRC to write, or None for the valid CRC of the new header
+        """
+        if parameters is not None:
+            if len(parameters) != len(self.raw_parameters):
+                raise ValueError('The new parameters must be {} bytes long, like the current ones'.format(len(self.raw_parameters)))
+            self._map[self.parameters_position:self.parameters_position + len(parameters)] = parameters
+        _INT.pack_into(self._map, self.crc_position, _signed(crc if crc is not None else header_crc(self.version, self.id, parameters or self.raw_parameters)))
+        self._map.flush()
+        self._read_header()
+
+
+def cdc_index(path):
+    """
+    Read the CDC index file of a segment, written from Cassandra 4.0.
+
+    @return (offset, completed): the offset up to which the segment holds CDC data, and whether it is complete;
+            None if the segment has no index file
+    """
+    index_path = re.sub(r'\.log$', '_cdc.idx', path)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        lines = f.read().split()
+    return int(lines[0]), len(lines) > 1 and lines[1] == 'COMPLETED'
+
+
+def segment_statistics(path, count_mutations=True):
+    """
+    @return A dict of the descriptor of a segment, its bytes used, its number of sync sections and
+            of mutations (None if they can't be read), and its CDC index
+    """
+    with CommitLogSegment(path) as segment:
+        sections = list(segment.sync_sections())
+        mutations = None
+        if count_mutations:
+            try:
+                mutations = sum(1 for _ in segment.mutations())
+            except UnsupportedSegment:
+                pass
+        return {
+            'version': segment.version,
+            'id': segment.id,
+            'compression': segment.compression,
+            'header_crc_valid': segment.header_crc_valid(),
+            'size': segment.size,
+            'bytes_used': segment.bytes_used(),
+            'sync_sections': len([section for section in sections if section.crc_valid]),
+            'mutations': mutations,
+            'cdc_index': cdc_index(path),
+        }
+
+
+def commitlog_segments(directory):
+    """
+    @return The paths of the commitlog segments of a directory, oldest first
+    """
+    paths = [path for path in glob.glob(os.path.join(directory, 'CommitLog-*.log')) if _FILENAME.match(os.path.basename(path))]
+    return sorted(paths, key=lambda path: segment_id(path)[1])
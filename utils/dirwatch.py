@@ -0,0 +1,442 @@
+"""
+Watch the data, commitlog, hints and cdc_raw directories of nodes, and keep
+count of their files and bytes as they change, rather than listing them over
+and over again.
+
+    watcher = watch_node(node)
+    node.nodetool('cleanup keyspace1 standard1')
+    watcher.max_sstable_count('keyspace1', 'standard1')
+    watcher.wait_until(lambda w: w.total_bytes('cdc_raw') >= 4 * 1024 * 1024, timeout=120)
+    watcher.stop()
+
+On Linux, changes are read from inotify, one by one, so that states that
+only last a few milliseconds, like sstables written then compacted away, are
+recorded too. Elsewhere, or if inotify can't be used, the directories are
+listed every poll_interval seconds, and short-lived states can be missed.
+
+Files are counted by category ('data', 'snapshots', 'backups', 'commitlog',
+'hints', 'cdc_raw'), keyspace and table; keyspace and table are None
+outside of data directories. Sizes are the ones of the last time a file was
+created, written or closed: the writes to memory mapped files, like
+commitlog segments, aren't seen until then.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+TREE_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+# watched in the parents of missing roots, to notice when they are created
+PARENT_MASK = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+
+_EVENT = struct.Struct('iIII')
+
+
+class _Inotify(object):
+    """
+    A thin wrapper of the inotify calls of libc.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+    def add_watch(self, path, mask):
+        """
+        @return The watch descriptor of path, or None if path is gone
+        """
+        wd = self._add_watch(self.fd, path.encode(sys.getfilesystemencoding() or 'utf-8') if isinstance(path, unicode) else path, mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return None
+            raise OSError(error, '{}: {}'.format(os.strerror(error), path))
+        return wd
+
+    def read(self, timeout):
+        """
+        @return The (wd, mask, name) events read within timeout seconds
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip('\0')
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DirectoryWatcher(object):
+    """
+    Keeps count of the files and bytes of directory trees in a background thread.
+
+    @param roots Dict of the directories to watch to their category; 'data' roots are
+                 laid out as data directories. Roots that don't exist yet are watched once created.
+    @param poll_interval Time, in seconds, between listings of the directories, when not using inotify
+    @param use_inotify Whether to use inotify, when it is available
+    """
+
+    def __init__(self, roots, poll_interval=0.1, use_inotify=True):
+        self.roots = dict((os.path.abspath(root), category) for root, category in roots.items())
+        self.poll_interval = poll_interval
+        self.started_at = None
+        # path -> (category, keyspace, table, size)
+        self._files = {}
+        self._counts = Counter()
+        self._bytes = Counter()
+        # highest sizes of every (category, keyspace, table), and of every (category,)
+        self._peak_bytes = Counter()
+        # (keyspace, table) -> [(time, number of sstables)], every time it changed
+        self._sstable_history = {}
+        self._changed = threading.Condition(threading.RLock())
+        self._stopped = threading.Event()
+        self._thread = None
+        self._inotify = None
+        if use_inotify and sys.platform.startswith('linux'):
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                # no inotify in this libc, or out of inotify instances
+                self._inotify = None
+        # watch descriptor -> directory
+        self._watches = {}
+        self._parent_watches = {}
+
+    @property
+    def using_inotify(self):
+        return self._inotify is not None
+
+    def start(self):
+        self.started_at = time.time()
+        if self._inotify is not None:
+            for root in self.roots:
+                self._watch_root(root)
+            target = self._read_events
+        else:
+            self._poll()
+            target = self._run_polls
+        self._thread = threading.Thread(target=target, name='directory-watcher')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _classify(self, path):
+        """
+        @return (category, keyspace, table) of a file, or None if it isn't in a root
+        """
+        for root, category in self.roots.items():
+            if not path.startswith(root + os.sep):
+                continue
+            if category != 'data':
+                return category, None, None
+            parts = path[len(root) + 1:].split(os.sep)
+            if len(parts) < 3:
+                return category, parts[0] if len(parts) > 1 else None, None
+            # ks/table-id/file, ks/table-id/snapshots/name/file, ks/table-id/backups/file
+            keyspace, table = parts[0], parts[1].split('-')[0]
+            if len(parts) > 3 and parts[2] in ('snapshots', 'backups'):
+                category = parts[2]
+            return category, keyspace, table
+        return None
+
+    def _is_sstable(self, path, category):
+        # tmplink sstables are early opened copies of sstables being written
+        name = os.path.basename(path)
+        return category == 'data' and name.endswith('Data.db') and 'tmplink' not in name
+
+    def _add(self, path, size):
+        key = self._classify(path)
+        if key is None:
+            return
+        if path in self._files:
+            self._bytes[key] += size - self._files[path][3]
+        else:
+            self._counts[key] += 1
+            self._bytes[key] += size
+            if self._is_sstable(path, key[0]):
+                self._record_sstables(key[1], key[2], 1)
+        self._files[path] = key + (size,)
+        self._peak_bytes[key] = max(self._peak_bytes[key], self._bytes[key])
+        category_bytes = sum(value for k, value in self._bytes.items() if k[0] == key[0])
+        self._peak_bytes[key[:1]] = max(self._peak_bytes[key[:1]], category_bytes)
+
+    def _remove(self, path):
+        if path not in self._files:
+            return
+        category, keyspace, table, size = self._files.pop(path)
+        self._counts[category, keyspace, table] -= 1
+        self._bytes[category, keyspace, table] -= size
+        if self._is_sstable(path, category):
+            self._record_sstables(keyspace, table, -1)
+
+    def _remove_tree(self, directory):
+        for path in [path for path in self._files if path.startswith(directory + os.sep)]:
+            self._remove(path)
+
+    def _record_sstables(self, keyspace, table, delta):
+        history = self._sstable_history.setdefault((keyspace, table), [(self.started_at, 0)])
+        history.append((time.time(), history[-1][1] + delta))
+
+    def _size(self, path):
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return None
+
+    def _list(self, directory):
+        """
+        @return Dict of every file under directory to its size
+        """
+        sizes = {}
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                size = self._size(path)
+                if size is not None:
+                    sizes[path] = size
+        return sizes
+
+    # polling
+
+    def _poll(self):
+        sizes = {}
+        for root in self.roots:
+            sizes.update(self._list(root))
+        with self._changed:
+            for path in [path for path in self._files if path not in sizes]:
+                self._remove(path)
+            for path, size in sizes.items():
+                if path not in self._files or self._files[path][3] != size:
+                    self._add(path, size)
+            self._changed.notify_all()
+
+    def _run_polls(self):
+        while not self._stopped.wait(self.poll_interval):
+            self._poll()
+
+    # inotify
+
+    def _watch_root(self, root):
+        parent = os.path.dirname(root)
+        if os.path.isdir(root):
+            self._watch_tree(root)
+        elif parent not in self._parent_watches.values():
+            wd = self._inotify.add_watch(parent, PARENT_MASK)
+            if wd is not None:
+                self._parent_watches[wd] = parent
+            # it could have been created in between
+            if os.path.isdir(root):
+                self._watch_tree(root)
+
+    def _watch_tree(self, directory):
+        """
+        Watch directory and its subdirectories, and count the files already in them.
+        """
+        for dirpath, _, _ in os.walk(directory):
+            wd = self._inotify.add_watch(dirpath, TREE_MASK)
+            if wd is not None:
+                self._watches[wd] = dirpath
+        with self._changed:
+            for path, size in self._list(directory).items():
+                self._add(path, size)
+
+    def _read_events(self):
+        while True:
+            # once stopped, handle the events already queued, then return
+            stopping = self._stopped.is_set()
+            events = self._inotify.read(timeout=0 if stopping else 0.5)
+            for wd, mask, name in events:
+                self._handle(wd, mask, name)
+            if events:
+                with self._changed:
+                    self._changed.notify_all()
+            elif stopping:
+                return
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            # events were lost: start over
+            with self._changed:
+                for path in list(self._files):
+                    self._remove(path)
+            for root in self.roots:
+                if os.path.isdir(root):
+                    self._watch_tree(root)
+            return
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            self._parent_watches.pop(wd, None)
+            return
+
+        if wd in self._parent_watches:
+            path = os.path.join(self._parent_watches[wd], name)
+            if path in self.roots and path not in self._watches.values():
+                self._watch_tree(path)
+            if wd not in self._watches:
+                return
+        directory = self._watches.get(wd)
+        if directory is None:
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            with self._changed:
+                self._remove_tree(directory)
+            if directory in self.roots:
+                self._watch_root(directory)
+            return
+        path = os.path.join(directory, name)
+
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                with self._changed:
+                    self._remove_tree(path)
+            return
+
+        with self._changed:
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._remove(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                # count it even if it's already gone, it existed for a moment
+                size = self._size(path)
+                self._add(path, size or 0)
+            elif path in self._files:
+                size = self._size(path)
+                if size is not None:
+                    self._add(path, size)
+
+    # queries
+
+    def _matching(self, counter, category, keyspace, table):
+        with self._changed:
+            return sum(value for (c, k, t), value in counter.items()
+                       if c == category and (keyspace is None or k == keyspace) and (table is None or t == table))
+
+    def file_count(self, category, keyspace=None, table=None):
+        """
+        @return The number of files in a category, of a keyspace and table if given
+        """
+        return self._matching(self._counts, category, keyspace, table)
+
+    def total_bytes(self, category, keyspace=None, table=None):
+        """
+        @return The size of the files in a category, of a keyspace and table if given
+        """
+        return self._matching(self._bytes, category, keyspace, table)
+
+    def peak_bytes(self, category, keyspace=None, table=None):
+        """
+        @return The highest size the files of a category, or of a table of it if keyspace and table
+                are given, had since the watcher started
+        """
+        key = (category, keyspace, table) if keyspace is not None and table is not None else (category,)
+        with self._changed:
+            return self._peak_bytes[key]
+
+    def files(self, category=None):
+        """
+        @return Dict of the path of every file, in category if given, to its size
+        """
+        with self._changed:
+            return dict((path, info[3]) for path, info in self._files.items() if category is None or info[0] == category)
+
+    def sstable_count(self, keyspace, table):
+        with self._changed:
+            return self._sstable_history.get((keyspace, table), [(None, 0)])[-1][1]
+
+    def sstable_count_history(self, keyspace, table):
+        """
+        @return [(time, number of sstables)] of a table, from when the watcher started, every time it changed
+        """
+        with self._changed:
+            return list(self._sstable_history.get((keyspace, table), [(self.started_at, 0)]))
+
+    def max_sstable_count(self, keyspace, table, since=None):
+        """
+        @return The highest number of sstables a table had, since the watcher started, or since the time since
+        """
+        history = self.sstable_count_history(keyspace, table)
+        if since is None:
+            return max(count for _, count in history)
+        # the count at since is the last one recorded before it
+        before = [count for timestamp, count in history if timestamp <= since]
+        return max(before[-1:] + [count for timestamp, count in history if timestamp > since])
+
+    def wait_until(self, predicate, timeout=60, description=None):
+        """
+        Block until predicate(watcher) is true, checking it every time the directories change.
+
+        @throws AssertionError If it isn't true within timeout seconds
+        """
+        deadline = time.time() + timeout
+        with self._changed:
+            while not predicate(self):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise AssertionError('{} was not true within {}s'.format(description or 'Condition on the watched directories', timeout))
+                # also wake up from time to time, for predicates on something else than the directories
+                self._changed.wait(min(remaining, 1.0))
+
+
+def node_directories(node):
+    """
+    @return Dict of the directories of a node a DirectoryWatcher watches, to their category
+    """
+    roots = dict((directory, 'data') for directory in node.data_directories())
+    for name, category in (('commitlogs', 'commitlog'), ('hints', 'hints'), ('cdc_raw', 'cdc_raw')):
+        roots[os.path.join(node.get_path(), name)] = category
+    return roots
+
+
+def watch_node(node, **kwargs):
+    """
+    @return A started DirectoryWatcher of the directories of a ccm node
+    """
+    return DirectoryWatcher(node_directories(node), **kwargs).start()
@@ -0,0 +1,122 @@
+"""
+HDR-style latency histograms: log-linear buckets with a fixed relative
+precision, so that recording is O(1), histograms of any number of samples
+have the same small size, and histograms recorded separately (say, in
+different processes) can be merged exactly.
+
+    histogram = LatencyHistogram()
+    histogram.record(time.time() - started)
+    histogram.percentile(99)  # in seconds
+
+Latencies are kept as integer microseconds. Values below 2 ** SUB_BUCKET_BITS
+microseconds get a bucket each; above that, every power of two is split in
+2 ** (SUB_BUCKET_BITS - 1) buckets, which keeps values within about 3% of
+what was recorded.
+"""
+
+SUB_BUCKET_BITS = 6
+_HALF_SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+# the largest shift covers latencies of up to 2 ** (MAX_SHIFT + SUB_BUCKET_BITS) microseconds, i.e. days
+MAX_SHIFT = 32
+NUM_BUCKETS = (MAX_SHIFT + 2) * _HALF_SUB_BUCKETS
+
+
+def bucket_index(micros):
+    """
+    @return The index of the bucket of a latency, in microseconds
+    """
+    micros = max(0, int(micros))
+    shift = max(0, micros.bit_length() - SUB_BUCKET_BITS)
+    if shift > MAX_SHIFT:
+        return NUM_BUCKETS - 1
+    return shift * _HALF_SUB_BUCKETS + (micros >> shift)
+
+
+def bucket_lowest(index):
+    """
+    @return The lowest latency, in microseconds, that falls in bucket index
+    """
+    if index < 2 * _HALF_SUB_BUCKETS:
+        return index
+    shift = index // _HALF_SUB_BUCKETS - 1
+    return (index - shift * _HALF_SUB_BUCKETS) << shift
+
+
+def bucket_highest(index):
+    """
+    @return The highest latency, in microseconds, that falls in bucket index
+    """
+    return bucket_lowest(index + 1) - 1
+
+
+class LatencyHistogram(object):
+    """
+    Counts of latencies by bucket.
+
+    @param counts The NUM_BUCKETS counts to start from; all zero by default
+    """
+
+    def __init__(self, counts=None):
+        self.counts = [0] * NUM_BUCKETS if counts is None else list(counts)
+        if len(self.counts) != NUM_BUCKETS:
+            raise ValueError('Expected {} bucket counts, got {}'.format(NUM_BUCKETS, len(self.counts)))
+
+    def record(self, seconds, count=1):
+        self.counts[bucket_index(seconds * 1e6)] += count
+
+    def nonzero(self):
+        """
+        @return The (bucket index, count) of every non-empty bucket
+        """
+        return [(index, count) for index, count in enumerate(self.counts) if count]
+
+    def merge(self, other):
+        """
+        Add the counts of other to this histogram.
+        """
+        for index, count in other.nonzero():
+            self.counts[index] += count
+        return self
+
+    def since(self, earlier):
+        """
+        @return The histogram of what was recorded since `earlier`, an earlier copy of this histogram
+        """
+        return LatencyHistogram(count - earlier_count for count, earlier_count in zip(self.counts, earlier.counts))
+
+    @property
+    def total_count(self):
+        return sum(self.counts)
+
+    def percentile(self, percentile):
+        """
+        @param percentile Between 0 and 100
+        @return The highest latency, in seconds, of the bucket that percentile
+                of the recorded latencies fall under; None if nothing was recorded
+        """
+        total = self.total_count
+        if total == 0:
+            return None
+        # the rank of the sample the percentile falls on, counting from 1
+        rank = max(1, -(-total * percentile // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return bucket_highest(index) / 1e6
+
+    def mean(self):
+        total = self.total_count
+        if total == 0:
+            return None
+        return sum((bucket_lowest(index) + bucket_highest(index)) / 2.0 * count for index, count in self.nonzero()) / total / 1e6
+
+    def summary(self):
+        """
+        @return A dict of the number of latencies recorded, and their mean, p50, p90, p99, p999 and max, in seconds
+        """
+        return {'count': self.total_count, 'mean': self.mean(), 'p50': self.percentile(50), 'p90': self.percentile(90),
+                'p99': self.percentile(99), 'p999': self.percentile(99.9), 'max': self.percentile(100)}
+
+    def __repr__(self):
+        return '{cls_name}({summary})'.format(cls_name=self.__class__.__name__, summary=self.summary())
@@ -0,0 +1,332 @@
+"""
+Record the operations concurrent workers issue against Cassandra, and check
+offline that the resulting history is linearizable.
+
+    history = HistoryRecorder()
+
+    # in each worker
+    op = history.invoke(worker_id, 'cas', (prev, prev + 1), key=k)
+    try:
+        applied = session.execute(...)[0][0]
+        history.complete(op, applied)
+    except WriteTimeout:
+        history.info(op)
+
+    assert_linearizable(history, CASRegister(initial=0))
+
+The checker is the Wing & Gong search with the memoization of Lowe's
+"Testing for linearizability", run separately on the operations of every
+key, since a history is linearizable if and only if the history of every
+key is.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+
+OK = 'ok'
+FAIL = 'fail'
+INFO = 'info'
+
+
+class Operation(object):
+    """
+    One operation of a history.
+
+    `invoke_index` and `complete_index` are the positions of the operation's
+    invocation and completion among all the events of its history, which
+    order them in real time. `status` is OK once the operation completed with
+    `result`, FAIL if it definitely didn't take effect, and INFO (or None, if
+    it never completed) if it may or may not have.
+    """
+    __slots__ = ('process', 'key', 'f', 'value', 'result', 'status',
+                 'invoke_index', 'complete_index', 'invoked_at', 'completed_at')
+
+    def __init__(self, process, key, f, value, invoke_index, invoked_at):
+        self.process = process
+        self.key = key
+        self.f = f
+        self.value = value
+        self.result = None
+        self.status = None
+        self.invoke_index = invoke_index
+        self.complete_index = None
+        self.invoked_at = invoked_at
+        self.completed_at = None
+
+    @property
+    def indeterminate(self):
+        return self.status not in (OK, FAIL)
+
+    def __repr__(self):
+        return '{cls_name}(process={process}, key={key}, f={f}, value={value}, result={result}, status={status})'.format(
+            cls_name=self.__class__.__name__, process=self.process, key=self.key, f=self.f,
+            value=self.value, result=self.result, status=self.status)
+
+
+class HistoryRecorder(object):
+    """
+    A thread-safe log of the invocations and completions of operations.
+
+    Events are numbered in the order they are recorded, so the numbers are
+    monotonic across all threads; wall-clock times are kept too, for reporting.
+    """
+
+    def __init__(self):
+        self.operations = []
+        self._events = 0
+        self._lock = threading.Lock()
+
+    def _next_event(self):
+        with self._lock:
+            self._events += 1
+            return self._events
+
+    def invoke(self, process, f, value=None, key=None):
+        """
+        Record that `process` is about to run operation `f` with argument `value` on `key`.
+
+        @return The Operation, to pass to complete(), fail() or info() once it's done
+        """
+        op = Operation(process, key, f, value, None, time.time())
+        with self._lock:
+            self._events += 1
+            op.invoke_index = self._events
+            self.operations.append(op)
+        return op
+
+    def _finish(self, op, status, result=None):
+        op.completed_at = time.time()
+        op.complete_index = self._next_event()
+        op.result = result
+        op.status = status
+
+    def complete(self, op, result=None):
+        """
+        Record that `op` took effect and returned `result`.
+        """
+        self._finish(op, OK, result)
+
+    def fail(self, op):
+        """
+        Record that `op` definitely didn't take effect.
+        """
+        self._finish(op, FAIL)
+
+    def info(self, op):
+        """
+        Record that `op` may or may not have taken effect, e.g. after a timeout.
+        """
+        self._finish(op, INFO)
+
+    def __len__(self):
+        return len(self.operations)
+
+
+class CASRegister(object):
+    """
+    Model of a register supporting 'read', 'write' and 'cas' operations.
+
+    A read's result is the value read. A write's value is the value written.
+    A cas's value is an (expected, new) tuple, and its result is either
+    whether it was applied, or an (applied, current) tuple when the current
+    value is known for a cas that wasn't applied, as Cassandra returns it.
+    """
+    operations = ('read', 'write', 'cas')
+
+    def __init__(self, initial=None):
+        self.initial = initial
+
+    def step(self, state, op):
+        """
+        @return The list of states the register can be in after applying `op`
+                to `state`; empty if `op` can't happen in `state`.
+        """
+        if op.f not in self.operations:
+            raise ValueError('{} does not support {} operations'.format(self.__class__.__name__, op.f))
+
+        if op.f == 'read':
+            return [state] if op.indeterminate or op.result == state else []
+        if op.f == 'write':
+            return [op.value]
+
+        expected, new = op.value
+        if op.indeterminate:
+            return [new] if state == expected else []
+        applied, current = op.result if isinstance(op.result, tuple) else (op.result, None)
+        if applied:
+            return [new] if state == expected else []
+        if isinstance(op.result, tuple):
+            return [state] if state == current else []
+        return [state] if state != expected else []
+
+
+class Register(CASRegister):
+    """
+    Model of a register supporting 'read' and 'write' operations only.
+    """
+    operations = ('read', 'write')
+
+
+class _Entry(object):
+    __slots__ = ('op_id', 'op', 'is_call', 'match', 'prev', 'next')
+
+    def __init__(self, op_id, op, is_call):
+        self.op_id = op_id
+        self.op = op
+        self.is_call = is_call
+        self.match = self.prev = self.next = None
+
+
+def _entry_list(operations):
+    """
+    Build the doubly linked list of call and return entries of `operations`
+    in real-time order, and return its head sentinel. Indeterminate operations
+    return after everything else, since they may take effect at any point
+    after they were invoked.
+    """
+    events = []
+    for op_id, op in enumerate(operations):
+        call, ret = _Entry(op_id, op, True), _Entry(op_id, op, False)
+        call.match = ret
+        events.append((op.invoke_index, call))
+        events.append((float('inf') if op.indeterminate else op.complete_index, ret))
+    events.sort(key=lambda event: event[0])
+
+    head = previous = _Entry(None, None, False)
+    for _, entry in events:
+        entry.prev, previous.next = previous, entry
+        previous = entry
+    return head
+
+
+def _lift(entry):
+    entry.prev.next = entry.next
+    entry.next.prev = entry.prev
+    match = entry.match
+    match.prev.next = match.next
+    if match.next is not None:
+        match.next.prev = match.prev
+
+
+def _unlift(entry):
+    match = entry.match
+    match.prev.next = match
+    if match.next is not None:
+        match.next.prev = match
+    entry.prev.next = entry
+    entry.next.prev = entry
+
+
+def _is_linearizable(operations, model):
+    """
+    Search for a linearization of the operations of a single key.
+
+    Calls are linearized greedily, backtracking when a return is reached
+    before its call could be linearized. Configurations already explored,
+    identified by the set of linearized operations and the model's state, are
+    never explored again; sets are Zobrist-hashed into 128 bits so that
+    memoizing them stays cheap for long histories. The model's transitions
+    are memoized too, since the search tries the same ones over and over.
+    """
+    operations = [op for op in operations if op.status != FAIL]
+    head = _entry_list(operations)
+    zobrist = [random.getrandbits(128) for _ in operations]
+
+    steps = {}
+
+    def successors(entry, state):
+        key = (entry.op_id, state)
+        if key not in steps:
+            states = model.step(state, entry.op)
+            # an indeterminate operation may also never take effect
+            if entry.op.indeterminate and state not in states:
+                states = states + [state]
+            steps[key] = states
+        return steps[key]
+
+    def try_linearize(entry, state, linearized, first_choice):
+        linearized ^= zobrist[entry.op_id]
+        states = successors(entry, state)
+        for choice in xrange(first_choice, len(states)):
+            if (linearized, states[choice]) not in cache:
+                cache.add((linearized, states[choice]))
+                return choice, states[choice]
+        return None
+
+    cache = set()
+    calls = []
+    state, linearized = model.initial, 0
+    entry = head.next
+    while head.next is not None:
+        if entry.is_call:
+            linearization = try_linearize(entry, state, linearized, 0)
+            if linearization is None:
+                entry = entry.next
+                continue
+        else:
+            # the operation returned before it could be linearized: undo the
+            # last linearized call, and try its next choice or the next call
+            while True:
+                if not calls:
+                    return False
+                entry, state, choice = calls.pop()
+                linearized ^= zobrist[entry.op_id]
+                _unlift(entry)
+                linearization = try_linearize(entry, state, linearized, choice + 1)
+                if linearization is not None:
+                    break
+                entry = entry.next
+                if entry.is_call:
+                    break
+            if linearization is None:
+                continue
+
+        choice, next_state = linearization
+        calls.append((entry, state, choice))
+        state = next_state
+        linearized ^= zobrist[entry.op_id]
+        _lift(entry)
+        entry = head.next
+    return True
+
+
+def check_linearizable(operations, model):
+    """
+    Check that a history is linearizable, one key at a time.
+
+    @param operations A HistoryRecorder, or an iterable of its Operations
+    @param model The model of each key, like CASRegister(initial=0)
+    @return The keys whose histories aren't linearizable, in the order they
+            first appear in the history
+    """
+    if isinstance(operations, HistoryRecorder):
+        operations = operations.operations
+
+    partitions = OrderedDict()
+    for op in operations:
+        partitions.setdefault(op.key, []).append(op)
+
+    return [key for key, ops in partitions.items() if not _is_linearizable(ops, model)]
+
+
+def assert_linearizable(operations, model, max_reported=50):
+    """
+    Assert that a history is linearizable, reporting the keys and the
+    operations that make it not.
+
+    @param operations A HistoryRecorder, or an iterable of its Operations
+    @param model The model of each key, like CASRegister(initial=0)
+    @param max_reported Maximum number of operations listed for each bad key
+    """
+    if isinstance(operations, HistoryRecorder):
+        operations = operations.operations
+    operations = list(operations)
+
+    bad_keys = check_linearizable(operations, model)
+    if bad_keys:
+        details = []
+        for key in bad_keys:
+            ops = sorted((op for op in operations if op.key == key), key=lambda op: op.invoke_index)
+            details.append('key {}, {} operations:\n{}'.format(key, len(ops), '\n'.join('  {}'.format(op) for op in ops[:max_reported])))
+        raise AssertionError('History is not linearizable for {} key(s): {}\n{}'.format(len(bad_keys), bad_keys, '\n'.join(details)))
@@ -0,0 +1,88 @@
+"""
+Run a command and measure the resources used by it and every process it starts.
+"""
+import os
+import subprocess
+import tempfile
+import time
+
+import psutil
+
+
+class ResourceUsage(object):
+    """
+    What a command printed, and what it took to run it.
+
+    `cpu_user` and `cpu_system` are the CPU seconds used by the command and the
+    descendants it waited for. `peak_rss` is the highest total resident memory,
+    in bytes, of the process tree, as sampled every `interval` seconds.
+    """
+
+    def __init__(self, returncode, stdout, stderr, elapsed, cpu_user, cpu_system, peak_rss, samples):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.cpu_user = cpu_user
+        self.cpu_system = cpu_system
+        self.peak_rss = peak_rss
+        self.samples = samples
+
+    def as_dict(self):
+        return {'elapsed': self.elapsed, 'cpu_user': self.cpu_user, 'cpu_system': self.cpu_system,
+                'peak_rss': self.peak_rss, 'returncode': self.returncode}
+
+    def __repr__(self):
+        return '{cls_name}({usage})'.format(cls_name=self.__class__.__name__, usage=self.as_dict())
+
+
+def _tree_rss(process):
+    rss = 0
+    try:
+        processes = [process] + process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    for p in processes:
+        try:
+            rss += p.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return rss
+
+
+def run_and_measure(args, env=None, stdin=None, interval=0.1):
+    """
+    Run args until it exits, sampling the memory of its process tree.
+
+    CPU times come from the rusage of the command once it is reaped, so they
+    are exact for the command and its descendants, as long as they were waited
+    for; memory is summed across the live processes of the tree at each sample.
+    Not supported on Windows, which has no wait4.
+
+    @param stdin String to feed to the command's standard input
+    @return A ResourceUsage
+    """
+    with tempfile.TemporaryFile() as stdin_file, tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        if stdin is not None:
+            stdin_file.write(stdin)
+            stdin_file.seek(0)
+
+        start = time.time()
+        process = subprocess.Popen(args, env=env, stdin=stdin_file, stdout=stdout_file, stderr=stderr_file)
+        tree = psutil.Process(process.pid)
+        peak_rss, samples = 0, 0
+        while True:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            peak_rss = max(peak_rss, _tree_rss(tree))
+            samples += 1
+            time.sleep(interval)
+        elapsed = time.time() - start
+        # let Popen know its process has been reaped
+        process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+        stdout_file.seek(0)
+        stderr_file.seek(0)
+        return ResourceUsage(process.returncode, stdout_file.read(), stderr_file.read(), elapsed,
+                             rusage.ru_utime, rusage.ru_stime, peak_rss, samples)
@@ -0,0 +1,234 @@
+"""
+Read the metadata of sstables, like their level, repairedAt, min and max
+timestamps or droppable tombstone ratio, straight from their Statistics.db
+component, instead of running sstablemetadata on them.
+
+    read_statistics(path, fields=('level', 'repaired_at'))
+    sstable_statistics(node, 'ks', 'cf', fields=('level',))  # every sstable of a table
+
+Supports the formats of Cassandra 2.1 to 3.x: ka, la, lb, ma, mb and mc.
+Files are memory mapped, and only the values of the fields asked for are
+decoded; histograms are skipped over unless they are needed.
+
+The Statistics.db component starts with a table of contents, the type and
+offset of each metadata component (validation, compaction, stats and, from
+3.0, serialization header); the fields read here are in the validation and
+stats components, which are laid out as in MetadataSerializer.
+"""
+import glob
+import mmap
+import os
+import re
+import struct
+import time
+
+VALIDATION, COMPACTION, STATS, HEADER = range(4)
+
+VALIDATION_FIELDS = ('partitioner', 'bloom_filter_fp_chance')
+# in the order they are serialized in
+STATS_FIELDS = ('min_timestamp', 'max_timestamp', 'min_local_deletion_time', 'max_local_deletion_time', 'min_ttl', 'max_ttl',
+                'compression_ratio', 'level', 'repaired_at', 'droppable_tombstone_ratio')
+FIELDS = VALIDATION_FIELDS + STATS_FIELDS
+
+INT_MAX = 2 ** 31 - 1
+
+_INT = struct.Struct('>i')
+_SHORT = struct.Struct('>H')
+_LONG = struct.Struct('>q')
+_TWO_LONGS = struct.Struct('>qq')
+_DOUBLE = struct.Struct('>d')
+_HISTOGRAM_BIN = struct.Struct('>dq')
+_COMMIT_LOG_POSITION_SIZE = 12
+
+_FILENAME = re.compile(r'(?:^|-)([a-z]{2})-\d+-(?:big-)?Statistics\.db$')
+
+
+def sstable_version(path):
+    """
+    @return The format version of an sstable, like 'ka' or 'mc', from the name of one of its components
+    """
+    match = _FILENAME.search(os.path.basename(path))
+    if match is None:
+        raise ValueError('Not the Statistics.db component of an sstable: {}'.format(path))
+    return match.group(1)
+
+
+class _Cursor(object):
+    """
+    Reads big-endian values from a buffer, without copying it.
+    """
+
+    def __init__(self, buf, offset):
+        self.buf = buf
+        self.offset = offset
+
+    def read(self, fmt):
+        values = fmt.unpack_from(self.buf, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def int(self):
+        return self.read(_INT)[0]
+
+    def long(self):
+        return self.read(_LONG)[0]
+
+    def double(self):
+        return self.read(_DOUBLE)[0]
+
+    def utf(self):
+        length = self.read(_SHORT)[0]
+        self.offset += length
+        return self.buf[self.offset - length:self.offset].decode('utf-8')
+
+    def estimated_histogram(self, decode):
+        """
+        @return The (bucket offsets, bucket counts) of an EstimatedHistogram if decode, else None
+        """
+        size = self.int()
+        histogram = None
+        if decode:
+            pairs = [_TWO_LONGS.unpack_from(self.buf, self.offset + i * _TWO_LONGS.size) for i in xrange(size)]
+            # the first offset is written twice
+            histogram = [offset for offset, _ in pairs[1:]], [count for _, count in pairs]
+        self.offset += size * _TWO_LONGS.size
+        return histogram
+
+    def streaming_histogram(self, decode):
+        """
+        @return The sorted (point, count) bins of a StreamingHistogram if decode, else None
+        """
+        self.int()  # max bins
+        size = self.int()
+        histogram = None
+        if decode:
+            histogram = sorted(_HISTOGRAM_BIN.unpack_from(self.buf, self.offset + i * _HISTOGRAM_BIN.size) for i in xrange(size))
+        self.offset += size * _HISTOGRAM_BIN.size
+        return histogram
+
+
+def _histogram_mean_times_count(histogram):
+    """
+    @return EstimatedHistogram.mean() * EstimatedHistogram.count()
+    """
+    offsets, counts = histogram
+    elements = sum(counts[:-1])
+    if elements == 0:
+        return 0
+    mean = -(-sum(count * offset for count, offset in zip(counts[:-1], offsets)) // elements)
+    return mean * sum(counts)
+
+
+def _streaming_histogram_sum(bins, b):
+    """
+    @return StreamingHistogram.sum(b), the estimated number of points up to b
+    """
+    if not bins or b >= bins[-1][0]:
+        return float(sum(count for _, count in bins))
+    previous = [i for i, (point, _) in enumerate(bins) if point <= b]
+    if not previous:
+        return 0.0
+    i = previous[-1]
+    (pi, mi), (pnext, mnext) = bins[i], bins[i + 1]
+    weight = (b - pi) / (pnext - pi)
+    mb = mi + (mnext - mi) * weight
+    return (mi + mb) * weight / 2 + mi / 2.0 + sum(count for _, count in bins[:i])
+
+
+def _read_validation(cursor, fields):
+    values = {'partitioner': cursor.utf()}
+    values['bloom_filter_fp_chance'] = cursor.double()
+    return dict((field, values[field]) for field in fields if field in values)
+
+
+def _read_stats(cursor, version, fields, gc_before):
+    droppable = 'droppable_tombstone_ratio' in fields
+    last_field = max(STATS_FIELDS.index(field) for field in fields)
+    # 3.0 sstables store rows, and the min local deletion time and TTLs of their cells
+    stores_rows = version >= 'ma'
+
+    values = {}
+    cursor.estimated_histogram(decode=False)  # partition sizes
+    column_counts = cursor.estimated_histogram(decode=droppable)
+    cursor.offset += _COMMIT_LOG_POSITION_SIZE
+    values['min_timestamp'] = cursor.long()
+    values['max_timestamp'] = cursor.long()
+    values['min_local_deletion_time'] = cursor.int() if stores_rows else INT_MAX
+    values['max_local_deletion_time'] = cursor.int()
+    values['min_ttl'] = cursor.int() if stores_rows else 0
+    values['max_ttl'] = cursor.int() if stores_rows else INT_MAX
+    values['compression_ratio'] = cursor.double()
+    if last_field > STATS_FIELDS.index('compression_ratio'):
+        tombstone_drop_times = cursor.streaming_histogram(decode=droppable)
+        values['level'] = cursor.int()
+        values['repaired_at'] = cursor.long()
+        if droppable:
+            columns = _histogram_mean_times_count(column_counts)
+            gc_before = int(time.time()) if gc_before is None else gc_before
+            values['droppable_tombstone_ratio'] = _streaming_histogram_sum(tombstone_drop_times, gc_before) / columns if columns > 0 else 0.0
+    return dict((field, values[field]) for field in fields)
+
+
+def read_statistics(path, fields=FIELDS, gc_before=None):
+    """
+    @param path The Statistics.db component of an sstable
+    @param fields The fields to read, from FIELDS
+    @param gc_before Time, in seconds since the epoch, before which tombstones are droppable, for
+                     droppable_tombstone_ratio; now by default, as for sstablemetadata
+    @return A dict of fields to their values. Times are in seconds for deletion times, and in
+            microseconds for timestamps, unless clients wrote them otherwise.
+    """
+    version = sstable_version(path)
+    if version < 'ka':
+        raise ValueError('Unsupported sstable format {}: {}'.format(version, path))
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError('Unknown fields {}'.format(', '.join(sorted(unknown))))
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError('Empty Statistics.db component: {}'.format(path))
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        cursor = _Cursor(buf, 0)
+        offsets = dict(cursor.read(struct.Struct('>ii')) for _ in xrange(cursor.int()))
+        values = {}
+        validation_fields = [field for field in fields if field in VALIDATION_FIELDS]
+        if validation_fields:
+            values.update(_read_validation(_Cursor(buf, offsets[VALIDATION]), validation_fields))
+        stats_fields = [field for field in fields if field in STATS_FIELDS]
+        if stats_fields:
+            values.update(_read_stats(_Cursor(buf, offsets[STATS]), version, stats_fields, gc_before))
+        return values
+    finally:
+        buf.close()
+
+
+def _is_temporary(path):
+    # sstables being written by 2.1 and 2.2 are prefixed by tmp- or tmplink-
+    return re.search(r'(?:^|-)tmp(?:link)?-', os.path.basename(path)) is not None
+
+
+def read_directory_statistics(directories, keyspace=None, table=None, fields=FIELDS, gc_before=None):
+    """
+    Read the metadata of every sstable of a table, or of every table of a keyspace, or of every
+    keyspace, in data directories, leaving out the sstables still being written.
+
+    @return A dict of the path of the Statistics.db component of every sstable to its fields
+    """
+    if isinstance(directories, basestring):
+        directories = [directories]
+    statistics = {}
+    for directory in directories:
+        pattern = os.path.join(directory, keyspace or '*', '{}-*'.format(table) if table else '*', '*Statistics.db')
+        for path in glob.glob(pattern):
+            if not _is_temporary(path):
+                statistics[path] = read_statistics(path, fields, gc_before)
+    return statistics
+
+
+def sstable_statistics(node, keyspace=None, table=None, fields=FIELDS, gc_before=None):
+    """
+    read_directory_statistics() of the data directories of a ccm node.
+    """
+    return read_directory_statistics(node.data_directories(), keyspace, table, fields, gc_before)